@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Detect adjusted-price revisions (dividends, splits) without refetching history.
+
+Every bar is fetched with adjusted=True, so a corporate action rescales all
+of a ticker's earlier bars upstream while the bar cache and the stock-ss*
+collections keep the old values. Instead of re-downloading everything, each
+ticker keeps a fingerprint: its adjusted daily closes and volumes over the
+last few completed trading days. A check fetches that short probe window
+for the whole universe (one 1d call per planner chunk) and compares it day
+by day with the stored fingerprint:
+
+    unchanged   every overlapping close is the same
+    adjusted    all closes moved by one common factor (within a tolerance):
+                the stored history can be rescaled locally by that factor
+    revised     closes moved by different factors: history must be rebuilt
+    new         no fingerprint yet (stored for the next check)
+    unverified  the fingerprint is too old to overlap the probe window
+
+Fingerprints of adjusted and revised tickers are only replaced once their
+history has been fixed, so a check that is not applied reports them again.
+They are kept in SQLite next to the bar cache (FIINQUANT_FINGERPRINT_PATH).
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import exchange_now, get_calendar
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FINGERPRINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'adjustments.sqlite')
+DEFAULT_PROBE_DAYS = 20
+# Max relative spread of the per-day close ratios still read as one adjustment factor;
+# adjusted prices are rounded upstream, so the ratios are never exactly equal
+DEFAULT_TOLERANCE = 0.002
+
+# (days, closes, volumes) of one ticker, days as YYYY-MM-DD
+Fingerprint = Tuple[List[str], List[float], List[float]]
+ProbeFetchFn = Callable[[List[str], str, str], Optional[pd.DataFrame]]
+
+
+class FingerprintStore:
+    """Per-ticker adjusted close fingerprints in SQLite."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv('FIINQUANT_FINGERPRINT_PATH', DEFAULT_FINGERPRINT_PATH)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    ticker TEXT PRIMARY KEY,
+                    days TEXT NOT NULL,
+                    closes TEXT NOT NULL,
+                    volumes TEXT NOT NULL,
+                    checked_at REAL NOT NULL
+                )
+            ''')
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def load(self, tickers: List[str]) -> Dict[str, Fingerprint]:
+        fingerprints = {}
+        with self._connect() as conn:
+            # Stay well below SQLite's bound parameter limit
+            for i in range(0, len(tickers), 500):
+                chunk = tickers[i:i + 500]
+                rows = conn.execute(
+                    'SELECT ticker, days, closes, volumes FROM fingerprints WHERE ticker IN ('
+                    + ', '.join(['?'] * len(chunk)) + ')',
+                    chunk
+                ).fetchall()
+                for ticker, days, closes, volumes in rows:
+                    fingerprints[ticker] = (json.loads(days), json.loads(closes), json.loads(volumes))
+        return fingerprints
+
+    def save(self, fingerprints: Dict[str, Fingerprint]) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)',
+                [
+                    (ticker, json.dumps(days), json.dumps(closes), json.dumps(volumes), now)
+                    for ticker, (days, closes, volumes) in fingerprints.items()
+                ]
+            )
+
+
+def probe_window(probe_days: int, now: Optional[Any] = None) -> Tuple[date, date]:
+    """
+    First and last day of the probe: the last `probe_days` completed trading days.
+
+    Today only counts once the session has closed, since its bar still changes.
+    """
+    calendar = get_calendar()
+    now = now or exchange_now()
+    if calendar.is_trading_day(now) and now.hour * 60 + now.minute >= calendar.close_minute:
+        end = now.date()
+    else:
+        end = calendar.previous_trading_day(now)
+    start = end
+    for _ in range(max(1, probe_days) - 1):
+        start = calendar.previous_trading_day(start)
+    return start, end
+
+
+def fingerprints_from_frame(df: Optional[pd.DataFrame]) -> Dict[str, Fingerprint]:
+    """Fingerprints of the tickers in a fetched 1d frame (rows without a positive close are skipped)."""
+    if df is None or df.empty or 'ticker' not in df.columns:
+        return {}
+    frame = pd.DataFrame({
+        'ticker': df['ticker'].astype(str).str.upper(),
+        'day': pd.to_datetime(df['timestamp'], errors='coerce').dt.strftime('%Y-%m-%d'),
+        'close': pd.to_numeric(df['close'], errors='coerce'),
+        'volume': pd.to_numeric(df['volume'], errors='coerce') if 'volume' in df.columns else np.nan,
+    })
+    frame = frame[frame['day'].notna() & (frame['close'] > 0)]
+    frame = frame.drop_duplicates(['ticker', 'day'], keep='last').sort_values(['ticker', 'day'])
+    return {
+        ticker: (
+            group['day'].tolist(),
+            group['close'].tolist(),
+            # NaN is not valid JSON; a missing volume just never counts towards the volume factor
+            group['volume'].fillna(0).tolist(),
+        )
+        for ticker, group in frame.groupby('ticker', sort=False)
+    }
+
+
+def compare_fingerprints(
+    old: Optional[Fingerprint],
+    new: Fingerprint,
+    tolerance: float = DEFAULT_TOLERANCE
+) -> Dict[str, Any]:
+    """
+    Compare a stored fingerprint with a fresh probe of the same ticker.
+
+    Returns:
+        {"status"} (see the module docstring); adjusted tickers also get
+        price_factor and volume_factor (new / old) and verified_through, the
+        last day both fingerprints cover, up to which the factors are known
+        to apply
+    """
+    if old is None:
+        return {'status': 'new'}
+    old_by_day = {day: (close, volume) for day, close, volume in zip(*old)}
+    overlap = [
+        (day, old_by_day[day], (close, volume))
+        for day, close, volume in zip(*new)
+        if day in old_by_day and old_by_day[day][0] > 0
+    ]
+    if not overlap:
+        return {'status': 'unverified'}
+
+    old_closes = np.array([o[0] for _, o, _ in overlap])
+    new_closes = np.array([n[0] for _, _, n in overlap])
+    ratios = new_closes / old_closes
+    verified_through = overlap[-1][0]
+    if np.allclose(ratios, 1.0, rtol=0, atol=1e-9):
+        return {'status': 'unchanged', 'verified_through': verified_through}
+
+    factor = float(np.median(ratios))
+    if np.max(np.abs(ratios / factor - 1)) > tolerance:
+        return {'status': 'revised', 'verified_through': verified_through}
+
+    old_volumes = np.array([o[1] for _, o, _ in overlap])
+    new_volumes = np.array([n[1] for _, _, n in overlap])
+    traded = (old_volumes > 0) & (new_volumes > 0)
+    volume_factor = float(np.median(new_volumes[traded] / old_volumes[traded])) if traded.any() else 1.0
+    # Cash dividends leave volumes alone; only snap near-1 factors, splits stay exact
+    if abs(volume_factor - 1) <= tolerance:
+        volume_factor = 1.0
+    return {
+        'status': 'adjusted',
+        'price_factor': factor,
+        'volume_factor': volume_factor,
+        'verified_through': verified_through,
+    }
+
+
+def check_adjustments(
+    fetch_fn: ProbeFetchFn,
+    tickers: List[str],
+    store: FingerprintStore,
+    probe_days: int = DEFAULT_PROBE_DAYS,
+    tolerance: float = DEFAULT_TOLERANCE,
+    now: Optional[Any] = None
+) -> Tuple[Dict[str, Any], Dict[str, Fingerprint]]:
+    """
+    Probe recent adjusted daily closes and flag tickers whose adjustment changed.
+
+    Args:
+        fetch_fn: Upstream 1d fetch taking (tickers, from_date, to_date); must
+            bypass the bar cache
+        tickers: Tickers to check
+        store: Fingerprint store; unchanged, new and unverified tickers get
+            their fingerprint refreshed
+        probe_days: Completed trading days fetched per ticker
+        tolerance: Max relative spread of the close ratios of one factor
+        now: Exchange-local current time (default: now)
+
+    Returns:
+        (report, fresh fingerprints of the changed tickers). The report has
+        the probe window, the adjusted and revised tickers with their
+        details, and the unchanged count and new / unverified / missing
+        tickers. The fingerprints are to be saved once the history of their
+        tickers has been fixed.
+    """
+    start, end = probe_window(probe_days, now)
+    started = time.perf_counter()
+    fresh = fingerprints_from_frame(fetch_fn(tickers, start.isoformat(), end.isoformat()))
+    stored = store.load(tickers)
+
+    changed: Dict[str, Dict[str, Any]] = {}
+    by_status: Dict[str, List[str]] = {'unchanged': [], 'new': [], 'unverified': []}
+    refreshed = {}
+    for ticker in tickers:
+        if ticker not in fresh:
+            continue
+        result = compare_fingerprints(stored.get(ticker), fresh[ticker], tolerance)
+        if result['status'] in by_status:
+            by_status[result['status']].append(ticker)
+            refreshed[ticker] = fresh[ticker]
+        else:
+            changed[ticker] = result
+    store.save(refreshed)
+
+    missing = [ticker for ticker in tickers if ticker not in fresh]
+    if changed:
+        logger.warning(f"Adjusted prices changed for {len(changed)} tickers: {sorted(changed)}")
+    logger.info(
+        f"Adjustment check {start}..{end}: {len(by_status['unchanged'])} unchanged, {len(changed)} changed, "
+        f"{len(by_status['new'])} new, {len(by_status['unverified'])} unverified, {len(missing)} without data"
+    )
+    report = {
+        'probe_from': start.isoformat(),
+        'probe_to': end.isoformat(),
+        'checked': len(fresh),
+        'unchanged': len(by_status['unchanged']),
+        'changed': changed,
+        'new': by_status['new'],
+        'unverified': by_status['unverified'],
+        'missing': missing,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    return report, {ticker: fresh[ticker] for ticker in changed}
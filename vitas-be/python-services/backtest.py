@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Vectorized backtest of the RSI-PSAR-engulfing strategy over many tickers at once.
+
+Mirrors the signal rules of RSIPSAREngulfingStrategy
+(src/common/strategies/rsi-psar-engulfing.strategy.ts) and the result
+fields of the backtest DTOs (src/modules/backtest/dto/backtest.dto.ts), but
+works on the bars the fetcher already holds instead of replaying them
+candle by candle.
+
+Like the indicator engine, tickers sit side by side in a (bars, tickers)
+panel padded with NaN. Indicators, signal masks, stop-loss / take-profit
+levels, exits and per-trade returns are all array operations over the
+whole panel; the only Python loop left steps from one trade to the next,
+skipping buy signals that fire while a position is open.
+
+A trade enters at the close of a buy bar and exits at the first later bar
+that hits the stop-loss (filled at the stop, or the open when it gapped
+through), the take-profit (likewise), or gives a sell / price-below-PSAR
+exit signal (filled at the close). A bar that touches both levels counts
+as a stop. Positions still open at the end are closed at the last close.
+
+List-valued parameters form a grid; its runs are spread over a process
+pool, each worker receiving the panel once and reusing indicators across
+runs that only differ in thresholds.
+"""
+
+import os
+import json
+import time
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from indicators import DEFAULT_OPTIONS, psar, rsi, volume_average
+
+logger = logging.getLogger(__name__)
+
+# Strategy, risk management and market filter defaults of src/common/config/trading.config.ts
+DEFAULT_PARAMS: Dict[str, float] = dict(
+    DEFAULT_OPTIONS,
+    rsiOverbought=70,
+    rsiOversold=30,
+    stopLoss=0.08,
+    takeProfit=0.15,
+    minPrice=1000,
+    maxPrice=1000000,
+    minVolume=10000,
+    # Charged on both the entry and the exit value
+    feeRate=0.0,
+)
+
+# Parameters the indicator values depend on; runs sharing them share indicators
+INDICATOR_PARAMS = ('rsiPeriod', 'psarAfInit', 'psarAfStep', 'psarAfMax', 'volumeAvgPeriod')
+
+# analyzeTicker() skips tickers with fewer bars than this
+MIN_HISTORY = 50
+
+# Bars looked ahead per candidate entry in the first exit search pass (doubled per pass)
+EXIT_SEARCH_SPAN = 32
+
+RUN_FIELDS = ('totalTrades', 'winRate', 'totalReturnPct', 'avgTradeReturnPct', 'maxDrawdownPct', 'profitFactor')
+
+
+def parse_backtest_params(value: Any) -> Dict[str, List[float]]:
+    """
+    Parse --backtest-params (JSON object or dict) into a grid.
+
+    Every value may be a number or a list of numbers; lists are swept.
+
+    Returns:
+        Parameter -> candidate values, defaults included
+    """
+    grid = {name: [default] for name, default in DEFAULT_PARAMS.items()}
+    if not value:
+        return grid
+    overrides = json.loads(value) if isinstance(value, str) else dict(value)
+    unknown = [k for k in overrides if k not in DEFAULT_PARAMS]
+    if unknown:
+        raise ValueError(f"Unsupported backtest params: {unknown} (supported: {list(DEFAULT_PARAMS)})")
+    for name, values in overrides.items():
+        values = values if isinstance(values, list) else [values]
+        if not values or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            raise ValueError(f"Backtest param {name} needs a number or a non-empty list of numbers")
+        grid[name] = values
+    return grid
+
+
+def expand_grid(grid: Dict[str, List[float]]) -> List[Dict[str, float]]:
+    """Every parameter combination of a grid, in a stable order."""
+    names = list(grid)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(grid[n] for n in names))]
+
+
+def _iso(millis: float) -> str:
+    # Same format as Date.toISOString()
+    return datetime.fromtimestamp(millis / 1000, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _round(value: float, digits: int = 4) -> Optional[float]:
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+class BarPanel:
+    """OHLCV bars of several tickers as (bars, tickers) arrays, oldest bar first, NaN padded."""
+
+    FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'change_percent')
+
+    def __init__(self, tickers: List[str], lengths: np.ndarray, arrays: Dict[str, np.ndarray]):
+        self.tickers = tickers
+        self.lengths = lengths
+        self.depth = int(lengths.max()) if len(lengths) else 0
+        for name in self.FIELDS:
+            setattr(self, name, arrays[name])
+        self.valid = np.arange(self.depth)[:, None] < lengths[None, :]
+
+    @classmethod
+    def from_bars(cls, bars: Any, limit: Optional[int] = None) -> 'BarPanel':
+        """
+        Build a panel from a BarSet (see bar_store and fiinquant_fetcher.prepare_frame).
+
+        Args:
+            bars: Prepared bars of every ticker
+            limit: Keep only each ticker's last `limit` bars, like RunBacktestDto.limit
+
+        Tickers without bars are left out.
+        """
+        stamps = bars.millis()
+        tickers, groups = [], []
+        for ticker in bars.tickers:
+            start, stop = bars.blocks[ticker]
+            if start == stop:
+                continue
+            idx = start + np.argsort(stamps[start:stop], kind='stable')
+            if limit:
+                idx = idx[-limit:]
+            tickers.append(ticker)
+            groups.append(idx)
+
+        lengths = np.array([len(idx) for idx in groups], dtype=np.int64)
+        depth = int(lengths.max()) if len(groups) else 0
+        rows = np.concatenate([np.arange(n) for n in lengths]) if groups else np.array([], dtype=np.int64)
+        cols = np.repeat(np.arange(len(groups)), lengths)
+        flat = np.concatenate(groups) if groups else np.array([], dtype=np.int64)
+
+        arrays = {}
+        for name in cls.FIELDS:
+            panel = np.full((depth, len(groups)), np.nan)
+            panel[rows, cols] = bars.field(name)[flat].astype(np.float64)
+            arrays[name] = panel
+        return cls(tickers, lengths, arrays)
+
+
+class BacktestEngine:
+    """Run the strategy over a BarPanel for one parameter set at a time."""
+
+    def __init__(self, panel: BarPanel):
+        self.panel = panel
+        self._indicators: Dict[Tuple[float, ...], Dict[str, np.ndarray]] = {}
+
+    def indicators(self, params: Dict[str, float]) -> Dict[str, np.ndarray]:
+        """RSI, PSAR and average volume panels for `params`, computed once per indicator setting."""
+        key = tuple(float(params[name]) for name in INDICATOR_PARAMS)
+        cached = self._indicators.get(key)
+        if cached is not None:
+            return cached
+
+        p = self.panel
+        rows = np.arange(p.depth)[:, None]
+        period = int(params['rsiPeriod'])
+        rsi_values = rsi(p.close, period)
+        psar_values, trends = psar(p.high, p.low, params['psarAfInit'], params['psarAfStep'], params['psarAfMax'])
+        avg_period = int(params['volumeAvgPeriod'])
+        averages, _ = volume_average(p.volume, avg_period, params['volumeAnomalyThreshold'])
+
+        cached = {
+            # Warm-up rows are NaN, as fields left unset by calculateAllIndicators
+            'rsi': np.where(p.valid & (rows >= period), rsi_values, np.nan),
+            'psar': np.where(p.valid & (p.lengths >= 2), psar_values, np.nan),
+            'up': trends == 1,
+            'avg_volume': np.where(p.valid & (rows >= avg_period - 1), averages, np.nan),
+        }
+        self._indicators[key] = cached
+        return cached
+
+    def signals(self, params: Dict[str, float]) -> Dict[str, np.ndarray]:
+        """
+        Boolean (bars, tickers) masks of the strategy's signals at every bar.
+
+        Returns:
+            buy, sell and risk as counted by the Node strategy, and exit, the
+            sell or price-below-PSAR bars that close an open position
+        """
+        p = self.panel
+        ind = self.indicators(params)
+        rsi_now = ind['rsi']
+        rows = np.arange(p.depth)[:, None]
+
+        with np.errstate(invalid='ignore'):
+            # `!latest.rsi || !latest.psar` drops zero values too; engulfing exists from the second bar
+            ready = (
+                p.valid & (rows >= MIN_HISTORY - 1)
+                & np.isfinite(rsi_now) & (rsi_now != 0)
+                & np.isfinite(ind['psar']) & (ind['psar'] != 0)
+            )
+            liquid = (p.close >= params['minPrice']) & (p.close <= params['maxPrice']) & (p.volume >= params['minVolume'])
+            active = ready & liquid
+
+            rsi_or_50 = np.where(np.isnan(rsi_now), 50.0, rsi_now)
+            prev_rsi = np.vstack([np.full((1, rsi_now.shape[1]), 50.0), rsi_or_50[:-1]])
+            above_psar = p.close > ind['psar']
+
+            main_buy = (rsi_or_50 <= params['rsiOversold']) & ind['up'] & above_psar
+            recovery = (rsi_or_50 > prev_rsi) & ind['up'] & (rsi_or_50 < 40)
+            buy = active & (main_buy | recovery)
+            sell = active & (rsi_or_50 >= params['rsiOverbought']) & ~ind['up']
+            exit_ = sell | (active & ~above_psar)
+
+            # Risk weights summed in the Node service's order
+            # Any of the last three bars moved more than 5%
+            moves = np.abs(np.nan_to_num(p.change_percent)) > 5
+            rapid = moves.copy()
+            rapid[1:] |= moves[:-1]
+            rapid[2:] |= moves[:-2]
+            rapid[:2] = False
+            low_volume = p.volume < np.where(np.isnan(ind['avg_volume']), p.volume, ind['avg_volume']) * 0.3
+            gap = np.zeros(p.close.shape, dtype=bool)
+            gap[1:] = (p.open[1:] > p.high[:-1] * 1.02) | (p.open[1:] < p.low[:-1] * 0.98)
+            level = np.zeros(p.close.shape)
+            level = level + np.where((rsi_or_50 > 85) | (rsi_or_50 < 15), 0.3, 0.0)
+            level = level + np.where(rapid, 0.4, 0.0)
+            level = level + np.where(low_volume, 0.2, 0.0)
+            level = level + np.where(gap, 0.3, 0.0)
+            risk = active & (np.minimum(level, 1.0) >= 0.5)
+
+        return {'buy': buy, 'sell': sell, 'risk': risk, 'exit': exit_}
+
+    def trades(self, params: Dict[str, float], signals: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Simulate long trades from the buy signals.
+
+        Returns:
+            Per-trade arrays ordered by ticker and entry: col, entry_row,
+            exit_row, entry_price, exit_price, reason (0 stop-loss,
+            1 take-profit, 2 exit signal, 3 end of data) and ret (fraction,
+            fees included)
+        """
+        p = self.panel
+        depth = p.depth
+        lengths = p.lengths
+
+        # Candidate entries in (ticker, bar) order; a ticker's last bar has nothing left to trade
+        cols, rows = np.nonzero(signals['buy'].T)
+        tradable = rows < lengths[cols] - 1
+        cols, rows = cols[tradable], rows[tradable]
+        count = len(rows)
+        entry = p.close[rows, cols]
+        stop = entry * (1 - params['stopLoss'])
+        target = entry * (1 + params['takeProfit'])
+
+        # First exit-signal bar after each bar (depth when there is none)
+        marks = np.where(signals['exit'], np.arange(depth)[:, None], depth)
+        next_exit = np.vstack([
+            np.minimum.accumulate(marks[::-1], axis=0)[::-1][1:],
+            np.full((1, marks.shape[1]), depth),
+        ]) if depth else marks
+        # Last bar searched for stop / take-profit hits: the exit bar, or the ticker's last bar
+        last = np.minimum(next_exit[rows, cols], lengths[cols] - 1)
+
+        exit_row = last.copy()
+        reason = np.where(next_exit[rows, cols] < lengths[cols], 2, 3)
+        start = rows + 1
+        pending = np.arange(count)
+        span = EXIT_SEARCH_SPAN
+        while len(pending):
+            ahead = start[pending, None] + np.arange(span)[None, :]
+            inside = ahead <= last[pending, None]
+            ahead = np.minimum(ahead, depth - 1)
+            col = cols[pending, None]
+            hit_stop = inside & (p.low[ahead, col] <= stop[pending, None])
+            hit_target = inside & (p.high[ahead, col] >= target[pending, None])
+            hit = hit_stop | hit_target
+            found = hit.any(axis=1)
+            first = np.argmax(hit, axis=1)
+
+            done = pending[found]
+            exit_row[done] = start[done] + first[found]
+            reason[done] = np.where(hit_stop[found, first[found]], 0, 1)
+
+            rest = pending[~found]
+            start[rest] += span
+            pending = rest[start[rest] <= last[rest]]
+            span *= 2
+
+        exit_open = p.open[exit_row, cols]
+        exit_close = p.close[exit_row, cols]
+        gapped = exit_open > 0
+        exit_price = np.select(
+            [reason == 0, reason == 1],
+            [np.where(gapped, np.minimum(exit_open, stop), stop), np.where(gapped, np.maximum(exit_open, target), target)],
+            exit_close,
+        )
+
+        # One position per ticker: step from each trade to the first entry after its exit bar
+        keys = cols * max(depth, 1) + rows
+        chosen = []
+        i = 0
+        while i < count:
+            chosen.append(i)
+            i = int(np.searchsorted(keys, cols[i] * max(depth, 1) + exit_row[i], side='right'))
+        chosen = np.array(chosen, dtype=np.int64)
+
+        fee = params['feeRate']
+        entry, exit_price = entry[chosen], exit_price[chosen]
+        return {
+            'col': cols[chosen],
+            'entry_row': rows[chosen],
+            'exit_row': exit_row[chosen],
+            'entry_price': entry,
+            'exit_price': exit_price,
+            'reason': reason[chosen],
+            'ret': exit_price * (1 - fee) / (entry * (1 + fee)) - 1,
+        }
+
+    def _performance(self, trades: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Per-ticker trade statistics as arrays over the panel's tickers."""
+        width = len(self.panel.tickers)
+        col, ret = trades['col'], trades['ret']
+        count = np.bincount(col, minlength=width)
+        wins = np.bincount(col, weights=ret > 0, minlength=width)
+        gains = np.bincount(col, weights=np.where(ret > 0, ret, 0.0), minlength=width)
+        losses = np.bincount(col, weights=np.where(ret < 0, -ret, 0.0), minlength=width)
+        log_growth = np.log1p(ret)
+        compounded = np.expm1(np.bincount(col, weights=log_growth, minlength=width))
+
+        # Drawdown of the compounded closed-trade equity, per ticker: cumulative sums and
+        # running peaks restart at each ticker's first trade
+        drawdown = np.zeros(width)
+        if len(ret):
+            starts = np.flatnonzero(np.r_[True, col[1:] != col[:-1]])
+            equity = np.cumsum(log_growth)
+            base = np.repeat(np.r_[0.0, equity][starts], np.diff(np.r_[starts, len(ret)]))
+            equity = equity - base
+            # Offsetting each ticker far above the previous one keeps the running max inside it
+            offset = col * (np.abs(equity).max() * 2 + 1)
+            peak = np.maximum(np.maximum.accumulate(equity + offset) - offset, 0.0)
+            drawdown[col[starts]] = np.maximum.reduceat(1 - np.exp(equity - peak), starts)
+
+        return {
+            'trades': count, 'wins': wins, 'gains': gains, 'losses': losses,
+            'compounded': compounded, 'drawdown': drawdown, 'ret_sum': np.bincount(col, weights=ret, minlength=width),
+        }
+
+    def run(self, params: Dict[str, float], details: bool = True, include_trades: bool = False) -> Dict[str, Any]:
+        """
+        Backtest one parameter set.
+
+        Args:
+            params: Full parameter set (see DEFAULT_PARAMS)
+            details: Include the per-ticker results (BacktestResultDto fields);
+                without them only the run's aggregate statistics are returned
+            include_trades: Add each ticker's trades to its result
+
+        Returns:
+            BacktestSummaryDto-shaped summary plus the run's params and
+            aggregate trade statistics (see RUN_FIELDS)
+        """
+        started = time.perf_counter()
+        p = self.panel
+        signals = self.signals(params)
+        trades = self.trades(params, signals)
+        perf = self._performance(trades)
+
+        buys = signals['buy'].sum(axis=0)
+        sells = signals['sell'].sum(axis=0)
+        risks = signals['risk'].sum(axis=0)
+        ret = trades['ret']
+        total_trades = len(ret)
+        gains, losses = perf['gains'].sum(), perf['losses'].sum()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        summary: Dict[str, Any] = {
+            'totalTickers': len(p.tickers),
+            'totalCandles': int(p.lengths.sum()),
+            'totalSignals': int(buys.sum() + sells.sum() + risks.sum()),
+            'totalProcessingTimeMs': round(elapsed_ms),
+            'overallStatus': 'completed',
+            'params': params,
+            'totalTrades': total_trades,
+            'winRate': _round((ret > 0).sum() / total_trades * 100) if total_trades else None,
+            # Equal-weight portfolio: one compounded return per ticker, averaged
+            'totalReturnPct': _round(perf['compounded'].mean() * 100) if len(p.tickers) else None,
+            'avgTradeReturnPct': _round(ret.mean() * 100) if total_trades else None,
+            'maxDrawdownPct': _round(perf['drawdown'].max() * 100) if len(p.tickers) else None,
+            'profitFactor': _round(gains / losses) if losses > 0 else None,
+        }
+        if not details:
+            return summary
+
+        any_signal = signals['buy'] | signals['sell'] | signals['risk']
+        has_signal = any_signal.any(axis=0)
+        first_row = np.argmax(any_signal, axis=0)
+        last_row = p.depth - 1 - np.argmax(any_signal[::-1], axis=0)
+        bounds = np.searchsorted(trades['col'], np.arange(len(p.tickers) + 1))
+        # Tickers share one vectorized run; each is credited an equal share of its time
+        share_ms = round(elapsed_ms / len(p.tickers)) if len(p.tickers) else 0
+
+        results = []
+        for col, ticker in enumerate(p.tickers):
+            n = int(perf['trades'][col])
+            result = {
+                'ticker': ticker,
+                'totalCandles': int(p.lengths[col]),
+                'buySignals': int(buys[col]),
+                'sellSignals': int(sells[col]),
+                'riskWarnings': int(risks[col]),
+                'processingTimeMs': share_ms,
+                'status': 'completed',
+                'trades': n,
+                'winningTrades': int(perf['wins'][col]),
+                'winRate': _round(perf['wins'][col] / n * 100) if n else None,
+                'totalReturnPct': _round(perf['compounded'][col] * 100),
+                'avgTradeReturnPct': _round(perf['ret_sum'][col] / n * 100) if n else None,
+                'maxDrawdownPct': _round(perf['drawdown'][col] * 100),
+                'profitFactor': _round(perf['gains'][col] / perf['losses'][col]) if perf['losses'][col] > 0 else None,
+            }
+            if has_signal[col]:
+                result['firstSignalTime'] = _iso(p.timestamp[first_row[col], col])
+                result['lastSignalTime'] = _iso(p.timestamp[last_row[col], col])
+            if include_trades:
+                result['tradeList'] = [
+                    {
+                        'entryTime': _iso(p.timestamp[trades['entry_row'][i], col]),
+                        'exitTime': _iso(p.timestamp[trades['exit_row'][i], col]),
+                        'entryPrice': float(trades['entry_price'][i]),
+                        'exitPrice': float(trades['exit_price'][i]),
+                        'exitReason': ('stop_loss', 'take_profit', 'signal', 'end')[int(trades['reason'][i])],
+                        'returnPct': _round(trades['ret'][i] * 100),
+                    }
+                    for i in range(bounds[col], bounds[col + 1])
+                ]
+            results.append(result)
+        summary['results'] = results
+        return summary
+
+
+# Per-process engine of a grid worker, set once by the pool initializer
+_worker_engine: Optional[BacktestEngine] = None
+
+
+def _init_worker(panel: BarPanel) -> None:
+    global _worker_engine
+    _worker_engine = BacktestEngine(panel)
+
+
+def _run_in_worker(params: Dict[str, float]) -> Dict[str, Any]:
+    return _worker_engine.run(params, details=False)
+
+
+def run_grid(
+    panel: BarPanel,
+    grid: Dict[str, List[float]],
+    workers: Optional[int] = None,
+    include_trades: bool = False
+) -> Dict[str, Any]:
+    """
+    Backtest every parameter combination of `grid` and report the best.
+
+    Args:
+        panel: Bars of all tickers
+        grid: Parameter -> values (see parse_backtest_params)
+        workers: Max worker processes for grids of several runs (default: CPU count)
+        include_trades: Add the trades to the best run's per-ticker results
+
+    Returns:
+        Summary of the run with the highest totalReturnPct (see
+        BacktestEngine.run); for grids of several runs, a "grid" list with
+        the aggregate statistics of every run, best first
+    """
+    combos = expand_grid(grid)
+    engine = BacktestEngine(panel)
+    started = time.perf_counter()
+    if len(combos) == 1:
+        return engine.run(combos[0], include_trades=include_trades)
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(combos)))
+    if workers == 1:
+        runs = [engine.run(params, details=False) for params in combos]
+    else:
+        # Runs sharing indicator settings go to the same worker in one chunk where possible
+        combos.sort(key=lambda params: tuple(params[name] for name in INDICATOR_PARAMS))
+        # Spawned, not forked: serve mode and the fetch planner run threads in this process
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(panel,)) as pool:
+            runs = list(pool.map(_run_in_worker, combos, chunksize=max(1, len(combos) // (workers * 4))))
+
+    runs.sort(key=lambda run: run['totalReturnPct'] if run['totalReturnPct'] is not None else float('-inf'), reverse=True)
+    logger.info(f"Backtested {len(runs)} parameter sets over {len(panel.tickers)} tickers with {workers} workers "
+                f"in {time.perf_counter() - started:.2f}s")
+    best = engine.run(runs[0]['params'], include_trades=include_trades)
+    best['grid'] = [
+        dict({'params': run['params'], 'totalSignals': run['totalSignals']}, **{field: run[field] for field in RUN_FIELDS})
+        for run in runs
+    ]
+    best['totalProcessingTimeMs'] = round((time.perf_counter() - started) * 1000)
+    return best
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Local on-disk cache of raw FiinQuantX bars.
+
+Bars are stored in SQLite keyed by (ticker, timeframe, adjusted), together
+with the day ranges that have already been fetched for each key. A request
+is split into the sub-ranges that are still missing; only those go to
+FiinQuantX, and everything else is served from disk.
+
+The current day is never marked as covered because its bars are still
+changing, so ranges that include today always refetch today.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'bars.sqlite')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'bu', 'sd', 'fn', 'fs', 'fb']
+
+DayRange = Tuple[date, date]
+FetchFn = Callable[[List[str], str, str], Optional[pd.DataFrame]]
+
+
+def _parse_day(value: str) -> date:
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+
+def _subtract_ranges(start: date, end: date, covered: List[DayRange]) -> List[DayRange]:
+    """Return the parts of [start, end] not inside any covered range (all inclusive)."""
+    missing = []
+    cursor = start
+    for cov_start, cov_end in sorted(covered):
+        if cov_end < cursor:
+            continue
+        if cov_start > end:
+            break
+        if cov_start > cursor:
+            missing.append((cursor, min(end, cov_start - timedelta(days=1))))
+        cursor = max(cursor, cov_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
+
+
+def _merge_ranges(ranges: List[DayRange]) -> List[DayRange]:
+    """Merge overlapping or adjacent inclusive day ranges."""
+    merged: List[DayRange] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class BarCache:
+    """SQLite-backed bar cache with per-key coverage tracking and LRU eviction."""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = path or os.getenv('FIINQUANT_CACHE_PATH', DEFAULT_CACHE_PATH)
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('FIINQUANT_CACHE_MAX_MB', DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            # Must be set before the first table exists to take effect
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS bars (
+                    ticker TEXT NOT NULL,
+                    timeframe TEXT NOT NULL,
+                    adjusted INTEGER NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    open REAL, high REAL, low REAL, close REAL, volume REAL,
+                    bu REAL, sd REAL, fn REAL, fs REAL, fb REAL,
+                    PRIMARY KEY (ticker, timeframe, adjusted, timestamp)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS coverage (
+                    ticker TEXT NOT NULL,
+                    timeframe TEXT NOT NULL,
+                    adjusted INTEGER NOT NULL,
+                    from_day TEXT NOT NULL,
+                    to_day TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS coverage_key ON coverage (ticker, timeframe, adjusted);
+                CREATE TABLE IF NOT EXISTS entries (
+                    ticker TEXT NOT NULL,
+                    timeframe TEXT NOT NULL,
+                    adjusted INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (ticker, timeframe, adjusted)
+                );
+            ''')
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One connection per call keeps the cache safe to use from serve-mode threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def covered_ranges(self, conn: sqlite3.Connection, ticker: str, timeframe: str, adjusted: bool) -> List[DayRange]:
+        rows = conn.execute(
+            'SELECT from_day, to_day FROM coverage WHERE ticker = ? AND timeframe = ? AND adjusted = ?',
+            (ticker, timeframe, int(adjusted))
+        ).fetchall()
+        return [(_parse_day(f), _parse_day(t)) for f, t in rows]
+
+    def missing_ranges(self, tickers: List[str], timeframe: str, adjusted: bool, start: date, end: date) -> Dict[str, List[DayRange]]:
+        """Day ranges within [start, end] that still have to be fetched, per ticker."""
+        with self._connect() as conn:
+            return {
+                ticker: _subtract_ranges(start, end, self.covered_ranges(conn, ticker, timeframe, adjusted))
+                for ticker in tickers
+            }
+
+    def store(self, df: Optional[pd.DataFrame], tickers: List[str], timeframe: str, adjusted: bool, start: date, end: date) -> int:
+        """
+        Save fetched bars and mark [start, end] as covered for `tickers`.
+
+        Coverage stops before today so the current session is always refetched.
+
+        Returns:
+            Number of rows written
+        """
+        rows = []
+        if df is not None and not df.empty and 'ticker' in df.columns and 'timestamp' in df.columns:
+            stamps = pd.to_datetime(df['timestamp'], errors='coerce')
+            keep = stamps.notna().to_numpy()
+            count = int(keep.sum())
+            columns = [
+                df['ticker'].astype(str).to_numpy()[keep].tolist(),
+                [timeframe] * count,
+                [int(adjusted)] * count,
+                stamps[keep].dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+            ]
+            for column in BAR_COLUMNS:
+                if column in df.columns:
+                    values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+                    # NaN is kept as NULL so missing values stay distinguishable from zero
+                    columns.append([None if v != v else v for v in values.tolist()])
+                else:
+                    columns.append([None] * count)
+            rows = list(zip(*columns))
+
+        coverage_end = min(end, date.today() - timedelta(days=1))
+
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO bars (ticker, timeframe, adjusted, timestamp, '
+                + ', '.join(BAR_COLUMNS) + ') VALUES (' + ', '.join(['?'] * (4 + len(BAR_COLUMNS))) + ')',
+                rows
+            )
+            if coverage_end >= start:
+                for ticker in tickers:
+                    merged = _merge_ranges(
+                        self.covered_ranges(conn, ticker, timeframe, adjusted) + [(start, coverage_end)]
+                    )
+                    conn.execute(
+                        'DELETE FROM coverage WHERE ticker = ? AND timeframe = ? AND adjusted = ?',
+                        (ticker, timeframe, int(adjusted))
+                    )
+                    conn.executemany(
+                        'INSERT INTO coverage VALUES (?, ?, ?, ?, ?)',
+                        [(ticker, timeframe, int(adjusted), f.isoformat(), t.isoformat()) for f, t in merged]
+                    )
+        return len(rows)
+
+    def load(self, tickers: List[str], timeframe: str, adjusted: bool, start: date, end: date) -> pd.DataFrame:
+        """Read cached bars for `tickers` in [start, end], ordered by ticker then time."""
+        placeholders = ', '.join(['?'] * len(tickers))
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            df = pd.read_sql_query(
+                'SELECT ticker, timestamp, ' + ', '.join(BAR_COLUMNS) + ' FROM bars '
+                'WHERE timeframe = ? AND adjusted = ? AND ticker IN (' + placeholders + ') '
+                'AND timestamp >= ? AND timestamp < ? ORDER BY ticker, timestamp',
+                conn,
+                params=[timeframe, int(adjusted)] + list(tickers) + [
+                    start.isoformat(), (end + timedelta(days=1)).isoformat()
+                ]
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                [(ticker, timeframe, int(adjusted), now) for ticker in tickers]
+            )
+        return df
+
+    def rescale(self, ticker: str, price_factor: float, volume_factor: float, through: date) -> int:
+        """
+        Multiply a ticker's cached adjusted bars up to `through` by new adjustment factors.
+
+        Used after a corporate action changed the adjustment (see adjustments.py),
+        so the cached history does not have to be fetched again.
+
+        Returns:
+            Number of rows rescaled, over all timeframes
+        """
+        prices = ', '.join(f'{column} = {column} * ?' for column in BAR_COLUMNS[:4])
+        volumes = ', '.join(f'{column} = {column} * ?' for column in BAR_COLUMNS[4:])
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                f'UPDATE bars SET {prices}, {volumes} WHERE ticker = ? AND adjusted = 1 AND timestamp < ?',
+                [price_factor] * 4 + [volume_factor] * (len(BAR_COLUMNS) - 4)
+                + [ticker, (through + timedelta(days=1)).isoformat()]
+            )
+            return cursor.rowcount
+
+    def discard(self, ticker: str, after: Optional[date] = None) -> int:
+        """
+        Drop a ticker's cached adjusted bars (only those after `after`, when given).
+
+        Coverage is trimmed to match, so the dropped days are fetched again on
+        their next request.
+
+        Returns:
+            Number of rows dropped
+        """
+        cutoff = '' if after is None else (after + timedelta(days=1)).isoformat()
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                'DELETE FROM bars WHERE ticker = ? AND adjusted = 1 AND timestamp >= ?', (ticker, cutoff)
+            )
+            rows = conn.execute(
+                'SELECT timeframe, from_day, to_day FROM coverage WHERE ticker = ? AND adjusted = 1', (ticker,)
+            ).fetchall()
+            conn.execute('DELETE FROM coverage WHERE ticker = ? AND adjusted = 1', (ticker,))
+            if after is not None:
+                conn.executemany(
+                    'INSERT INTO coverage VALUES (?, ?, 1, ?, ?)',
+                    [
+                        (ticker, timeframe, from_day, min(_parse_day(to_day), after).isoformat())
+                        for timeframe, from_day, to_day in rows
+                        if _parse_day(from_day) <= after
+                    ]
+                )
+            return cursor.rowcount
+
+    def size_bytes(self, conn: sqlite3.Connection) -> int:
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def evict(self) -> int:
+        """
+        Drop least recently used keys until the cache fits in `max_bytes`.
+
+        Returns:
+            Number of (ticker, timeframe, adjusted) keys evicted
+        """
+        evicted = 0
+        with self._lock, self._connect() as conn:
+            while self.size_bytes(conn) > self.max_bytes:
+                oldest = conn.execute(
+                    'SELECT ticker, timeframe, adjusted FROM entries ORDER BY last_access LIMIT 1'
+                ).fetchone()
+                if oldest is None:
+                    break
+                for table in ('bars', 'coverage', 'entries'):
+                    conn.execute(
+                        f'DELETE FROM {table} WHERE ticker = ? AND timeframe = ? AND adjusted = ?', oldest
+                    )
+                conn.commit()
+                evicted += 1
+            if evicted:
+                conn.execute('PRAGMA incremental_vacuum')
+        if evicted:
+            logger.info(f"Bar cache evicted {evicted} entries to stay under {self.max_bytes} bytes")
+        return evicted
+
+    def fetch(
+        self,
+        fetch_fn: FetchFn,
+        tickers: List[str],
+        timeframe: str,
+        adjusted: bool,
+        from_date: str,
+        to_date: str
+    ) -> Optional[pd.DataFrame]:
+        """
+        Serve [from_date, to_date] from the cache, fetching only the missing day ranges.
+
+        Tickers that miss exactly the same ranges share one upstream call per
+        range. A hit/miss summary is logged to stderr.
+
+        Args:
+            fetch_fn: Upstream fetch taking (tickers, from_date, to_date)
+            tickers: List of stock symbols
+            timeframe: Data timeframe
+            adjusted: Whether prices are adjusted
+            from_date: Start date (YYYY-MM-DD)
+            to_date: End date (YYYY-MM-DD)
+
+        Returns:
+            DataFrame with the same columns as Fetch_Trading_Data output, or None if empty
+        """
+        start, end = _parse_day(from_date), _parse_day(to_date)
+        missing = self.missing_ranges(tickers, timeframe, adjusted, start, end)
+
+        groups: Dict[Tuple[DayRange, ...], List[str]] = {}
+        for ticker in tickers:
+            if missing[ticker]:
+                groups.setdefault(tuple(missing[ticker]), []).append(ticker)
+
+        upstream_calls = 0
+        fetched_rows = 0
+        for ranges, group in groups.items():
+            for gap_start, gap_end in ranges:
+                df = fetch_fn(group, gap_start.isoformat(), gap_end.isoformat())
+                upstream_calls += 1
+                fetched_rows += self.store(df, group, timeframe, adjusted, gap_start, gap_end)
+
+        result = self.load(tickers, timeframe, adjusted, start, end)
+        if upstream_calls:
+            self.evict()
+
+        hits = sum(1 for ticker in tickers if not missing[ticker])
+        full_misses = sum(1 for ticker in tickers if missing[ticker] == [(start, end)])
+        logger.info(
+            f"Bar cache {timeframe} {from_date}..{to_date}: "
+            f"hits={hits} partial={len(tickers) - hits - full_misses} misses={full_misses} "
+            f"upstream_calls={upstream_calls} fetched_rows={fetched_rows} "
+            f"cached_rows={max(len(result) - fetched_rows, 0)}"
+        )
+
+        return result if not result.empty else None
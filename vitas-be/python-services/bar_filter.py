@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Row filters applied to trading DataFrames before they are converted to bars.
+
+All conditions are evaluated on the timestamp column as NumPy arrays, so
+selecting a handful of bar times out of a large 1m pull prunes the frame
+before any per-row Python work happens. Times are the bar's own wall-clock
+time (the HH:MM shown in its ISO timestamp).
+"""
+
+import re
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from fetch_metrics import current as current_metrics
+from resample import LUNCH_BREAK_SPLIT
+
+logger = logging.getLogger(__name__)
+
+SESSIONS = ('morning', 'afternoon')
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+_CLOCK = re.compile(r'^(\d{1,2}):(\d{2})$')
+
+
+def _split(value: Any) -> List[str]:
+    if not value:
+        return []
+    items = value.split(',') if isinstance(value, str) else value
+    return [str(item).strip() for item in items if str(item).strip()]
+
+
+def _minute_of_day(text: str) -> int:
+    match = _CLOCK.match(text)
+    if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        raise ValueError(f"Invalid time '{text}' (expected HH:MM)")
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def parse_hours(value: Any) -> Set[int]:
+    """Parse --hours (HH:MM list) into minutes of the day."""
+    return {_minute_of_day(item) for item in _split(value)}
+
+
+def parse_minutes(value: Any) -> Set[int]:
+    """Parse --minutes (minute-of-hour list, e.g. 0,15,30,45)."""
+    minutes = set()
+    for item in _split(value):
+        if not item.isdigit() or int(item) > 59:
+            raise ValueError(f"Invalid minute '{item}' (expected 0-59)")
+        minutes.add(int(item))
+    return minutes
+
+
+def parse_windows(value: Any) -> List[Tuple[int, int]]:
+    """Parse --time-window (HH:MM-HH:MM list, both ends inclusive)."""
+    windows = []
+    for item in _split(value):
+        start, sep, end = item.partition('-')
+        if not sep:
+            raise ValueError(f"Invalid time window '{item}' (expected HH:MM-HH:MM)")
+        windows.append((_minute_of_day(start.strip()), _minute_of_day(end.strip())))
+    return windows
+
+
+def parse_weekdays(value: Any) -> Set[int]:
+    """Parse --weekdays (mon..sun or 0-6, Monday is 0)."""
+    days = set()
+    for item in _split(value):
+        name = item.lower()[:3]
+        if name in WEEKDAYS:
+            days.add(WEEKDAYS.index(name))
+        elif item.isdigit() and int(item) < 7:
+            days.add(int(item))
+        else:
+            raise ValueError(f"Invalid weekday '{item}' (expected mon..sun or 0-6)")
+    return days
+
+
+def _clock_fields(timestamps: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(valid, minute of day, weekday) arrays for a timestamp column."""
+    if pd.api.types.is_datetime64_any_dtype(timestamps):
+        parsed = timestamps
+    else:
+        texts = timestamps.map(lambda v: v.replace('Z', '+00:00') if isinstance(v, str) else v)
+        try:
+            parsed = pd.to_datetime(texts, format='ISO8601', errors='coerce')
+        except (ValueError, TypeError):
+            # Mixed UTC offsets: keep each value's own wall-clock time
+            parsed = None
+
+    if parsed is None:
+        values = [_parse(v) for v in texts]
+        valid = np.array([v is not None for v in values], dtype=bool)
+        minute = np.array([v.hour * 60 + v.minute if v is not None else -1 for v in values], dtype=np.int64)
+        weekday = np.array([v.weekday() if v is not None else -1 for v in values], dtype=np.int64)
+        return valid, minute, weekday
+
+    valid = parsed.notna().to_numpy()
+    minute = (parsed.dt.hour * 60 + parsed.dt.minute).fillna(-1).to_numpy(dtype=np.int64)
+    weekday = parsed.dt.weekday.fillna(-1).to_numpy(dtype=np.int64)
+    return valid, minute, weekday
+
+
+def _parse(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class BarFilter:
+    """
+    Keep only rows whose bar time matches every configured condition.
+
+    Each condition is optional; within one condition any listed value
+    matches (e.g. any of the HH:MM times, any of the windows).
+    """
+
+    def __init__(
+        self,
+        hours: Optional[Set[int]] = None,
+        minutes: Optional[Set[int]] = None,
+        windows: Optional[List[Tuple[int, int]]] = None,
+        session: Optional[str] = None,
+        weekdays: Optional[Set[int]] = None
+    ):
+        if session is not None and session not in SESSIONS:
+            raise ValueError(f"Invalid session '{session}' (expected one of {list(SESSIONS)})")
+        self.hours = hours or set()
+        self.minutes = minutes or set()
+        self.windows = windows or []
+        self.session = session
+        self.weekdays = weekdays or set()
+
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]) -> Optional['BarFilter']:
+        """Build the filter for an action's params, or None when nothing is filtered."""
+        bar_filter = cls(
+            hours=parse_hours(params.get('hours')),
+            minutes=parse_minutes(params.get('minutes')),
+            windows=parse_windows(params.get('time_window')),
+            session=params.get('session') or None,
+            weekdays=parse_weekdays(params.get('weekdays')),
+        )
+        return bar_filter if bar_filter.active else None
+
+    @property
+    def active(self) -> bool:
+        return bool(self.hours or self.minutes or self.windows or self.session or self.weekdays)
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        """Boolean array marking the rows to keep. Rows without a valid timestamp are dropped."""
+        if 'timestamp' not in df.columns:
+            return np.ones(len(df), dtype=bool)
+
+        valid, minute, weekday = _clock_fields(df['timestamp'])
+        keep = valid
+        if self.hours:
+            keep = keep & np.isin(minute, list(self.hours))
+        if self.minutes:
+            keep = keep & np.isin(minute % 60, list(self.minutes))
+        if self.windows:
+            in_window = np.zeros(len(df), dtype=bool)
+            for start, end in self.windows:
+                in_window |= (minute >= start) & (minute <= end)
+            keep = keep & in_window
+        if self.session == 'morning':
+            keep = keep & (minute < LUNCH_BREAK_SPLIT)
+        elif self.session == 'afternoon':
+            keep = keep & (minute >= LUNCH_BREAK_SPLIT)
+        if self.weekdays:
+            keep = keep & np.isin(weekday, list(self.weekdays))
+        return keep
+
+    def keep_rows(self, df: pd.DataFrame, label: str = '') -> np.ndarray:
+        """Evaluate the filter on `df` and log how many rows it prunes."""
+        with current_metrics().stage('filter'):
+            keep = self.mask(df)
+        kept = int(keep.sum())
+        logger.info(f"Bar filter{' ' + label if label else ''}: pruned {len(df) - kept} of {len(df)} rows, {kept} kept")
+        return keep
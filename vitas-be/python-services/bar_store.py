@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Compact array-backed store for converted bars.
+
+A list of bar dicts costs a dict and about a dozen boxed Python objects per
+bar, and repeats fields that follow from others (match_volume is volume,
+total_match_value is volume * close) on every row. A BarSet instead keeps
+the bars of many tickers in one contiguous typed array per stored field,
+ticker after ticker, about 64 bytes per bar plus the indicator columns:
+
+    time                      datetime64[ns]
+    open, high, low, close    float64
+    volume, foreign_buy_volume, foreign_sell_volume    int64
+
+A BarSeries is a view of one ticker's block. Slicing it by position or by
+time range shares the arrays, derived fields are computed when asked for,
+and bar dicts are only built when a series is written out as JSON
+(to_dicts; fiinquant_fetcher.json_default does it inside json.dumps).
+Binary outputs take the columns (to_columns) without building any.
+
+Times are naive local wall-clock times, the way FiinQuantX and the bar
+cache return them. Timestamps given with UTC offsets are stored as UTC
+instants and keep their original ISO text, so the output is unchanged.
+"""
+
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+
+STORED_FIELDS = (
+    'time', 'open', 'high', 'low', 'close', 'volume', 'foreign_buy_volume', 'foreign_sell_volume',
+)
+DERIVED_FIELDS = ('change', 'change_percent', 'total_match_value', 'match_volume')
+
+# Base columns of the binary output formats; match_volume equals volume
+COLUMNAR_FIELDS = [
+    'timestamp', 'open', 'high', 'low', 'close', 'volume', 'change', 'change_percent',
+    'total_match_value', 'foreign_buy_volume', 'foreign_sell_volume',
+]
+
+# Indicator column: (values, present, categories). String columns such as
+# psar_trend are stored as small integer codes into `categories`.
+Extra = Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]
+
+TimeBound = Union[None, str, datetime, np.datetime64]
+
+
+def _encode_extra(values: np.ndarray, present: np.ndarray) -> Extra:
+    if values.dtype != object:
+        return values, present, None
+    codes, categories = pd.factorize(values)
+    return codes.astype(np.min_scalar_type(max(len(categories) - 1, 0))), present, np.asarray(categories, dtype=object)
+
+
+def _decode_extra(extra: Extra, start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+    values, present, categories = extra
+    values = values[start:stop]
+    if categories is not None:
+        values = categories[values]
+    return values, present[start:stop]
+
+
+def _iso_text(time: np.ndarray) -> List[str]:
+    """ISO strings of naive datetime64 values, with fractions only where there are any."""
+    whole = time.astype('datetime64[s]')
+    text = np.datetime_as_string(whole, unit='s').tolist()
+    for i in np.flatnonzero(whole != time).tolist():
+        text[i] = pd.Timestamp(time[i]).isoformat()
+    return text
+
+
+def _local_millis(time: np.ndarray) -> np.ndarray:
+    """
+    Epoch milliseconds of naive local times.
+
+    Read the same way `new Date(iso)` reads the ISO strings of the JSON
+    output on the Node side (both processes share the machine's timezone).
+    """
+    stamps = pd.Series(time).dt.tz_localize(tzlocal(), ambiguous=True, nonexistent='shift_forward')
+    return stamps.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy(dtype='datetime64[us]').astype(np.int64) / 1000
+
+
+class BarSet:
+    """Bars of several tickers in contiguous typed columns, one block of rows per ticker."""
+
+    def __init__(
+        self,
+        tickers: List[str],
+        offsets: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        extras: Optional[Dict[str, Extra]] = None,
+        text: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            tickers: Tickers in block order
+            offsets: Row offset of every block, plus the total row count
+            columns: STORED_FIELDS arrays, blocks in `tickers` order
+            extras: Indicator columns, see Extra
+            text: ISO timestamps when `time` holds UTC instants (see module
+                docstring), None for local times
+        """
+        self.tickers = tickers
+        self.offsets = offsets
+        self.columns = columns
+        self.extras = extras or {}
+        self.text = text
+        self.blocks = {ticker: (int(offsets[i]), int(offsets[i + 1])) for i, ticker in enumerate(tickers)}
+        self._millis: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_rows(
+        cls,
+        columns: Dict[str, np.ndarray],
+        groups: Dict[str, np.ndarray],
+        extras: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None,
+        text: Optional[np.ndarray] = None
+    ) -> 'BarSet':
+        """
+        Gather the rows of each ticker into one contiguous block.
+
+        Args:
+            columns: STORED_FIELDS arrays of a whole frame
+            groups: Ticker -> row positions of its bars, in bar order
+            extras: Indicator field -> (values, present) arrays of the whole frame
+            text: Whole-frame ISO timestamps (see __init__)
+        """
+        tickers = list(groups)
+        lengths = [len(idx) for idx in groups.values()]
+        order = np.concatenate(list(groups.values())) if groups else np.array([], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64)
+        return cls(
+            tickers,
+            offsets,
+            {name: columns[name][order] for name in STORED_FIELDS},
+            {field: _encode_extra(values[order], present[order]) for field, (values, present) in (extras or {}).items()},
+            None if text is None else text[order]
+        )
+
+    @classmethod
+    def empty(cls) -> 'BarSet':
+        """A set without bars; every ticker's series is empty."""
+        columns = {name: np.array([], dtype=np.float64) for name in STORED_FIELDS}
+        columns['time'] = np.array([], dtype='datetime64[ns]')
+        for name in ('volume', 'foreign_buy_volume', 'foreign_sell_volume'):
+            columns[name] = np.array([], dtype=np.int64)
+        return cls([], np.zeros(1, dtype=np.int64), columns)
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the arrays (ISO text of offset timestamps not included)."""
+        total = sum(array.nbytes for array in self.columns.values())
+        for values, present, _ in self.extras.values():
+            total += values.nbytes + present.nbytes
+        return total
+
+    def series(self, ticker: str) -> 'BarSeries':
+        """The bars of `ticker` (empty when it has none)."""
+        start, stop = self.blocks.get(ticker, (0, 0))
+        return BarSeries(self, ticker, start, stop)
+
+    def __iter__(self) -> Iterator[Tuple[str, 'BarSeries']]:
+        for ticker in self.tickers:
+            yield ticker, self.series(ticker)
+
+    def millis(self) -> np.ndarray:
+        """Epoch milliseconds of every bar, computed once."""
+        if self._millis is None:
+            time = self.columns['time']
+            if self.text is None:
+                self._millis = _local_millis(time)
+            else:
+                self._millis = time.astype('datetime64[us]').astype(np.int64) / 1000
+        return self._millis
+
+    def field(self, name: str, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        One field of rows [start, stop): stored fields as views, derived ones computed.
+
+        Accepts STORED_FIELDS, DERIVED_FIELDS, 'timestamp' (epoch ms) and
+        'priced' (whether the bar has an open price).
+        """
+        rows = slice(start, len(self) if stop is None else stop)
+        columns = self.columns
+        if name in columns:
+            return columns[name][rows]
+        if name == 'timestamp':
+            return self.millis()[rows]
+        if name == 'match_volume':
+            return columns['volume'][rows]
+        if name == 'total_match_value':
+            return columns['volume'][rows].astype(np.float64) * columns['close'][rows]
+        if name == 'priced':
+            return columns['open'][rows] > 0
+        opens = columns['open'][rows]
+        changes = columns['close'][rows] - opens
+        if name == 'change':
+            return changes
+        if name == 'change_percent':
+            priced = opens > 0
+            change_percents = np.zeros(len(opens), dtype=np.float64)
+            change_percents[priced] = changes[priced] / opens[priced] * 100
+            return change_percents
+        raise KeyError(name)
+
+
+class BarSeries(Sequence):
+    """
+    The bars of one ticker: a view of its BarSet block.
+
+    Behaves as a read-only sequence of bar dicts (indexing and iteration
+    build them on demand); slices and time ranges are views again.
+    """
+
+    def __init__(self, bars: BarSet, ticker: str, start: int, stop: int):
+        self.bars = bars
+        self.ticker = ticker
+        self.start = start
+        self.stop = stop
+
+    @classmethod
+    def concat(cls, ticker: str, pieces: List['BarSeries']) -> 'BarSeries':
+        """One series of the bars of `pieces` in order (copied unless there is only one)."""
+        pieces = [piece for piece in pieces if len(piece)]
+        if not pieces:
+            return BarSet.empty().series(ticker)
+        if len(pieces) == 1:
+            return pieces[0]
+        first = pieces[0].bars
+        offsets = np.array([0, sum(len(piece) for piece in pieces)], dtype=np.int64)
+        columns = {
+            name: np.concatenate([piece.bars.columns[name][piece.start:piece.stop] for piece in pieces])
+            for name in STORED_FIELDS
+        }
+        extras = {}
+        for field in first.extras:
+            values, present = zip(*(_decode_extra(piece.bars.extras[field], piece.start, piece.stop) for piece in pieces))
+            extras[field] = _encode_extra(np.concatenate(values), np.concatenate(present))
+        text = None
+        if first.text is not None:
+            text = np.concatenate([piece.bars.text[piece.start:piece.stop] for piece in pieces])
+        return BarSet([ticker], offsets, columns, extras, text).series(ticker)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.take(np.arange(start, stop, step))
+            return BarSeries(self.bars, self.ticker, self.start + start, self.start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('bar index out of range')
+        return self[index:index + 1].to_dicts()[0]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.to_dicts())
+
+    def __repr__(self) -> str:
+        return f"BarSeries({self.ticker!r}, {len(self)} bars)"
+
+    def column(self, name: str) -> np.ndarray:
+        """One field of these bars (see BarSet.field)."""
+        return self.bars.field(name, self.start, self.stop)
+
+    def timestamps(self) -> List[str]:
+        """ISO timestamps, as in the JSON output."""
+        if self.bars.text is not None:
+            return self.bars.text[self.start:self.stop].tolist()
+        return _iso_text(self.column('time'))
+
+    def take(self, positions: Iterable[int]) -> 'BarSeries':
+        """A compact copy of the bars at `positions`."""
+        rows = self.start + np.asarray(positions, dtype=np.int64)
+        bars = self.bars
+        return BarSet(
+            [self.ticker],
+            np.array([0, len(rows)], dtype=np.int64),
+            {name: array[rows] for name, array in bars.columns.items()},
+            {field: (values[rows], present[rows], categories) for field, (values, present, categories) in bars.extras.items()},
+            None if bars.text is None else bars.text[rows]
+        ).series(self.ticker)
+
+    def between(self, start: TimeBound = None, end: TimeBound = None) -> 'BarSeries':
+        """
+        Bars with start <= time <= end; either bound may be left open.
+
+        Bounds are in the stored time (local wall-clock time, or UTC for
+        offset timestamps). A view when the bars are in time order, as
+        fetched bars are; otherwise a compact copy.
+        """
+        time = self.column('time')
+        low = None if start is None else np.datetime64(pd.Timestamp(start).tz_localize(None), 'ns')
+        high = None if end is None else np.datetime64(pd.Timestamp(end).tz_localize(None), 'ns')
+        if len(time) < 2 or bool(np.all(time[1:] >= time[:-1])):
+            first = 0 if low is None else int(np.searchsorted(time, low, side='left'))
+            last = len(time) if high is None else int(np.searchsorted(time, high, side='right'))
+            return self[first:max(first, last)]
+        inside = np.ones(len(time), dtype=bool)
+        if low is not None:
+            inside &= time >= low
+        if high is not None:
+            inside &= time <= high
+        return self.take(np.flatnonzero(inside))
+
+    def to_dicts(self, extra: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Market data points as dicts, the JSON output of the fetcher.
+
+        Args:
+            extra: Fields appended to every bar (e.g. the timeframe of derived series)
+        """
+        if not len(self):
+            return []
+        ticker = self.ticker
+        # Plain Python lists make the per-bar dict building below cheap
+        change_percent_list = self.column('change_percent').tolist()
+        # change_percent stays the integer 0 in JSON when there is no open price
+        for i in np.flatnonzero(~self.column('priced')).tolist():
+            change_percent_list[i] = 0
+        volume_list = self.column('volume').tolist()
+        rows = zip(
+            self.timestamps(),
+            self.column('open').tolist(),
+            self.column('high').tolist(),
+            self.column('low').tolist(),
+            self.column('close').tolist(),
+            volume_list,
+            self.column('change').tolist(),
+            change_percent_list,
+            self.column('total_match_value').tolist(),
+            self.column('foreign_buy_volume').tolist(),
+            self.column('foreign_sell_volume').tolist(),
+        )
+
+        bars = [
+            {
+                'ticker': ticker,
+                'timestamp': timestamp,
+                'open': open_price,
+                'high': high_price,
+                'low': low_price,
+                'close': close_price,
+                'volume': volume,
+                'change': change,
+                'change_percent': change_percent,
+                'total_match_value': total_match_value,
+                'foreign_buy_volume': foreign_buy,
+                'foreign_sell_volume': foreign_sell,
+                'match_volume': volume,
+            }
+            for (timestamp, open_price, high_price, low_price, close_price, volume,
+                 change, change_percent, total_match_value, foreign_buy, foreign_sell) in rows
+        ]
+
+        for field, stored in self.bars.extras.items():
+            values, present = _decode_extra(stored, self.start, self.stop)
+            for bar, value, ok in zip(bars, values.tolist(), present.tolist()):
+                if ok:
+                    bar[field] = value
+        if extra:
+            for bar in bars:
+                bar.update(extra)
+        return bars
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """
+        These bars as float64 columns for the binary output formats.
+
+        `timestamp` is epoch milliseconds, volumes are whole numbers, and
+        indicator columns are NaN where the JSON output leaves the field out
+        (psar_trend is 1/-1, flags are 1/0).
+        """
+        out = {name: self.column(name).astype(np.float64) for name in COLUMNAR_FIELDS}
+        for field, stored in self.bars.extras.items():
+            values, present = _decode_extra(stored, self.start, self.stop)
+            if field == 'psar_trend':
+                values = np.where(values == 'up', 1.0, -1.0)
+            out[field] = np.where(present, values.astype(np.float64), np.nan)
+        return out
+
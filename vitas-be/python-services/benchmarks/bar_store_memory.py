@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Memory held by converted bars: BarSet vs. the old list-of-dicts results.
+
+Converts a synthetic 1m frame with prepare_frame and measures, with
+tracemalloc, the memory retained by the BarSet and by the same bars as
+per-ticker lists of dicts (what fetch_historical_data used to return).
+Also times both conversions (outside tracemalloc), checks that time-range
+slices share the BarSet's arrays, and that indexing and slicing a series
+give the same bars as converting it whole.
+
+Usage:
+    python benchmarks/bar_store_memory.py --tickers 200 --bars 2000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fiinquant_fetcher import prepare_frame  # noqa: E402
+from indicator_throughput import synthetic_frame  # noqa: E402
+
+
+def retained(fn: Callable[[], Any]) -> Tuple[Any, int]:
+    """(result, bytes still allocated once fn returns)."""
+    tracemalloc.start()
+    result = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(fn: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BarSet vs. list-of-dicts memory')
+    parser.add_argument('--tickers', type=int, default=200)
+    parser.add_argument('--bars', type=int, default=2000)
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.tickers, args.bars)
+    tickers = [f'T{t:04d}' for t in range(args.tickers)]
+
+    bars, set_bytes = retained(lambda: prepare_frame(df, tickers))
+    dicts, dict_bytes = retained(lambda: {ticker: series.to_dicts() for ticker, series in bars})
+
+    series = bars.series(tickers[0])
+    rows = dicts[tickers[0]]
+    window = series.between('2025-01-02 10:00', '2025-01-02 11:00')
+    in_window = [row for row in rows if '2025-01-02T10:00:00' <= row['timestamp'] <= '2025-01-02T11:00:00']
+    view_parity = (
+        series[5] == rows[5] and series[-1] == rows[-1]
+        and series[10:20].to_dicts() == rows[10:20] and window.to_dicts() == in_window
+    )
+    report = {
+        'bars': len(bars),
+        'bytes_per_bar': {
+            'bar_set': round(set_bytes / len(bars), 1),
+            'list_of_dicts': round(dict_bytes / len(bars), 1),
+        },
+        'bar_set_nbytes_per_bar': round(bars.nbytes / len(bars), 1),
+        'seconds': {
+            'prepare_frame': round(timed(lambda: prepare_frame(df, tickers)), 4),
+            'to_dicts': round(timed(lambda: [series.to_dicts() for _, series in bars]), 4),
+        },
+        'time_slice': {
+            'bars': len(window),
+            'zero_copy': bool(np.shares_memory(window.column('close'), bars.columns['close'])),
+        },
+        'view_parity': view_parity,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+"""
+Offline stand-in for the FiinQuantX package, used by the benchmark suite.
+
+Put `benchmarks/fake_fiinquant` first on PYTHONPATH and `from FiinQuantX
+import FiinSession` resolves here instead of the real library. Login always
+succeeds and `Fetch_Trading_Data` generates bars shaped like
+fiinquant_1d.json (ticker, 'YYYY-MM-DD HH:MM' timestamp, open, high, low,
+close, volume, bu, sd, fn, fs, fb) on the HOSE session grid:
+
+    1d            one bar per trading day at 00:00 (weekdays that are not
+                  in vn_market_holidays.json)
+    1m/15m/1h/4h  bars starting 09:00-11:30 and 13:00-14:45, anchored at
+                  each session start (so 4h is 09:00 and 13:00)
+
+Price level, daily volatility and volume of each ticker are sampled from
+the tickers in fiinquant_1d.json; intraday closes are bridged to the daily
+close, so the last 1m bar of a day closes where the 1d bar does. Every bar
+depends only on its ticker, timeframe, time and the seed, so fetches split
+by ticker chunk or date window return the same bars as one big fetch.
+
+Environment:
+    FAKE_FIINQUANT_SEED          Seed mixed into every ticker (default 0)
+    FAKE_FIINQUANT_LATENCY_MS    Sleep per Fetch_Trading_Data call (default 0)
+    FAKE_FIINQUANT_LOGIN_MS      Sleep per login (default 0)
+    FAKE_FIINQUANT_TOKEN_TTL     Seconds a login's token stays valid (default 3600)
+    FAKE_FIINQUANT_REALTIME_BARS Bars returned by realtime=True without a
+                                 callback (default 1)
+    FAKE_FIINQUANT_INTERVAL      Seconds between callback updates (default 0.05)
+    FAKE_FIINQUANT_PROFILE       Sample file (default ../../fiinquant_1d.json)
+    FAKE_FIINQUANT_HOLIDAYS      Exchange holiday file (default ../../vn_market_holidays.json)
+    FAKE_FIINQUANT_LOG           Append one JSON line per login and upstream call here
+"""
+
+import os
+import json
+import time
+import zlib
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+__version__ = 'fake'
+
+SESSIONS = ((540, 690), (780, 885))
+BAR_MINUTES = {'1m': 1, '5m': 5, '15m': 15, '30m': 30, '1h': 60, '4h': 240}
+COLUMNS = ['ticker', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'bu', 'sd', 'fn', 'fs', 'fb']
+EPOCH = np.datetime64('2000-01-03', 'D')
+MEMORY_DAYS = 250
+REVERSION = 0.98
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+DEFAULT_PROFILE = os.path.join(SERVICES_DIR, 'fiinquant_1d.json')
+DEFAULT_HOLIDAYS = os.path.join(SERVICES_DIR, 'vn_market_holidays.json')
+
+_profiles: Optional[List[Dict[str, float]]] = None
+_holidays: Optional[np.ndarray] = None
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _load_profiles() -> List[Dict[str, float]]:
+    """Per-ticker price level, daily log-return volatility and volume from the sample file."""
+    global _profiles
+    if _profiles is not None:
+        return _profiles
+
+    profiles = []
+    try:
+        with open(os.getenv('FAKE_FIINQUANT_PROFILE', DEFAULT_PROFILE), encoding='utf-8') as f:
+            sample = pd.DataFrame(json.load(f))
+        for _, rows in sample.groupby('ticker', sort=True):
+            close = rows['close'].to_numpy(dtype=np.float64)
+            close = close[close > 0]
+            if len(close) < 2:
+                continue
+            volume = rows['volume'].to_numpy(dtype=np.float64)
+            profiles.append({
+                'price': float(close[-1]),
+                'volatility': float(np.std(np.diff(np.log(close)))) or 0.02,
+                'volume': float(max(np.median(volume), 100.0)),
+            })
+    except (OSError, ValueError, KeyError):
+        pass
+    _profiles = profiles or [{'price': 12350.0, 'volatility': 0.025, 'volume': 5000.0}]
+    return _profiles
+
+
+def _tick_size(price: np.ndarray) -> np.ndarray:
+    """HOSE price steps: 10 below 10,000, 50 below 50,000, 100 above."""
+    return np.where(price < 10000, 10.0, np.where(price < 50000, 50.0, 100.0))
+
+
+def _load_holidays() -> np.ndarray:
+    """Exchange holidays on which no bars are generated."""
+    global _holidays
+    if _holidays is None:
+        try:
+            with open(os.getenv('FAKE_FIINQUANT_HOLIDAYS', DEFAULT_HOLIDAYS), encoding='utf-8') as f:
+                data = json.load(f)
+            _holidays = np.array(data.get('holidays', []) if isinstance(data, dict) else data, dtype='datetime64[ns]')
+        except (OSError, ValueError):
+            _holidays = np.array([], dtype='datetime64[ns]')
+    return _holidays
+
+
+def bar_grid(by: str, start: datetime, end: datetime) -> pd.DatetimeIndex:
+    """Bar start times of timeframe `by` between `start` and `end` (inclusive)."""
+    days = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq='D')
+    days = days[(days.weekday < 5) & ~days.isin(_load_holidays())]
+    if by == '1d':
+        grid = days
+    else:
+        grid = pd.DatetimeIndex((days.values[:, None] + _slot_offsets(by)[None, :]).ravel())
+    return grid[(grid >= pd.Timestamp(start)) & (grid <= pd.Timestamp(end))]
+
+
+def _slot_offsets(by: str) -> np.ndarray:
+    step = BAR_MINUTES.get(by, 240)
+    minutes = np.concatenate([np.arange(open_, close, step) for open_, close in SESSIONS])
+    return minutes.astype('timedelta64[m]')
+
+
+def _normal(key: int, counters: np.ndarray, stream: int) -> np.ndarray:
+    """
+    Standard normal noise that depends only on (key, counter, stream).
+
+    A splitmix64 hash of the counter replaces a sequential RNG, so any bar
+    can be generated without generating the bars before it.
+    """
+    with np.errstate(over='ignore'):
+        base = counters.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) + np.uint64(key)
+        uniforms = []
+        for salt in (2 * stream + 1, 2 * stream + 2):
+            z = base + np.uint64(salt * 0xD1B54A32D192ED03 % 2 ** 64)
+            z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            z = z ^ (z >> np.uint64(31))
+            uniforms.append(((z >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53)
+    return np.sqrt(-2.0 * np.log(uniforms[0])) * np.cos(2.0 * np.pi * uniforms[1])
+
+
+def _daily_log_closes(key: int, profile: Dict[str, float], day_index: np.ndarray) -> np.ndarray:
+    """
+    Log close of each business day in `day_index` (ascending, gaps allowed
+    for holidays): a mean-reverting walk around the profile price, truncated
+    to MEMORY_DAYS so each day is computed alone.
+    """
+    lookback = np.arange(day_index[0] - MEMORY_DAYS + 1, day_index[-1] + 1)
+    shocks = _normal(key, lookback, 0) * profile['volatility']
+    kernel = REVERSION ** np.arange(MEMORY_DAYS)
+    deviation = np.convolve(shocks, kernel)[MEMORY_DAYS - 1:len(shocks)]
+    return np.log(profile['price']) + deviation[day_index - day_index[0]]
+
+
+def _ticker_bars(ticker: str, by: str, days: pd.DatetimeIndex, seed: int) -> Dict[str, np.ndarray]:
+    key = (zlib.crc32(ticker.encode('utf-8')) ^ seed) & 0xFFFFFFFF
+    profiles = _load_profiles()
+    profile = profiles[key % len(profiles)]
+
+    day_index = np.busday_count(EPOCH, days.values.astype('datetime64[D]'))
+    # The first day opens from the previous trading day's close, skipping holidays
+    first = days.values[:1].astype('datetime64[D]')
+    previous_day = np.busday_offset(first, -1, roll='backward', holidays=_load_holidays().astype('datetime64[D]'))
+    daily = _daily_log_closes(key, profile, np.concatenate([np.busday_count(EPOCH, previous_day), day_index]))
+    previous, closes = daily[:-1], daily[1:]
+
+    if by == '1d':
+        counters = day_index * 1024
+        close_log = closes
+        open_log = previous + _normal(key, counters, 1) * profile['volatility'] / 4
+        sigma = profile['volatility']
+        slots = 1
+    else:
+        slots = len(_slot_offsets(by))
+        sigma = profile['volatility'] / np.sqrt(slots)
+        counters = (day_index[:, None] * 1024 + np.arange(slots)[None, :]).ravel()
+        # Brownian bridge from the previous day's close to this day's close
+        steps = (_normal(key, counters, 1) * sigma).reshape(len(days), slots)
+        path = np.cumsum(steps, axis=1)
+        fraction = np.arange(1, slots + 1) / slots
+        path += fraction * ((closes - previous)[:, None] - path[:, -1:])
+        close_log = (previous[:, None] + path).ravel()
+        open_log = np.concatenate([[previous[0]], close_log[:-1]])
+        open_log[::slots] = previous + _normal(key, counters[::slots], 2) * sigma / 4
+
+    close, open_ = np.exp(close_log), np.exp(open_log)
+    high = np.maximum(open_, close) * np.exp(np.abs(_normal(key, counters, 3)) * sigma / 2)
+    low = np.minimum(open_, close) * np.exp(-np.abs(_normal(key, counters, 4)) * sigma / 2)
+
+    tick = _tick_size(close)
+    close, open_ = np.round(close / tick) * tick, np.round(open_ / tick) * tick
+    high = np.maximum(np.ceil(high / tick) * tick, np.maximum(open_, close))
+    low = np.minimum(np.floor(low / tick) * tick, np.minimum(open_, close))
+
+    volume = np.floor(np.exp(np.log(profile['volume'] / slots) + _normal(key, counters, 5)))
+    buy = np.floor(volume * (0.5 + 0.15 * np.tanh(_normal(key, counters, 6))))
+    foreign_buy = np.floor(volume * 0.05 * np.abs(np.tanh(_normal(key, counters, 7))))
+    foreign_sell = np.floor(volume * 0.05 * np.abs(np.tanh(_normal(key, counters, 8))))
+    return {
+        'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume,
+        'bu': buy, 'sd': volume - buy, 'fn': foreign_buy - foreign_sell, 'fs': foreign_sell, 'fb': foreign_buy,
+    }
+
+
+def generate_bars(tickers: List[str], by: str, start: datetime, end: datetime, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic trading data for `tickers` on the `by` grid between `start` and `end`.
+
+    Every bar is a pure function of (ticker, timeframe, bar time, seed), so
+    the same bar has the same values whatever range or ticker chunk it was
+    requested in.
+    """
+    grid = bar_grid(by, start, end)
+    if not len(grid) or not tickers:
+        return pd.DataFrame(columns=COLUMNS)
+
+    days = pd.DatetimeIndex(np.unique(grid.normalize()))
+    full = bar_grid(by, days[0], days[-1] + pd.Timedelta(hours=23, minutes=59))
+    window = (full >= grid[0]) & (full <= grid[-1])
+    stamps = grid.strftime('%Y-%m-%d %H:%M').to_numpy()
+
+    frames = []
+    for ticker in tickers:
+        columns = _ticker_bars(ticker, by, days, seed)
+        frame = {'ticker': ticker, 'timestamp': stamps}
+        frame.update({name: values[window] for name, values in columns.items()})
+        frames.append(pd.DataFrame(frame))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _parse_date(value: Any, default: datetime, end_of_day: bool = False) -> datetime:
+    if not value:
+        return default
+    parsed = pd.Timestamp(value).to_pydatetime()
+    if end_of_day and len(str(value)) <= 10:
+        parsed = parsed.replace(hour=23, minute=59)
+    return parsed
+
+
+def _log_call(record: Dict[str, Any]) -> None:
+    path = os.getenv('FAKE_FIINQUANT_LOG')
+    if path:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+class _Update:
+    """Realtime callback payload, like FiinQuantX's update objects."""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+
+    def to_dataFrame(self) -> pd.DataFrame:
+        return self.frame
+
+
+class TradingDataEvent:
+    """Result of Fetch_Trading_Data: data is generated on get_data()."""
+
+    def __init__(self, realtime: bool = False, tickers: Any = None, by: str = '1d',
+                 from_date: Any = None, to_date: Any = None, period: Optional[int] = None,
+                 callback: Optional[Callable[[Any], None]] = None, **kwargs: Any):
+        self.realtime = realtime
+        self.tickers = [tickers] if isinstance(tickers, str) else list(tickers or [])
+        self.by = by
+        self.from_date = from_date
+        self.to_date = to_date
+        self.period = period
+        self.callback = callback
+        self.seed = int(_env_float('FAKE_FIINQUANT_SEED', 0))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _latest(self, count: int) -> pd.DataFrame:
+        now = datetime.now()
+        days = max(7, count * 2 if self.by == '1d' else count // 40 + 7)
+        frame = generate_bars(self.tickers, self.by, now - timedelta(days=days), now, self.seed)
+        return frame.groupby('ticker', sort=False).tail(count).reset_index(drop=True)
+
+    def get_data(self) -> Optional[pd.DataFrame]:
+        started = time.perf_counter()
+        time.sleep(_env_float('FAKE_FIINQUANT_LATENCY_MS', 0) / 1000)
+
+        if self.realtime and self.callback is not None:
+            self._thread = threading.Thread(target=self._run_callbacks, daemon=True)
+            self._thread.start()
+            return None
+
+        if self.realtime:
+            frame = self._latest(int(_env_float('FAKE_FIINQUANT_REALTIME_BARS', 1)))
+        else:
+            end = _parse_date(self.to_date, datetime.now(), end_of_day=True)
+            start = _parse_date(self.from_date, end - timedelta(days=30))
+            frame = generate_bars(self.tickers, self.by, start, end, self.seed)
+            if self.period and not self.from_date:
+                frame = frame.groupby('ticker', sort=False).tail(self.period).reset_index(drop=True)
+
+        _log_call({
+            'realtime': bool(self.realtime), 'by': self.by, 'tickers': len(self.tickers),
+            'from_date': str(self.from_date), 'to_date': str(self.to_date),
+            'rows': len(frame), 'ms': round((time.perf_counter() - started) * 1000, 3),
+        })
+        return frame
+
+    def _run_callbacks(self) -> None:
+        interval = _env_float('FAKE_FIINQUANT_INTERVAL', 0.05)
+        while not self._stop.is_set():
+            self.callback(_Update(self._latest(1)))
+            self._stop.wait(interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class FiinClient:
+    """Logged-in client returned by FiinSession.login(), holding a bearer token."""
+
+    def __init__(self, access_token: str = '', expired_token: float = 0.0):
+        self.access_token = access_token
+        self.expired_token = expired_token
+
+    def Fetch_Trading_Data(self, **kwargs: Any) -> TradingDataEvent:
+        if not self.access_token or self.expired_token <= time.time():
+            raise PermissionError('Access token is missing or expired, please login again')
+        return TradingDataEvent(**kwargs)
+
+
+class FiinSession:
+    """
+    Accepts any credentials. login() sleeps FAKE_FIINQUANT_LOGIN_MS and issues
+    a token valid for FAKE_FIINQUANT_TOKEN_TTL seconds (default 3600).
+    """
+
+    def __init__(self, username: str = '', password: str = ''):
+        self.username = username
+        self.password = password
+
+    def login(self) -> FiinClient:
+        time.sleep(_env_float('FAKE_FIINQUANT_LOGIN_MS', 0) / 1000)
+        _log_call({'login': True})
+        return FiinClient(
+            access_token=os.urandom(16).hex(),
+            expired_token=time.time() + _env_float('FAKE_FIINQUANT_TOKEN_TTL', 3600)
+        )
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Check that every export format gives the same gap scan.
+
+Builds one set of bars on the session grid of a past window, removes some
+slots and zeroes some opens, then writes it out in each format the gap
+scanner reads and scans every file:
+
+  naive        fetcher JSON output keyed by ticker, naive exchange-local times
+  offset       NDJSON with UTC ISO strings (mongoexport relaxed mode)
+  date_string  NDJSON with {"$date": "<UTC ISO>"}
+  date_long    NDJSON with {"$date": {"$numberLong": "<epoch ms>"}} (canonical mode)
+  epoch_ms     JSON array with plain epoch milliseconds
+  csv          CSV with naive exchange-local times
+
+All scans must match the naive one, whose ranges are checked against the
+removed slots. Also times each scan.
+
+Usage:
+    python benchmarks/gap_scan_inputs.py --tickers 50 --timeframe 15m
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gap_scanner import MINUTES_PER_DAY, load_export, scan_gaps  # noqa: E402
+from trading_calendar import EXCHANGE_TIMEZONE, bar_slots, get_calendar  # noqa: E402
+
+
+def synthetic_export(tickers: int, timeframe: str, from_date: str, to_date: str, seed: int) -> pd.DataFrame:
+    """Bars of every slot in the window, minus ~2% dropped slots and ~0.5% zero opens."""
+    rng = np.random.default_rng(seed)
+    days = np.array(get_calendar().trading_days(from_date, to_date), dtype='datetime64[D]').astype(np.int64)
+    grid = (days[:, None] * MINUTES_PER_DAY + np.array(bar_slots(timeframe))[None, :]).ravel()
+    names = np.repeat([f'T{t:03d}' for t in range(tickers)], len(grid))
+    minutes = np.tile(grid, tickers)
+    keep = rng.random(len(minutes)) > 0.02
+    opens = rng.uniform(10, 100, len(minutes))
+    opens[rng.random(len(minutes)) < 0.005] = 0.0
+    return pd.DataFrame({
+        'ticker': names[keep],
+        'time': minutes[keep].astype('datetime64[m]').astype('datetime64[ns]'),
+        'open': opens[keep],
+    })
+
+
+def write_formats(bars: pd.DataFrame, directory: str) -> Dict[str, str]:
+    """Write `bars` in every supported layout; returns format -> path."""
+    local = bars['time'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    utc = bars['time'].dt.tz_localize(EXCHANGE_TIMEZONE).dt.tz_convert('UTC')
+    iso_utc = utc.dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    epoch_ms = (utc.dt.tz_localize(None).to_numpy(dtype='datetime64[ms]').astype(np.int64)).tolist()
+    tickers, opens = bars['ticker'].tolist(), bars['open'].tolist()
+
+    def path(name: str) -> str:
+        return os.path.join(directory, f'stock-ss-{name}')
+
+    def write_lines(name: str, stamps: List[Any]) -> str:
+        with open(path(name), 'w', encoding='utf-8') as f:
+            for ticker, stamp, value in zip(tickers, stamps, opens):
+                f.write(json.dumps({'ticker': ticker, 'timestamp': stamp, 'open': value}) + '\n')
+        return path(name)
+
+    paths = {}
+    keyed: Dict[str, List[Dict[str, Any]]] = {}
+    for ticker, stamp, value in zip(tickers, local, opens):
+        keyed.setdefault(ticker, []).append({'timestamp': stamp, 'open': value})
+    with open(path('naive.json'), 'w', encoding='utf-8') as f:
+        json.dump(keyed, f)
+    paths['naive'] = path('naive.json')
+    paths['offset'] = write_lines('offset.json', iso_utc.tolist())
+    paths['date_string'] = write_lines('date_string.json', [{'$date': stamp} for stamp in iso_utc])
+    paths['date_long'] = write_lines('date_long.json', [{'$date': {'$numberLong': str(ms)}} for ms in epoch_ms])
+    with open(path('epoch_ms.json'), 'w', encoding='utf-8') as f:
+        json.dump([
+            {'ticker': ticker, 'timestamp': ms, 'open': value}
+            for ticker, ms, value in zip(tickers, epoch_ms, opens)
+        ], f)
+    paths['epoch_ms'] = path('epoch_ms.json')
+    pd.DataFrame({'ticker': tickers, 'timestamp': local, 'open': opens}).to_csv(path('csv.csv'), index=False)
+    paths['csv'] = path('csv.csv')
+    return paths
+
+
+def timed(fn: Callable[[], Any]) -> tuple:
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gap scan parity across export formats')
+    parser.add_argument('--tickers', type=int, default=50)
+    parser.add_argument('--timeframe', default='15m', choices=['1m', '15m', '1h', '4h', '1d'])
+    parser.add_argument('--from-date', default='2025-03-03')
+    parser.add_argument('--to-date', default='2025-03-28')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    bars = synthetic_export(args.tickers, args.timeframe, args.from_date, args.to_date, args.seed)
+    expected_bad = (
+        args.tickers * len(get_calendar().trading_days(args.from_date, args.to_date)) * len(bar_slots(args.timeframe))
+        - int((bars['open'] > 0).sum())
+    )
+
+    report: Dict[str, Any] = {'bars': len(bars), 'expected_bad_bars': expected_bad, 'formats': {}}
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        reference = None
+        for name, path in write_formats(bars, directory).items():
+            scan, seconds = timed(lambda: scan_gaps(
+                load_export(path), args.timeframe, args.from_date, args.to_date
+            ))
+            if reference is None:
+                reference = scan
+            bad = scan['missing_bars'] + scan['bad_opens']
+            same = scan == reference and bad == expected_bad
+            ok &= same
+            report['formats'][name] = {
+                'seconds': round(seconds, 4),
+                'ranges': len(scan['ranges']),
+                'bad_bars': bad,
+                'matches': same,
+            }
+    report['ok'] = ok
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Check the batch indicator engine against TechnicalIndicatorsService.
+
+`reference_indicators` is a line-by-line scalar port of
+calculateAllIndicators (src/common/indicators/technical-indicators.service.ts)
+and serves as the reference output. Random multi-ticker frames, including
+flat candles, zero-range bars and series shorter than every warm-up period,
+are pushed through `iter_frame_bars(..., indicators=...)` and every
+indicator field of every bar must match the reference exactly.
+
+Usage:
+    python benchmarks/indicator_parity.py --cases 50
+"""
+
+import os
+import sys
+import json
+import math
+import argparse
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicators import DEFAULT_OPTIONS, INDICATORS, IndicatorEngine  # noqa: E402
+from fiinquant_fetcher import iter_frame_bars  # noqa: E402
+
+FIELDS = ['rsi', 'psar', 'psar_trend', 'price_vs_psar', 'engulfing_pattern', 'avg_volume_20', 'volume_anomaly']
+
+
+def _rsi(prices: List[float], period: int) -> List[float]:
+    if len(prices) < period + 1:
+        return []
+    gains, losses = [], []
+    for i in range(1, len(prices)):
+        change = prices[i] - prices[i - 1]
+        gains.append(change if change > 0 else 0)
+        losses.append(abs(change) if change < 0 else 0)
+    values = []
+    avg_gain = sum_in_order(gains[:period]) / period
+    avg_loss = sum_in_order(losses[:period]) / period
+    values.append(100 - (100 / (1 + avg_gain / (avg_loss or 0.0001))))
+    for i in range(period, len(gains)):
+        avg_gain = ((avg_gain * (period - 1)) + gains[i]) / period
+        avg_loss = ((avg_loss * (period - 1)) + losses[i]) / period
+        values.append(100 - (100 / (1 + avg_gain / (avg_loss or 0.0001))))
+    return values
+
+
+def _psar(highs: List[float], lows: List[float], af_init: float, af_step: float, af_max: float):
+    if len(highs) < 2:
+        return [], []
+    psar, ep, af, trend = lows[0], highs[0], af_init, 1
+    values, trends = [psar], [trend]
+    for i in range(1, len(highs)):
+        prev = psar
+        psar = prev + af * (ep - prev)
+        if trend == 1:
+            psar = min(psar, lows[i], lows[i - 1])
+            if highs[i] > ep:
+                ep = highs[i]
+                af = min(af + af_step, af_max)
+            if lows[i] <= psar:
+                trend, psar, ep, af = -1, ep, lows[i], af_init
+        else:
+            psar = max(psar, highs[i], highs[i - 1])
+            if lows[i] < ep:
+                ep = lows[i]
+                af = min(af + af_step, af_max)
+            if highs[i] >= psar:
+                trend, psar, ep, af = 1, ep, highs[i], af_init
+        values.append(psar)
+        trends.append(trend)
+    return values, trends
+
+
+def _divide(a: float, b: float) -> float:
+    # JavaScript division: x/0 is +-Infinity, 0/0 is NaN
+    if b == 0:
+        return math.nan if a == 0 else math.copysign(math.inf, a)
+    return a / b
+
+
+def _engulfing(opens, highs, lows, closes, min_body_ratio: float) -> List[int]:
+    if len(opens) < 2:
+        return []
+    signals = [0]
+    for i in range(1, len(opens)):
+        po, pc, co, cc = opens[i - 1], closes[i - 1], opens[i], closes[i]
+        prev_ratio = _divide(abs(pc - po), highs[i - 1] - lows[i - 1])
+        curr_ratio = _divide(abs(cc - co), highs[i] - lows[i])
+        signal = 0
+        if prev_ratio >= min_body_ratio and curr_ratio >= min_body_ratio:
+            if pc < po and cc > co and co < pc and cc > po:
+                signal = 1
+            elif pc > po and cc < co and co > pc and cc < po:
+                signal = -1
+        signals.append(signal)
+    return signals
+
+
+def _volume(volumes, avg_period: int, threshold: float):
+    if len(volumes) < avg_period:
+        return [], []
+    averages, anomalies = [], []
+    for i in range(avg_period - 1, len(volumes)):
+        average = sum_in_order(volumes[i - avg_period + 1:i + 1]) / avg_period
+        averages.append(average)
+        anomalies.append(1 if volumes[i] > average * (1 + threshold) else 0)
+    return averages, anomalies
+
+
+def sum_in_order(values) -> float:
+    total = 0
+    for value in values:
+        total = total + value
+    return total
+
+
+def reference_indicators(bars: List[Dict[str, Any]], options: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Scalar port of calculateAllIndicators with snake_case output fields."""
+    if not bars:
+        return []
+    closes = [b['close'] for b in bars]
+    highs = [b['high'] for b in bars]
+    lows = [b['low'] for b in bars]
+    opens = [b['open'] for b in bars]
+    volumes = [b['volume'] for b in bars]
+
+    rsi_period = options['rsiPeriod']
+    avg_period = options['volumeAvgPeriod']
+    rsi = _rsi(closes, rsi_period)
+    psar, trends = _psar(highs, lows, options['psarAfInit'], options['psarAfStep'], options['psarAfMax'])
+    engulfing = _engulfing(opens, highs, lows, closes, options['engulfingMinBodyRatio'])
+    averages, anomalies = _volume(volumes, avg_period, options['volumeAnomalyThreshold'])
+
+    out = []
+    for index, bar in enumerate(bars):
+        fields: Dict[str, Any] = {}
+        if index >= rsi_period and len(rsi) > index - rsi_period:
+            fields['rsi'] = rsi[index - rsi_period]
+        if len(psar) > index:
+            fields['psar'] = psar[index]
+            fields['psar_trend'] = 'up' if trends[index] == 1 else 'down'
+            fields['price_vs_psar'] = bar['close'] > psar[index]
+        if len(engulfing) > index:
+            fields['engulfing_pattern'] = engulfing[index]
+        if index >= avg_period - 1 and len(averages) > index - avg_period + 1:
+            fields['avg_volume_20'] = averages[index - avg_period + 1]
+            fields['volume_anomaly'] = anomalies[index - avg_period + 1] == 1
+        out.append(fields)
+    return out
+
+
+def random_frame(rng: np.random.Generator, tickers: int) -> pd.DataFrame:
+    """Multi-ticker 1m-style frame with mixed lengths and awkward candles."""
+    frames = []
+    for t in range(tickers):
+        n = int(rng.choice([0, 1, 2, 14, 15, 19, 20, int(rng.integers(21, 400))]))
+        if n == 0:
+            continue
+        close = np.round(10000 + np.cumsum(rng.normal(0, 60, n)), -1)
+        open_ = np.round(close + rng.normal(0, 60, n), -1)
+        high = np.maximum(open_, close) + np.round(rng.exponential(30, n), -1)
+        low = np.minimum(open_, close) - np.round(rng.exponential(30, n), -1)
+        flat = rng.random(n) < 0.05
+        open_[flat] = close[flat]
+        high[flat] = close[flat]
+        low[flat] = close[flat]
+        volume = rng.integers(0, 100000, n).astype(float)
+        volume[rng.random(n) < 0.03] = np.nan
+        frames.append(pd.DataFrame({
+            'ticker': f'T{t:03d}',
+            'timestamp': pd.date_range('2025-01-02 09:00', periods=n, freq='1min').strftime('%Y-%m-%d %H:%M'),
+            'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume,
+            'bu': 0.0, 'sd': 0.0, 'fn': 0.0, 'fs': 0.0, 'fb': 0.0,
+        }))
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['ticker', 'timestamp'])
+    # Interleave tickers the way multi-ticker upstream frames arrive
+    return frame.sample(frac=1, random_state=int(rng.integers(0, 2 ** 31))).sort_values('timestamp', kind='stable')
+
+
+def same(a: Any, b: Any) -> bool:
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return type(a) is type(b) and a == b
+
+
+def check_case(rng: np.random.Generator, options: Dict[str, float]) -> int:
+    df = random_frame(rng, int(rng.integers(1, 12)))
+    tickers = [f'T{t:03d}' for t in range(12)]
+    engine = IndicatorEngine(list(INDICATORS), options)
+    checked = 0
+    for ticker, series in iter_frame_bars(df, tickers, engine):
+        bars = series.to_dicts()
+        expected = reference_indicators(bars, options)
+        for index, (bar, fields) in enumerate(zip(bars, expected)):
+            got = {k: bar[k] for k in FIELDS if k in bar}
+            if got.keys() != fields.keys() or not all(same(got[k], fields[k]) for k in fields):
+                raise AssertionError(f"{ticker} bar {index}: expected {fields}, got {got}")
+            checked += 1
+    return checked
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch indicator engine vs. calculateAllIndicators parity')
+    parser.add_argument('--cases', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    option_sets = [
+        dict(DEFAULT_OPTIONS),
+        dict(DEFAULT_OPTIONS, rsiPeriod=5, psarAfStep=0.05, psarAfMax=0.3, engulfingMinBodyRatio=0.2,
+             volumeAvgPeriod=3, volumeAnomalyThreshold=0.5),
+    ]
+    bars = 0
+    for case in range(args.cases):
+        bars += check_case(rng, option_sets[case % len(option_sets)])
+    print(json.dumps({'cases': args.cases, 'bars_checked': bars, 'parity': 'ok'}))
+
+
+if __name__ == '__main__':
+    main()
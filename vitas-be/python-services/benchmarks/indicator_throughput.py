@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Throughput of the batch indicator engine in bars per second.
+
+Times `IndicatorEngine.compute` on a synthetic multi-ticker frame, the full
+`iter_frame_bars` conversion with and without indicators, and the scalar
+per-ticker reference (a port of calculateAllIndicators) for comparison.
+
+Usage:
+    python benchmarks/indicator_throughput.py --tickers 400 --bars 1000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicators import DEFAULT_OPTIONS, INDICATORS, IndicatorEngine  # noqa: E402
+from fiinquant_fetcher import frame_to_bars, iter_frame_bars  # noqa: E402
+from indicator_parity import reference_indicators  # noqa: E402
+
+
+def synthetic_frame(tickers: int, bars: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = tickers * bars
+    close = np.round(10000 + np.cumsum(rng.normal(0, 50, (tickers, bars)), axis=1), -1).ravel()
+    open_ = np.round(close + rng.normal(0, 50, n), -1)
+    return pd.DataFrame({
+        'ticker': np.repeat([f'T{t:04d}' for t in range(tickers)], bars),
+        'timestamp': np.tile(pd.date_range('2025-01-02 09:00', periods=bars, freq='1min').strftime('%Y-%m-%d %H:%M'), tickers),
+        'open': open_,
+        'high': np.maximum(open_, close) + 20,
+        'low': np.minimum(open_, close) - 20,
+        'close': close,
+        'volume': rng.integers(0, 100000, n).astype(float),
+        'bu': 0.0, 'sd': 0.0, 'fn': 0.0, 'fs': 0.0, 'fb': 0.0,
+    })
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch indicator throughput (bars/sec)')
+    parser.add_argument('--tickers', type=int, default=400)
+    parser.add_argument('--bars', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.tickers, args.bars)
+    tickers = list(pd.unique(df['ticker']))
+    total = len(df)
+    engine = IndicatorEngine(list(INDICATORS), DEFAULT_OPTIONS)
+
+    columns = {name: df[name].to_numpy(dtype=np.float64) for name in ('open', 'high', 'low', 'close', 'volume')}
+    groups = [np.asarray(idx) for idx in df.groupby('ticker', sort=False).indices.values()]
+    bars = {ticker: series.to_dicts() for ticker, series in frame_to_bars(df, tickers).items()}
+
+    results: Dict[str, float] = {
+        'engine': timed(lambda: engine.compute(columns, groups), args.repeat),
+        'convert': timed(lambda: [b.to_dicts() for _, b in iter_frame_bars(df, tickers)], args.repeat),
+        'convert_with_indicators': timed(lambda: [b.to_dicts() for _, b in iter_frame_bars(df, tickers, engine)], args.repeat),
+        'scalar_reference': timed(lambda: [reference_indicators(b, DEFAULT_OPTIONS) for b in bars.values()], 1),
+    }
+
+    report = {
+        'tickers': args.tickers,
+        'bars_per_ticker': args.bars,
+        'total_bars': total,
+        'seconds': {k: round(v, 4) for k, v in results.items()},
+        'bars_per_sec': {k: round(total / v) for k, v in results.items()},
+    }
+    report['engine_speedup_vs_scalar'] = round(results['scalar_reference'] / results['engine'], 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Smoke test of MongoBarSink against a real MongoDB.
+
+Writes synthetic bars with every indicator into a throwaway database twice:
+the first run must insert every bar, the second must match them all and
+insert none (upserts keyed on ticker, timestamp and timeframe). Stored
+documents are then compared field by field with build_documents, including
+the indicator fields left out during warm-up. The database is dropped
+afterwards unless --keep is given.
+
+Needs pymongo and MONGODB_URI (e.g. mongodb://localhost:27017); without
+MONGODB_URI it reports itself as skipped.
+
+Usage:
+    MONGODB_URI=mongodb://localhost:27017 python benchmarks/mongo_sink_smoke.py --tickers 5 --bars 300
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fiinquant_fetcher import prepare_frame  # noqa: E402
+from indicators import INDICATORS, IndicatorEngine  # noqa: E402
+from indicator_throughput import synthetic_frame  # noqa: E402
+from mongo_sink import MongoBarSink, build_documents, collection_name, get_client  # noqa: E402
+
+TIMEFRAME = '1m'
+
+
+def write_all(sink: MongoBarSink, bars) -> Dict[str, Any]:
+    for ticker, series in bars:
+        sink.write(ticker, series.to_columns(), TIMEFRAME)
+    sink.close()
+    return sink.summary()
+
+
+def stored_mismatches(db, bars) -> List[str]:
+    """Fields whose stored value differs from build_documents, or that only one side has."""
+    mismatches = []
+    ignored = {'_id', '__v', 'createdAt', 'updatedAt'}
+    collection = db[collection_name(TIMEFRAME)]
+    for ticker, series in bars:
+        expected = build_documents(ticker, TIMEFRAME, series.to_columns())
+        stored = {doc['timestamp']: doc for doc in collection.find({'ticker': ticker})}
+        for doc in expected:
+            found = stored.get(doc['timestamp'])
+            if found is None:
+                mismatches.append(f"{ticker} {doc['timestamp']}: not stored")
+                continue
+            for field in (set(doc) | set(found)) - ignored:
+                if doc.get(field) != found.get(field):
+                    mismatches.append(f"{ticker} {doc['timestamp']} {field}: {doc.get(field)!r} != {found.get(field)!r}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MongoBarSink smoke test')
+    parser.add_argument('--tickers', type=int, default=5)
+    parser.add_argument('--bars', type=int, default=300)
+    parser.add_argument('--db', default=f'fiinquant_sink_smoke_{os.getpid()}')
+    parser.add_argument('--keep', action='store_true', help='Keep the database afterwards')
+    args = parser.parse_args()
+
+    uri = os.getenv('MONGODB_URI')
+    if not uri:
+        print(json.dumps({'skipped': 'MONGODB_URI is not set'}))
+        return
+
+    tickers = [f'T{t:04d}' for t in range(args.tickers)]
+    bars = prepare_frame(synthetic_frame(args.tickers, args.bars), tickers, IndicatorEngine(list(INDICATORS)))
+    client = get_client(uri)
+    try:
+        started = time.perf_counter()
+        first = write_all(MongoBarSink(db_name=args.db, client=client), bars)
+        second = write_all(MongoBarSink(db_name=args.db, client=client), bars)
+        elapsed = time.perf_counter() - started
+        db = client[args.db]
+        count = db[collection_name(TIMEFRAME)].count_documents({})
+        with_engulfing = db[collection_name(TIMEFRAME)].count_documents({'engulfingSignal': {'$exists': True}})
+        mismatches = stored_mismatches(db, bars)
+    finally:
+        if not args.keep:
+            client.drop_database(args.db)
+
+    ok = (
+        first['success'] and second['success']
+        and first['upserted'] == len(bars) and second['upserted'] == 0
+        and second['bars'] == len(bars) and count == len(bars)
+        and with_engulfing > 0 and not mismatches
+    )
+    print(json.dumps({
+        'bars': len(bars),
+        'first': {key: first[key] for key in ('upserted', 'modified', 'batches', 'write_errors')},
+        'second': {key: second[key] for key in ('upserted', 'modified', 'batches', 'write_errors')},
+        'stored': count,
+        'with_engulfing_signal': with_engulfing,
+        'mismatches': mismatches[:10],
+        'seconds': round(elapsed, 3),
+        'ok': ok,
+    }, indent=2, default=str))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
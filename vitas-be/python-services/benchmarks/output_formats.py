@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Compare historical output formats: NDJSON vs. MessagePack vs. Arrow columns.
+
+For a synthetic multi-ticker frame, reports per format the encoded size,
+encode time (frame -> bytes, the fetcher's side) and decode time (bytes ->
+per-ticker numeric columns, the reader's side). When `node` is on PATH the
+NDJSON decode is also timed with JSON.parse, the way FiinQuantDataService
+reads it today.
+
+Formats whose Python package (msgpack, pyarrow) is missing are skipped.
+
+Usage:
+    python benchmarks/output_formats.py --tickers 200 --bars 2000
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar_output import open_column_writer  # noqa: E402
+from fiinquant_fetcher import iter_frame_bars, iter_frame_columns  # noqa: E402
+from indicator_throughput import synthetic_frame  # noqa: E402
+
+NODE_JSON_DECODE = r"""
+const fs = require('fs');
+const text = fs.readFileSync(process.argv[1], 'utf8');
+const started = process.hrtime.bigint();
+const result = {};
+for (const line of text.split('\n')) {
+  if (!line) continue;
+  const row = JSON.parse(line);
+  (result[row.ticker] = result[row.ticker] || []).push({ timestamp: new Date(row.timestamp), close: row.close });
+}
+console.log(Number(process.hrtime.bigint() - started) / 1e6);
+"""
+
+
+def encode_ndjson(df: pd.DataFrame, tickers) -> bytes:
+    out = io.StringIO()
+    for _, bars in iter_frame_bars(df, tickers):
+        if bars:
+            out.write('\n'.join(json.dumps(bar, default=str) for bar in bars) + '\n')
+    return out.getvalue().encode('utf-8')
+
+
+def encode_columnar(fmt: str) -> Callable[[pd.DataFrame, list], bytes]:
+    def encode(df: pd.DataFrame, tickers) -> bytes:
+        out = io.BytesIO()
+        writer = open_column_writer(fmt, out)
+        for ticker, columns in iter_frame_columns(df, tickers):
+            writer.write(ticker, columns)
+        writer.close()
+        return out.getvalue()
+    return encode
+
+
+def decode_ndjson(data: bytes) -> int:
+    rows = 0
+    for line in data.decode('utf-8').splitlines():
+        json.loads(line)
+        rows += 1
+    return rows
+
+
+def decode_msgpack(data: bytes) -> int:
+    import msgpack
+    rows = 0
+    for message in msgpack.Unpacker(io.BytesIO(data), raw=False):
+        columns = {name: np.frombuffer(values, '<f8') for name, values in message['columns'].items()}
+        rows += len(columns['timestamp'])
+    return rows
+
+
+def decode_arrow(data: bytes) -> int:
+    import pyarrow
+    rows = 0
+    for batch in pyarrow.ipc.open_stream(data):
+        columns = {name: batch.column(name).to_numpy() for name in batch.schema.names[2:]}
+        rows += len(columns['timestamp'])
+    return rows
+
+
+def node_json_decode_ms(data: bytes) -> Optional[float]:
+    node = shutil.which('node')
+    if not node:
+        return None
+    with tempfile.NamedTemporaryFile(suffix='.ndjson') as handle:
+        handle.write(data)
+        handle.flush()
+        result = subprocess.run([node, '-e', NODE_JSON_DECODE, handle.name], capture_output=True, text=True, check=True)
+    return round(float(result.stdout.strip()), 1)
+
+
+def timed(fn: Callable[[], object]) -> tuple:
+    started = time.perf_counter()
+    value = fn()
+    return value, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Historical output format comparison')
+    parser.add_argument('--tickers', type=int, default=200)
+    parser.add_argument('--bars', type=int, default=2000)
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.tickers, args.bars)
+    tickers = list(pd.unique(df['ticker']))
+    formats = {
+        'ndjson': (encode_ndjson, decode_ndjson),
+        'msgpack': (encode_columnar('msgpack'), decode_msgpack),
+        'arrow': (encode_columnar('arrow'), decode_arrow),
+    }
+
+    report: Dict[str, object] = {'tickers': args.tickers, 'bars': len(df), 'formats': {}}
+    for name, (encode, decode) in formats.items():
+        try:
+            data, encode_ms = timed(lambda: encode(df, tickers))
+        except ValueError as e:
+            report['formats'][name] = {'skipped': str(e)}
+            continue
+        rows, decode_ms = timed(lambda: decode(data))
+        assert rows == len(df), f"{name} decoded {rows} of {len(df)} rows"
+        entry = {
+            'bytes': len(data),
+            'bytes_per_bar': round(len(data) / len(df), 1),
+            'encode_ms': round(encode_ms, 1),
+            'decode_ms': round(decode_ms, 1),
+        }
+        if name == 'ndjson':
+            entry['node_decode_ms'] = node_json_decode_ms(data)
+        report['formats'][name] = entry
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for fiinquant_fetcher.py.
+
+Every action runs against the fake FiinQuantX package in
+benchmarks/fake_fiinquant, so no credentials or network are needed. The
+report is one JSON document with:
+
+  startup     interpreter start alone, and `fiinquant_fetcher.py --help`
+              (all module imports, no login)
+  actions     per action / timeframe / output format, as its own process:
+              end-to-end wall time, time to first output byte, output
+              bytes and bars, and the process's peak RSS
+  conversion  in-process per timeframe: fake upstream generation, frame ->
+              bar dicts (bars/sec), and serialization time per format
+
+Ranges end at --to-date (fixed by default) so runs on different commits
+fetch the same bars. With --baseline, the relative change of every timing
+and RSS figure against a previous report is added under "baseline".
+
+The fake package also works for the other benchmarks and for manual runs:
+    PYTHONPATH=benchmarks/fake_fiinquant FIINQUANT_USERNAME=x FIINQUANT_PASSWORD=x \
+        python benchmarks/serve_latency.py --action historical --timeframe 1h
+
+Usage:
+    python benchmarks/run_suite.py --tickers 100 --timeframes 1d,1h,1m --days 30 --out results.json
+    python benchmarks/run_suite.py --out new.json --baseline results.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import importlib.util
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCHMARKS_DIR)
+FAKE_DIR = os.path.join(BENCHMARKS_DIR, 'fake_fiinquant')
+FETCHER = os.path.join(SERVICE_DIR, 'fiinquant_fetcher.py')
+TICKERS_CSV = os.path.join(SERVICE_DIR, 'all_tickers.csv')
+
+sys.path.insert(0, FAKE_DIR)
+sys.path.insert(0, SERVICE_DIR)
+
+from FiinQuantX import generate_bars  # noqa: E402
+from columnar_output import open_column_writer  # noqa: E402
+from fiinquant_fetcher import iter_frame_bars, iter_frame_columns  # noqa: E402
+
+BINARY_PACKAGES = {'msgpack': 'msgpack', 'arrow': 'pyarrow'}
+INDICATORS = 'rsi,psar,engulfing,volume'
+
+
+def load_tickers(count: int) -> List[str]:
+    """The first `count` symbols of all_tickers.csv, padded with synthetic ones."""
+    with open(TICKERS_CSV, encoding='utf-8-sig') as f:
+        tickers = [line.strip() for line in f.read().splitlines()[1:] if line.strip()]
+    tickers = tickers[:count]
+    tickers += [f'Z{i:04d}' for i in range(count - len(tickers))]
+    return tickers
+
+
+def fetcher_env(base: Dict[str, str], scratch: str) -> Dict[str, str]:
+    """Environment that makes the fetcher import the fake FiinQuantX."""
+    env = dict(base)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [FAKE_DIR, env.get('PYTHONPATH')]))
+    env['FIINQUANT_USERNAME'] = 'benchmark'
+    env['FIINQUANT_PASSWORD'] = 'benchmark'
+    env['FIINQUANT_CACHE_PATH'] = os.path.join(scratch, 'bars.sqlite')
+    env.setdefault('FAKE_FIINQUANT_INTERVAL', '0.01')
+    return env
+
+
+# Forks and waits for the measured process from a bare interpreter. A child's
+# ru_maxrss starts at its parent's RSS at fork time, so forking straight from
+# this (pandas-sized) process would inflate every figure.
+LAUNCHER = r"""
+import os, sys
+pid = os.fork()
+if pid == 0:
+    os.execv(sys.argv[2], sys.argv[2:])
+_, status, usage = os.wait4(pid, 0)
+with open(sys.argv[1], 'w') as f:
+    f.write(str(usage.ru_maxrss))
+sys.exit(os.waitstatus_to_exitcode(status))
+"""
+
+
+def run_process(argv: List[str], env: Dict[str, str], stdin_data: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Run one process to completion.
+
+    Returns wall time, time to the first stdout byte, the captured stdout
+    and the process's peak RSS.
+    """
+    with tempfile.NamedTemporaryFile(prefix='fiinquant-rss-') as rss_file:
+        result = _run_launched([sys.executable, '-c', LAUNCHER, rss_file.name] + argv, env, stdin_data)
+        max_rss = int(rss_file.read() or 0)
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    result['peak_rss_mb'] = max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return result
+
+
+def _run_launched(argv: List[str], env: Dict[str, str], stdin_data: Optional[bytes]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        argv, env=env, cwd=SERVICE_DIR,
+        stdin=subprocess.PIPE if stdin_data is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    if stdin_data is not None:
+        proc.stdin.write(stdin_data)
+        proc.stdin.close()
+
+    chunks = []
+    first_byte = None
+    while True:
+        chunk = os.read(proc.stdout.fileno(), 1 << 20)
+        if not chunk:
+            break
+        if first_byte is None:
+            first_byte = time.perf_counter()
+        chunks.append(chunk)
+    proc.stdout.close()
+
+    proc.wait()
+    finished = time.perf_counter()
+    return {
+        'exit_code': proc.returncode,
+        'wall_ms': (finished - started) * 1000,
+        'first_byte_ms': (first_byte - started) * 1000 if first_byte else None,
+        'output': b''.join(chunks),
+    }
+
+
+def count_bars(kind: str, output: bytes) -> Optional[int]:
+    """Bars (or records) in a process's stdout, for the given output kind."""
+    if kind == 'ndjson':
+        return output.count(b'\n')
+    if kind == 'serve':
+        responses = [json.loads(line) for line in output.splitlines() if line.strip()]
+        failed = [r.get('error') for r in responses if not r.get('success')]
+        if failed:
+            raise RuntimeError(failed[0])
+        # Historical answers map tickers to bar lists, latest answers map tickers to one bar
+        return sum(len(value) if isinstance(value, list) else 1
+                   for r in responses for value in r['data'].values())
+    if kind == 'msgpack':
+        import msgpack
+        return sum(message['count'] for message in msgpack.Unpacker(io.BytesIO(output), raw=False))
+    if kind == 'arrow':
+        import pyarrow
+        return sum(batch.num_rows for batch in pyarrow.ipc.open_stream(output)) if output else 0
+
+    result = json.loads(output)
+    if isinstance(result, dict) and result.get('success') is False:
+        raise RuntimeError(result.get('error'))
+    if kind == 'json-bars':
+        nested = [v for v in result.values() if isinstance(v, dict)]
+        groups = [bars for tf in nested for bars in tf.values()] if nested else list(result.values())
+        return sum(len(bars) for bars in groups)
+    if kind == 'json-latest':
+        return len(result)
+    return None
+
+
+def scenarios(args: argparse.Namespace, tickers: List[str]) -> List[Dict[str, Any]]:
+    """Every action the fetcher supports, with the output kind used to count bars."""
+    to_date = datetime.strptime(args.to_date, '%Y-%m-%d')
+    range_args = ['--from-date', (to_date - timedelta(days=args.days)).strftime('%Y-%m-%d'), '--to-date', args.to_date]
+    ticker_args = ['--tickers', ','.join(tickers)]
+    formats = ['json', 'ndjson'] + [fmt for fmt, package in BINARY_PACKAGES.items()
+                                   if importlib.util.find_spec(package) is not None]
+
+    runs = []
+    for timeframe in args.timeframes:
+        base = ['--action', 'historical', '--no-cache', '--timeframe', timeframe] + ticker_args + range_args
+        for fmt in formats:
+            if fmt == 'json':
+                extra, kind = [], 'json-bars'
+            elif fmt == 'ndjson':
+                extra, kind = ['--output', 'ndjson'], 'ndjson'
+            else:
+                extra, kind = ['--format', fmt], fmt
+            runs.append({'name': f'historical/{timeframe}/{fmt}', 'argv': base + extra, 'kind': kind})
+
+    first = args.timeframes[0]
+    runs.append({
+        'name': f'historical/{first}/json+indicators',
+        'argv': ['--action', 'historical', '--no-cache', '--timeframe', first, '--indicators', INDICATORS]
+                + ticker_args + range_args,
+        'kind': 'json-bars',
+    })
+    derived = [tf for tf in args.timeframes if tf != '1m'] or ['1h']
+    runs.append({
+        'name': f"historical/derive:{','.join(derived)}/ndjson",
+        'argv': ['--action', 'historical', '--no-cache', '--derive', ','.join(derived), '--output', 'ndjson']
+                + ticker_args + range_args,
+        'kind': 'ndjson',
+    })
+    runs.append({'name': 'latest', 'argv': ['--action', 'latest', '--no-cache'] + ticker_args, 'kind': 'json-latest'})
+    runs.append({'name': 'market-status', 'argv': ['--action', 'market-status', '--no-cache'], 'kind': 'json'})
+    runs.append({'name': 'all-tickers', 'argv': ['--action', 'all-tickers', '--no-cache'], 'kind': 'json'})
+    runs.append({
+        'name': 'stream',
+        'argv': ['--action', 'stream', '--source', 'fiinquant', '--max-updates', str(args.stream_updates),
+                 '--flush-interval', '0.05'] + ticker_args,
+        'kind': 'ndjson',
+    })
+
+    requests = []
+    for request_id in range(args.serve_requests):
+        action = 'historical' if request_id % 2 == 0 else 'latest'
+        params = {'tickers': ','.join(tickers)}
+        if action == 'historical':
+            params.update({'timeframe': first, 'from_date': range_args[1], 'to_date': range_args[3]})
+        requests.append(json.dumps({'id': request_id, 'action': action, 'params': params}))
+    runs.append({
+        'name': 'serve',
+        'argv': ['--action', 'serve', '--no-cache'],
+        'stdin': ('\n'.join(requests) + '\n').encode('utf-8'),
+        'kind': 'serve',
+    })
+    return runs
+
+
+def bench_actions(args: argparse.Namespace, tickers: List[str], env: Dict[str, str]) -> Dict[str, Any]:
+    results = {}
+    for scenario in scenarios(args, tickers):
+        samples = []
+        for _ in range(args.repeat):
+            samples.append(run_process([sys.executable, FETCHER] + scenario['argv'], env, scenario.get('stdin')))
+        last = samples[-1]
+        entry: Dict[str, Any] = {
+            'wall_ms': round(statistics.median(s['wall_ms'] for s in samples), 1),
+            'wall_ms_min': round(min(s['wall_ms'] for s in samples), 1),
+            'first_byte_ms': round(statistics.median(s['first_byte_ms'] or 0.0 for s in samples), 1),
+            'peak_rss_mb': round(max(s['peak_rss_mb'] for s in samples), 1),
+            'output_bytes': len(last['output']),
+        }
+        if any(s['exit_code'] for s in samples):
+            entry['error'] = last['output'][-500:].decode('utf-8', 'replace')
+        else:
+            try:
+                bars = count_bars(scenario['kind'], last['output'])
+                if bars is not None:
+                    entry['bars'] = bars
+            except Exception as e:
+                entry['error'] = f"Unreadable output: {e}"
+        if entry.get('bars') and entry['wall_ms']:
+            entry['bars_per_sec'] = round(entry['bars'] / entry['wall_ms'] * 1000)
+        results[scenario['name']] = entry
+        print(f"{scenario['name']}: {entry['wall_ms']} ms, {entry['peak_rss_mb']} MB", file=sys.stderr)
+    return results
+
+
+def bench_startup(env: Dict[str, str], repeat: int) -> Dict[str, float]:
+    def median_ms(argv: List[str]) -> float:
+        return round(statistics.median(_run_launched(argv, env, None)['wall_ms'] for _ in range(repeat)), 1)
+    return {
+        'interpreter_ms': median_ms([sys.executable, '-c', 'pass']),
+        'fetcher_import_ms': median_ms([sys.executable, FETCHER, '--help']),
+    }
+
+
+def best_ms(fn: Callable[[], object], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def encode_columnar(fmt: str, df: pd.DataFrame, tickers: List[str]) -> bytes:
+    out = io.BytesIO()
+    writer = open_column_writer(fmt, out)
+    for ticker, columns in iter_frame_columns(df, tickers):
+        writer.write(ticker, columns)
+    writer.close()
+    return out.getvalue()
+
+
+def bench_conversion(args: argparse.Namespace, tickers: List[str]) -> Dict[str, Any]:
+    """In-process conversion and serialization cost per timeframe, excluding process overhead."""
+    to_date = datetime.strptime(args.to_date, '%Y-%m-%d').replace(hour=23, minute=59)
+    from_date = to_date.replace(hour=0, minute=0) - timedelta(days=args.days)
+    results = {}
+    for timeframe in args.timeframes:
+        started = time.perf_counter()
+        df = generate_bars(tickers, timeframe, from_date, to_date)
+        generate_ms = (time.perf_counter() - started) * 1000
+        total = len(df)
+        if not total:
+            continue
+
+        bars = {ticker: series.to_dicts() for ticker, series in iter_frame_bars(df, tickers)}
+        convert_ms = best_ms(lambda: [series.to_dicts() for _, series in iter_frame_bars(df, tickers)], args.repeat)
+        serialize = {
+            'json': best_ms(lambda: json.dumps({'success': True, 'data': bars}, default=str), args.repeat),
+            'ndjson': best_ms(lambda: [
+                '\n'.join(json.dumps(bar, default=str) for bar in rows) for rows in bars.values()
+            ], args.repeat),
+        }
+        for fmt, package in BINARY_PACKAGES.items():
+            if importlib.util.find_spec(package) is not None:
+                # Columnar output skips the dicts: conversion and encoding are one step
+                serialize[fmt] = best_ms(lambda: encode_columnar(fmt, df, tickers), args.repeat)
+
+        results[timeframe] = {
+            'bars': total,
+            'upstream_generate_ms': round(generate_ms, 1),
+            'convert_ms': round(convert_ms, 1),
+            'convert_bars_per_sec': round(total / convert_ms * 1000),
+            'serialize_ms': {fmt: round(ms, 1) for fmt, ms in serialize.items()},
+        }
+    return results
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*argv: str) -> str:
+        return subprocess.run(['git'] + list(argv), cwd=SERVICE_DIR, capture_output=True, text=True).stdout.strip()
+    return {'commit': git('rev-parse', 'HEAD') or None, 'dirty': bool(git('status', '--porcelain', '--', '.'))}
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change (new / old - 1) of every shared numeric metric; negative is faster or smaller."""
+    def walk(new: Any, old: Any) -> Any:
+        if isinstance(new, dict) and isinstance(old, dict):
+            changes = {key: walk(new[key], old[key]) for key in new if key in old}
+            return {key: value for key, value in changes.items() if value is not None and value != {}}
+        if isinstance(new, (int, float)) and isinstance(old, (int, float)) and old and not isinstance(new, bool):
+            return round(new / old - 1, 4)
+        return None
+
+    sections = ('startup', 'actions', 'conversion')
+    return {
+        'commit': baseline.get('meta', {}).get('git', {}).get('commit'),
+        'same_params': baseline.get('meta', {}).get('params') == report['meta']['params'],
+        'change': walk({k: report[k] for k in sections}, {k: baseline.get(k, {}) for k in sections}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline fiinquant_fetcher.py benchmark suite')
+    parser.add_argument('--tickers', type=int, default=50, help='Number of tickers (from all_tickers.csv)')
+    parser.add_argument('--timeframes', default='1d,1h,1m', help='Comma-separated historical timeframes')
+    parser.add_argument('--days', type=int, default=30, help='Calendar days per historical range')
+    parser.add_argument('--to-date', default='2025-06-30', help='End of every historical range (YYYY-MM-DD)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement')
+    parser.add_argument('--stream-updates', type=int, default=20, help='Source updates per stream run')
+    parser.add_argument('--serve-requests', type=int, default=10, help='Requests per serve run')
+    parser.add_argument('--skip-actions', action='store_true', help='Only run the in-process measurements')
+    parser.add_argument('--out', help='Also write the report to this file')
+    parser.add_argument('--baseline', help='Previous report to compare against')
+    args = parser.parse_args()
+    args.timeframes = [tf.strip() for tf in args.timeframes.split(',') if tf.strip()]
+
+    tickers = load_tickers(args.tickers)
+    scratch = tempfile.TemporaryDirectory(prefix='fiinquant-bench-')
+    env = fetcher_env(os.environ, scratch.name)
+
+    report: Dict[str, Any] = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'params': {
+                'tickers': args.tickers, 'timeframes': args.timeframes, 'days': args.days,
+                'to_date': args.to_date, 'repeat': args.repeat,
+            },
+        },
+        'startup': bench_startup(env, args.repeat),
+        'actions': {} if args.skip_actions else bench_actions(args, tickers, env),
+        'conversion': bench_conversion(args, tickers),
+    }
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            report['baseline'] = compare(report, json.load(f))
+
+    scratch.cleanup()
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
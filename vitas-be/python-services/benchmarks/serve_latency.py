@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Compare per-call latency of spawn-per-request vs. the long-running serve mode.
+
+Spawn mode starts `fiinquant_fetcher.py --action <action>` once per call, the
+way FiinQuantDataService does today. Serve mode starts one
+`fiinquant_fetcher.py --action serve` process and sends every call over its
+stdin as a newline-delimited JSON request.
+
+Usage:
+    python benchmarks/serve_latency.py --action latest --tickers VIC --calls 20
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List
+
+FETCHER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fiinquant_fetcher.py')
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        'calls': len(samples),
+        'mean_ms': round(statistics.mean(ordered), 3),
+        'p50_ms': round(ordered[len(ordered) // 2], 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+def action_args(action: str, params: Dict[str, str]) -> List[str]:
+    args = ['--action', action]
+    for key, value in params.items():
+        args += ['--' + key.replace('_', '-'), str(value)]
+    return args
+
+
+def bench_spawn(action: str, params: Dict[str, str], calls: int) -> List[float]:
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, FETCHER] + action_args(action, params),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+        )
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def bench_serve(action: str, params: Dict[str, str], calls: int) -> Dict[str, object]:
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, FETCHER, '--action', 'serve'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        text=True, bufsize=1,
+    )
+    samples = []
+    first_call_ms = 0.0
+    try:
+        # One extra warm-up call: the first answer waits for interpreter start,
+        # imports and login, and is reported separately
+        for request_id in range(calls + 1):
+            sent = time.perf_counter()
+            proc.stdin.write(json.dumps({'id': request_id, 'action': action, 'params': params}) + '\n')
+            proc.stdin.flush()
+            response = json.loads(proc.stdout.readline())
+            if not response.get('success'):
+                raise RuntimeError(response.get('error'))
+            if request_id == 0:
+                first_call_ms = (time.perf_counter() - started) * 1000
+            else:
+                samples.append((time.perf_counter() - sent) * 1000)
+    finally:
+        proc.stdin.close()
+        proc.wait(timeout=30)
+    return {'samples': samples, 'first_call_ms': round(first_call_ms, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spawn-per-request vs. serve mode latency')
+    parser.add_argument('--action', default='latest', choices=['historical', 'latest', 'market-status', 'all-tickers'])
+    parser.add_argument('--tickers', default='VIC')
+    parser.add_argument('--timeframe', default='1m')
+    parser.add_argument('--calls', type=int, default=10)
+    args = parser.parse_args()
+
+    params = {}
+    if args.action in ('historical', 'latest'):
+        params['tickers'] = args.tickers
+    if args.action == 'historical':
+        params['timeframe'] = args.timeframe
+
+    spawn = bench_spawn(args.action, params, args.calls)
+    serve = bench_serve(args.action, params, args.calls)
+
+    report = {
+        'action': args.action,
+        'spawn': summarize(spawn),
+        'serve': summarize(serve['samples']),
+        'serve_first_call_ms': serve['first_call_ms'],
+    }
+    report['speedup_p50'] = round(report['spawn']['p50_ms'] / max(report['serve']['p50_ms'], 1e-9), 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Resumable bulk export of raw FiinQuantX history for research dumps (`--action export`).
+
+The ticker universe (all_tickers.csv by default) and the date range are
+split into units of one ticker chunk by one month-aligned window. Units are
+fetched in parallel through the FetchPlanner (same chunk size, worker count,
+rate limit and retries as historical fetches), and every finished unit is
+written out and forgotten before the next one is taken, so memory stays at
+a few units whatever the size of the export.
+
+Layout:
+
+    <output_dir>/<timeframe>/<TICKER>/<YYYY-MM>.ndjson   (or .parquet)
+    <output_dir>/_export_checkpoint.json
+
+Rows keep the raw upstream fields (open, high, low, close, volume, bu, sd,
+fn, fs, fb); the timestamp is normalized for the whole frame at once to
+exchange time (Asia/Ho_Chi_Minh, "2025-06-02T09:00:00+07:00" in NDJSON, a
+tz-aware timestamp in Parquet), whether FiinQuantX returned epoch seconds,
+epoch milliseconds, "YYYY-MM-DD HH:MM" strings or datetimes.
+
+Partition files are written to a temporary name and renamed, and a unit is
+only recorded in the checkpoint after all of its files are in place. A
+crashed or interrupted run started again with the same arguments skips the
+recorded units and redoes the rest; a unit that was half written is simply
+written again. Units whose chunk failed after retries are left out of the
+checkpoint, so the next run retries them.
+
+Parquet output needs pyarrow.
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from fetch_metrics import current as current_metrics
+from fetch_planner import FetchPlanner
+from trading_calendar import EXCHANGE_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('ndjson', 'parquet')
+CHECKPOINT_NAME = '_export_checkpoint.json'
+DEFAULT_TICKERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'all_tickers.csv')
+
+# Upstream columns kept in the export, in output order
+EXPORT_COLUMNS = ['ticker', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'bu', 'sd', 'fn', 'fs', 'fb']
+
+# Months per fetch unit; small timeframes get short windows to keep each call's frame small
+WINDOW_MONTHS = {'1d': 12, '4h': 6, '1h': 3, '15m': 1, '1m': 1}
+
+# ISO offset of exchange time (UTC+7, no daylight saving)
+UTC_OFFSET = '+07:00'
+
+# Failed units listed in the summary; the rest are only counted
+MAX_REPORTED_FAILURES = 20
+
+# Fetches one unit: (tickers, from_date, to_date) -> raw trading DataFrame or None
+UnitFetchFn = Callable[[List[str], str, str], Optional[pd.DataFrame]]
+
+
+def load_ticker_file(path: Optional[str] = None) -> List[str]:
+    """
+    Read a ticker universe CSV (a `ticker` column, or the first column).
+
+    Args:
+        path: CSV file; defaults to all_tickers.csv next to this module
+
+    Returns:
+        Upper-cased tickers in file order, without blanks and duplicates
+    """
+    df = pd.read_csv(path or DEFAULT_TICKERS_FILE, dtype=str, encoding='utf-8-sig')
+    column = df['ticker'] if 'ticker' in df.columns else df.iloc[:, 0]
+    tickers = column.dropna().str.strip().str.upper()
+    return list(dict.fromkeys(tickers[tickers != '']))
+
+
+def month_windows(from_date: str, to_date: str, months: int) -> List[Tuple[str, str]]:
+    """
+    Split [from_date, to_date] into windows of `months` calendar months.
+
+    Windows start on the first of a month (except the first one), so every
+    YYYY-MM partition belongs to exactly one window.
+    """
+    start = date.fromisoformat(from_date[:10])
+    end = date.fromisoformat(to_date[:10])
+    months = max(1, months)
+    windows = []
+    while start <= end:
+        index = start.year * 12 + start.month - 1 + months
+        next_start = date(index // 12, index % 12 + 1, 1)
+        windows.append((start.isoformat(), min(end, next_start - timedelta(days=1)).isoformat()))
+        start = next_start
+    return windows
+
+
+def normalize_timestamps(raw: pd.Series) -> pd.Series:
+    """
+    Parse a FiinQuantX timestamp column into tz-aware exchange-time timestamps in one pass.
+
+    Numbers (and numeric strings) are epoch seconds below 1e12 and epoch
+    milliseconds above, read as UTC; naive strings and datetimes are
+    exchange-local wall time; aware values are converted. Unparseable
+    values come back as NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(raw):
+        stamps = raw
+    elif pd.api.types.is_numeric_dtype(raw):
+        return _epoch_timestamps(raw)
+    else:
+        text = raw.astype('string')
+        stamps = pd.to_datetime(text, format='ISO8601', errors='coerce', utc=_is_aware(text))
+        digits = stamps.isna() & text.str.fullmatch(r'\d+').fillna(False).to_numpy(dtype=bool)
+        if digits.any():
+            stamps = _localize(stamps)
+            stamps[digits] = _epoch_timestamps(pd.to_numeric(text[digits]))
+            return stamps
+    return _localize(stamps)
+
+
+def _is_aware(text: pd.Series) -> bool:
+    """Whether the first timestamp string carries a UTC offset (the export is uniform)."""
+    first = text.dropna()
+    if first.empty:
+        return False
+    sample = first.iloc[0]
+    return sample.endswith('Z') or (len(sample) > 19 and sample[19:].lstrip('.0123456789')[:1] in ('+', '-'))
+
+
+def _localize(stamps: pd.Series) -> pd.Series:
+    if stamps.dt.tz is None:
+        return stamps.dt.tz_localize(EXCHANGE_TIMEZONE, ambiguous='NaT', nonexistent='NaT')
+    return stamps.dt.tz_convert(EXCHANGE_TIMEZONE)
+
+
+def _epoch_timestamps(values: pd.Series) -> pd.Series:
+    numbers = values.astype(np.float64)
+    millis = np.where(numbers < 1e12, numbers * 1000, numbers)
+    return pd.to_datetime(pd.Series(millis, index=values.index), unit='ms', utc=True).dt.tz_convert(EXCHANGE_TIMEZONE)
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Export rows of a raw trading DataFrame: known columns, normalized timestamps, sorted.
+
+    Rows without a parseable timestamp or ticker are dropped with a warning.
+    """
+    columns = [name for name in EXPORT_COLUMNS if name in df.columns]
+    out = df[columns].copy()
+    out['timestamp'] = normalize_timestamps(df['timestamp'])
+    bad = out['timestamp'].isna() | out['ticker'].isna()
+    if bad.any():
+        logger.warning(f"Skipped {int(bad.sum())} rows without a valid ticker or timestamp")
+        out = out[~bad]
+    return out.sort_values(['ticker', 'timestamp'], kind='stable').reset_index(drop=True)
+
+
+class ExportCheckpoint:
+    """Units already exported, persisted after every unit so a new run can resume."""
+
+    def __init__(self, path: str, settings: Dict[str, Any]):
+        """
+        Args:
+            path: Checkpoint file
+            settings: Export arguments the checkpoint is only valid for
+                (timeframe, from_date, to_date, format)
+
+        Raises:
+            ValueError: When an existing checkpoint was written for other settings
+        """
+        self.path = path
+        self.settings = settings
+        self.done: Dict[str, set] = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('settings') != settings:
+                raise ValueError(
+                    f"{path} belongs to an export with other settings ({saved.get('settings')}); "
+                    "use another --output-dir or delete the checkpoint to start over"
+                )
+            self.done = {window: set(tickers) for window, tickers in saved.get('done', {}).items()}
+
+    @staticmethod
+    def window_key(window: Tuple[str, str]) -> str:
+        return f"{window[0]}..{window[1]}"
+
+    def pending(self, window: Tuple[str, str], tickers: List[str]) -> List[str]:
+        done = self.done.get(self.window_key(window), ())
+        return [ticker for ticker in tickers if ticker not in done]
+
+    def mark_done(self, window: Tuple[str, str], tickers: Iterable[str]) -> None:
+        self.done.setdefault(self.window_key(window), set()).update(tickers)
+        payload = {
+            'settings': self.settings,
+            'done': {window: sorted(tickers) for window, tickers in self.done.items()},
+        }
+        _atomic_write(self.path, lambda tmp: _write_json(tmp, payload))
+
+
+def _write_json(path: str, payload: Any) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+
+
+def _atomic_write(path: str, write: Callable[[str], None]) -> None:
+    """Write through a temporary file and rename it, so `path` is never half written."""
+    tmp = f"{path}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def write_partitions(df: pd.DataFrame, root: str, fmt: str) -> Tuple[int, int]:
+    """
+    Write normalized rows as one file per ticker and month under `root`.
+
+    The rows are sorted by ticker and time (see normalize_frame), so every
+    partition is a contiguous run: the frame is serialized once and cut at
+    the run boundaries instead of going through a groupby per file.
+
+    Returns:
+        (rows written, files written)
+    """
+    if df.empty:
+        return 0, 0
+
+    # Exchange wall time; the exchange has no daylight saving, so the offset is fixed
+    local = df['timestamp'].dt.tz_localize(None).to_numpy(dtype='datetime64[s]')
+    months = local.astype('datetime64[M]')
+    tickers = df['ticker'].to_numpy()
+    cuts = np.flatnonzero((tickers[1:] != tickers[:-1]) | (months[1:] != months[:-1])) + 1
+    starts, ends = np.r_[0, cuts], np.r_[cuts, len(df)]
+
+    if fmt == 'ndjson':
+        text = df.assign(timestamp=pd.Series(np.datetime_as_string(local, unit='s'), index=df.index) + UTC_OFFSET)
+        lines = text.to_json(orient='records', lines=True, force_ascii=False).splitlines()
+
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        directory = os.path.join(root, str(tickers[start]))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{months[start]}.{fmt}")
+        if fmt == 'ndjson':
+            body = '\n'.join(lines[start:end]) + '\n'
+            _atomic_write(path, lambda tmp: _write_text(tmp, body))
+        else:
+            part = df.iloc[start:end]
+            _atomic_write(path, lambda tmp: part.to_parquet(tmp, index=False))
+    return len(df), len(starts)
+
+
+def _write_text(path: str, text: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def run_export(
+    fetch_unit: UnitFetchFn,
+    planner: FetchPlanner,
+    tickers: List[str],
+    timeframe: str,
+    from_date: str,
+    to_date: str,
+    output_dir: str,
+    fmt: str = 'ndjson',
+    window_months: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Export `tickers` over [from_date, to_date], resuming from the checkpoint in `output_dir`.
+
+    Args:
+        fetch_unit: Fetches one unit's raw trading DataFrame, raising on upstream errors
+        planner: Chunk size, parallelism, rate limit and retries of the unit fetches
+        tickers: Ticker universe
+        timeframe: FiinQuantX timeframe (1m, 15m, 1h, 4h, 1d)
+        from_date: First day (YYYY-MM-DD)
+        to_date: Last day (YYYY-MM-DD)
+        output_dir: Export root; created when missing
+        fmt: ndjson or parquet
+        window_months: Months per unit (default WINDOW_MONTHS for the timeframe)
+
+    Returns:
+        Summary with unit, row and file counts and the failed units
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt} (supported: {list(FORMATS)})")
+    if fmt == 'parquet':
+        import pyarrow  # noqa: F401  (fail before fetching anything)
+
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    root = os.path.join(output_dir, timeframe)
+    checkpoint = ExportCheckpoint(
+        os.path.join(output_dir, CHECKPOINT_NAME),
+        {'timeframe': timeframe, 'from_date': from_date, 'to_date': to_date, 'format': fmt}
+    )
+
+    windows = month_windows(from_date, to_date, window_months or WINDOW_MONTHS.get(timeframe, 1))
+    units: List[Tuple[Tuple[str, str], List[str]]] = []
+    skipped = 0
+    for window in windows:
+        pending = checkpoint.pending(window, tickers)
+        skipped += len(tickers) - len(pending)
+        units.extend((window, chunk) for chunk in planner.plan(pending))
+    if skipped:
+        logger.info(f"Resuming export: {skipped} ticker-windows already done, {len(units)} units left")
+
+    jobs = [
+        (chunk, lambda group, window=window: fetch_unit(group, window[0], window[1]))
+        for window, chunk in units
+    ]
+    rows = files = failed_units = 0
+    failures: List[Dict[str, Any]] = []
+    for index, df, report in planner.run_as_completed(jobs):
+        window, chunk = units[index]
+        if report['status'] != 'ok':
+            failed_units += 1
+            if len(failures) < MAX_REPORTED_FAILURES:
+                failures.append({'from_date': window[0], 'to_date': window[1], 'tickers': chunk, 'error': report.get('error')})
+            continue
+        if df is not None and not df.empty:
+            with current_metrics().stage('encode'):
+                unit_rows, unit_files = write_partitions(normalize_frame(df), root, fmt)
+            rows += unit_rows
+            files += unit_files
+        checkpoint.mark_done(window, chunk)
+
+    summary = {
+        'success': failed_units == 0,
+        'output_dir': output_dir,
+        'timeframe': timeframe,
+        'format': fmt,
+        'from_date': from_date,
+        'to_date': to_date,
+        'tickers': len(tickers),
+        'windows': len(windows),
+        'units': len(units),
+        'skipped_ticker_windows': skipped,
+        'failed_units': failed_units,
+        'failures': failures,
+        'rows': rows,
+        'files': files,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    logger.info(f"Exported {rows} rows into {files} files ({len(units) - failed_units}/{len(units)} units)")
+    return summary
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Binary columnar output for historical bars (`--format arrow|msgpack`).
+
+Each ticker is written as one unit of float64 columns (see
+iter_frame_columns in fiinquant_fetcher.py), so neither side formats or
+parses numbers and timestamps as text.
+
+msgpack: a sequence of MessagePack maps, one per ticker:
+    {"ticker": "VIC", "timeframe": "1h" | None, "count": n,
+     "columns": {"timestamp": <bin>, "open": <bin>, ...}}
+  where every <bin> holds n little-endian float64 values.
+
+arrow: an Arrow IPC stream with one record batch per ticker and the
+  columns ticker, timeframe and the float64 bar columns.
+
+pyarrow and msgpack are only needed when the matching format is used.
+"""
+
+import logging
+from typing import Any, BinaryIO, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('arrow', 'msgpack')
+
+
+def _row_count(columns: Any) -> int:
+    return len(columns['timestamp']) if columns else 0
+
+
+class MsgpackColumnWriter:
+    """Write one MessagePack map of little-endian float64 columns per ticker."""
+
+    def __init__(self, out: BinaryIO):
+        import msgpack
+        self.out = out
+        self.packer = msgpack.Packer(use_bin_type=True)
+        self.written = 0
+
+    def write(self, ticker: str, columns: Dict[str, np.ndarray], timeframe: Optional[str] = None) -> None:
+        count = _row_count(columns)
+        if not count:
+            return
+        self.out.write(self.packer.pack({
+            'ticker': ticker,
+            'timeframe': timeframe,
+            'count': count,
+            'columns': {name: values.astype('<f8', copy=False).tobytes() for name, values in columns.items()},
+        }))
+        self.out.flush()
+        self.written += count
+
+    def close(self) -> None:
+        self.out.flush()
+
+
+class ArrowColumnWriter:
+    """Write one Arrow record batch per ticker to an IPC stream."""
+
+    def __init__(self, out: BinaryIO):
+        import pyarrow
+        self.pa = pyarrow
+        self.out = out
+        self.writer = None
+        self.schema = None
+        self.names: List[str] = []
+        self.written = 0
+
+    def write(self, ticker: str, columns: Dict[str, np.ndarray], timeframe: Optional[str] = None) -> None:
+        count = _row_count(columns)
+        if not count:
+            return
+        pa = self.pa
+        if self.writer is None:
+            # Every ticker of one run has the same columns, so the first one fixes the schema
+            self.names = list(columns)
+            self.schema = pa.schema(
+                [('ticker', pa.string()), ('timeframe', pa.string())]
+                + [(name, pa.float64()) for name in self.names]
+            )
+            self.writer = pa.ipc.new_stream(self.out, self.schema)
+
+        arrays = [
+            pa.array([ticker]).take(pa.array(np.zeros(count, dtype=np.int32))),
+            pa.nulls(count, pa.string()) if timeframe is None
+            else pa.array([timeframe]).take(pa.array(np.zeros(count, dtype=np.int32))),
+        ] + [pa.array(columns[name], type=pa.float64()) for name in self.names]
+        self.writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        self.out.flush()
+        self.written += count
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.out.flush()
+
+
+def open_column_writer(fmt: str, out: BinaryIO):
+    """
+    Create the writer for `fmt`.
+
+    Raises:
+        ValueError: Unknown format, or its Python package is not installed
+    """
+    writers = {'arrow': (ArrowColumnWriter, 'pyarrow'), 'msgpack': (MsgpackColumnWriter, 'msgpack')}
+    if fmt not in writers:
+        raise ValueError(f"Unsupported format: {fmt} (supported: json, {', '.join(FORMATS)})")
+    writer_class, package = writers[fmt]
+    try:
+        return writer_class(out)
+    except ImportError:
+        raise ValueError(f"--format {fmt} requires the '{package}' package: pip install {package}")
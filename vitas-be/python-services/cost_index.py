@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Per-ticker fetch cost index, used to balance work across worker processes.
+
+Bar density differs by orders of magnitude across the universe: VN30 names
+fill every 1m slot while many listed symbols barely trade. Every upstream
+call records, for each ticker and timeframe, the bars returned per trading
+day and the call's upstream time per bar, smoothed over runs. The expected
+cost of fetching a ticker over a date range is then
+
+    max(bars per day, MIN_BARS_PER_DAY) * trading days * ms per bar
+
+Tickers never seen for a timeframe get the median of the known ones, so a
+fresh index plans like an even split. Entries are kept in SQLite next to
+the bar cache (FIINQUANT_COST_INDEX_PATH) and shared by all processes.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from trading_calendar import get_calendar
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COST_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'cost_index.sqlite')
+
+# Weight of the newest observation in the smoothed figures
+SMOOTHING = 0.3
+# Even a ticker without trades costs a request slot and a conversion pass
+MIN_BARS_PER_DAY = 1.0
+# Used until the index has seen any call for a timeframe
+DEFAULT_MS_PER_BAR = 0.05
+
+
+class CostIndex:
+    """Smoothed bars per trading day and upstream ms per bar, per ticker and timeframe."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv('FIINQUANT_COST_INDEX_PATH', DEFAULT_COST_INDEX_PATH)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Chunk threads of one process observe concurrently; updates are read-modify-write
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS costs (
+                    ticker TEXT NOT NULL,
+                    timeframe TEXT NOT NULL,
+                    bars_per_day REAL NOT NULL,
+                    ms_per_bar REAL NOT NULL,
+                    samples INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (ticker, timeframe)
+                )
+            ''')
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def load(self, tickers: List[str], timeframe: str) -> Dict[str, Tuple[float, float]]:
+        """(bars per day, ms per bar) of the known `tickers` for `timeframe`."""
+        entries = {}
+        with self._connect() as conn:
+            # Stay well below SQLite's bound parameter limit
+            for i in range(0, len(tickers), 500):
+                chunk = tickers[i:i + 500]
+                rows = conn.execute(
+                    'SELECT ticker, bars_per_day, ms_per_bar FROM costs WHERE timeframe = ? AND ticker IN ('
+                    + ', '.join(['?'] * len(chunk)) + ')',
+                    [timeframe] + chunk
+                ).fetchall()
+                for ticker, bars_per_day, ms_per_bar in rows:
+                    entries[ticker] = (bars_per_day, ms_per_bar)
+        return entries
+
+    def observe(
+        self,
+        tickers: List[str],
+        timeframe: str,
+        from_date: str,
+        to_date: str,
+        df: Optional[pd.DataFrame],
+        elapsed_ms: float
+    ) -> None:
+        """
+        Record one upstream call.
+
+        Args:
+            tickers: Tickers requested in the call
+            timeframe: FiinQuantX timeframe of the call
+            from_date: Start of the requested range
+            to_date: End of the requested range
+            df: Returned frame (None when nothing came back)
+            elapsed_ms: Upstream time of the call
+        """
+        clamped = get_calendar().clamp(from_date, to_date)
+        days = len(get_calendar().trading_days(*clamped)) if clamped else 0
+        if not days or not tickers:
+            return
+        if df is not None and not df.empty and 'ticker' in df.columns:
+            counts = df['ticker'].astype(str).str.upper().value_counts()
+        else:
+            counts = pd.Series(dtype='int64')
+        tickers = [t.upper() for t in tickers]
+        rows = int(counts.sum())
+        # The call's time is shared by its bars; an empty answer still took a request
+        ms_per_bar = elapsed_ms / max(rows, len(tickers))
+
+        with self._lock:
+            known = self.load(tickers, timeframe)
+            now = time.time()
+            updates = []
+            for ticker in tickers:
+                bars_per_day = float(counts.get(ticker, 0)) / days
+                if ticker in known:
+                    old_bars, old_ms = known[ticker]
+                    bars_per_day = old_bars + SMOOTHING * (bars_per_day - old_bars)
+                    ticker_ms = old_ms + SMOOTHING * (ms_per_bar - old_ms)
+                else:
+                    ticker_ms = ms_per_bar
+                updates.append((ticker, timeframe, bars_per_day, ticker_ms, now))
+            with self._connect() as conn:
+                conn.executemany(
+                    'INSERT INTO costs VALUES (?, ?, ?, ?, 1, ?) '
+                    'ON CONFLICT(ticker, timeframe) DO UPDATE SET bars_per_day = excluded.bars_per_day, '
+                    'ms_per_bar = excluded.ms_per_bar, samples = samples + 1, updated_at = excluded.updated_at',
+                    updates
+                )
+
+    def expected_costs(self, tickers: List[str], timeframe: str, from_date: str, to_date: str) -> Tuple[Dict[str, float], int]:
+        """
+        Expected fetch cost of each ticker over a date range, in ms.
+
+        Returns:
+            (ticker -> expected ms, number of tickers estimated from the
+            medians because the index has not seen them yet)
+        """
+        clamped = get_calendar().clamp(from_date, to_date)
+        days = max(1, len(get_calendar().trading_days(*clamped)) if clamped else 0)
+        known = self.load([t.upper() for t in tickers], timeframe)
+        if known:
+            bars = sorted(b for b, _ in known.values())
+            latencies = sorted(ms for _, ms in known.values())
+            median_bars, median_ms = bars[len(bars) // 2], latencies[len(latencies) // 2]
+        else:
+            median_bars, median_ms = MIN_BARS_PER_DAY, DEFAULT_MS_PER_BAR
+
+        costs = {}
+        for ticker in tickers:
+            bars_per_day, ms_per_bar = known.get(ticker.upper(), (median_bars, median_ms))
+            costs[ticker] = max(bars_per_day, MIN_BARS_PER_DAY) * days * ms_per_bar
+        return costs, sum(1 for ticker in tickers if ticker.upper() not in known)
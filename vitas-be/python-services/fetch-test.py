@@ -3,9 +3,12 @@
 
 """
 Kéo dữ liệu 1D từ FiinQuantX và lưu JSON với timestamp có giờ:phút:giây (Asia/Ho_Chi_Minh).
-- Đọc user/pass từ biến môi trường: FIQ_USER, FIQ_PASS
+- Đọc user/pass từ biến môi trường: FIQ_USER, FIQ_PASS (hoặc FIINQUANT_USERNAME, FIINQUANT_PASSWORD)
 - Danh sách mã: sửa trong biến TICKERS bên dưới
 - Mặc định lấy 120 phiên gần nhất (có thể đổi period hoặc dùng from_date/to_date)
+
+Xuất dữ liệu cả thị trường (all_tickers.csv, chạy song song, tiếp tục được khi bị ngắt):
+    python fiinquant_fetcher.py --action export --timeframe 1d --from-date 2015-01-01 --output-dir exports
 """
 
 import os
@@ -57,8 +60,10 @@ def normalize_epoch_to_iso(ts, tz: ZoneInfo) -> str:
 
 # ======= MAIN =======
 def main():
-    username = "DSTC_17@fiinquant.vn"
-    password = "Fiinquant0606"
+    username = os.getenv("FIQ_USER") or os.getenv("FIINQUANT_USERNAME")
+    password = os.getenv("FIQ_PASS") or os.getenv("FIINQUANT_PASSWORD")
+    if not username or not password:
+        raise SystemExit("Thiếu FIQ_USER/FIQ_PASS (hoặc FIINQUANT_USERNAME/FIINQUANT_PASSWORD)")
 
     # Đăng nhập
     client = fq.FiinSession(username=username, password=password).login()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Per-stage timings and counters of fetcher actions (`--metrics`, FIINQUANT_METRICS).
+
+One FetchMetrics collects a single action: the one-shot command line run,
+or one serve-mode request. Code deep in the fetch path reports to whichever
+collector is active through current(), which is a no-op object when metrics
+are off, so the hooks cost next to nothing by default. The active collector
+lives in a context variable; FetchPlanner copies the context into its worker
+threads so chunk fetches report to the request that started them.
+
+Stages (summed wall time in ms, plus call count; parallel chunks overlap):
+
+    module_import       the fetcher module and its light dependencies (one-shot runs;
+                        interpreter start-up itself is not included)
+    fetch_stack_import  pandas, numpy, FiinQuantX and the data modules
+    login               saved-session restore or login, including re-logins
+    upstream            Fetch_Trading_Data(...).get_data() calls
+    resample            building derived timeframes from fetched bars
+    filter              BarFilter row masks (hours, minutes, windows, sessions, weekdays)
+    prepare             cleaning a fetched frame into a BarSet (includes indicators)
+    indicators          indicator columns for all tickers
+    convert             building each ticker's float64 columns for binary outputs
+    encode              JSON / NDJSON / Arrow / MessagePack serialization and writing
+                        (including building bar dicts), export partition files and
+                        Mongo document building
+    sink                MongoDB bulk writes
+    backtest            signals, trades and statistics of every backtest run
+
+Counters: upstream_calls, upstream_rows, upstream_errors, relogins,
+upstream_retries, failed_chunks, rows_in, rows_out and bytes_out. Per
+ticker: rows_in (fetched) and rows_out (emitted after filtering).
+
+Records go out as one `{"metrics": {...}}` JSON line on stderr (target
+"stderr"; serve mode attaches it to the response as `metrics` instead), or
+are written as a Prometheus textfile (any other target is a file path; a
+"{action}" in it gives every action its own file). Several targets can be
+given comma-separated.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Per-ticker rows are only listed up to this many tickers; totals always cover all
+MAX_REPORTED_TICKERS = 100
+
+
+class FetchMetrics:
+    """Thread-safe stage timings, counters and per-ticker row counts of one action."""
+
+    enabled = True
+
+    def __init__(self, action: str, started: Optional[float] = None):
+        """
+        Args:
+            action: Action name the record is labelled with
+            started: perf_counter() value the run started at (default now)
+        """
+        self.action = action
+        self.started = time.perf_counter() if started is None else started
+        self._lock = threading.Lock()
+        self.stages: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.tickers: Dict[str, List[int]] = {}
+        self.extra: Dict[str, Any] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as one call of stage `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - started)
+
+    def add_stage(self, name: str, seconds: float, calls: int = 1) -> None:
+        with self._lock:
+            totals = self.stages.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += calls
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def ticker(self, ticker: str, rows_in: int = 0, rows_out: int = 0) -> None:
+        """Add fetched and emitted rows of `ticker` (also to the rows_in / rows_out totals)."""
+        with self._lock:
+            rows = self.tickers.setdefault(ticker, [0, 0])
+            rows[0] += rows_in
+            rows[1] += rows_out
+            self.counters['rows_in'] = self.counters.get('rows_in', 0) + rows_in
+            self.counters['rows_out'] = self.counters.get('rows_out', 0) + rows_out
+
+    def record(self, success: bool = True) -> Dict[str, Any]:
+        """The metrics record of the action so far."""
+        with self._lock:
+            tickers = sorted(self.tickers.items())
+            record = {
+                'action': self.action,
+                'success': success,
+                'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 3),
+                'stages': {
+                    name: {'ms': round(seconds * 1000, 3), 'calls': calls}
+                    for name, (seconds, calls) in self.stages.items()
+                },
+                'counters': dict(self.counters),
+                'tickers': {ticker: {'rows_in': rows[0], 'rows_out': rows[1]} for ticker, rows in tickers[:MAX_REPORTED_TICKERS]},
+                'ticker_count': len(tickers),
+                'peak_rss_bytes': peak_rss_bytes(),
+            }
+            record.update(self.extra)
+        return record
+
+
+class _NullMetrics:
+    """Stand-in used while no collector is active; every hook does nothing."""
+
+    enabled = False
+
+    def stage(self, name: str):
+        return nullcontext()
+
+    def add_stage(self, name: str, seconds: float, calls: int = 1) -> None:
+        pass
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+    def ticker(self, ticker: str, rows_in: int = 0, rows_out: int = 0) -> None:
+        pass
+
+
+NULL_METRICS = _NullMetrics()
+_current: contextvars.ContextVar = contextvars.ContextVar('fetch_metrics', default=NULL_METRICS)
+
+
+def current():
+    """The collector of the running action, or a no-op one when metrics are off."""
+    return _current.get()
+
+
+def activate(metrics: Optional[FetchMetrics]) -> contextvars.Token:
+    """Make `metrics` the active collector of this context; pass the token to deactivate()."""
+    return _current.set(metrics or NULL_METRICS)
+
+
+def deactivate(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of the process so far (None where unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def parse_targets(value: Optional[str]) -> List[str]:
+    """Split a --metrics / FIINQUANT_METRICS value into its targets."""
+    return [target.strip() for target in (value or '').split(',') if target.strip()]
+
+
+def prometheus_text(record: Dict[str, Any]) -> str:
+    """Render a metrics record in the Prometheus text exposition format."""
+    action = record['action']
+    lines = [
+        '# HELP fiinquant_fetcher_stage_seconds Wall time spent in each stage of the last run',
+        '# TYPE fiinquant_fetcher_stage_seconds gauge',
+    ]
+    for name, stage in record['stages'].items():
+        lines.append(f'fiinquant_fetcher_stage_seconds{{action="{action}",stage="{name}"}} {stage["ms"] / 1000:.6f}')
+    lines += [
+        '# HELP fiinquant_fetcher_stage_calls Times each stage ran in the last run',
+        '# TYPE fiinquant_fetcher_stage_calls gauge',
+    ]
+    for name, stage in record['stages'].items():
+        lines.append(f'fiinquant_fetcher_stage_calls{{action="{action}",stage="{name}"}} {stage["calls"]}')
+    lines += [
+        '# HELP fiinquant_fetcher_events Counters of the last run (rows, bytes, upstream calls, retries)',
+        '# TYPE fiinquant_fetcher_events gauge',
+    ]
+    for name, value in record['counters'].items():
+        lines.append(f'fiinquant_fetcher_events{{action="{action}",counter="{name}"}} {value}')
+    lines += [
+        '# HELP fiinquant_fetcher_run_seconds Duration of the last run',
+        '# TYPE fiinquant_fetcher_run_seconds gauge',
+        f'fiinquant_fetcher_run_seconds{{action="{action}"}} {record["elapsed_ms"] / 1000:.6f}',
+        '# HELP fiinquant_fetcher_success Whether the last run succeeded',
+        '# TYPE fiinquant_fetcher_success gauge',
+        f'fiinquant_fetcher_success{{action="{action}"}} {int(record["success"])}',
+        '# HELP fiinquant_fetcher_last_run_timestamp_seconds When the last run finished',
+        '# TYPE fiinquant_fetcher_last_run_timestamp_seconds gauge',
+        f'fiinquant_fetcher_last_run_timestamp_seconds{{action="{action}"}} {time.time():.3f}',
+    ]
+    if record.get('peak_rss_bytes') is not None:
+        lines += [
+            '# HELP fiinquant_fetcher_peak_rss_bytes Peak resident memory of the fetcher process',
+            '# TYPE fiinquant_fetcher_peak_rss_bytes gauge',
+            f'fiinquant_fetcher_peak_rss_bytes{{action="{action}"}} {record["peak_rss_bytes"]}',
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def emit(record: Dict[str, Any], targets: List[str], stderr: bool = True) -> None:
+    """
+    Send a metrics record to every target.
+
+    Args:
+        record: FetchMetrics.record() output
+        targets: "stderr" and/or Prometheus textfile paths
+        stderr: Whether the "stderr" target prints (serve mode returns the
+            record in the response instead)
+    """
+    for target in targets:
+        if target == 'stderr':
+            if stderr:
+                print(json.dumps({'metrics': record}, default=str), file=sys.stderr, flush=True)
+            continue
+        path = target.replace('{action}', record['action'])
+        # Textfile collectors may read at any time, so never expose a half-written file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(prometheus_text(record))
+        os.replace(tmp, path)
+
+
+class CountingStream:
+    """Binary stream wrapper counting the bytes written through it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.written = 0
+
+    def write(self, data) -> int:
+        self.written += len(data)
+        return self.stream.write(data)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    @property
+    def closed(self) -> bool:
+        return self.stream.closed
+
+
+class DeepProfile:
+    """
+    Optional deep-dive profiling of a whole run (`--profile cprofile|tracemalloc`).
+
+    cprofile: function-level CPU profile; saved as pstats to `output`, or the
+        top functions by cumulative time printed on stderr.
+    tracemalloc: Python allocation tracing; peak traced memory and the top
+        allocation sites go into the metrics record (or stderr without
+        metrics) and a snapshot is saved to `output` when given.
+    Both slow the run down noticeably; they are not meant for production.
+    """
+
+    MODES = ('cprofile', 'tracemalloc')
+    TOP = 25
+
+    def __init__(self, mode: str, output: Optional[str] = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported profile mode: {mode} (supported: {list(self.MODES)})")
+        self.mode = mode
+        self.output = output
+        self.profiler = None
+
+    def start(self) -> None:
+        if self.mode == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            import tracemalloc
+            tracemalloc.start(10)
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop profiling and write its output; returns a summary for the metrics record."""
+        if self.mode == 'cprofile':
+            import io
+            import pstats
+            self.profiler.disable()
+            if self.output:
+                self.profiler.dump_stats(self.output)
+                return {'profile': {'mode': 'cprofile', 'output': self.output}}
+            text = io.StringIO()
+            pstats.Stats(self.profiler, stream=text).sort_stats('cumulative').print_stats(self.TOP)
+            print(text.getvalue(), file=sys.stderr, flush=True)
+            return {'profile': {'mode': 'cprofile', 'output': 'stderr'}}
+
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if self.output:
+            snapshot.dump(self.output)
+        top = [
+            {'site': str(stat.traceback[0]), 'bytes': stat.size, 'blocks': stat.count}
+            for stat in snapshot.statistics('lineno')[:self.TOP]
+        ]
+        return {'profile': {
+            'mode': 'tracemalloc',
+            'output': self.output,
+            'traced_peak_bytes': peak_bytes,
+            'traced_current_bytes': current_bytes,
+            'top_allocations': top,
+        }}
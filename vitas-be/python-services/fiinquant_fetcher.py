@@ -4,30 +4,101 @@ FiinQuant Data Fetcher for VITAS Trading System
 Uses FiinQuantX Python library for data fetching
 """
 
+from __future__ import annotations
+
+import time
+
+# For --profile-startup, taken before the other imports
+_MODULE_STARTED = time.perf_counter()
+
+import io
 import os
 import sys
 import json
+import signal
 import logging
 import argparse
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-import pandas as pd
-
-# Import FiinQuantX library
-try:
-    from FiinQuantX import FiinSession
-    FIINQUANT_AVAILABLE = True
-except ImportError as e:
-    print(f"Warning: FiinQuantX library not available: {e}", file=sys.stderr)
-    print("Please install FiinQuantX library: pip install --extra-index-url https://fiinquant.github.io/fiinquantx/simple fiinquantx", file=sys.stderr)
-    FIINQUANT_AVAILABLE = False
-
-# Load environment variables if available
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
+import threading
+import socketserver
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple, TypeVar
+
+from fetch_metrics import CountingStream, DeepProfile, FetchMetrics, activate as activate_metrics, current as current_metrics
+from fetch_metrics import deactivate as deactivate_metrics, emit as emit_metrics, parse_targets as parse_metric_targets
+from market_info import LOGIN_FREE_ACTIONS, all_tickers, market_status
+from trading_calendar import get_calendar
+
+# Set by _import_fetch_stack()
+FIINQUANT_AVAILABLE = False
+_FETCH_STACK_LOADED = False
+
+
+def _import_fetch_stack() -> None:
+    """
+    Import pandas, numpy, FiinQuantX and the modules built on them, and load .env.
+
+    They take most of the process start-up time and the login-free actions
+    (market-status, all-tickers) need none of them, so the command line only
+    imports them once an action does. Importing this module from other code
+    loads them right away (see below).
+    """
+    global _FETCH_STACK_LOADED, FIINQUANT_AVAILABLE, FiinSession
+    global np, pd, sqlite3, tzlocal, BarCache, FetchPlanner, plan_time_windows, parse_derive, resample_bars, BarFilter
+    global IndicatorEngine, parse_indicators, parse_indicator_options, open_column_writer
+    global BatchedNDJSONWriter, FakeBarSource, FiinQuantRealtimeSource, SessionStore, session_reuse_enabled, LatestQuoteCache
+    global load_export, scan_gaps, execute_plan, timeframe_from_name, MongoBarSink, close_mongo_clients
+    global load_ticker_file, run_export, load_watermarks, plan_since_groups, newer_than
+    global FingerprintStore, check_adjustments, DEFAULT_PROBE_DAYS
+    global BarPanel, parse_backtest_params, run_grid, CostIndex, run_sharded, BarSet, BarSeries
+    if _FETCH_STACK_LOADED:
+        return
+    
+    import sqlite3
+    import numpy as np
+    import pandas as pd
+    from dateutil.tz import tzlocal
+    
+    from bar_cache import BarCache
+    from bar_store import BarSet, BarSeries
+    from fetch_planner import FetchPlanner, plan_time_windows
+    from resample import parse_derive, resample_bars
+    from bar_filter import BarFilter
+    from indicators import IndicatorEngine, parse_indicators, parse_indicator_options
+    from columnar_output import open_column_writer
+    from realtime_stream import BatchedNDJSONWriter, FakeBarSource, FiinQuantRealtimeSource
+    from session_store import SessionStore, session_reuse_enabled
+    from quote_cache import LatestQuoteCache
+    from gap_scanner import load_export, scan_gaps, execute_plan, timeframe_from_name
+    from mongo_sink import MongoBarSink, close_clients as close_mongo_clients
+    from bulk_export import load_ticker_file, run_export
+    from watermarks import load_watermarks, plan_since_groups, newer_than
+    from adjustments import FingerprintStore, check_adjustments, DEFAULT_PROBE_DAYS
+    from backtest import BarPanel, parse_backtest_params, run_grid
+    from cost_index import CostIndex
+    from sharding import run_sharded
+    
+    # Import FiinQuantX library
+    try:
+        from FiinQuantX import FiinSession
+        FIINQUANT_AVAILABLE = True
+    except ImportError as e:
+        print(f"Warning: FiinQuantX library not available: {e}", file=sys.stderr)
+        print("Please install FiinQuantX library: pip install --extra-index-url https://fiinquant.github.io/fiinquantx/simple fiinquantx", file=sys.stderr)
+        FIINQUANT_AVAILABLE = False
+    
+    # Load environment variables if available
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    
+    _FETCH_STACK_LOADED = True
+
+
+if __name__ != "__main__":
+    _import_fetch_stack()
 
 
 # Configure logging to stderr only
@@ -38,11 +109,339 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
+# Liquid ticker whose recent daily bars check a restored session before it is trusted
+SESSION_PROBE_TICKER = os.getenv('FIINQUANT_SESSION_PROBE_TICKER', 'VIC')
+
+
+def _fiinquant_timeframe(timeframe: str) -> str:
+    """Convert timeframe to FiinQuantX format, defaulting to 4h."""
+    timeframe_map = {
+        '1m': '1m',
+        '15m': '15m',
+        '1h': '1h',
+        '4h': '4h',
+        '1d': '1d'
+    }
+    return timeframe_map.get(timeframe, '4h')
+
+
+def _default_date_range(from_date: Optional[str], to_date: Optional[str]) -> Tuple[str, str]:
+    """Fill in the default 30-day window ending today."""
+    if not from_date:
+        from_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    if not to_date:
+        to_date = datetime.now().strftime('%Y-%m-%d')
+    return from_date, to_date
+
+
+def _numeric_column(df: pd.DataFrame, name: str) -> np.ndarray:
+    """Return a column as float64 with missing values (or a missing column) as 0.0."""
+    if name not in df.columns:
+        return np.zeros(len(df), dtype=np.float64)
+    values = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(np.isnan(values), 0.0, values)
+
+
+def _integer_column(df: pd.DataFrame, name: str) -> np.ndarray:
+    """Return a column truncated to int64 the same way int(float(x)) does."""
+    return np.trunc(_numeric_column(df, name)).astype(np.int64)
+
+
+def _parsed_timestamps(df: pd.DataFrame) -> Tuple[pd.Series, np.ndarray]:
+    """
+    Parse the timestamp column once for every output format.
+
+    Strings are parsed as ISO timestamps and datetimes are kept. Returns the
+    parsed values (datetime64 when possible, else objects with None for
+    invalid entries) and a mask of rows that had no timestamp at all, which
+    are stamped with the current time.
+    """
+    raw = df['timestamp']
+    if pd.api.types.is_datetime64_any_dtype(raw):
+        return raw, raw.isna().to_numpy()
+
+    if pd.api.types.is_string_dtype(raw):
+        missing = raw.isna().to_numpy()
+    else:
+        missing = ~raw.map(lambda v: isinstance(v, (str, datetime))).to_numpy(dtype=bool)
+    candidates = raw.where(~missing, None).map(
+        lambda v: v.replace('Z', '+00:00') if isinstance(v, str) else v
+    )
+    try:
+        parsed = pd.to_datetime(candidates, format='ISO8601', errors='coerce')
+    except (ValueError, TypeError):
+        # Mixed UTC offsets cannot share one datetime64 dtype
+        parsed = pd.Series([_parse_timestamp(v) for v in candidates], index=raw.index, dtype=object)
+    return parsed, missing
+
+
+def _timestamp_strings(df: pd.DataFrame) -> np.ndarray:
+    """
+    Format the timestamp column as ISO strings in one pass.
+
+    Mirrors the old per-row rules: strings are parsed as ISO timestamps,
+    datetimes are kept, anything else falls back to the current time.
+    Unparseable strings come back as None so the caller can drop the row.
+    """
+    if 'timestamp' not in df.columns:
+        return np.full(len(df), datetime.now().isoformat(), dtype=object)
+
+    parsed, missing = _parsed_timestamps(df)
+    out = np.empty(len(df), dtype=object)
+    valid = parsed.notna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(parsed) and parsed.dt.tz is None:
+        stamps = parsed[valid]
+        text = stamps.dt.strftime('%Y-%m-%dT%H:%M:%S').to_numpy(dtype=object)
+        fractional = (stamps.dt.microsecond != 0).to_numpy() | (stamps.dt.nanosecond != 0).to_numpy()
+        if fractional.any():
+            text[fractional] = [ts.isoformat() for ts in stamps[fractional]]
+        out[valid] = text
+    else:
+        out[valid] = [ts.isoformat() for ts in parsed[valid]]
+
+    out[missing] = datetime.now().isoformat()
+    out[~valid & ~missing] = None
+    return out
+
+
+def _timestamp_millis(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Epoch milliseconds for the timestamp column, without building strings.
+
+    Naive timestamps are read as local time, the same way `new Date(iso)`
+    reads the ISO strings of the JSON output on the Node side (both
+    processes share the machine's timezone). Same fallbacks as
+    _timestamp_strings.
+
+    Returns:
+        (float64 epoch ms, mask of rows to drop)
+    """
+    now_ms = time.time() * 1000
+    if 'timestamp' not in df.columns:
+        return np.full(len(df), now_ms), np.zeros(len(df), dtype=bool)
+
+    parsed, missing = _parsed_timestamps(df)
+    valid = parsed.notna().to_numpy()
+    millis = np.full(len(df), np.nan)
+    if pd.api.types.is_datetime64_any_dtype(parsed):
+        stamps = parsed[valid]
+        if stamps.dt.tz is None:
+            stamps = stamps.dt.tz_localize(tzlocal(), ambiguous=True, nonexistent='shift_forward')
+        millis[valid] = stamps.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy(dtype='datetime64[us]').astype(np.int64) / 1000
+    else:
+        millis[valid] = [
+            (ts if ts.tzinfo else ts.astimezone()).timestamp() * 1000 for ts in parsed[valid]
+        ]
+
+    millis[missing] = now_ms
+    return millis, ~valid & ~missing
+
+
+def _parse_timestamp(value: Any) -> Any:
+    """Parse a single timestamp value, returning None when it is not valid ISO."""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _timestamp_values(df: pd.DataFrame) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+    """
+    Parse the timestamp column into the time column of a BarSet.
+
+    Same rules as _timestamp_strings. Naive timestamps are kept as naive
+    datetime64; timestamps with UTC offsets are stored as UTC instants
+    together with their ISO text (see bar_store).
+
+    Returns:
+        (datetime64[ns] times, ISO text or None, mask of rows to drop)
+    """
+    if 'timestamp' not in df.columns:
+        return np.full(len(df), np.datetime64(datetime.now(), 'ns')), None, np.zeros(len(df), dtype=bool)
+
+    parsed, missing = _parsed_timestamps(df)
+    dropped = ~parsed.notna().to_numpy() & ~missing
+    if pd.api.types.is_datetime64_any_dtype(parsed) and parsed.dt.tz is None:
+        times = parsed.to_numpy(dtype='datetime64[ns]')
+        times[missing] = np.datetime64(datetime.now(), 'ns')
+        return times, None, dropped
+
+    text = _timestamp_strings(df)
+    millis, _ = _timestamp_millis(df)
+    times = (np.nan_to_num(millis) * 1000).astype(np.int64).astype('datetime64[us]').astype('datetime64[ns]')
+    return times, text, dropped
+
+
+def prepare_frame(
+    df: pd.DataFrame,
+    tickers: List[str],
+    indicators: Optional[IndicatorEngine] = None,
+    keep: Optional[np.ndarray] = None
+) -> BarSet:
+    """
+    Clean every column of `df` once and pack the output bars into a BarSet.
+
+    Rows are split by ticker with a single groupby instead of one boolean
+    mask per ticker, and each ticker's bars are gathered into one block.
+
+    Args:
+        df: DataFrame returned by Fetch_Trading_Data().get_data()
+        tickers: Tickers to return
+        indicators: Optional engine whose columns are computed for all tickers at once
+        keep: Optional row mask (see BarFilter); only kept rows are output,
+            while indicators still see every row
+    """
+    if keep is not None and indicators is None:
+        # Nothing needs the pruned rows, so skip all column work for them
+        df = df[keep]
+        keep = None
+
+    times, text, dropped = _timestamp_values(df)
+    if dropped.any():
+        logger.warning(f"Skipped {int(dropped.sum())} data points with unparseable timestamps")
+
+    columns = {
+        'time': times,
+        'open': _numeric_column(df, 'open'),
+        'high': _numeric_column(df, 'high'),
+        'low': _numeric_column(df, 'low'),
+        'close': _numeric_column(df, 'close'),
+        'volume': _integer_column(df, 'volume'),
+        'foreign_buy_volume': _integer_column(df, 'fb'),
+        'foreign_sell_volume': _integer_column(df, 'fs'),
+    }
+
+    if 'ticker' in df.columns:
+        positions = {
+            key: np.asarray(idx)
+            for key, idx in df.groupby('ticker', sort=False).indices.items()
+        }
+    else:
+        positions = None
+    all_positions = np.arange(len(df))
+
+    groups: Dict[str, np.ndarray] = {}
+    for ticker in tickers:
+        idx = all_positions if positions is None else positions.get(ticker)
+        if idx is not None:
+            groups[ticker] = idx[~dropped[idx]]
+
+    extras = None
+    if indicators is not None:
+        with current_metrics().stage('indicators'):
+            extras = indicators.compute(
+                {
+                    'open': columns['open'],
+                    'high': columns['high'],
+                    'low': columns['low'],
+                    'close': columns['close'],
+                    'volume': columns['volume'].astype(np.float64),
+                },
+                list(groups.values())
+            )
+    if keep is not None:
+        groups = {ticker: idx[keep[idx]] for ticker, idx in groups.items()}
+
+    return BarSet.from_rows(columns, groups, extras, text)
+
+
+def iter_frame_bars(
+    df: pd.DataFrame,
+    tickers: List[str],
+    indicators: Optional[IndicatorEngine] = None,
+    keep: Optional[np.ndarray] = None
+) -> Iterator[Tuple[str, BarSeries]]:
+    """
+    Convert a FiinQuantX trading DataFrame into market data points, one ticker at a time.
+
+    Columns are cleaned and derived once for the whole frame (see
+    prepare_frame); each ticker's bars are a view of the resulting BarSet,
+    and bar dicts are only built when they are written out.
+
+    Args:
+        df: DataFrame returned by Fetch_Trading_Data().get_data()
+        tickers: Tickers to return, in output order
+        indicators: Optional engine whose columns are added to every bar;
+            they are computed for all tickers at once before the first yield
+        keep: Optional row mask (see BarFilter); only kept rows become bars,
+            while indicators still see every row
+
+    Yields:
+        (ticker, bar series) pairs in `tickers` order
+    """
+    with current_metrics().stage('prepare'):
+        bars = prepare_frame(df, tickers, indicators, keep)
+
+    for ticker in tickers:
+        yield ticker, bars.series(ticker)
+
+
+def iter_frame_columns(
+    df: pd.DataFrame,
+    tickers: List[str],
+    indicators: Optional[IndicatorEngine] = None,
+    keep: Optional[np.ndarray] = None
+) -> Iterator[Tuple[str, Dict[str, np.ndarray]]]:
+    """
+    Columnar counterpart of iter_frame_bars for the binary output formats.
+
+    Same bars and values, as float64 columns (see BarSeries.to_columns).
+
+    Yields:
+        (ticker, column name -> float64 array) in `tickers` order;
+        tickers without data get zero-length columns
+    """
+    metrics = current_metrics()
+    for ticker, bars in iter_frame_bars(df, tickers, indicators, keep):
+        with metrics.stage('convert'):
+            columns = bars.to_columns()
+        yield ticker, columns
+
+
+def frame_to_bars(df: pd.DataFrame, tickers: List[str]) -> Dict[str, BarSeries]:
+    """
+    Convert a FiinQuantX trading DataFrame into per-ticker market data points.
+
+    Args:
+        df: DataFrame returned by Fetch_Trading_Data().get_data()
+        tickers: Tickers to return, in output order
+
+    Returns:
+        Dictionary with ticker as key and its bar series as value
+    """
+    return dict(iter_frame_bars(df, tickers))
+
+
+def _probe_client(client: Any) -> bool:
+    """Whether `client` returns daily bars for SESSION_PROBE_TICKER over the last weeks."""
+    today = datetime.now()
+    df = client.Fetch_Trading_Data(
+        realtime=False,
+        tickers=[SESSION_PROBE_TICKER],
+        fields=['close'],
+        adjusted=True,
+        from_date=(today - timedelta(days=20)).strftime('%Y-%m-%d'),
+        to_date=today.strftime('%Y-%m-%d'),
+        by='1d'
+    ).get_data()
+    return df is not None and len(df) > 0
+
 
 class FiinQuantFetcher:
     """Standalone FiinQuant data fetcher using FiinQuantX Python library."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        use_cache: bool = True,
+        planner: Optional[FetchPlanner] = None,
+        use_session_cache: bool = True,
+        latest_cache: Optional[LatestQuoteCache] = None,
+        memory_budget_mb: Optional[float] = None
+    ):
         if not FIINQUANT_AVAILABLE:
             logger.error("FiinQuantX library is not available")
             raise ImportError("FiinQuantX library is required but not installed")
@@ -58,23 +457,82 @@ class FiinQuantFetcher:
         self.session = None
         self.client = None
         self.authenticated = False
+        self._login_lock = threading.Lock()
+        
+        # Saved session state, reused across processes until it expires (opt-in)
+        self.session_store = SessionStore() if use_session_cache and session_reuse_enabled() else None
+        self.session_restored = False
+        
+        started = time.perf_counter()
+        restored = None
+        if self.session_store:
+            restored = self.session_store.load(self.username, self.password, FiinSession, verify=_probe_client)
+        if restored:
+            self.session, self.client, _ = restored
+            self.authenticated = True
+            self.session_restored = True
+        else:
+            try:
+                # Create session and login
+                self.session = FiinSession(username=self.username, password=self.password)
+                self._login()
+                logger.info("FiinQuantX session initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize FiinQuantX session: {e}")
+                raise
+        self.login_ms = (time.perf_counter() - started) * 1000
+        current_metrics().add_stage('login', self.login_ms / 1000)
+        
+        # Splits large ticker lists into parallel, retried upstream calls
+        self.planner = planner or FetchPlanner()
+        # Long ranges are fetched in time windows sized to this (see plan_time_windows)
+        self.memory_budget_mb = memory_budget_mb
         
+        # Shares latest-quote calls between concurrent requests and serves
+        # repeats from memory until the snapshot's TTL runs out
+        self.latest_cache = latest_cache or LatestQuoteCache()
+        
+        # Local bar cache so repeated ranges only fetch what is missing
+        self.cache = None
+        if use_cache:
+            try:
+                self.cache = BarCache()
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Bar cache disabled: {e}")
+        
+        # Per-ticker bar counts and upstream latency, used to balance --shards
+        try:
+            self.cost_index = CostIndex()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Cost index disabled: {e}")
+            self.cost_index = None
+    
+    def _login(self) -> None:
+        """Log in with the current session and save its state for later runs."""
+        self.client = self.session.login()
+        self.authenticated = True
+        self.session_restored = False
+        if self.session_store:
+            self.session_store.save(self.username, self.password, self.session, self.client)
+    
+    def relogin(self) -> bool:
+        """Discard the current session and log in again from scratch."""
+        self.authenticated = False
         try:
-            # Create session and login
             self.session = FiinSession(username=self.username, password=self.password)
-            self.client = self.session.login()
-            logger.info("FiinQuantX session initialized successfully")
-            self.authenticated = True
+            self._login()
+            logger.info("Re-authenticated with FiinQuant using a fresh session")
+            return True
         except Exception as e:
-            logger.error(f"Failed to initialize FiinQuantX session: {e}")
-            raise
+            logger.error(f"Re-authentication failed: {str(e)}")
+            return False
     
     def ensure_connection(self) -> bool:
         """Ensure we have a valid connection."""
         if not self.authenticated or not self.client:
             try:
-                self.client = self.session.login()
-                self.authenticated = True
+                with current_metrics().stage('login'):
+                    self._login()
                 logger.info("Successfully authenticated with FiinQuant")
                 return True
             except Exception as e:
@@ -82,39 +540,398 @@ class FiinQuantFetcher:
                 return False
         return True
     
+    def _call_upstream(self, call: Callable[[Any], T]) -> T:
+        """
+        Run `call(client)`, logging in again once if it fails on a saved session.
+        
+        A session restored from the session file may have been revoked or may
+        lack state that could not be saved, so its first failure gets a fresh
+        login and one retry instead of failing the request.
+        """
+        client = self.client
+        try:
+            return call(client)
+        except Exception as e:
+            metrics = current_metrics()
+            metrics.count('upstream_errors')
+            with self._login_lock:
+                # Another thread may already have replaced the failed client
+                if self.client is client:
+                    if not self.session_restored:
+                        raise
+                    logger.warning(f"Saved FiinQuant session failed ({e}), logging in again")
+                    if self.session_store:
+                        self.session_store.clear()
+                    metrics.count('relogins')
+                    with metrics.stage('login'):
+                        relogged = self.relogin()
+                    if not relogged:
+                        raise
+        return call(self.client)
+    
     def get_all_tickers(self) -> List[str]:
         """Get all available tickers from the market."""
+        tickers = all_tickers()
+        logger.info(f"Returning {len(tickers)} predefined tickers")
+        return tickers
+    
+    def fetch_trading_frame(
+        self,
+        tickers: List[str],
+        timeframe: str = '4h',
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None
+    ) -> Optional[pd.DataFrame]:
+        """
+        Run one historical Fetch_Trading_Data call and return the raw DataFrame.
+        
+        Args:
+            tickers: List of stock symbols
+            timeframe: Data timeframe (1m, 15m, 1h, 4h, 1d)
+            from_date: Start date (YYYY-MM-DD), defaults to 30 days ago
+            to_date: End date (YYYY-MM-DD), defaults to today
+            
+        Returns:
+            DataFrame from FiinQuantX, or None when nothing was returned.
+            Upstream errors are raised to the caller.
+        
+        The window is narrowed to its first and last trading day, and no call
+        is made at all when it holds no trading session (weekends, holidays,
+        today before the open).
+        """
+        fiinquant_timeframe = _fiinquant_timeframe(timeframe)
+        from_date, to_date = _default_date_range(from_date, to_date)
+        
+        clamped = get_calendar().clamp(from_date, to_date)
+        if clamped is None:
+            logger.info(f"No trading sessions in {from_date}..{to_date}, skipping upstream call")
+            return None
+        # Dates with a time of day are kept as they are; only whole days are narrowed
+        if len(from_date) <= 10:
+            from_date = clamped[0].isoformat()
+        if len(to_date) <= 10:
+            to_date = clamped[1].isoformat()
+        
+        # Prepare fields to fetch
+        fields = ['open', 'high', 'low', 'close', 'volume', 'bu', 'sd', 'fn', 'fs', 'fb']
+        
+        # Use FiinQuantX Fetch_Trading_Data method
+        logger.info(f"Fetching data for tickers: {tickers}, timeframe: {fiinquant_timeframe}")
+        metrics = current_metrics()
+        started = time.perf_counter()
+        with metrics.stage('upstream'):
+            df = self._call_upstream(lambda client: client.Fetch_Trading_Data(
+                realtime=False,
+                tickers=tickers,
+                fields=fields,
+                adjusted=True,
+                from_date=from_date,
+                to_date=to_date,
+                by=fiinquant_timeframe
+            ).get_data())
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        metrics.count('upstream_calls')
+        metrics.count('upstream_rows', 0 if df is None else len(df))
+        
+        if self.cost_index is not None:
+            try:
+                self.cost_index.observe(tickers, fiinquant_timeframe, from_date, to_date, df, elapsed_ms)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not update the cost index: {e}")
+        
+        logger.info(f"Raw data type: {type(df)}")
+        if df is not None:
+            logger.info(f"Data shape: {df.shape if hasattr(df, 'shape') else 'No shape'}")
+            logger.info(f"Data columns: {df.columns.tolist() if hasattr(df, 'columns') else 'No columns'}")
+        
+        if df is None or df.empty:
+            return None
+        return df
+    
+    def fetch_frame(
+        self,
+        tickers: List[str],
+        timeframe: str = '4h',
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None
+    ) -> Optional[pd.DataFrame]:
+        """
+        Fetch a trading DataFrame, serving already-cached days from the bar cache.
+        
+        Falls back to a direct upstream call when the cache is disabled or the
+        range has a time-of-day component the day-based cache cannot honor.
+        """
+        from_date, to_date = _default_date_range(from_date, to_date)
+        
+        if self.cache is None or len(from_date) > 10 or len(to_date) > 10:
+            return self.fetch_trading_frame(tickers, timeframe, from_date, to_date)
+        
+        fiinquant_timeframe = _fiinquant_timeframe(timeframe)
+        return self.cache.fetch(
+            lambda group, start, end: self.fetch_trading_frame(group, fiinquant_timeframe, start, end),
+            tickers,
+            fiinquant_timeframe,
+            True,
+            from_date,
+            to_date
+        )
+    
+    def fetch_historical_frame(
+        self,
+        tickers: List[str],
+        timeframe: str = '4h',
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None
+    ) -> Optional[pd.DataFrame]:
+        """
+        Fetch historical bars for all tickers as one raw DataFrame.
+        
+        Tickers are fetched in planned chunks; chunks that fail after
+        retries leave their tickers out instead of failing the whole batch.
+        
+        Returns:
+            Combined DataFrame, or None when nothing was returned
+        """
+        df, failed, _ = self.planner.run(
+            tickers,
+            lambda chunk: self.fetch_frame(chunk, timeframe, from_date, to_date)
+        )
+        if failed:
+            logger.warning(f"No data for {len(failed)} tickers in failed chunks: {failed}")
+            if len(failed) == len(tickers):
+                # Force a fresh login on the next call in case the session expired
+                self.authenticated = False
+        
+        if df is not None:
+            window = _default_date_range(from_date, to_date)
+            expected = get_calendar().expected_bars(_fiinquant_timeframe(timeframe), *window) * len(tickers)
+            logger.info(f"Fetched data shape: {df.shape} ({expected} bars expected from the trading calendar)")
+        else:
+            logger.warning("No data received from FiinQuantX")
+        return df
+    
+    def _iter_timeframes(
+        self,
+        tickers: List[str],
+        timeframes: List[str],
+        source_timeframe: str,
+        from_date: Optional[str],
+        to_date: Optional[str],
+        indicators: Optional[IndicatorEngine] = None,
+        bar_filter: Optional[BarFilter] = None,
+        columnar: bool = False
+    ) -> Iterator[Tuple[str, str, Any]]:
+        """
+        Fetch `source_timeframe` bars once and yield them, resampled into each of `timeframes`.
+        
+        Ranges too large for the memory budget are fetched and emitted one
+        time window at a time (see _time_windows); a ticker's bars then come
+        in several pieces, in time order, that together equal the unsplit
+        result. Bars repeated at window edges are only emitted once.
+        
+        Yields:
+            (timeframe, ticker, bar series) in `timeframes` then `tickers` order
+            (per window when split); with `columnar`, the bars are a column dict
+            (see iter_frame_columns)
+        """
+        convert = iter_frame_columns if columnar else iter_frame_bars
         if not self.ensure_connection():
             logger.error("Failed to connect to FiinQuant")
-            return []
+            return
+        
+        pending = [(tf, ticker) for tf in timeframes for ticker in tickers]
+        done = set()
+        metrics = current_metrics()
+        windows = self._time_windows(tickers, source_timeframe, from_date, to_date, indicators)
+        split = len(windows) > 1
+        # Last emitted bar (epoch ms) per timeframe and ticker, for the window edges
+        emitted: Dict[str, Dict[str, float]] = {tf: {} for tf in timeframes}
         
         try:
-            # Predefined VN30 and major Vietnamese stocks
-            vn30_tickers = [
-                'ACB', 'BCM', 'BID', 'BVH', 'CTG', 'FPT', 'GAS', 'GVR', 'HDB', 'HPG', 
-                'LPB', 'MBB', 'MSN', 'MWG', 'PLX', 'SAB', 'SHB', 'SSB', 'SSI', 'STB', 
-                'TCB', 'TPB', 'VCB', 'VHM', 'VIB', 'VIC', 'VJC', 'VNM', 'VPB', 'VRE'
-            ]
+            for window_from, window_to in windows:
+                df = self.fetch_historical_frame(tickers, source_timeframe, window_from, window_to)
+                if df is None:
+                    continue
+                
+                # Fetched rows per ticker, counted once however many timeframes are built
+                fetched = {}
+                if metrics.enabled:
+                    # Without a ticker column every row belongs to every ticker (see prepare_frame)
+                    fetched = df['ticker'].value_counts().to_dict() if 'ticker' in df.columns else dict.fromkeys(tickers, len(df))
+                for tf in timeframes:
+                    if tf == source_timeframe:
+                        frame = df
+                    else:
+                        with metrics.stage('resample'):
+                            frame = resample_bars(df, tf)
+                    keep = bar_filter.keep_rows(frame, tf) if bar_filter else None
+                    if split:
+                        keep = _after_emitted(frame, tickers, keep, emitted[tf])
+                    
+                    for ticker, market_data in convert(frame, tickers, indicators, keep):
+                        count = len(market_data['timestamp']) if columnar else len(market_data)
+                        metrics.ticker(ticker, fetched.pop(ticker, 0), count)
+                        if split and not count:
+                            # Tickers without bars in any window are reported once at the end
+                            continue
+                        logger.info(f"Fetched {count} {tf} data points for {ticker}")
+                        done.add((tf, ticker))
+                        yield tf, ticker, market_data
+                del df, frame
+                
+        except Exception as e:
+            logger.error(f"FiinQuantX API error: {str(e)}")
+            logger.error(f"Error type: {type(e)}")
+            import traceback
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            # Force a fresh login on the next call in case the session expired
+            self.authenticated = False
+        
+        for tf, ticker in pending:
+            if (tf, ticker) not in done:
+                yield tf, ticker, []
+    
+    def _time_windows(
+        self,
+        tickers: List[str],
+        timeframe: str,
+        from_date: Optional[str],
+        to_date: Optional[str],
+        indicators: Optional[IndicatorEngine]
+    ) -> List[Tuple[Optional[str], Optional[str]]]:
+        """Time windows to fetch [from_date, to_date] in within the memory budget (see plan_time_windows)."""
+        start, end = _default_date_range(from_date, to_date)
+        windows = plan_time_windows(_fiinquant_timeframe(timeframe), start, end, len(tickers), self.memory_budget_mb)
+        if len(windows) == 1:
+            return [(from_date, to_date)]
+        if indicators is not None:
+            # Indicator values depend on every earlier bar, so windows would change them
+            logger.warning(f"{timeframe} range {start}..{end} exceeds the memory budget but indicators "
+                           f"need the whole series; fetching it in one piece")
+            return [(from_date, to_date)]
+        logger.info(f"Fetching {timeframe} range {start}..{end} in {len(windows)} time windows to stay within the memory budget")
+        return windows
+    
+    def iter_historical_data(
+        self,
+        tickers: List[str],
+        timeframe: str = '4h',
+        period: int = 100,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        indicators: Optional[IndicatorEngine] = None,
+        bar_filter: Optional[BarFilter] = None,
+        columnar: bool = False
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Fetch historical market data and yield it one ticker at a time.
+        
+        Same arguments as fetch_historical_data. Bars are BarSet views until
+        they are written out, so only the ticker currently being written is
+        ever held as Python objects.
+        
+        Yields:
+            (ticker, bar series) pairs in `tickers` order; with
+            `columnar`, (ticker, column dict) as from iter_frame_columns
+        """
+        for _, ticker, market_data in self._iter_timeframes(
+            tickers, [timeframe], timeframe, from_date, to_date, indicators, bar_filter, columnar
+        ):
+            yield ticker, market_data
+    
+    def iter_derived_data(
+        self,
+        tickers: List[str],
+        timeframes: List[str],
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        indicators: Optional[IndicatorEngine] = None,
+        bar_filter: Optional[BarFilter] = None,
+        columnar: bool = False
+    ) -> Iterator[Tuple[str, str, Any]]:
+        """
+        Fetch 1m bars once and yield them resampled into every requested timeframe.
+        
+        Yields:
+            (timeframe, ticker, bar series) in `timeframes` then `tickers` order;
+            with `columnar`, the bars are a column dict (see iter_frame_columns)
+        """
+        yield from self._iter_timeframes(
+            tickers, timeframes, '1m', from_date, to_date, indicators, bar_filter, columnar
+        )
+    
+    def iter_since_data(
+        self,
+        watermarks: Dict[str, Optional[float]],
+        timeframe: str = '4h',
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        bar_filter: Optional[BarFilter] = None,
+        columnar: bool = False,
+        tolerance_bars: Optional[int] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Yield only the bars newer than each ticker's watermark (see watermarks.py).
+        
+        Tickers with nearby watermarks share one upstream call from the first
+        bar after the oldest of them; up-to-date tickers are not fetched.
+        
+        Args:
+            watermarks: TICKER -> last stored bar (epoch ms), None when nothing is stored
+            timeframe: Data timeframe
+            from_date: Start date for tickers without a watermark
+            to_date: End date (YYYY-MM-DD), defaults to today
+            bar_filter: Optional filter selecting which bars are returned
+            columnar: Yield column dicts (see iter_frame_columns) instead of bars
+            tolerance_bars: Max watermark spread, in bars, of tickers sharing a call
             
-            # Additional major stocks
-            additional_tickers = [
-                'HSG', 'PNJ', 'SMC', 'DHG', 'REE', 'GMD', 'VND', 'DGC', 'HCM', 'DXG',
-                'KDH', 'NVL', 'PDR', 'VGC', 'ACV', 'ASM', 'BGI', 'BMI', 'CEO', 'CTD',
-                'DCM', 'DGW', 'DRC', 'DTL', 'DVP', 'EIB', 'EVE', 'FCN', 'FIT', 'GEX',
-                'HAG', 'HAX', 'HNG', 'HTN', 'IMP', 'ITD', 'KBC', 'KDC', 'LGC', 'MAS',
-                'NKG', 'NT2', 'OCB', 'PAN', 'PC1', 'PGD', 'PHR', 'POM', 'POW', 'PPC',
-                'PVD', 'PVT', 'QCG', 'SAM', 'SBT', 'SC5', 'SCS', 'SGN', 'SHI', 'SJD',
-                'SRC', 'SSC', 'SVC', 'TLG', 'TMT', 'TNA', 'TNG', 'TRC', 'TSC', 'TVN',
-                'VCI', 'VGI', 'VHC', 'VPI', 'VTB', 'YEG'
-            ]
+        Yields:
+            (ticker, new bars) for every ticker of `watermarks`, in completion order
+        """
+        convert = iter_frame_columns if columnar else iter_frame_bars
+        groups, up_to_date = plan_since_groups(
+            watermarks, timeframe, tolerance_bars, self.planner.chunk_size, to_date
+        )
+        metrics = current_metrics()
+        metrics.count('since_up_to_date', len(up_to_date))
+        logger.info(f"Incremental {timeframe} fetch: {len(watermarks) - len(up_to_date)} tickers in "
+                    f"{len(groups)} calls, {len(up_to_date)} already up to date")
+        # Empty frames give up-to-date and failed tickers the same empty output as any ticker without bars
+        empty = pd.DataFrame({'ticker': pd.Series(dtype=object), 'timestamp': pd.Series(dtype=object)})
+        yield from convert(empty, up_to_date, None, None)
+        
+        if not groups:
+            return
+        if not self.ensure_connection():
+            logger.error("Failed to connect to FiinQuant")
+            yield from convert(empty, [ticker for group in groups for ticker in group['tickers']], None, None)
+            return
+        
+        failed: List[str] = []
+        jobs = [
+            (group['tickers'], lambda chunk, start=group['from_date'] or from_date: self.fetch_frame(chunk, timeframe, start, to_date))
+            for group in groups
+        ]
+        for index, df, report in self.planner.run_as_completed(jobs):
+            tickers = groups[index]['tickers']
+            if report['status'] != 'ok':
+                failed.extend(tickers)
+            if df is None:
+                df = empty
             
-            all_tickers = vn30_tickers + additional_tickers
-            logger.info(f"Returning {len(all_tickers)} predefined tickers")
-            return all_tickers
+            stamps, _ = _timestamp_millis(df)
+            keep = newer_than(df, stamps, watermarks)
+            if bar_filter:
+                keep &= bar_filter.keep_rows(df, timeframe)
+            fetched = df['ticker'].value_counts().to_dict() if metrics.enabled and 'ticker' in df.columns else {}
             
-        except Exception as e:
-            logger.error(f"Failed to get all tickers: {str(e)}")
-            return []
+            for ticker, market_data in convert(df, tickers, None, keep):
+                count = len(market_data['timestamp']) if columnar else len(market_data)
+                metrics.ticker(ticker, fetched.get(ticker, 0), count)
+                yield ticker, market_data
+        
+        if failed:
+            logger.warning(f"No new data for {len(failed)} tickers in failed fetches: {failed}")
     
     def fetch_historical_data(
         self, 
@@ -122,8 +939,10 @@ class FiinQuantFetcher:
         timeframe: str = '4h',
         period: int = 100,
         from_date: Optional[str] = None,
-        to_date: Optional[str] = None
-    ) -> Dict[str, List[Dict[str, Any]]]:
+        to_date: Optional[str] = None,
+        indicators: Optional[IndicatorEngine] = None,
+        bar_filter: Optional[BarFilter] = None
+    ) -> Dict[str, BarSeries]:
         """
         Fetch historical market data for given tickers using FiinQuantX library.
         
@@ -133,146 +952,63 @@ class FiinQuantFetcher:
             period: Number of periods to fetch
             from_date: Start date (YYYY-MM-DD)
             to_date: End date (YYYY-MM-DD)
+            indicators: Optional indicator columns to add to every bar
+            bar_filter: Optional filter selecting which bars are returned
             
         Returns:
-            Dictionary with ticker as key and list of market data as value
+            Dictionary with ticker as key and its bar series (a sequence of
+            market data dicts, see bar_store) as value
         """
-        if not self.ensure_connection():
-            logger.error("Failed to connect to FiinQuant")
-            return {}
+        pieces: Dict[str, List[BarSeries]] = {ticker: [] for ticker in tickers}
+        for ticker, market_data in self.iter_historical_data(
+            tickers, timeframe, period, from_date, to_date, indicators, bar_filter
+        ):
+            # Ranges split into time windows come in several pieces per ticker
+            pieces.setdefault(ticker, []).append(market_data)
+        return {ticker: BarSeries.concat(ticker, series) for ticker, series in pieces.items()}
+    
+    def fetch_derived_data(
+        self,
+        tickers: List[str],
+        timeframes: List[str],
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        indicators: Optional[IndicatorEngine] = None,
+        bar_filter: Optional[BarFilter] = None
+    ) -> Dict[str, Dict[str, BarSeries]]:
+        """
+        Fetch 1m data once and build every requested timeframe from it.
         
-        try:
-            # Convert timeframe to FiinQuantX format
-            timeframe_map = {
-                '1m': '1m',
-                '15m': '15m',
-                '1h': '1h',
-                '4h': '4h',
-                '1d': '1d'
-            }
-            
-            fiinquant_timeframe = timeframe_map.get(timeframe, '4h')
-            
-            # Prepare date range
-            if not from_date:
-                from_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            if not to_date:
-                to_date = datetime.now().strftime('%Y-%m-%d')
-            
-            # Prepare fields to fetch
-            fields = ['open', 'high', 'low', 'close', 'volume', 'bu', 'sd', 'fn', 'fs', 'fb']
-            
-            results = {}
-            
-            try:
-                # Use FiinQuantX Fetch_Trading_Data method
-                logger.info(f"Fetching data for tickers: {tickers}, timeframe: {fiinquant_timeframe}")
-                df = self.client.Fetch_Trading_Data(
-                    realtime=False,
-                    tickers=tickers,
-                    fields=fields,
-                    adjusted=True,
-                    from_date=from_date,
-                    to_date=to_date,
-                    by=fiinquant_timeframe
-                ).get_data()
-                
-                logger.info(f"Raw data type: {type(df)}")
-                if df is not None:
-                    logger.info(f"Data shape: {df.shape if hasattr(df, 'shape') else 'No shape'}")
-                    logger.info(f"Data columns: {df.columns.tolist() if hasattr(df, 'columns') else 'No columns'}")
-                
-                if df is not None and not df.empty:
-                    logger.info(f"Fetched data shape: {df.shape}")
-                    
-                    # Group by ticker
-                    for ticker in tickers:
-                        ticker_data = df[df['ticker'] == ticker] if 'ticker' in df.columns else df
-                        
-                        if ticker_data.empty:
-                            results[ticker] = []
-                            continue
-                        
-                        market_data = []
-                        for _, row in ticker_data.iterrows():
-                            try:
-                                # Convert timestamp
-                                timestamp = row.get('timestamp', datetime.now())
-                                if isinstance(timestamp, str):
-                                    timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                                elif not isinstance(timestamp, datetime):
-                                    timestamp = datetime.now()
-                                
-                                # Extract OHLCV data with NaN handling
-                                open_price = float(row.get('open', 0)) if pd.notna(row.get('open')) else 0.0
-                                high_price = float(row.get('high', 0)) if pd.notna(row.get('high')) else 0.0
-                                low_price = float(row.get('low', 0)) if pd.notna(row.get('low')) else 0.0
-                                close_price = float(row.get('close', 0)) if pd.notna(row.get('close')) else 0.0
-                                
-                                # Handle volume conversion safely
-                                volume_raw = row.get('volume', 0)
-                                if pd.notna(volume_raw) and not pd.isna(volume_raw):
-                                    volume = int(float(volume_raw))
-                                else:
-                                    volume = 0
-                                
-                                # Calculate change
-                                change = close_price - open_price
-                                change_percent = (change / open_price * 100) if open_price > 0 else 0
-                                
-                                # Foreign trading data with NaN handling
-                                fb_raw = row.get('fb', 0)
-                                fs_raw = row.get('fs', 0)
-                                foreign_buy = int(float(fb_raw)) if pd.notna(fb_raw) and not pd.isna(fb_raw) else 0
-                                foreign_sell = int(float(fs_raw)) if pd.notna(fs_raw) and not pd.isna(fs_raw) else 0
-                                
-                                data_point = {
-                                    'ticker': ticker,
-                                    'timestamp': timestamp.isoformat(),
-                                    'open': open_price,
-                                    'high': high_price,
-                                    'low': low_price,
-                                    'close': close_price,
-                                    'volume': volume,
-                                    'change': change,
-                                    'change_percent': change_percent,
-                                    'total_match_value': volume * close_price,
-                                    'foreign_buy_volume': foreign_buy,
-                                    'foreign_sell_volume': foreign_sell,
-                                    'match_volume': volume
-                                }
-                                market_data.append(data_point)
-                                
-                            except (ValueError, KeyError, TypeError) as e:
-                                logger.warning(f"Failed to parse data point for {ticker}: {e}")
-                                continue
-                        
-                        results[ticker] = market_data
-                        logger.info(f"Fetched {len(market_data)} data points for {ticker}")
-                
-                else:
-                    logger.warning("No data received from FiinQuantX")
-                    for ticker in tickers:
-                        results[ticker] = []
-                        
-            except Exception as e:
-                logger.error(f"FiinQuantX API error: {str(e)}")
-                logger.error(f"Error type: {type(e)}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                for ticker in tickers:
-                    results[ticker] = []
-            
-            return results
+        Args:
+            tickers: List of stock symbols
+            timeframes: Timeframes to return (1m, 15m, 1h, 4h, 1d)
+            from_date: Start date (YYYY-MM-DD)
+            to_date: End date (YYYY-MM-DD)
+            indicators: Optional indicator columns to add to every bar
+            bar_filter: Optional filter selecting which bars are returned
             
-        except Exception as e:
-            logger.error(f"Failed to fetch historical data: {str(e)}")
-            return {}
+        Returns:
+            Dictionary keyed by timeframe, then ticker, with bar series
+        """
+        pieces: Dict[str, Dict[str, List[BarSeries]]] = {
+            tf: {ticker: [] for ticker in tickers} for tf in timeframes
+        }
+        for tf, ticker, market_data in self.iter_derived_data(
+            tickers, timeframes, from_date, to_date, indicators, bar_filter
+        ):
+            pieces[tf].setdefault(ticker, []).append(market_data)
+        return {
+            tf: {ticker: BarSeries.concat(ticker, series) for ticker, series in by_ticker.items()}
+            for tf, by_ticker in pieces.items()
+        }
     
     def fetch_latest_data(self, tickers: List[str]) -> Dict[str, Dict[str, Any]]:
         """
         Fetch latest market data for given tickers using FiinQuantX library.
         
+        Quotes come from the latest-quote cache while fresh; misses of
+        concurrent requests are fetched together in one upstream call.
+        
         Args:
             tickers: List of stock symbols
             
@@ -284,84 +1020,54 @@ class FiinQuantFetcher:
             return {}
         
         try:
-            # Use FiinQuantX Fetch_Trading_Data for real-time data
-            fields = ['open', 'high', 'low', 'close', 'volume', 'bu', 'sd', 'fn', 'fs', 'fb']
-            
-            df = self.client.Fetch_Trading_Data(
+            return self.latest_cache.get_many(tickers, self._fetch_latest_upstream)
+        except Exception as e:
+            logger.error(f"Failed to fetch latest data: {str(e)}")
+            self.authenticated = False
+            return {}
+    
+    def _fetch_latest_upstream(self, tickers: List[str]) -> Dict[str, Dict[str, Any]]:
+        """One realtime Fetch_Trading_Data call for `tickers`; raises on failure."""
+        # Use FiinQuantX Fetch_Trading_Data for real-time data
+        fields = ['open', 'high', 'low', 'close', 'volume', 'bu', 'sd', 'fn', 'fs', 'fb']
+        
+        metrics = current_metrics()
+        with metrics.stage('upstream'):
+            df = self._call_upstream(lambda client: client.Fetch_Trading_Data(
                 realtime=True,
                 tickers=tickers,
                 fields=fields,
                 adjusted=True,
                 by='4h'
-            ).get_data()
+            ).get_data())
+        metrics.count('upstream_calls')
+        metrics.count('upstream_rows', 0 if df is None else len(df))
+        
+        results = {}
+        
+        if df is not None and not df.empty:
+            logger.info(f"Fetched latest data shape: {df.shape}")
             
-            results = {}
+            # Only the most recent row per ticker is needed, stamped with
+            # the fetch time rather than the bar time
+            if 'ticker' in df.columns:
+                df = df.groupby('ticker', sort=False).tail(1)
+            else:
+                df = df.tail(1)
+            df = df.drop(columns=['timestamp'], errors='ignore')
             
-            if df is not None and not df.empty:
-                logger.info(f"Fetched latest data shape: {df.shape}")
-                
-                for ticker in tickers:
-                    try:
-                        # Get latest data for ticker
-                        ticker_data = df[df['ticker'] == ticker] if 'ticker' in df.columns else df
-                        
-                        if ticker_data.empty:
-                            logger.warning(f"No latest data for {ticker}")
-                            continue
-                        
-                        # Get the most recent row
-                        latest_row = ticker_data.iloc[-1]
-                        
-                        # Extract data with NaN handling
-                        open_price = float(latest_row.get('open', 0)) if pd.notna(latest_row.get('open')) else 0.0
-                        high_price = float(latest_row.get('high', 0)) if pd.notna(latest_row.get('high')) else 0.0
-                        low_price = float(latest_row.get('low', 0)) if pd.notna(latest_row.get('low')) else 0.0
-                        close_price = float(latest_row.get('close', 0)) if pd.notna(latest_row.get('close')) else 0.0
-                        
-                        # Handle volume conversion safely
-                        volume_raw = latest_row.get('volume', 0)
-                        if pd.notna(volume_raw) and not pd.isna(volume_raw):
-                            volume = int(float(volume_raw))
-                        else:
-                            volume = 0
-                        
-                        # Calculate change
-                        change = close_price - open_price
-                        change_percent = (change / open_price * 100) if open_price > 0 else 0
-                        
-                        # Foreign trading data with NaN handling
-                        fb_raw = latest_row.get('fb', 0)
-                        fs_raw = latest_row.get('fs', 0)
-                        foreign_buy = int(float(fb_raw)) if pd.notna(fb_raw) and not pd.isna(fb_raw) else 0
-                        foreign_sell = int(float(fs_raw)) if pd.notna(fs_raw) and not pd.isna(fs_raw) else 0
-                        
-                        data_point = {
-                            'ticker': ticker,
-                            'timestamp': datetime.now().isoformat(),
-                            'open': open_price,
-                            'high': high_price,
-                            'low': low_price,
-                            'close': close_price,
-                            'volume': volume,
-                            'change': change,
-                            'change_percent': change_percent,
-                            'total_match_value': volume * close_price,
-                            'foreign_buy_volume': foreign_buy,
-                            'foreign_sell_volume': foreign_sell,
-                            'match_volume': volume
-                        }
-                        
-                        results[ticker] = data_point
-                        logger.info(f"Fetched latest data for {ticker}: {close_price}")
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to process latest data for {ticker}: {str(e)}")
-            
-            return results
+            bars = frame_to_bars(df, tickers)
             
-        except Exception as e:
-            logger.error(f"Failed to fetch latest data: {str(e)}")
-            return {}
+            for ticker in tickers:
+                if not bars[ticker]:
+                    logger.warning(f"No latest data for {ticker}")
+                    continue
+                
+                data_point = bars[ticker][-1]
+                results[ticker] = data_point
+                logger.info(f"Fetched latest data for {ticker}: {data_point['close']}")
+        
+        return results
     
     def check_market_status(self) -> Dict[str, Any]:
         """
@@ -370,96 +1076,1111 @@ class FiinQuantFetcher:
         Returns:
             Dictionary with market status information
         """
-        now = datetime.now()
-        weekday = now.weekday()
-        hour = now.hour
+        return market_status()
+
+def _after_emitted(
+    frame: pd.DataFrame,
+    tickers: List[str],
+    keep: Optional[np.ndarray],
+    emitted: Dict[str, float]
+) -> np.ndarray:
+    """
+    Narrow `keep` to rows newer than each ticker's last emitted bar, and record the new last bars.
+
+    Args:
+        frame: Bars of the current time window
+        tickers: Requested tickers (all rows belong to each when there is no ticker column)
+        keep: Row mask so far, or None
+        emitted: TICKER -> epoch ms of the last emitted bar; updated in place
+    """
+    stamps, _ = _timestamp_millis(frame)
+    keep = newer_than(frame, stamps, emitted) if keep is None else keep & newer_than(frame, stamps, emitted)
+    if keep.any():
+        if 'ticker' in frame.columns:
+            latest = pd.Series(stamps[keep]).groupby(frame['ticker'].to_numpy()[keep]).max().to_dict()
+        else:
+            latest = dict.fromkeys(tickers, stamps[keep].max())
+        emitted.update(latest)
+    return keep
+
+
+def _split_tickers(tickers: Any) -> List[str]:
+    """Accept tickers as a list or a comma-separated string; repeats are dropped, order is kept."""
+    if isinstance(tickers, str):
+        tickers = [t.strip() for t in tickers.split(',') if t.strip()]
+    return list(dict.fromkeys(tickers or []))
+
+
+def _parse_derive_param(derive: Any) -> List[str]:
+    """Accept --derive as a list or a comma-separated string."""
+    if not derive:
+        return []
+    return parse_derive(derive if isinstance(derive, str) else ','.join(derive))
+
+
+def _indicator_engine(params: Dict[str, Any]) -> Optional[IndicatorEngine]:
+    """Build the indicator engine requested by --indicators / --indicator-options, if any."""
+    names = parse_indicators(params.get('indicators'))
+    if not names:
+        return None
+    return IndicatorEngine(names, parse_indicator_options(params.get('indicator_options')))
+
+
+def _iter_historical_series(
+    fetcher: 'FiinQuantFetcher',
+    params: Dict[str, Any],
+    columnar: bool = False
+) -> Iterator[Tuple[Optional[str], str, Any]]:
+    """
+    Yield (timeframe, ticker, bars) for a historical request, one ticker at a time.
+
+    The timeframe is only set with `derive`, or with a `since` watermark map
+    keyed by timeframe, where one request returns several series.
+    """
+    if params.get('since') is not None:
+        yield from _iter_since_series(fetcher, params, columnar)
+        return
+    
+    tickers = _split_tickers(params.get('tickers'))
+    if not tickers:
+        raise ValueError("--tickers is required for historical data")
+    
+    derive = _parse_derive_param(params.get('derive'))
+    indicators = _indicator_engine(params)
+    bar_filter = BarFilter.from_params(params)
+    
+    if derive:
+        yield from fetcher.iter_derived_data(
+            tickers=tickers,
+            timeframes=derive,
+            from_date=params.get('from_date'),
+            to_date=params.get('to_date'),
+            indicators=indicators,
+            bar_filter=bar_filter,
+            columnar=columnar
+        )
+        return
+    
+    for ticker, bars in fetcher.iter_historical_data(
+        tickers=tickers,
+        timeframe=params.get('timeframe') or '4h',
+        period=int(params.get('period') or 100),
+        from_date=params.get('from_date'),
+        to_date=params.get('to_date'),
+        indicators=indicators,
+        bar_filter=bar_filter,
+        columnar=columnar
+    ):
+        yield None, ticker, bars
+
+
+def _since_watermarks(params: Dict[str, Any]) -> Tuple[Dict[str, Dict[str, Optional[float]]], bool]:
+    """
+    Watermark map of an incremental request, restricted to `tickers` when given.
+
+    Listed tickers missing from the map count as having nothing stored.
+    """
+    if params.get('derive'):
+        raise ValueError("--since cannot be combined with --derive; pass a watermark map per timeframe instead")
+    if params.get('indicators'):
+        # Indicators need the stored history before the watermark, which is not fetched
+        raise ValueError("--indicators is not supported with --since")
+    by_timeframe, nested = load_watermarks(params['since'], params.get('timeframe') or '4h')
+    tickers = _split_tickers(params.get('tickers'))
+    if tickers:
+        by_timeframe = {
+            tf: {ticker: marks.get(ticker) for ticker in tickers}
+            for tf, marks in by_timeframe.items()
+        }
+    return by_timeframe, nested
+
+
+def _iter_since_series(
+    fetcher: 'FiinQuantFetcher',
+    params: Dict[str, Any],
+    columnar: bool = False
+) -> Iterator[Tuple[Optional[str], str, Any]]:
+    """Yield (timeframe, ticker, new bars) of a `since` request (see FiinQuantFetcher.iter_since_data)."""
+    by_timeframe, nested = _since_watermarks(params)
+    bar_filter = BarFilter.from_params(params)
+    tolerance = params.get('since_tolerance')
+    for timeframe, watermarks in by_timeframe.items():
+        for ticker, bars in fetcher.iter_since_data(
+            watermarks,
+            timeframe=timeframe,
+            from_date=params.get('from_date'),
+            to_date=params.get('to_date'),
+            bar_filter=bar_filter,
+            columnar=columnar,
+            tolerance_bars=None if tolerance is None else int(tolerance)
+        ):
+            yield timeframe if nested else None, ticker, bars
+
+
+def write_historical_ndjson(fetcher: 'FiinQuantFetcher', params: Dict[str, Any], out) -> int:
+    """
+    Write historical bars to `out` as NDJSON, one bar per line.
+
+    Each ticker is serialized and flushed as soon as it has been converted,
+    so only one ticker's bars are held as Python objects at a time. With
+    `derive`, every line also carries its `timeframe`.
+
+    Returns:
+        Number of bars written
+    """
+    written = 0
+    metrics = current_metrics()
+    
+    for timeframe, ticker, bars in _iter_historical_series(fetcher, params):
+        if bars:
+            with metrics.stage('encode'):
+                rows = bars.to_dicts({'timeframe': timeframe} if timeframe else None)
+                text = '\n'.join(json.dumps(bar, default=str) for bar in rows) + '\n'
+                out.write(text)
+                out.flush()
+            # json.dumps escapes non-ASCII, so characters are bytes
+            metrics.count('bytes_out', len(text))
+            written += len(bars)
+    
+    return written
+
+
+def write_historical_columnar(fetcher: 'FiinQuantFetcher', params: Dict[str, Any], fmt: str, out) -> int:
+    """
+    Write historical bars to the binary stream `out` as Arrow or MessagePack columns.
+
+    One unit (record batch / message) per ticker and timeframe (and time
+    window, for ranges split to fit the memory budget), flushed as soon as it
+    is converted; no per-bar Python objects are built.
+
+    Returns:
+        Number of bars written
+    """
+    metrics = current_metrics()
+    if metrics.enabled:
+        out = CountingStream(out)
+    writer = open_column_writer(fmt, out)
+    try:
+        for timeframe, ticker, columns in _iter_historical_series(fetcher, params, columnar=True):
+            with metrics.stage('encode'):
+                writer.write(ticker, columns, timeframe)
+    finally:
+        writer.close()
+        if metrics.enabled:
+            metrics.count('bytes_out', out.written)
+    return writer.written
+
+
+def write_historical_mongo(fetcher: 'FiinQuantFetcher', params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Upsert historical bars straight into the stock-ss* collections (see mongo_sink).
+
+    Bars go from the columnar conversion into bulk upserts one ticker at a
+    time; nothing but the write summary is returned.
+
+    Returns:
+        MongoBarSink.summary() of the run
+    """
+    sink = MongoBarSink(
+        uri=params.get('mongo_uri'),
+        db_name=params.get('mongo_db'),
+        batch_size=params.get('mongo_batch_size')
+    )
+    timeframe = params.get('timeframe') or '4h'
+    try:
+        for series_timeframe, ticker, columns in _iter_historical_series(fetcher, params, columnar=True):
+            sink.write(ticker, columns, series_timeframe or timeframe)
+    finally:
+        sink.close()
+    
+    summary = sink.summary()
+    logger.info(f"Upserted {summary['bars']} bars into MongoDB ({summary['upserted']} new, "
+                f"{summary['modified']} updated, {summary['write_errors']} failed)")
+    return summary
+
+
+def run_action(fetcher: Optional['FiinQuantFetcher'], action: str, params: Dict[str, Any]) -> Any:
+    """
+    Run one fetcher action and return its JSON-serializable result.
+
+    Shared by the one-shot command line and the long-running serve mode.
+
+    Args:
+        fetcher: Authenticated fetcher instance; may be None for LOGIN_FREE_ACTIONS
+        action: One of historical, latest, latest-stats, market-status, all-tickers,
+            trading-calendar, backtest
+        params: Action parameters (tickers, timeframe, period, from_date, to_date, derive,
+            indicators, indicator_options, the BarFilter fields hours, minutes,
+            time_window, session, weekdays, sink='mongo' with optional
+            mongo_uri, mongo_db, mongo_batch_size, and since (watermark map,
+            path or "-", see watermarks.py) with optional since_tolerance;
+            for backtest, limit, backtest_params, backtest_workers and
+            include_trades, see run_backtest)
+
+    Returns:
+        Result payload for the action
+    """
+    if action == 'historical':
+        if params.get('sink') == 'mongo':
+            if params.get('since') is None and not _split_tickers(params.get('tickers')):
+                raise ValueError("--tickers is required for historical data")
+            return write_historical_mongo(fetcher, params)
         
-        is_weekday = weekday < 5
-        is_trading_hours = is_weekday and (9 <= hour < 15)
+        if params.get('since') is not None:
+            # Keyed by timeframe first when the watermark map was
+            result: Dict[str, Any] = {}
+            for timeframe, ticker, bars in _iter_since_series(fetcher, params):
+                (result.setdefault(timeframe, {}) if timeframe else result)[ticker] = bars
+            return result
         
-        return {
-            'is_open': is_trading_hours,
-            'is_weekday': is_weekday,
-            'current_time': now.isoformat(),
-            'trading_hours': '09:00-15:00',
-            'timezone': 'Asia/Ho_Chi_Minh'
-        }
+        tickers = _split_tickers(params.get('tickers'))
+        if not tickers:
+            raise ValueError("--tickers is required for historical data")
+        
+        derive = _parse_derive_param(params.get('derive'))
+        indicators = _indicator_engine(params)
+        bar_filter = BarFilter.from_params(params)
+        
+        if derive:
+            return fetcher.fetch_derived_data(
+                tickers=tickers,
+                timeframes=derive,
+                from_date=params.get('from_date'),
+                to_date=params.get('to_date'),
+                indicators=indicators,
+                bar_filter=bar_filter
+            )
+        
+        return fetcher.fetch_historical_data(
+            tickers=tickers,
+            timeframe=params.get('timeframe') or '4h',
+            period=int(params.get('period') or 100),
+            from_date=params.get('from_date'),
+            to_date=params.get('to_date'),
+            indicators=indicators,
+            bar_filter=bar_filter
+        )
+    
+    if action == 'backtest':
+        return run_backtest(fetcher, params)
+    
+    if action == 'latest':
+        tickers = _split_tickers(params.get('tickers'))
+        if not tickers:
+            raise ValueError("--tickers is required for latest data")
+        return fetcher.fetch_latest_data(tickers)
+    
+    if action == 'latest-stats':
+        return fetcher.latest_cache.stats()
+    
+    if action == 'market-status':
+        return market_status()
+    
+    if action == 'all-tickers':
+        return {'tickers': all_tickers()}
+    
+    if action == 'trading-calendar':
+        from_date, to_date = _default_date_range(params.get('from_date'), params.get('to_date'))
+        timeframes = _split_tickers(params.get('timeframe')) or ['1m', '15m', '1h', '4h', '1d']
+        return get_calendar().describe(from_date, to_date, timeframes)
+    
+    raise ValueError(f"Unsupported action: {action}")
+
+
+def run_backtest(fetcher: 'FiinQuantFetcher', params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Backtest the RSI-PSAR-engulfing strategy on freshly fetched bars (see backtest.py).
+    
+    Bars go from the fetched DataFrame into the backtest panel as NumPy
+    columns, without building per-bar Python objects. The BarFilter fields
+    apply as for historical data.
+    
+    Args:
+        fetcher: Authenticated fetcher instance
+        params: tickers, timeframe (default 15m), from_date, to_date, limit
+            (last bars per ticker), backtest_params (JSON object of strategy
+            parameters; list values are swept as a grid), backtest_workers
+            (grid worker processes) and include_trades
+    
+    Returns:
+        BacktestSummaryDto-shaped summary of the best parameter set, with the
+        aggregate statistics of every run under "grid" for a sweep
+    """
+    tickers = _split_tickers(params.get('tickers'))
+    if not tickers:
+        raise ValueError("--tickers is required for backtest")
+    grid = parse_backtest_params(params.get('backtest_params'))
+    timeframe = params.get('timeframe') or '15m'
+    
+    df = fetcher.fetch_historical_frame(tickers, timeframe, params.get('from_date'), params.get('to_date'))
+    if df is None or df.empty:
+        raise ValueError(f"No {timeframe} bars to backtest for {tickers}")
+    
+    metrics = current_metrics()
+    bar_filter = BarFilter.from_params(params)
+    keep = bar_filter.keep_rows(df, timeframe) if bar_filter else None
+    with metrics.stage('prepare'):
+        panel = BarPanel.from_bars(prepare_frame(df, tickers, keep=keep), params.get('limit'))
+    with metrics.stage('backtest'):
+        summary = run_grid(
+            panel,
+            grid,
+            workers=params.get('backtest_workers'),
+            include_trades=bool(params.get('include_trades'))
+        )
+    
+    # Requested tickers without bars are reported as failed, like the Node backtest does
+    missing = [ticker for ticker in tickers if ticker not in panel.tickers]
+    summary['totalTickers'] = len(tickers)
+    summary['results'].extend(
+        {'ticker': ticker, 'totalCandles': 0, 'buySignals': 0, 'sellSignals': 0, 'riskWarnings': 0,
+         'processingTimeMs': 0, 'status': 'failed'}
+        for ticker in missing
+    )
+    return summary
+
+
+def run_gap_scan(args: argparse.Namespace, planner: FetchPlanner) -> Dict[str, Any]:
+    """
+    Scan exported bars for missing bars and bad opens, and refetch them with --execute.
+
+    Args:
+        args: Parsed command line (input, timeframe, from_date, to_date, tickers,
+            merge_days, execute, no_session_cache)
+        planner: Fetch planner used for the refetch calls
+
+    Returns:
+        Scan result (see gap_scanner.scan_gaps) per timeframe, with a `refetch`
+        entry when the plan was executed
+    """
+    paths = [p.strip() for p in (args.input or '').split(',') if p.strip()]
+    if not paths:
+        raise ValueError("--input is required for scan-gaps")
+    
+    frames: Dict[str, List[pd.DataFrame]] = {}
+    for path in paths:
+        timeframe = args.timeframe or timeframe_from_name(os.path.basename(path))
+        if not timeframe:
+            raise ValueError(f"Cannot tell the timeframe of {path}; name it after its stock-ss* collection or pass --timeframe")
+        frames.setdefault(timeframe, []).append(load_export(path))
+    
+    fetcher = None
+    if args.execute:
+        # The bar cache may hold the very gaps being repaired, so refetches always go upstream
+        fetcher = FiinQuantFetcher(use_cache=False, planner=planner, use_session_cache=not args.no_session_cache)
+    
+    result = {}
+    for timeframe, parts in frames.items():
+        scan = scan_gaps(
+            pd.concat(parts, ignore_index=True),
+            timeframe,
+            from_date=args.from_date,
+            to_date=args.to_date,
+            tickers=_split_tickers(args.tickers) or None,
+            merge_days=args.merge_days
+        )
+        if fetcher:
+            scan['refetch'] = execute_plan(fetcher, scan)
+        result[timeframe] = scan
+    return result
+
+
+def run_bulk_export(args: argparse.Namespace, planner: FetchPlanner) -> Dict[str, Any]:
+    """
+    Export raw history for a ticker universe into partitioned files (see bulk_export).
+
+    Args:
+        args: Parsed command line (tickers or tickers_file, timeframe, from_date,
+            to_date, output_dir, export_format, window_months, no_session_cache)
+        planner: Chunk size, parallelism, rate limit and retries of the unit fetches
+
+    Returns:
+        Export summary (see bulk_export.run_export)
+    """
+    if not args.output_dir:
+        raise ValueError("--output-dir is required for export")
+    if not args.from_date:
+        raise ValueError("--from-date is required for export")
+    tickers = _split_tickers(args.tickers) or load_ticker_file(args.tickers_file)
+    if not tickers:
+        raise ValueError("No tickers to export")
+    timeframe = _fiinquant_timeframe(args.timeframe or '1d')
+    from_date, to_date = _default_date_range(args.from_date, args.to_date)
+    
+    # Research dumps are raw upstream bars, so the bar cache is neither read nor filled
+    fetcher = FiinQuantFetcher(use_cache=False, planner=planner, use_session_cache=not args.no_session_cache)
+    if not fetcher.ensure_connection():
+        raise RuntimeError("Failed to connect to FiinQuant")
+    
+    return run_export(
+        lambda tickers, start, end: fetcher.fetch_trading_frame(tickers, timeframe, start, end),
+        planner,
+        tickers,
+        timeframe,
+        from_date,
+        to_date,
+        args.output_dir,
+        fmt=args.export_format,
+        window_months=args.window_months
+    )
+
+
+def run_sharded_historical(args: argparse.Namespace, planner: FetchPlanner, out) -> Dict[str, Any]:
+    """
+    Fetch historical data in --shards worker processes balanced by expected cost (see sharding).
+
+    Args:
+        args: Parsed command line (tickers or tickers_file, shards, timeframe,
+            derive, from_date, to_date, output and the options passed on to the shards)
+        planner: Used to log in once before the shards start
+        out: Text stream the merged result is written to
+
+    Returns:
+        Shard balance report (see sharding.balance_report)
+    """
+    if args.format != 'json' or args.sink != 'stdout':
+        raise ValueError("--shards only supports JSON or NDJSON output on stdout")
+    if args.since is not None:
+        raise ValueError("--shards cannot be combined with --since")
+    tickers = _split_tickers(args.tickers) or load_ticker_file(args.tickers_file)
+    if not tickers:
+        raise ValueError("No tickers to fetch")
+    # With --derive every shard fetches 1m bars and resamples them
+    timeframe = '1m' if args.derive else _fiinquant_timeframe(args.timeframe or '4h')
+    from_date, to_date = _default_date_range(args.from_date, args.to_date)
+    
+    if not args.no_session_cache and session_reuse_enabled():
+        # Log in here so the shards restore the saved session instead of each logging in
+        fetcher = FiinQuantFetcher(use_cache=False, planner=planner)
+        if not fetcher.ensure_connection():
+            raise RuntimeError("Failed to connect to FiinQuant")
+    
+    costs, estimated = CostIndex().expected_costs(tickers, timeframe, from_date, to_date)
+    return run_sharded(sys.argv[1:], tickers, costs, args.shards, args.output, out, estimated)
+
+
+def run_adjustment_check(args: argparse.Namespace, planner: FetchPlanner) -> Dict[str, Any]:
+    """
+    Flag tickers whose adjusted prices changed since the last check, and fix their stored history with --apply.
+
+    Args:
+        args: Parsed command line (tickers or tickers_file, probe_days, apply,
+            sink with mongo_uri / mongo_db / mongo_batch_size, no_cache,
+            no_session_cache)
+        planner: Chunk size, parallelism, rate limit and retries of the probe calls
+
+    Returns:
+        Check report (see adjustments.check_adjustments), with `applied` per
+        changed ticker when the fixes were applied
+    """
+    tickers = _split_tickers(args.tickers) or load_ticker_file(args.tickers_file)
+    if not tickers:
+        raise ValueError("No tickers to check")
+    
+    fetcher = FiinQuantFetcher(
+        use_cache=not args.no_cache,
+        planner=planner,
+        use_session_cache=not args.no_session_cache,
+        memory_budget_mb=args.memory_budget_mb
+    )
+    if not fetcher.ensure_connection():
+        raise RuntimeError("Failed to connect to FiinQuant")
+    
+    def probe(group: List[str], from_date: str, to_date: str) -> Optional[pd.DataFrame]:
+        # The bar cache holds the very values being verified, so the probe always goes upstream
+        df, failed, _ = planner.run(group, lambda chunk: fetcher.fetch_trading_frame(chunk, '1d', from_date, to_date))
+        if failed:
+            logger.warning(f"Adjustment probe failed for {len(failed)} tickers: {failed}")
+        return df
+    
+    store = FingerprintStore()
+    report, fingerprints = check_adjustments(probe, tickers, store, args.probe_days or DEFAULT_PROBE_DAYS)
+    if args.apply and report['changed']:
+        mongo = None
+        if args.sink == 'mongo':
+            mongo = {'mongo_uri': args.mongo_uri, 'mongo_db': args.mongo_db, 'mongo_batch_size': args.mongo_batch_size}
+        report['applied'] = apply_adjustments(fetcher, report['changed'], fingerprints, store, mongo)
+    return report
+
+
+def apply_adjustments(
+    fetcher: 'FiinQuantFetcher',
+    changed: Dict[str, Dict[str, Any]],
+    fingerprints: Dict[str, Any],
+    store: 'FingerprintStore',
+    mongo: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Bring the stored history of tickers with changed adjusted prices up to date.
+
+    Adjusted tickers are rescaled in place up to the last verified day and
+    only the days after it are fetched again; revised tickers (no single
+    factor) lose their cached bars and are rebuilt from their oldest stored
+    bar in every stock-ss* collection.
+
+    A rescale multiplies the stored bars, so it must not run twice: an
+    adjusted ticker's fresh fingerprint is saved as soon as it is rescaled,
+    before any refetch. A revised ticker's is saved once its rebuild went
+    through without write errors; rebuilding again is harmless.
+
+    Args:
+        fetcher: Connected fetcher; its bar cache, if any, is fixed too
+        changed: `changed` entries of an adjustment check report
+        fingerprints: Fresh fingerprints of the changed tickers
+        store: Fingerprint store they are saved to
+        mongo: Mongo sink parameters (mongo_uri, mongo_db, mongo_batch_size)
+            to fix the stock-ss* collections as well, or None
+
+    Returns:
+        {"tickers": what was done per ticker, "rebuilt": Mongo refetch summaries}
+    """
+    sink = MongoBarSink(uri=mongo.get('mongo_uri'), db_name=mongo.get('mongo_db')) if mongo is not None else None
+    applied: Dict[str, Dict[str, Any]] = {}
+    # (timeframe, from_date) -> tickers refetched into Mongo together
+    refetch: Dict[Tuple[str, str], List[str]] = {}
+    # Revised tickers -> refetch groups that must succeed before their fingerprint is saved
+    pending: Dict[str, int] = {}
+    
+    for ticker, change in changed.items():
+        through = date.fromisoformat(change['verified_through'])
+        done: Dict[str, Any] = {}
+        if change['status'] == 'adjusted':
+            if fetcher.cache is not None:
+                done['cache_rescaled'] = fetcher.cache.rescale(ticker, change['price_factor'], change['volume_factor'], through)
+                done['cache_dropped'] = fetcher.cache.discard(ticker, after=through)
+            if sink is not None:
+                done['mongo_rescaled'] = sink.rescale(ticker, change['price_factor'], change['volume_factor'], through)
+                for timeframe in sink.first_timestamps(ticker):
+                    refetch.setdefault((timeframe, (through + timedelta(days=1)).isoformat()), []).append(ticker)
+            store.save({ticker: fingerprints[ticker]})
+            done['fingerprint_saved'] = True
+        else:
+            if fetcher.cache is not None:
+                done['cache_dropped'] = fetcher.cache.discard(ticker)
+            if sink is not None:
+                for timeframe, first in sink.first_timestamps(ticker).items():
+                    # Stored as UTC; the fetch range is in host-local days like the bars themselves
+                    first_day = first.replace(tzinfo=timezone.utc).astimezone().date().isoformat()
+                    refetch.setdefault((timeframe, first_day), []).append(ticker)
+                    pending[ticker] = pending.get(ticker, 0) + 1
+            if not pending.get(ticker):
+                store.save({ticker: fingerprints[ticker]})
+            done['fingerprint_saved'] = not pending.get(ticker)
+        applied[ticker] = done
+    
+    rebuilt = []
+    for (timeframe, from_date), tickers in refetch.items():
+        entry: Dict[str, Any] = {'timeframe': timeframe, 'from_date': from_date, 'tickers': tickers}
+        try:
+            summary = write_historical_mongo(fetcher, {
+                'tickers': tickers,
+                'timeframe': timeframe,
+                'from_date': from_date,
+                **mongo,
+            })
+            entry.update(bars=summary['bars'], write_errors=summary['write_errors'])
+        except Exception as e:
+            # The other groups are still refetched; unsaved fingerprints make the next check retry this one
+            logger.error(f"Refetch of {timeframe} from {from_date} for {len(tickers)} tickers failed: {e}")
+            entry['error'] = str(e)
+        rebuilt.append(entry)
+        
+        if entry.get('error') or entry.get('write_errors'):
+            continue
+        for ticker in tickers:
+            if ticker in pending:
+                pending[ticker] -= 1
+                if not pending[ticker]:
+                    store.save({ticker: fingerprints[ticker]})
+                    applied[ticker]['fingerprint_saved'] = True
+    return {'tickers': applied, 'rebuilt': rebuilt}
+
+
+class FetcherServer:
+    """
+    Long-running request loop around one authenticated FiinQuantFetcher.
+
+    Requests and responses are newline-delimited JSON objects:
+        {"id": 1, "action": "historical", "params": {"tickers": ["VIC"], "timeframe": "1m"}}
+        {"id": 1, "success": true, "data": {...}}
+
+    Requests are executed on a small thread pool so several can be in flight
+    at once; responses are written as soon as each one completes and carry
+    the request id so the caller can match them up.
+
+    With metrics targets (see fetch_metrics), every request gets its own
+    collector; the "stderr" target attaches the record to the response as
+    `metrics` and textfile targets are rewritten after each request.
+    """
+    
+    SERVE_ACTIONS = ('historical', 'latest', 'latest-stats', 'market-status', 'all-tickers', 'trading-calendar', 'backtest')
+    UPSTREAM_ACTIONS = ('historical', 'latest', 'backtest')
+    
+    def __init__(
+        self,
+        fetcher: 'FiinQuantFetcher',
+        max_workers: int = 4,
+        startup_profile: Optional[StartupProfile] = None,
+        metrics_targets: Optional[List[str]] = None
+    ):
+        self.fetcher = fetcher
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fiinquant-serve')
+        self._login_lock = threading.Lock()
+        # Reported once the first request has been answered
+        self.startup_profile = startup_profile
+        self.metrics_targets = metrics_targets or []
+    
+    def _ensure_session(self) -> None:
+        """Re-login with a fresh session when the current one is no longer usable."""
+        with self._login_lock:
+            if self.fetcher.ensure_connection():
+                return
+            logger.warning("Connection check failed, logging in again")
+            self.fetcher.relogin()
+    
+    def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a single decoded request and build its response."""
+        request_id = request.get('id')
+        action = request.get('action')
+        started = time.perf_counter()
+        metrics = None
+        if self.metrics_targets:
+            # The action names textfile targets, so unknown ones are not used verbatim
+            metrics = FetchMetrics(action if action in self.SERVE_ACTIONS else 'invalid')
+        token = activate_metrics(metrics)
+        
+        try:
+            if action not in self.SERVE_ACTIONS:
+                raise ValueError(f"Unsupported action: {action}")
+            if action in self.UPSTREAM_ACTIONS:
+                self._ensure_session()
+            
+            data = run_action(self.fetcher, action, request.get('params') or {})
+            response = {'id': request_id, 'success': True, 'data': data}
+        except Exception as e:
+            logger.error(f"Request {request_id} ({action}) failed: {e}")
+            response = {'id': request_id, 'success': False, 'error': str(e), 'data': {}}
+        finally:
+            # Pool threads are reused, so the next request must not inherit this collector
+            deactivate_metrics(token)
+        
+        response['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        if metrics:
+            record = metrics.record(response['success'])
+            if 'stderr' in self.metrics_targets:
+                response['metrics'] = record
+            try:
+                emit_metrics(record, self.metrics_targets, stderr=False)
+            except OSError as e:
+                logger.warning(f"Failed to write metrics: {e}")
+        if self.startup_profile and not self.startup_profile.emitted:
+            self.startup_profile.timings['first_request_ms'] = response['elapsed_ms']
+            self.startup_profile.emit()
+        return response
+    
+    def serve_stream(self, reader, writer) -> None:
+        """
+        Answer requests read line by line from `reader` until EOF.
+
+        Waits for in-flight requests to finish before returning.
+        """
+        write_lock = threading.Lock()
+        in_flight = []
+        
+        def respond(response: Dict[str, Any]) -> None:
+            line = json.dumps(response, default=json_default)
+            with write_lock:
+                writer.write(line + '\n')
+                writer.flush()
+        
+        def run(request: Dict[str, Any]) -> None:
+            respond(self.handle_request(request))
+        
+        for line in reader:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+            except ValueError as e:
+                respond({'id': None, 'success': False, 'error': f"Invalid request: {e}", 'data': {}})
+                continue
+            
+            in_flight = [f for f in in_flight if not f.done()]
+            in_flight.append(self.executor.submit(run, request))
+        
+        wait(in_flight)
+    
+    def serve_unix_socket(self, socket_path: str) -> None:
+        """Accept connections on a local Unix socket, one request stream per connection."""
+        server = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                reader = io.TextIOWrapper(self.rfile, encoding='utf-8')
+                writer = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+                server.serve_stream(reader, writer)
+        
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        
+        with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as unix_server:
+            os.chmod(socket_path, 0o600)
+            logger.info(f"Serving FiinQuant requests on {socket_path}")
+            try:
+                unix_server.serve_forever()
+            finally:
+                os.unlink(socket_path)
+    
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        close_mongo_clients()
+
+
+class StartupProfile:
+    """
+    Start-up timings reported by --profile-startup, as one JSON line on stderr.
+
+    Fields (milliseconds):
+        module_import_ms: importing this module and its light dependencies, up to main()
+            (interpreter start-up itself is not included)
+        fetch_stack_import_ms: importing pandas, numpy, FiinQuantX and the data modules
+        login_ms / session: session setup, and whether a saved session was reused
+        first_request_ms: the first action, until its output is written
+        total_ms: start of the module to the report
+    """
+    
+    def __init__(self):
+        self.timings: Dict[str, Any] = {}
+        self.emitted = False
+        self.record('module_import', _MODULE_STARTED)
+    
+    def record(self, name: str, started: float) -> None:
+        self.timings[f'{name}_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    
+    def record_login(self, fetcher: 'FiinQuantFetcher') -> None:
+        self.timings['login_ms'] = round(fetcher.login_ms, 3)
+        self.timings['session'] = 'saved' if fetcher.session_restored else 'login'
+    
+    def emit(self) -> None:
+        if self.emitted:
+            return
+        self.emitted = True
+        self.record('total', _MODULE_STARTED)
+        print(json.dumps({'startup_profile': self.timings}), file=sys.stderr, flush=True)
+
+
+def run_stream(args: argparse.Namespace, out, profile: Optional[StartupProfile] = None) -> None:
+    """
+    Hold one realtime subscription and write every bar update to `out` as NDJSON.
+
+    Runs until the source finishes (--max-updates), the reader goes away, or
+    the process is terminated.
+    """
+    tickers = _split_tickers(args.tickers)
+    if not tickers:
+        raise ValueError("--tickers is required for streaming")
+    
+    started = time.perf_counter()
+    fetcher = None
+    if args.source == 'fake':
+        source = FakeBarSource(tickers, interval=args.fake_interval)
+    else:
+        fetcher = FiinQuantFetcher(use_cache=False, use_session_cache=not args.no_session_cache)
+        source = FiinQuantRealtimeSource(fetcher.client, tickers, timeframe=args.timeframe or '1m')
+    
+    writer = BatchedNDJSONWriter(
+        out,
+        batch_size=args.batch_size,
+        flush_interval=args.flush_interval,
+        max_buffered=args.stream_buffer
+    )
+    done = threading.Event()
+    updates = 0
+    
+    def on_frame(df: pd.DataFrame) -> None:
+        nonlocal updates
+        try:
+            for bars in frame_to_bars(df, tickers).values():
+                for bar in bars:
+                    writer.put(bar)
+        except Exception as e:
+            logger.error(f"Failed to process realtime update: {e}")
+        updates += 1
+        if args.max_updates and updates >= args.max_updates:
+            done.set()
+    
+    writer.start()
+    source.start(on_frame)
+    if profile:
+        if fetcher:
+            profile.record_login(fetcher)
+        profile.record('first_request', started)
+        profile.emit()
+    try:
+        while not done.wait(0.5):
+            if writer.broken.is_set():
+                break
+    finally:
+        source.stop()
+        writer.close()
+        logger.info(f"Stream stopped after {updates} updates, {writer.written} bars written")
+
 
 def main():
     """Main function to handle command line arguments."""
     parser = argparse.ArgumentParser(description='FiinQuant Data Fetcher')
     parser.add_argument('--action', required=True, 
-                       choices=['historical', 'latest', 'market-status', 'all-tickers'],
+                       choices=['historical', 'latest', 'market-status', 'all-tickers', 'trading-calendar',
+                                'serve', 'stream', 'scan-gaps', 'export', 'check-adjustments', 'backtest'],
                        help='Action to perform')
     parser.add_argument('--tickers', help='Comma-separated list of tickers')
-    parser.add_argument('--timeframe', default='4h', help='Data timeframe (1m, 15m, 1h, 4h, 1d)')
+    parser.add_argument('--timeframe', help='Data timeframe (1m, 15m, 1h, 4h, 1d); default 4h, or 1m for stream; '
+                       'a comma-separated list for trading-calendar')
     parser.add_argument('--period', type=int, default=100, help='Number of periods')
     parser.add_argument('--from-date', help='Start date (YYYY-MM-DD)')
     parser.add_argument('--to-date', help='End date (YYYY-MM-DD)')
+    parser.add_argument('--derive', help='Comma-separated timeframes (e.g. 15m,1h,4h,1d) built from one 1m fetch; '
+                       'historical output is then keyed by timeframe first')
+    parser.add_argument('--indicators', help='Comma-separated indicators to add to historical bars (rsi, psar, engulfing, volume)')
+    parser.add_argument('--indicator-options', help='JSON object with calculateAllIndicators options, '
+                       'e.g. {"rsiPeriod": 14, "volumeAvgPeriod": 20}')
     parser.add_argument('--hours', help='Comma-separated HH:MM list to filter timestamps (local)')
+    parser.add_argument('--minutes', help='Comma-separated minutes of the hour to keep (e.g. 0,15,30,45)')
+    parser.add_argument('--time-window', help='Comma-separated HH:MM-HH:MM intraday windows to keep (inclusive)')
+    parser.add_argument('--session', choices=['morning', 'afternoon'], help='Keep only one trading session')
+    parser.add_argument('--weekdays', help='Comma-separated weekdays to keep (mon..sun or 0-6)')
+    parser.add_argument('--output', default='json', choices=['json', 'ndjson'],
+                       help='Historical output: one JSON document, or NDJSON with one bar per line flushed per ticker')
+    parser.add_argument('--format', default='json', choices=['json', 'arrow', 'msgpack'],
+                       help='Historical output encoding: json (see --output), or per-ticker binary columns')
+    parser.add_argument('--output-file', help='Write binary --format output to this file instead of stdout')
+    parser.add_argument('--sink', default='stdout', choices=['stdout', 'mongo'],
+                       help='Historical mode: "mongo" upserts the bars into the stock-ss* collections and only prints a summary; '
+                       'check-adjustments mode: --apply fixes the stock-ss* collections too')
+    parser.add_argument('--mongo-uri', help='Mongo sink: connection string (default MONGODB_URI)')
+    parser.add_argument('--mongo-db', help='Mongo sink: database (default MONGODB_DB_NAME or the URI\'s database)')
+    parser.add_argument('--mongo-batch-size', type=int,
+                       help='Mongo sink: upserts per bulk write (default FIINQUANT_MONGO_BATCH_SIZE or 1000)')
+    parser.add_argument('--since', help='Historical mode: JSON watermark map (file, or "-" for stdin) of the last stored '
+                       'bar per ticker, optionally keyed by timeframe first; only strictly newer bars are fetched and returned')
+    parser.add_argument('--since-tolerance', type=int,
+                       help='With --since: tickers whose watermarks are at most this many bars apart share an upstream call (default 30)')
+    parser.add_argument('--shards', type=int, default=1,
+                       help='Historical mode: split the tickers over this many fetcher processes, balanced by the expected '
+                       'cost of each ticker (FIINQUANT_COST_INDEX_PATH); results are merged in ticker order')
+    parser.add_argument('--memory-budget-mb', type=float,
+                       help='Historical mode: fetch long ranges in time windows sized so the rows held at once stay within '
+                       'this many MB (default FIINQUANT_MEMORY_BUDGET_MB or 256; 0 fetches every range in one piece)')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the local bar cache and fetch every range upstream')
+    parser.add_argument('--no-session-cache', action='store_true',
+                       help='Always log in, without reading or saving the session file (FIINQUANT_SESSION_PATH)')
+    parser.add_argument('--profile-startup', action='store_true',
+                       help='Report import, login and first-request timings as one JSON line on stderr')
+    parser.add_argument('--metrics', default=os.getenv('FIINQUANT_METRICS'),
+                       help='Per-stage timings, row/byte counts, retries and peak memory of the action: "stderr" for one '
+                       'JSON line (serve mode: a "metrics" field in each response), or a Prometheus textfile path '
+                       '("{action}" is replaced); comma-separated for several (default FIINQUANT_METRICS)')
+    parser.add_argument('--profile', choices=list(DeepProfile.MODES),
+                       help='Profile the whole run with cProfile or tracemalloc (slow; for investigations only)')
+    parser.add_argument('--profile-output', help='With --profile: save the pstats file / tracemalloc snapshot here '
+                       'instead of reporting the top entries')
+    parser.add_argument('--latest-ttl', type=float,
+                       help='Seconds latest quotes are served from memory (default FIINQUANT_LATEST_TTL or 5)')
+    parser.add_argument('--latest-coalesce-ms', type=float,
+                       help='Serve mode: how long a latest-quote miss waits for concurrent requests to join '
+                       'its upstream call (default FIINQUANT_LATEST_COALESCE_MS or 10)')
+    parser.add_argument('--chunk-size', type=int, default=50, help='Max tickers per upstream historical call')
+    parser.add_argument('--fetch-workers', type=int, default=4, help='Max concurrent upstream historical calls')
+    parser.add_argument('--rate-limit', type=float, help='Max upstream calls started per second (default: unlimited)')
+    parser.add_argument('--retries', type=int, default=2, help='Retries per failed chunk, with exponential backoff')
+    parser.add_argument('--input', help='Scan-gaps mode: comma-separated exported bar files (mongoexport of a '
+                       'stock-ss* collection, fetcher JSON/NDJSON, or CSV); timeframe from the name or --timeframe')
+    parser.add_argument('--execute', action='store_true', help='Scan-gaps mode: refetch the planned ranges and output the bars that fill them')
+    parser.add_argument('--merge-days', type=int, default=1,
+                       help='Scan-gaps mode: refetch ranges of one ticker at most this many trading days apart together')
+    parser.add_argument('--probe-days', type=int,
+                       help='Check-adjustments mode: completed trading days of daily closes compared per ticker (default 20)')
+    parser.add_argument('--apply', action='store_true',
+                       help='Check-adjustments mode: rescale or rebuild the bar cache (and with --sink mongo, the stock-ss* '
+                       'collections) of the tickers whose adjusted prices changed')
+    parser.add_argument('--limit', type=int, help='Backtest mode: only the last N bars per ticker')
+    parser.add_argument('--backtest-params', help='Backtest mode: JSON object of strategy parameters (rsiOversold, '
+                       'stopLoss, takeProfit, feeRate, indicator options, ...); list values are swept as a grid, '
+                       'e.g. {"rsiOversold": [25, 30], "stopLoss": [0.05, 0.08]}')
+    parser.add_argument('--backtest-workers', type=int,
+                       help='Backtest mode: worker processes for parameter grids (default: CPU count)')
+    parser.add_argument('--include-trades', action='store_true', help='Backtest mode: list the trades of each ticker')
+    parser.add_argument('--output-dir', help='Export mode: root directory of the partitioned files and the checkpoint')
+    parser.add_argument('--tickers-file', help='Export, check-adjustments and sharded historical modes: ticker universe CSV when --tickers is not given '
+                       '(default all_tickers.csv)')
+    parser.add_argument('--export-format', default='ndjson', choices=['ndjson', 'parquet'],
+                       help='Export mode: one NDJSON or Parquet file per ticker and month')
+    parser.add_argument('--window-months', type=int,
+                       help='Export mode: months fetched per unit (default 12 for 1d, 6 for 4h, 3 for 1h, 1 otherwise)')
+    parser.add_argument('--socket', help='Serve mode: listen on this Unix socket instead of stdin/stdout')
+    parser.add_argument('--workers', type=int, default=4, help='Serve mode: max concurrent requests')
+    parser.add_argument('--source', default='fiinquant', choices=['fiinquant', 'fake'],
+                       help='Stream mode: realtime source (fake generates offline random-walk bars)')
+    parser.add_argument('--batch-size', type=int, default=200, help='Stream mode: max bars per flush')
+    parser.add_argument('--flush-interval', type=float, default=0.2, help='Stream mode: max seconds before a partial batch is flushed')
+    parser.add_argument('--stream-buffer', type=int, default=5000, help='Stream mode: max buffered bars before the source is blocked')
+    parser.add_argument('--max-updates', type=int, help='Stream mode: stop after this many source updates')
+    parser.add_argument('--fake-interval', type=float, default=1.0, help='Stream mode: seconds between fake source updates')
     
     args = parser.parse_args()
+    profile = StartupProfile() if args.profile_startup else None
+    request_started = None
+    
+    metrics_targets = parse_metric_targets(args.metrics)
+    # Serve mode collects per request and a stream never finishes, so neither gets a run record
+    metrics = None
+    if metrics_targets and args.action not in ('serve', 'stream'):
+        metrics = FetchMetrics(args.action, started=_MODULE_STARTED)
+        metrics.add_stage('module_import', time.perf_counter() - _MODULE_STARTED)
+    activate_metrics(metrics)
+    deep_profile = DeepProfile(args.profile, args.profile_output) if args.profile else None
+    if deep_profile:
+        deep_profile.start()
+    failed = False
     
     # Redirect stdout to stderr temporarily to capture any unwanted output
     original_stdout = sys.stdout
     sys.stdout = sys.stderr
     
+    if args.action in ('serve', 'stream'):
+        # Turn SIGTERM into a normal exit so cleanup in finally blocks runs
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
     try:
-        fetcher = FiinQuantFetcher()
-        
-        if args.action == 'historical':
-            if not args.tickers:
-                raise ValueError("--tickers is required for historical data")
-            
-            tickers = args.tickers.split(',')
-            result = fetcher.fetch_historical_data(
-                tickers=tickers,
-                timeframe=args.timeframe,
-                period=args.period,
-                from_date=getattr(args, 'from_date'),
-                to_date=getattr(args, 'to_date')
-            )
-            
-            # Optional hour filtering
-            if args.hours:
-                try:
-                    wanted = set([h.strip() for h in args.hours.split(',') if h.strip()])
-                    for t in list(result.keys()):
-                        filtered = [r for r in result[t] if datetime.fromisoformat(r['timestamp']).strftime('%H:%M') in wanted]
-                        result[t] = filtered
-                except Exception as e:
-                    logger.warning(f"Failed to filter by hours: {e}")
-            
-            # Restore stdout for JSON output
+        if args.action in LOGIN_FREE_ACTIONS:
+            # Answered without pandas, FiinQuantX or a login
+            request_started = time.perf_counter()
+            result = run_action(None, args.action, {
+                'from_date': args.from_date,
+                'to_date': args.to_date,
+                'timeframe': args.timeframe,
+            })
             sys.stdout = original_stdout
-            print(json.dumps(result, default=str))
+            _print_result(result)
+            return
         
-        elif args.action == 'latest':
-            if not args.tickers:
-                raise ValueError("--tickers is required for latest data")
-            
-            tickers = args.tickers.split(',')
-            result = fetcher.fetch_latest_data(tickers)
-            
-            # Restore stdout for JSON output
-            sys.stdout = original_stdout
-            print(json.dumps(result, default=str))
+        started = time.perf_counter()
+        with current_metrics().stage('fetch_stack_import'):
+            _import_fetch_stack()
+        if profile:
+            profile.record('fetch_stack_import', started)
         
-        elif args.action == 'market-status':
-            result = fetcher.check_market_status()
-            
-            # Restore stdout for JSON output
-            sys.stdout = original_stdout
-            print(json.dumps(result, default=str))
+        if args.action == 'stream':
+            run_stream(args, original_stdout, profile)
+            return
         
-        elif args.action == 'all-tickers':
-            result = fetcher.get_all_tickers()
-            
-            # Restore stdout for JSON output
+        planner = FetchPlanner(
+            chunk_size=args.chunk_size,
+            max_workers=args.fetch_workers,
+            rate_limit=args.rate_limit,
+            retries=args.retries
+        )
+        # A one-shot run has nobody to coalesce with, so it does not wait
+        coalesce_ms = args.latest_coalesce_ms if args.action == 'serve' else 0
+        latest_cache = LatestQuoteCache(
+            ttl=args.latest_ttl,
+            coalesce_window=None if coalesce_ms is None else coalesce_ms / 1000
+        )
+        if args.action == 'historical' and args.shards > 1:
+            report = run_sharded_historical(args, planner, original_stdout)
+            print(json.dumps({'shard_balance': report}), file=sys.stderr, flush=True)
+            return
+        
+        if args.action in ('scan-gaps', 'export', 'check-adjustments'):
+            runners = {'scan-gaps': run_gap_scan, 'export': run_bulk_export, 'check-adjustments': run_adjustment_check}
+            result = runners[args.action](args, planner)
             sys.stdout = original_stdout
-            print(json.dumps({'tickers': result}, default=str))
+            _print_result(result)
+            return
+        
+        fetcher = FiinQuantFetcher(
+            use_cache=not args.no_cache,
+            planner=planner,
+            use_session_cache=not args.no_session_cache,
+            latest_cache=latest_cache,
+            memory_budget_mb=args.memory_budget_mb
+        )
+        if profile:
+            profile.record_login(fetcher)
+        
+        if args.action == 'serve':
+            server = FetcherServer(
+                fetcher,
+                max_workers=args.workers,
+                startup_profile=profile,
+                metrics_targets=metrics_targets
+            )
+            try:
+                if args.socket:
+                    server.serve_unix_socket(args.socket)
+                else:
+                    server.serve_stream(sys.stdin, original_stdout)
+            finally:
+                server.close()
+            return
+        
+        request_started = time.perf_counter()
+        params = {
+            'tickers': args.tickers,
+            'timeframe': args.timeframe,
+            'period': args.period,
+            'from_date': args.from_date,
+            'to_date': args.to_date,
+            'hours': args.hours,
+            'minutes': args.minutes,
+            'time_window': args.time_window,
+            'session': args.session,
+            'weekdays': args.weekdays,
+            'derive': args.derive,
+            'indicators': args.indicators,
+            'indicator_options': args.indicator_options,
+            'sink': args.sink,
+            'mongo_uri': args.mongo_uri,
+            'mongo_db': args.mongo_db,
+            'mongo_batch_size': args.mongo_batch_size,
+            'since': args.since,
+            'since_tolerance': args.since_tolerance,
+            'limit': args.limit,
+            'backtest_params': args.backtest_params,
+            'backtest_workers': args.backtest_workers,
+            'include_trades': args.include_trades,
+        }
+        
+        if args.sink == 'mongo':
+            if args.action != 'historical':
+                raise ValueError("--sink mongo is only supported for historical data")
+        elif args.format != 'json':
+            if args.action != 'historical':
+                raise ValueError(f"--format {args.format} is only supported for historical data")
+            if args.output_file:
+                with open(args.output_file, 'wb') as out:
+                    written = write_historical_columnar(fetcher, params, args.format, out)
+            else:
+                written = write_historical_columnar(fetcher, params, args.format, original_stdout.buffer)
+            logger.info(f"Wrote {written} bars as {args.format}")
+            return
+        
+        if args.action == 'historical' and args.output == 'ndjson' and args.sink != 'mongo':
+            written = write_historical_ndjson(fetcher, params, original_stdout)
+            logger.info(f"Wrote {written} bars as NDJSON")
+            return
+        
+        result = run_action(fetcher, args.action, params)
+        
+        # Restore stdout for JSON output
+        sys.stdout = original_stdout
+        _print_result(result)
     
     except Exception as e:
+        failed = True
         logger.error(f"Error: {e}")
         # Return error as JSON instead of plain text
         error_response = {
@@ -472,6 +2193,48 @@ def main():
         sys.stdout = original_stdout
         print(json.dumps(error_response))
         sys.exit(1)
+    
+    finally:
+        if profile:
+            if request_started is not None and 'first_request_ms' not in profile.timings:
+                profile.record('first_request', request_started)
+            profile.emit()
+        _finish_metrics(metrics, metrics_targets, deep_profile, not failed)
+
+
+def json_default(value: Any) -> Any:
+    """`default` for json.dumps: bar series (see bar_store) become lists of bar dicts, anything else its str()."""
+    to_dicts = getattr(value, 'to_dicts', None)
+    return to_dicts() if to_dicts is not None else str(value)
+
+
+def _print_result(result: Any) -> None:
+    """Print a JSON result document on stdout, counted as the run's encode stage."""
+    metrics = current_metrics()
+    with metrics.stage('encode'):
+        # Bar dicts are built one ticker at a time while the document is encoded
+        line = json.dumps(result, default=json_default)
+        print(line)
+    metrics.count('bytes_out', len(line) + 1)
+
+
+def _finish_metrics(
+    metrics: Optional[FetchMetrics],
+    targets: List[str],
+    deep_profile: Optional[DeepProfile],
+    success: bool
+) -> None:
+    """Stop --profile and emit the run's metrics record, if either was requested."""
+    summary = deep_profile.stop() if deep_profile else {}
+    if metrics:
+        metrics.extra.update(summary)
+        try:
+            emit_metrics(metrics.record(success), targets)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics: {e}")
+    elif summary.get('profile', {}).get('mode') == 'tracemalloc':
+        # Without a metrics record the allocation summary goes to stderr on its own
+        print(json.dumps(summary, default=str), file=sys.stderr, flush=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Find missing bars and bad opens in exported bars and plan their refetch.
+
+Exported bars of one timeframe (mongoexport of a stock-ss* collection, the
+fetcher's JSON/NDJSON output, or CSV) are placed on the expected session
+grid: every bar slot of the trading calendar (trading_calendar.bar_slots)
+on every trading day of the scanned window, up to the current time. A slot is bad when it has no bar or its
+open is missing, NaN or not positive; the fetcher turns NaN into 0.0, so
+zero opens are treated as missing data too.
+
+Bad slots are merged into the fewest contiguous (ticker, from, to) ranges
+on that grid, so a gap running over the lunch break or overnight stays one
+range. Ranges are then grouped into day-level fetches that share their
+tickers, which is what a refetch actually sends upstream.
+"""
+
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import EXCHANGE_TIMEZONE, TradingCalendar, bar_slots, exchange_now, get_calendar
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+_AWARE_TIMESTAMP = re.compile(r'(Z|[+-]\d\d:?\d\d)$')
+_COLLECTION_TIMEFRAME = re.compile(r'stock-ss(1m|15m|1h|4h|1d)\b')
+
+
+def timeframe_from_name(name: str) -> Optional[str]:
+    """Timeframe of a stock-ss* collection or export file name, e.g. stock-ss15m.json -> 15m."""
+    match = _COLLECTION_TIMEFRAME.search(name)
+    return match.group(1) if match else None
+
+
+def _unwrap(value: Any) -> Any:
+    """Plain value of a MongoDB extended JSON wrapper such as {"$date": ...} or {"$numberDouble": "NaN"}."""
+    while isinstance(value, dict) and len(value) == 1:
+        key, inner = next(iter(value.items()))
+        if key == '$date':
+            value = inner
+        elif key in ('$numberDouble', '$numberDecimal'):
+            return float(inner)
+        elif key in ('$numberLong', '$numberInt'):
+            return int(inner)
+        else:
+            break
+    return value
+
+
+def load_export(path: str) -> pd.DataFrame:
+    """
+    Read exported bars into a DataFrame with ticker, timestamp and open columns.
+
+    Args:
+        path: CSV file, JSON array, NDJSON (mongoexport default), or the fetcher's
+            historical JSON output keyed by ticker
+
+    Returns:
+        DataFrame with the raw ticker, timestamp and open values
+    """
+    columns = ['ticker', 'timestamp', 'open']
+    if path.endswith('.csv'):
+        frame = pd.read_csv(path, usecols=lambda c: c in columns)
+        return frame.reindex(columns=columns)
+
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+
+    records = None
+    stripped = text.lstrip()
+    if stripped.startswith('['):
+        records = json.loads(text)
+    elif stripped.startswith('{'):
+        try:
+            document = json.loads(text)
+        except ValueError:
+            document = None  # more than one object: NDJSON
+        if isinstance(document, dict):
+            if document and all(isinstance(bars, list) for bars in document.values()):
+                records = [
+                    {'ticker': ticker, **bar}
+                    for ticker, bars in document.items()
+                    for bar in bars
+                ]
+            else:
+                records = [document]
+    if records is None:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    return pd.DataFrame.from_records(
+        [[_unwrap(record.get(name)) for name in columns] for record in records],
+        columns=columns
+    )
+
+
+def _exchange_minutes(values: pd.Series) -> np.ndarray:
+    """
+    Minutes since the epoch in exchange local time; -1 where unparseable.
+
+    Numbers are epoch milliseconds. Strings are naive exchange-local times
+    (fetcher output) or carry an offset (mongoexport, in UTC); the first
+    string decides which, as one export does not mix the two.
+    """
+    minutes = np.full(len(values), -1, dtype=np.int64)
+    if values.empty:
+        return minutes
+
+    if pd.api.types.is_numeric_dtype(values):
+        stamps = pd.to_datetime(values, unit='ms', utc=True, errors='coerce')
+        stamps = stamps.dt.tz_convert(EXCHANGE_TIMEZONE).dt.tz_localize(None)
+    else:
+        first = values.dropna()
+        aware = not first.empty and bool(_AWARE_TIMESTAMP.search(str(first.iloc[0]).strip()))
+        stamps = pd.to_datetime(values, format='ISO8601', errors='coerce', utc=aware)
+        if aware:
+            stamps = stamps.dt.tz_convert(EXCHANGE_TIMEZONE).dt.tz_localize(None)
+
+    parsed = stamps.notna().to_numpy()
+    minutes[parsed] = stamps[parsed].to_numpy(dtype='datetime64[m]').astype(np.int64)
+    return minutes
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    """np.unique for int arrays, skipping the sort when they are already ordered (exports usually are)."""
+    if len(values) > 1 and not (values[1:] >= values[:-1]).all():
+        values = np.sort(values)
+    if len(values) > 1:
+        values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    return values
+
+
+def _format_minute(minute: int) -> str:
+    return str(np.datetime64(int(minute), 'm').astype('datetime64[s]'))
+
+
+def _day_of(minute: int) -> str:
+    return str(np.datetime64(int(minute) // MINUTES_PER_DAY, 'D'))
+
+
+def scan_gaps(
+    df: pd.DataFrame,
+    timeframe: str,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    tickers: Optional[List[str]] = None,
+    merge_days: int = 1,
+    calendar: Optional[TradingCalendar] = None
+) -> Dict[str, Any]:
+    """
+    Compare exported bars against the session grid and build a refetch plan.
+
+    Args:
+        df: Exported bars with ticker, timestamp and open columns (see load_export)
+        timeframe: Timeframe of the bars (1m, 15m, 1h, 4h, 1d)
+        from_date: First day to scan (YYYY-MM-DD), defaults to the first exported day
+        to_date: Last day to scan (YYYY-MM-DD), defaults to the last exported day
+        tickers: Tickers to scan; tickers without any exported bar are reported as
+            missing entirely. Defaults to every exported ticker.
+        merge_days: Ranges of one ticker at most this many trading days apart are
+            refetched in one call
+        calendar: Trading calendar, defaults to the shared HOSE calendar
+
+    Returns:
+        Dictionary with scan counts, the bad ranges (ticker, from, to, bars) and
+        the day-level fetches (from_date, to_date, tickers) that cover them
+    """
+    calendar = calendar or get_calendar()
+    offsets = np.array(bar_slots(timeframe), dtype=np.int64)
+
+    minutes = _exchange_minutes(df['timestamp'])
+    opens = pd.to_numeric(df['open'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    # Normalize the distinct ticker names only, not every row
+    raw_codes, raw_names = pd.factorize(df['ticker'])
+    clean_names = [str(name).strip().upper() for name in raw_names]
+
+    keep = (minutes >= 0) & (raw_codes >= 0)
+    if from_date:
+        keep &= minutes >= np.datetime64(from_date[:10], 'm').astype(np.int64)
+    if to_date:
+        keep &= minutes < (np.datetime64(to_date[:10], 'D') + 1).astype('datetime64[m]').astype(np.int64)
+    if tickers:
+        universe = list(dict.fromkeys(t.strip().upper() for t in tickers))
+    else:
+        present = np.flatnonzero(np.bincount(raw_codes[keep], minlength=len(clean_names)))
+        universe = list(dict.fromkeys(clean_names[i] for i in present))
+    lookup = pd.Index(universe).get_indexer(clean_names) if clean_names else np.zeros(0, dtype=np.int64)
+    codes = np.where(raw_codes >= 0, lookup[raw_codes] if len(lookup) else -1, -1)
+    keep &= codes >= 0
+    minutes, opens, codes = minutes[keep], opens[keep], codes[keep]
+
+    # Trading days of the window, which defaults to the exported days
+    start = from_date or (_day_of(minutes.min()) if len(minutes) else None)
+    end = to_date or (_day_of(minutes.max()) if len(minutes) else None)
+    now = exchange_now()
+    clamped = calendar.clamp(start, end, now) if start and end else None
+    trading_days = calendar.trading_days(*clamped) if clamped else []
+    days = np.array(trading_days, dtype='datetime64[D]').astype(np.int64)
+    grid = (days[:, None] * MINUTES_PER_DAY + offsets[None, :]).ravel()
+    # Bars of today's later slots do not exist yet
+    grid = grid[grid <= np.datetime64(now, 'm').astype(np.int64)]
+    n_slots = len(grid)
+
+    slot = np.searchsorted(grid, minutes)
+    on_grid = slot < n_slots
+    on_grid[on_grid] = grid[slot[on_grid]] == minutes[on_grid]
+    good = on_grid & (opens > 0)
+    bad_open = on_grid & ~good
+
+    # Each ticker gets n_slots + 2 positions: a sentinel before, its slots, a sentinel after
+    width = n_slots + 2
+    base = np.arange(len(universe), dtype=np.int64) * width
+    good_positions = _sorted_unique(codes[good] * width + slot[good] + 1)
+    bad_open_positions = _sorted_unique(codes[bad_open] * width + slot[bad_open] + 1)
+    if len(good_positions) and len(bad_open_positions):
+        index = np.searchsorted(good_positions, bad_open_positions).clip(max=len(good_positions) - 1)
+        bad_open_positions = bad_open_positions[good_positions[index] != bad_open_positions]
+    marks = np.sort(np.concatenate([base, base + width - 1, good_positions]), kind='stable')
+
+    step = np.diff(marks)
+    gap = (step > 1) & (marks[1:] // width == marks[:-1] // width)
+    gap_ticker = marks[:-1][gap] // width
+    gap_from = marks[:-1][gap] % width       # first bad slot (position - 1 + 1)
+    gap_to = marks[1:][gap] % width - 2      # last bad slot
+
+    ranges = [
+        {
+            'ticker': universe[t],
+            'from': _format_minute(grid[a]),
+            'to': _format_minute(grid[b]),
+            'bars': int(b - a + 1),
+        }
+        for t, a, b in zip(gap_ticker, gap_from, gap_to)
+    ]
+
+    fetches = _plan_fetches(universe, gap_ticker, grid[gap_from] // MINUTES_PER_DAY, grid[gap_to] // MINUTES_PER_DAY, days, merge_days)
+
+    missing_slots = int((gap_to - gap_from + 1).sum())
+    result = {
+        'timeframe': timeframe,
+        'from_date': _day_of(days[0] * MINUTES_PER_DAY) if len(days) else from_date,
+        'to_date': _day_of(days[-1] * MINUTES_PER_DAY) if len(days) else to_date,
+        'trading_days': int(len(days)),
+        'tickers': len(universe),
+        'expected_bars': int(n_slots * len(universe)),
+        'scanned_bars': int(len(minutes)),
+        'off_grid_bars': int((~on_grid).sum()),
+        'bad_opens': int(len(bad_open_positions)),
+        'missing_bars': missing_slots - int(len(bad_open_positions)),
+        'ranges': ranges,
+        'fetches': fetches,
+    }
+    logger.info(
+        f"Gap scan {timeframe}: {result['missing_bars']} missing bars and {result['bad_opens']} bad opens "
+        f"in {len(ranges)} ranges, {len(fetches)} fetches"
+    )
+    return result
+
+
+def _plan_fetches(
+    universe: List[str],
+    gap_ticker: np.ndarray,
+    from_days: np.ndarray,
+    to_days: np.ndarray,
+    days: np.ndarray,
+    merge_days: int
+) -> List[Dict[str, Any]]:
+    """Merge each ticker's ranges into day spans and group tickers sharing a span."""
+    if not len(gap_ticker):
+        return []
+    first = np.searchsorted(days, from_days)
+    last = np.searchsorted(days, to_days)
+    # Ranges come sorted by ticker then time, so a span starts where the ticker
+    # changes or the previous range ended too many trading days earlier
+    starts = np.ones(len(first), dtype=bool)
+    starts[1:] = (gap_ticker[1:] != gap_ticker[:-1]) | (first[1:] > last[:-1] + max(1, merge_days))
+    span_id = np.cumsum(starts) - 1
+    span_ticker = gap_ticker[starts]
+    span_first = first[starts]
+    span_last = np.zeros(len(span_ticker), dtype=np.int64)
+    np.maximum.at(span_last, span_id, last)
+
+    spans = pd.DataFrame({
+        'from_date': days[span_first].astype('datetime64[D]').astype(str),
+        'to_date': days[span_last].astype('datetime64[D]').astype(str),
+        'ticker': np.asarray(universe, dtype=object)[span_ticker],
+    })
+    grouped = spans.groupby(['from_date', 'to_date'], sort=True)['ticker'].agg(list)
+    return [
+        {'from_date': from_day, 'to_date': to_day, 'tickers': group}
+        for (from_day, to_day), group in grouped.items()
+    ]
+
+
+def execute_plan(fetcher: Any, scan: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Refetch the plan of one scan and keep the bars that fill its ranges.
+
+    Every fetch is one fetch_historical_data call for all of its tickers (the
+    fetcher's planner still chunks large ticker lists).
+
+    Args:
+        fetcher: Authenticated FiinQuantFetcher
+        scan: Result of scan_gaps
+
+    Returns:
+        Dictionary with the number of calls, filled and still-missing bar counts,
+        and the refetched bars by ticker
+    """
+    timeframe = scan['timeframe']
+    ranges_by_ticker: Dict[str, List[tuple]] = {}
+    for item in scan['ranges']:
+        ranges_by_ticker.setdefault(item['ticker'], []).append(
+            (np.datetime64(item['from'], 'm').astype(np.int64), np.datetime64(item['to'], 'm').astype(np.int64))
+        )
+
+    bars_by_ticker: Dict[str, List[Dict[str, Any]]] = {}
+    for fetch in scan['fetches']:
+        data = fetcher.fetch_historical_data(
+            tickers=fetch['tickers'],
+            timeframe=timeframe,
+            from_date=fetch['from_date'],
+            to_date=fetch['to_date']
+        )
+        for ticker, bars in data.items():
+            if not bars or ticker not in ranges_by_ticker:
+                continue
+            bounds = np.array(ranges_by_ticker[ticker], dtype=np.int64)
+            # Bar series (see bar_store): only the filling bars are turned into dicts
+            minutes = _exchange_minutes(pd.Series(bars.timestamps()))
+            opens = bars.column('open')
+            index = np.searchsorted(bounds[:, 0], minutes, side='right') - 1
+            inside = (index >= 0) & (minutes >= 0)
+            inside[inside] = minutes[inside] <= bounds[index[inside], 1]
+            fills = np.flatnonzero(inside & (opens > 0))
+            if len(fills):
+                bars_by_ticker.setdefault(ticker, []).extend(bars.take(fills).to_dicts())
+
+    filled = sum(len(bars) for bars in bars_by_ticker.values())
+    wanted = sum(item['bars'] for item in scan['ranges'])
+    logger.info(f"Refetch {timeframe}: {len(scan['fetches'])} calls filled {filled} of {wanted} bad bars")
+    return {
+        'calls': len(scan['fetches']),
+        'filled_bars': filled,
+        'unfilled_bars': wanted - filled,
+        'bars': bars_by_ticker,
+    }
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Batch technical indicators for every ticker of a trading DataFrame at once.
+
+Mirrors TechnicalIndicatorsService.calculateAllIndicators
+(src/common/indicators/technical-indicators.service.ts): same parameters,
+same defaults, same warm-up rules and the same floating point operation
+order, so values match the Node implementation exactly.
+
+Tickers are laid out side by side in a (bars, tickers) panel padded with
+NaN. Element-wise indicators (engulfing, volume) are computed on the whole
+panel in one go; the recursive ones (RSI smoothing, PSAR) step through time
+once with every ticker updated together as a NumPy vector.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+INDICATORS = ('rsi', 'psar', 'engulfing', 'volume')
+
+# Same option names and defaults as calculateAllIndicators
+DEFAULT_OPTIONS = {
+    'rsiPeriod': 14,
+    'psarAfInit': 0.02,
+    'psarAfStep': 0.02,
+    'psarAfMax': 0.20,
+    'engulfingMinBodyRatio': 0.5,
+    'volumeAvgPeriod': 20,
+    'volumeAnomalyThreshold': 1.0,
+}
+
+# Below this many tickers the recursive indicators run as plain Python loops
+# per ticker, which beat per-step NumPy calls on narrow panels
+SCALAR_WIDTH = 8
+
+# field -> (values, present) with one entry per DataFrame row
+IndicatorColumns = Dict[str, Tuple[np.ndarray, np.ndarray]]
+
+
+def parse_indicators(value: Any) -> List[str]:
+    """Parse the --indicators option (list or comma-separated string)."""
+    if not value:
+        return []
+    names = [n.strip() for n in (value.split(',') if isinstance(value, str) else value) if n.strip()]
+    unknown = [n for n in names if n not in INDICATORS]
+    if unknown:
+        raise ValueError(f"Unsupported indicators: {unknown} (supported: {list(INDICATORS)})")
+    return names
+
+
+def parse_indicator_options(value: Any) -> Dict[str, float]:
+    """Parse --indicator-options (JSON object or dict) on top of the defaults."""
+    options = dict(DEFAULT_OPTIONS)
+    if not value:
+        return options
+    overrides = json.loads(value) if isinstance(value, str) else dict(value)
+    unknown = [k for k in overrides if k not in DEFAULT_OPTIONS]
+    if unknown:
+        raise ValueError(f"Unsupported indicator options: {unknown} (supported: {list(DEFAULT_OPTIONS)})")
+    options.update(overrides)
+    return options
+
+
+def _panel(values: np.ndarray, groups: List[np.ndarray], rows: np.ndarray, cols: np.ndarray, depth: int) -> np.ndarray:
+    panel = np.full((depth, len(groups)), np.nan)
+    panel[rows, cols] = values[np.concatenate(groups)] if groups else []
+    return panel
+
+
+def _nonzero(values: np.ndarray) -> np.ndarray:
+    # `avgLoss || 0.0001` in the Node service: 0 and NaN both fall back
+    return np.where((values == 0) | np.isnan(values), 0.0001, values)
+
+
+def _smooth_rsi_column(gains: List[float], losses: List[float], avg_gain: float, avg_loss: float, period: int) -> List[float]:
+    def value(gain: float, loss: float) -> float:
+        return 100 - (100 / (1 + gain / (0.0001 if loss == 0 or loss != loss else loss)))
+
+    out = [value(avg_gain, avg_loss)]
+    for gain, loss in zip(gains[period:], losses[period:]):
+        avg_gain = ((avg_gain * (period - 1)) + gain) / period
+        avg_loss = ((avg_loss * (period - 1)) + loss) / period
+        out.append(value(avg_gain, avg_loss))
+    return out
+
+
+def rsi(closes: np.ndarray, period: int) -> np.ndarray:
+    """
+    Wilder RSI for every column of a (bars, tickers) panel.
+
+    Row i holds the RSI of bar i (the Node service's rsiValues[i - period]);
+    rows before `period` are NaN.
+    """
+    depth = closes.shape[0]
+    out = np.full(closes.shape, np.nan)
+    if depth < period + 1:
+        return out
+
+    change = np.diff(closes, axis=0)
+    gains = np.where(change > 0, change, 0.0)
+    losses = np.where(change < 0, np.abs(change), 0.0)
+
+    # Summed in order, like Array.reduce, to keep results bit-identical
+    avg_gain = np.zeros(closes.shape[1])
+    avg_loss = np.zeros(closes.shape[1])
+    for k in range(period):
+        avg_gain = avg_gain + gains[k]
+        avg_loss = avg_loss + losses[k]
+    avg_gain = avg_gain / period
+    avg_loss = avg_loss / period
+
+    if closes.shape[1] < SCALAR_WIDTH:
+        for col in range(closes.shape[1]):
+            out[period:, col] = _smooth_rsi_column(
+                gains[:, col].tolist(), losses[:, col].tolist(), float(avg_gain[col]), float(avg_loss[col]), period
+            )
+        return out
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[period] = 100 - (100 / (1 + avg_gain / _nonzero(avg_loss)))
+        for i in range(period, depth - 1):
+            avg_gain = ((avg_gain * (period - 1)) + gains[i]) / period
+            avg_loss = ((avg_loss * (period - 1)) + losses[i]) / period
+            out[i + 1] = 100 - (100 / (1 + avg_gain / _nonzero(avg_loss)))
+    return out
+
+
+def _psar_column(highs: List[float], lows: List[float], af_init: float, af_step: float, af_max: float) -> Tuple[List[float], List[int]]:
+    sar, ep, af, trend = lows[0], highs[0], af_init, 1
+    values, trends = [sar], [trend]
+    for i in range(1, len(highs)):
+        sar = sar + af * (ep - sar)
+        if trend == 1:
+            sar = min(sar, lows[i], lows[i - 1])
+            if highs[i] > ep:
+                ep = highs[i]
+                af = min(af + af_step, af_max)
+            if lows[i] <= sar:
+                trend, sar, ep, af = -1, ep, lows[i], af_init
+        else:
+            sar = max(sar, highs[i], highs[i - 1])
+            if lows[i] < ep:
+                ep = lows[i]
+                af = min(af + af_step, af_max)
+            if highs[i] >= sar:
+                trend, sar, ep, af = 1, ep, highs[i], af_init
+        values.append(sar)
+        trends.append(trend)
+    return values, trends
+
+
+def psar(highs: np.ndarray, lows: np.ndarray, af_init: float, af_step: float, af_max: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parabolic SAR for every column of a (bars, tickers) panel.
+
+    Returns:
+        (psar values, trend with 1 for up and -1 for down)
+    """
+    depth, width = highs.shape
+    values = np.full(highs.shape, np.nan)
+    trends = np.ones(highs.shape, dtype=np.int8)
+    if depth == 0:
+        return values, trends
+
+    if width < SCALAR_WIDTH:
+        # NaN padding after a ticker's last bar only affects rows masked out later
+        for col in range(width):
+            values[:, col], trends[:, col] = _psar_column(
+                highs[:, col].tolist(), lows[:, col].tolist(), af_init, af_step, af_max
+            )
+        return values, trends
+
+    sar = lows[0].copy()
+    ep = highs[0].copy()
+    af = np.full(width, af_init)
+    up = np.ones(width, dtype=bool)
+    values[0] = sar
+
+    for i in range(1, depth):
+        sar = sar + af * (ep - sar)
+
+        # Uptrend: SAR stays below the last two lows, new highs extend EP
+        sar_up = np.minimum(np.minimum(sar, lows[i]), lows[i - 1])
+        new_high = up & (highs[i] > ep)
+        # Downtrend: SAR stays above the last two highs, new lows extend EP
+        sar_down = np.maximum(np.maximum(sar, highs[i]), highs[i - 1])
+        new_low = ~up & (lows[i] < ep)
+
+        extended = new_high | new_low
+        ep = np.where(new_high, highs[i], np.where(new_low, lows[i], ep))
+        af = np.where(extended, np.minimum(af + af_step, af_max), af)
+        sar = np.where(up, sar_up, sar_down)
+
+        to_down = up & (lows[i] <= sar)
+        to_up = ~up & (highs[i] >= sar)
+        reversed_ = to_down | to_up
+        sar = np.where(reversed_, ep, sar)
+        ep = np.where(to_down, lows[i], np.where(to_up, highs[i], ep))
+        af = np.where(reversed_, af_init, af)
+        up = (up & ~to_down) | to_up
+
+        values[i] = sar
+        trends[i] = np.where(up, 1, -1)
+
+    return values, trends
+
+
+def engulfing(opens: np.ndarray, highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, min_body_ratio: float) -> np.ndarray:
+    """Engulfing signal per bar: 1 bullish, -1 bearish, 0 none (first bar is 0)."""
+    signals = np.zeros(opens.shape, dtype=np.int64)
+    if opens.shape[0] < 2:
+        return signals
+
+    prev_open, prev_close, curr_open, curr_close = opens[:-1], closes[:-1], opens[1:], closes[1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prev_ratio = np.abs(prev_close - prev_open) / (highs[:-1] - lows[:-1])
+        curr_ratio = np.abs(curr_close - curr_open) / (highs[1:] - lows[1:])
+    bodies = (prev_ratio >= min_body_ratio) & (curr_ratio >= min_body_ratio)
+
+    bullish = bodies & (prev_close < prev_open) & (curr_close > curr_open) & (curr_open < prev_close) & (curr_close > prev_open)
+    bearish = bodies & (prev_close > prev_open) & (curr_close < curr_open) & (curr_open > prev_close) & (curr_close < prev_open)
+    signals[1:] = np.where(bullish, 1, np.where(bearish, -1, 0))
+    return signals
+
+
+def volume_average(volumes: np.ndarray, avg_period: int, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rolling average volume and anomaly flag per bar.
+
+    Rows before `avg_period - 1` are NaN / False.
+    """
+    depth = volumes.shape[0]
+    averages = np.full(volumes.shape, np.nan)
+    if depth < avg_period:
+        return averages, np.zeros(volumes.shape, dtype=bool)
+
+    # Window sums accumulated in order, like slice().reduce()
+    window_count = depth - avg_period + 1
+    total = np.zeros((window_count,) + volumes.shape[1:])
+    for k in range(avg_period):
+        total = total + volumes[k:k + window_count]
+    averages[avg_period - 1:] = total / avg_period
+
+    with np.errstate(invalid='ignore'):
+        anomalies = volumes > (averages * (1 + threshold))
+    return averages, anomalies
+
+
+class IndicatorEngine:
+    """Compute the requested indicators for all tickers of a frame in one pass."""
+
+    def __init__(self, names: List[str], options: Optional[Dict[str, float]] = None):
+        self.names = names
+        self.options = dict(DEFAULT_OPTIONS, **(options or {}))
+
+    def compute(self, columns: Dict[str, np.ndarray], groups: List[np.ndarray]) -> IndicatorColumns:
+        """
+        Compute indicator columns aligned with the frame rows.
+
+        Args:
+            columns: open/high/low/close/volume arrays, one entry per row, with
+                the same values the emitted bars carry
+            groups: Row positions of each ticker, in bar order
+
+        Returns:
+            Output field -> (values, present) arrays, in calculateAllIndicators
+            key order. `present` is False where the Node service leaves the
+            field unset (warm-up bars, too little data).
+        """
+        size = len(columns['close'])
+        lengths = np.array([len(g) for g in groups], dtype=np.int64)
+        depth = int(lengths.max()) if len(groups) else 0
+        rows = np.concatenate([np.arange(n) for n in lengths]) if len(groups) else np.array([], dtype=np.int64)
+        cols = np.repeat(np.arange(len(groups)), lengths)
+        flat = np.concatenate(groups) if groups else np.array([], dtype=np.int64)
+        # Bar position of each row within its ticker, and that ticker's bar count
+        position = np.zeros(size, dtype=np.int64)
+        position[flat] = rows
+        count = np.zeros(size, dtype=np.int64)
+        count[flat] = lengths[cols]
+
+        panels = {name: _panel(columns[name], groups, rows, cols, depth) for name in ('open', 'high', 'low', 'close', 'volume')}
+        assigned = np.zeros(size, dtype=bool)
+        assigned[flat] = True
+
+        def to_rows(panel: np.ndarray, dtype: Any = np.float64) -> np.ndarray:
+            out = np.zeros(size, dtype=dtype)
+            out[flat] = panel[rows, cols]
+            return out
+
+        result: IndicatorColumns = {}
+        opts = self.options
+
+        if 'rsi' in self.names:
+            period = int(opts['rsiPeriod'])
+            result['rsi'] = (to_rows(rsi(panels['close'], period)), assigned & (position >= period) & (count >= period + 1))
+
+        if 'psar' in self.names:
+            values, trends = psar(panels['high'], panels['low'], opts['psarAfInit'], opts['psarAfStep'], opts['psarAfMax'])
+            psar_values = to_rows(values)
+            present = assigned & (count >= 2)
+            result['psar'] = (psar_values, present)
+            result['psar_trend'] = (np.where(to_rows(trends, np.int8) == 1, 'up', 'down').astype(object), present)
+            result['price_vs_psar'] = (columns['close'] > psar_values, present)
+
+        if 'engulfing' in self.names:
+            signals = engulfing(panels['open'], panels['high'], panels['low'], panels['close'], opts['engulfingMinBodyRatio'])
+            result['engulfing_pattern'] = (to_rows(signals, np.int64), assigned & (count >= 2))
+
+        if 'volume' in self.names:
+            avg_period = int(opts['volumeAvgPeriod'])
+            averages, anomalies = volume_average(panels['volume'], avg_period, opts['volumeAnomalyThreshold'])
+            present = assigned & (position >= avg_period - 1) & (count >= avg_period)
+            result['avg_volume_20'] = (to_rows(averages), present)
+            result['volume_anomaly'] = (to_rows(anomalies, bool), present)
+
+        return result
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Market information that needs no FiinQuant session.
+
+Kept free of pandas, numpy and FiinQuantX so the login-free actions
+(market-status, all-tickers, trading-calendar) can answer without
+importing them.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from trading_calendar import get_calendar
+
+# Actions answered without logging in
+LOGIN_FREE_ACTIONS = ('market-status', 'all-tickers', 'trading-calendar')
+
+# Predefined VN30 and major Vietnamese stocks
+VN30_TICKERS = [
+    'ACB', 'BCM', 'BID', 'BVH', 'CTG', 'FPT', 'GAS', 'GVR', 'HDB', 'HPG',
+    'LPB', 'MBB', 'MSN', 'MWG', 'PLX', 'SAB', 'SHB', 'SSB', 'SSI', 'STB',
+    'TCB', 'TPB', 'VCB', 'VHM', 'VIB', 'VIC', 'VJC', 'VNM', 'VPB', 'VRE'
+]
+
+# Additional major stocks
+ADDITIONAL_TICKERS = [
+    'HSG', 'PNJ', 'SMC', 'DHG', 'REE', 'GMD', 'VND', 'DGC', 'HCM', 'DXG',
+    'KDH', 'NVL', 'PDR', 'VGC', 'ACV', 'ASM', 'BGI', 'BMI', 'CEO', 'CTD',
+    'DCM', 'DGW', 'DRC', 'DTL', 'DVP', 'EIB', 'EVE', 'FCN', 'FIT', 'GEX',
+    'HAG', 'HAX', 'HNG', 'HTN', 'IMP', 'ITD', 'KBC', 'KDC', 'LGC', 'MAS',
+    'NKG', 'NT2', 'OCB', 'PAN', 'PC1', 'PGD', 'PHR', 'POM', 'POW', 'PPC',
+    'PVD', 'PVT', 'QCG', 'SAM', 'SBT', 'SC5', 'SCS', 'SGN', 'SHI', 'SJD',
+    'SRC', 'SSC', 'SVC', 'TLG', 'TMT', 'TNA', 'TNG', 'TRC', 'TSC', 'TVN',
+    'VCI', 'VGI', 'VHC', 'VPI', 'VTB', 'YEG'
+]
+
+
+def all_tickers() -> List[str]:
+    """Tickers returned by the all-tickers action."""
+    return VN30_TICKERS + ADDITIONAL_TICKERS
+
+
+def market_status(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Check market status and trading hours.
+
+    Args:
+        now: Exchange-local (Asia/Ho_Chi_Minh) time to evaluate, defaults to the
+            current time whatever the host's time zone
+
+    Returns:
+        Dictionary with market status information (see TradingCalendar.status);
+        is_open is true during ATO, continuous matching and ATC on trading days
+    """
+    return get_calendar().status(now)
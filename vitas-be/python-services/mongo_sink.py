@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Bulk MongoDB sink for historical bars (`--sink mongo`).
+
+Without it, every bar goes DataFrame -> dict -> JSON on stdout -> parsed
+object in Node -> one Mongoose document at a time. The sink writes the
+columnar bars (see iter_frame_columns in fiinquant_fetcher.py) straight
+into the timeframe's `stock-ss*` collection with unordered bulk upserts
+keyed on (ticker, timestamp, timeframe) - the collections' unique index -
+and only a small summary goes back to Node.
+
+Documents use the same field names as the Mongoose schemas in
+src/schemas/market-data-*.schema.ts, including the createdAt/updatedAt
+timestamps Mongoose would add. Re-fetched bars overwrite the stored values.
+
+The sink can also rescale a ticker's stored bars in place after a corporate
+action changed the adjusted prices (see adjustments.py).
+
+MongoClient instances are kept per URI, so a serve-mode fetcher reuses one
+connection pool across requests. pymongo is only needed when the sink is used.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import date, datetime, time as day_time, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from fetch_metrics import current as current_metrics
+
+logger = logging.getLogger(__name__)
+
+# Same mapping as TIMEFRAME_COLLECTION_MAP in src/common/constants/timeframe.constants.ts
+TIMEFRAME_COLLECTION_MAP = {
+    '1d': 'stock-ss1d',
+    '4h': 'stock-ss4h',
+    '1h': 'stock-ss1h',
+    '15m': 'stock-ss15m',
+    '1m': 'stock-ss1m',
+}
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_POOL_SIZE = 10
+# Write errors kept in the summary; the rest are only counted
+MAX_REPORTED_ERRORS = 5
+
+# Columnar field -> document field for the price columns
+PRICE_FIELDS = (
+    ('open', 'open'),
+    ('high', 'high'),
+    ('low', 'low'),
+    ('close', 'close'),
+    ('change', 'change'),
+    ('change_percent', 'changePercent'),
+    ('total_match_value', 'totalMatchValue'),
+)
+VOLUME_FIELDS = (
+    ('volume', 'volume'),
+    ('foreign_buy_volume', 'foreignBuyVolume'),
+    ('foreign_sell_volume', 'foreignSellVolume'),
+)
+
+# Document fields scaled with the price / volume adjustment factor; the
+# match value is both, and changePercent and rsi do not change at all
+PRICE_SCALED_FIELDS = ('open', 'high', 'low', 'close', 'change')
+VOLUME_SCALED_FIELDS = ('volume', 'matchVolume', 'foreignBuyVolume', 'foreignSellVolume')
+# Indicator fields missing during warm-up; $mul would create them as 0
+OPTIONAL_SCALED_FIELDS = (('psar', 'price'), ('avgVolume20', 'volume'))
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(uri: str, pool_size: Optional[int] = None):
+    """
+    Shared MongoClient for `uri`, created on first use.
+
+    Args:
+        uri: MongoDB connection string
+        pool_size: Max pooled connections (default FIINQUANT_MONGO_POOL_SIZE or 10);
+            only used when the client is created
+    """
+    with _clients_lock:
+        client = _clients.get(uri)
+        if client is None:
+            from pymongo import MongoClient
+            if pool_size is None:
+                pool_size = int(os.getenv('FIINQUANT_MONGO_POOL_SIZE', DEFAULT_POOL_SIZE))
+            client = MongoClient(uri, maxPoolSize=pool_size)
+            _clients[uri] = client
+        return client
+
+
+def close_clients() -> None:
+    """Close every shared client (serve-mode shutdown)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def collection_name(timeframe: str) -> str:
+    if timeframe not in TIMEFRAME_COLLECTION_MAP:
+        raise ValueError(f"No collection for timeframe: {timeframe} (supported: {list(TIMEFRAME_COLLECTION_MAP)})")
+    return TIMEFRAME_COLLECTION_MAP[timeframe]
+
+
+def build_documents(ticker: str, timeframe: str, columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """
+    Mongo documents for one ticker's columnar bars.
+
+    Indicator columns are NaN where the bar has no value; those fields are
+    left out, as calculateAllIndicators does during warm-up.
+    """
+    # Tickers without any bars come as an empty list, even from the columnar path
+    count = len(columns['timestamp']) if columns else 0
+    if not count:
+        return []
+
+    # Epoch milliseconds -> naive UTC datetimes, which pymongo stores as BSON dates
+    timestamps = columns['timestamp'].astype(np.int64).astype('datetime64[ms]').tolist()
+    fields = [('ticker', [ticker] * count), ('timestamp', timestamps), ('timeframe', [timeframe] * count)]
+    fields += [(name, columns[column].tolist()) for column, name in PRICE_FIELDS]
+    volumes = {name: columns[column].astype(np.int64).tolist() for column, name in VOLUME_FIELDS}
+    fields += list(volumes.items())
+    # match_volume equals volume
+    fields.append(('matchVolume', volumes['volume']))
+
+    names = [name for name, _ in fields]
+    docs = [dict(zip(names, row)) for row in zip(*(values for _, values in fields))]
+
+    if 'rsi' in columns:
+        _add_optional(docs, columns['rsi'], 'rsi', float)
+    if 'psar' in columns:
+        present = _add_optional(docs, columns['psar'], 'psar', float)
+        for i in present:
+            docs[i]['psarTrend'] = 'up' if columns['psar_trend'][i] == 1 else 'down'
+            docs[i]['priceVsPsar'] = bool(columns['price_vs_psar'][i] == 1)
+    if 'avg_volume_20' in columns:
+        present = _add_optional(docs, columns['avg_volume_20'], 'avgVolume20', float)
+        for i in present:
+            docs[i]['volumeAnomaly'] = bool(columns['volume_anomaly'][i] == 1)
+    if 'engulfing_pattern' in columns:
+        # Stored as engulfingSignal, like incremental-data.service.ts does
+        _add_optional(docs, columns['engulfing_pattern'], 'engulfingSignal', int)
+
+    return docs
+
+
+def _add_optional(docs: List[Dict[str, Any]], values: np.ndarray, field: str, cast) -> List[int]:
+    """Set `field` on the documents whose value is not NaN; returns their positions."""
+    present = np.flatnonzero(~np.isnan(values)).tolist()
+    for i, value in zip(present, values[present].tolist()):
+        docs[i][field] = cast(value)
+    return present
+
+
+class MongoBarSink:
+    """Unordered bulk upserts of historical bars into the stock-ss* collections."""
+
+    def __init__(
+        self,
+        uri: Optional[str] = None,
+        db_name: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        client: Any = None
+    ):
+        """
+        Args:
+            uri: Connection string (default MONGODB_URI, as used by the Node app)
+            db_name: Database (default MONGODB_DB_NAME, else the URI's database)
+            batch_size: Upserts per bulk_write call (default FIINQUANT_MONGO_BATCH_SIZE or 1000)
+            client: Existing MongoClient to use instead of the shared one
+        """
+        uri = uri or os.getenv('MONGODB_URI')
+        if client is None:
+            if not uri:
+                raise ValueError("MONGODB_URI (or --mongo-uri) is required for the mongo sink")
+            client = get_client(uri)
+        if batch_size is None:
+            batch_size = int(os.getenv('FIINQUANT_MONGO_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+
+        db_name = db_name or os.getenv('MONGODB_DB_NAME')
+        # Mongoose falls back to "test" when neither names a database
+        self.db = client[db_name] if db_name else client.get_default_database('test')
+        self.batch_size = max(1, batch_size)
+
+        self._pending: Dict[str, List[Any]] = {}
+        self._started = time.perf_counter()
+        self.tickers = set()
+        self.empty_tickers = set()
+        self.batches = 0
+        self.collections: Dict[str, Dict[str, int]] = {}
+        self.errors: List[str] = []
+        self.error_count = 0
+
+    def write(self, ticker: str, columns: Dict[str, np.ndarray], timeframe: str) -> None:
+        """Queue one ticker's bars, sending full batches as they fill up."""
+        from pymongo import UpdateOne
+
+        with current_metrics().stage('encode'):
+            docs = build_documents(ticker, timeframe, columns)
+        if not docs:
+            self.empty_tickers.add(ticker)
+            return
+        name = collection_name(timeframe)
+        self.tickers.add(ticker)
+        self._counts(name)['bars'] += len(docs)
+
+        now = datetime.now(timezone.utc)
+        pending = self._pending.setdefault(name, [])
+        for doc in docs:
+            doc['updatedAt'] = now
+            pending.append(UpdateOne(
+                {'ticker': doc['ticker'], 'timestamp': doc['timestamp'], 'timeframe': timeframe},
+                {'$set': doc, '$setOnInsert': {'createdAt': now, '__v': 0}},
+                upsert=True
+            ))
+            if len(pending) >= self.batch_size:
+                self._flush(name)
+                pending = self._pending.setdefault(name, [])
+
+    def close(self) -> None:
+        """Send the remaining partial batches."""
+        for name in list(self._pending):
+            self._flush(name)
+
+    def _counts(self, name: str) -> Dict[str, int]:
+        return self.collections.setdefault(name, {
+            'bars': 0, 'upserted': 0, 'modified': 0, 'matched': 0, 'write_errors': 0
+        })
+
+    def _flush(self, name: str) -> None:
+        from pymongo.errors import BulkWriteError
+
+        operations = self._pending.pop(name, None)
+        if not operations:
+            return
+        try:
+            with current_metrics().stage('sink'):
+                result = self.db[name].bulk_write(operations, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            # ordered=False: every other operation of the batch was still applied
+            result = e.details
+        self.batches += 1
+
+        counts = self._counts(name)
+        counts['upserted'] += result.get('nUpserted', 0)
+        counts['modified'] += result.get('nModified', 0)
+        counts['matched'] += result.get('nMatched', 0)
+        write_errors = result.get('writeErrors') or []
+        if write_errors:
+            counts['write_errors'] += len(write_errors)
+            self.error_count += len(write_errors)
+            for error in write_errors[:MAX_REPORTED_ERRORS - len(self.errors)]:
+                self.errors.append(f"{name}: {error.get('errmsg')}")
+            logger.warning(f"{len(write_errors)} upserts into {name} failed")
+
+    def rescale(self, ticker: str, price_factor: float, volume_factor: float, through: date) -> Dict[str, int]:
+        """
+        Multiply a ticker's stored bars up to `through` by new adjustment factors, in every stock-ss* collection.
+
+        Returns:
+            Modified documents per collection
+        """
+        # Bar times are host-local, stored as UTC (see build_documents)
+        cutoff = datetime.fromtimestamp(
+            datetime.combine(through + timedelta(days=1), day_time()).timestamp(), timezone.utc
+        ).replace(tzinfo=None)
+        factors = {'price': price_factor, 'volume': volume_factor}
+        scale = {field: price_factor for field in PRICE_SCALED_FIELDS}
+        if volume_factor != 1:
+            scale.update({field: volume_factor for field in VOLUME_SCALED_FIELDS})
+        scale['totalMatchValue'] = price_factor * volume_factor
+
+        modified = {}
+        for name in dict.fromkeys(TIMEFRAME_COLLECTION_MAP.values()):
+            query = {'ticker': ticker, 'timestamp': {'$lt': cutoff}}
+            with current_metrics().stage('sink'):
+                count = self.db[name].update_many(query, {'$mul': scale}).modified_count
+                for field, kind in OPTIONAL_SCALED_FIELDS:
+                    if factors[kind] != 1:
+                        self.db[name].update_many({**query, field: {'$exists': True}}, {'$mul': {field: factors[kind]}})
+            if count:
+                modified[name] = count
+        logger.info(f"Rescaled {sum(modified.values())} stored {ticker} bars up to {through} "
+                    f"(price x{price_factor:.6f}, volume x{volume_factor:.6f})")
+        return modified
+
+    def first_timestamps(self, ticker: str) -> Dict[str, datetime]:
+        """Timestamp (UTC) of the oldest stored bar of `ticker` per timeframe that has any."""
+        first = {}
+        for timeframe, name in TIMEFRAME_COLLECTION_MAP.items():
+            doc = self.db[name].find_one({'ticker': ticker}, {'timestamp': 1}, sort=[('timestamp', 1)])
+            if doc is not None:
+                first[timeframe] = doc['timestamp']
+        return first
+
+    def summary(self) -> Dict[str, Any]:
+        """What was written, for the Node side (no bar data)."""
+        return {
+            'success': self.error_count == 0,
+            'sink': 'mongo',
+            'database': self.db.name,
+            'tickers': len(self.tickers),
+            'tickers_without_data': sorted(self.empty_tickers - self.tickers),
+            'bars': sum(counts['bars'] for counts in self.collections.values()),
+            'upserted': sum(counts['upserted'] for counts in self.collections.values()),
+            'modified': sum(counts['modified'] for counts in self.collections.values()),
+            'batches': self.batches,
+            'write_errors': self.error_count,
+            'errors': self.errors,
+            'collections': self.collections,
+            'elapsed_ms': round((time.perf_counter() - self._started) * 1000, 1),
+        }
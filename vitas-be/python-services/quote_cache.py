@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Snapshot cache and request coalescing for latest-quote lookups.
+
+Every `latest` request used to be one realtime Fetch_Trading_Data call, so a
+dashboard asking for thirty tickers one at a time made thirty upstream calls
+within the same second. LatestQuoteCache sits in front of the fetcher:
+
+- each ticker's latest bar is kept for `ttl` seconds and served from memory;
+- tickers already being fetched by another request wait for that call
+  instead of starting their own;
+- the remaining misses of requests arriving within `coalesce_window` seconds
+  of each other are merged into one upstream call.
+
+Tickers the upstream returned nothing for are remembered for the TTL as
+well, so unknown symbols are not fetched again on every request. Failed
+calls are not cached.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 5.0
+DEFAULT_COALESCE_MS = 10.0
+
+LatestFetch = Callable[[List[str]], Dict[str, Dict[str, Any]]]
+
+
+class _Snapshot:
+    __slots__ = ('bar', 'fetched_at')
+
+    def __init__(self, bar: Optional[Dict[str, Any]], fetched_at: float):
+        self.bar = bar
+        self.fetched_at = fetched_at
+
+
+class _Batch:
+    """One upstream call shared by every request waiting on its tickers."""
+
+    def __init__(self):
+        self.tickers: List[str] = []
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+
+class LatestQuoteCache:
+    """Thread-safe TTL snapshot cache that coalesces concurrent latest-quote fetches."""
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        coalesce_window: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            ttl: Seconds a fetched quote is served from memory
+                (default FIINQUANT_LATEST_TTL or 5; 0 only shares in-flight calls)
+            coalesce_window: Seconds the first miss waits for other requests to join
+                its upstream call (default FIINQUANT_LATEST_COALESCE_MS / 1000, or 0.01)
+            clock: Monotonic time source
+        """
+        if ttl is None:
+            ttl = float(os.getenv('FIINQUANT_LATEST_TTL', DEFAULT_TTL_SECONDS))
+        if coalesce_window is None:
+            coalesce_window = float(os.getenv('FIINQUANT_LATEST_COALESCE_MS', DEFAULT_COALESCE_MS)) / 1000
+        self.ttl = max(0.0, ttl)
+        self.coalesce_window = max(0.0, coalesce_window)
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, _Snapshot] = {}
+        # Ticker -> batch that will (or is about to) fetch it
+        self._in_flight: Dict[str, _Batch] = {}
+        # Batch still accepting tickers during its coalesce window
+        self._open: Optional[_Batch] = None
+
+        self._requests = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._upstream_calls = 0
+        self._upstream_tickers = 0
+        self._upstream_errors = 0
+
+    def get_many(self, tickers: List[str], fetch: LatestFetch) -> Dict[str, Dict[str, Any]]:
+        """
+        Latest bar for each ticker, from the cache or a shared upstream call.
+
+        Args:
+            tickers: Stock symbols; duplicates are ignored
+            fetch: Upstream call taking a ticker list and returning {ticker: bar};
+                it may raise, in which case nothing is cached
+
+        Returns:
+            Dictionary with ticker as key and latest bar as value, in request order,
+            omitting tickers the upstream has no data for
+
+        Raises:
+            The exception of a failed upstream call this request depended on
+        """
+        tickers = list(dict.fromkeys(tickers))
+        found: Dict[str, Dict[str, Any]] = {}
+        waiting: Dict[str, _Batch] = {}
+        leading: Optional[_Batch] = None
+
+        with self._lock:
+            self._requests += 1
+            now = self.clock()
+            for ticker in tickers:
+                snapshot = self._snapshots.get(ticker)
+                if snapshot is not None and now - snapshot.fetched_at < self.ttl:
+                    self._hits += 1
+                    if snapshot.bar is not None:
+                        found[ticker] = snapshot.bar
+                    continue
+
+                self._misses += 1
+                batch = self._in_flight.get(ticker)
+                if batch is None:
+                    if self._open is None:
+                        self._open = leading = _Batch()
+                    batch = self._open
+                    batch.tickers.append(ticker)
+                    self._in_flight[ticker] = batch
+                waiting[ticker] = batch
+
+            if any(batch is not leading for batch in waiting.values()):
+                self._coalesced += 1
+
+        if leading is not None:
+            self._run(leading, fetch)
+
+        error = None
+        for ticker, batch in waiting.items():
+            batch.done.wait()
+            if batch.error is not None:
+                error = error or batch.error
+            elif ticker in batch.results:
+                found[ticker] = batch.results[ticker]
+        if error is not None:
+            raise error
+
+        return {ticker: found[ticker] for ticker in tickers if ticker in found}
+
+    def _run(self, batch: _Batch, fetch: LatestFetch) -> None:
+        """Close `batch` after the coalesce window, fetch its tickers and publish the results."""
+        if self.coalesce_window:
+            time.sleep(self.coalesce_window)
+        with self._lock:
+            if self._open is batch:
+                self._open = None
+            tickers = list(batch.tickers)
+            self._upstream_calls += 1
+            self._upstream_tickers += len(tickers)
+
+        fetched_at = self.clock()
+        try:
+            batch.results = fetch(tickers) or {}
+        except Exception as e:
+            batch.error = e
+
+        with self._lock:
+            if batch.error is not None:
+                self._upstream_errors += 1
+            else:
+                for ticker in tickers:
+                    self._snapshots[ticker] = _Snapshot(batch.results.get(ticker), fetched_at)
+            for ticker in tickers:
+                if self._in_flight.get(ticker) is batch:
+                    del self._in_flight[ticker]
+        batch.done.set()
+
+        if len(tickers) > 1:
+            logger.info(f"Fetched latest data for {len(tickers)} tickers in one upstream call")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and upstream-call counters since the cache was created."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'requests': self._requests,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'coalesced_requests': self._coalesced,
+                'upstream_calls': self._upstream_calls,
+                'upstream_tickers': self._upstream_tickers,
+                'upstream_errors': self._upstream_errors,
+                'cached_tickers': len(self._snapshots),
+                'ttl_seconds': self.ttl,
+                'coalesce_ms': round(self.coalesce_window * 1000, 3),
+            }
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Realtime bar sources and a batched NDJSON writer for `--action stream`.
+
+A source pushes pandas DataFrames shaped like Fetch_Trading_Data output
+(one row per ticker update) into a callback. The writer turns bars into
+newline-delimited JSON and flushes them to stdout in micro-batches from a
+bounded queue, so a slow reader blocks the producer instead of letting
+memory grow.
+"""
+
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+STREAM_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'bu', 'sd', 'fn', 'fs', 'fb']
+
+FrameCallback = Callable[[pd.DataFrame], None]
+
+
+class FiinQuantRealtimeSource:
+    """Single realtime Fetch_Trading_Data subscription for a ticker set."""
+
+    def __init__(self, client: Any, tickers: List[str], timeframe: str = '1m'):
+        self.client = client
+        self.tickers = tickers
+        self.timeframe = timeframe
+        self.event = None
+
+    def start(self, on_frame: FrameCallback) -> None:
+        def on_update(update: Any) -> None:
+            frame = update.to_dataFrame() if hasattr(update, 'to_dataFrame') else pd.DataFrame(update)
+            if frame is not None and not frame.empty:
+                on_frame(frame)
+
+        self.event = self.client.Fetch_Trading_Data(
+            realtime=True,
+            tickers=self.tickers,
+            fields=STREAM_FIELDS,
+            adjusted=True,
+            by=self.timeframe,
+            callback=on_update,
+            wait_for_full_timeFrame=False
+        )
+        self.event.get_data()
+        logger.info(f"Subscribed to realtime data for {len(self.tickers)} tickers")
+
+    def stop(self) -> None:
+        if self.event is not None:
+            self.event.stop()
+            self.event = None
+
+
+class FakeBarSource:
+    """
+    Offline stand-in for FiinQuantRealtimeSource.
+
+    Emits one random-walk bar per ticker every `interval` seconds from a
+    background thread.
+    """
+
+    def __init__(self, tickers: List[str], interval: float = 1.0, seed: int = 0):
+        self.tickers = tickers
+        self.interval = interval
+        self.random = random.Random(seed)
+        self.prices = {ticker: 10000.0 + self.random.randint(0, 90000) for ticker in tickers}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def next_frame(self) -> pd.DataFrame:
+        now = datetime.now().strftime('%Y-%m-%d %H:%M')
+        rows = []
+        for ticker in self.tickers:
+            open_price = self.prices[ticker]
+            close_price = max(100.0, round(open_price * (1 + self.random.gauss(0, 0.002)), -1))
+            volume = float(self.random.randint(0, 50000))
+            rows.append({
+                'ticker': ticker,
+                'timestamp': now,
+                'open': open_price,
+                'high': max(open_price, close_price) + 50.0,
+                'low': min(open_price, close_price) - 50.0,
+                'close': close_price,
+                'volume': volume,
+                'bu': volume * 0.6,
+                'sd': volume * 0.4,
+                'fn': 0.0,
+                'fs': float(self.random.randint(0, 1000)),
+                'fb': float(self.random.randint(0, 1000)),
+            })
+            self.prices[ticker] = close_price
+        return pd.DataFrame(rows)
+
+    def start(self, on_frame: FrameCallback) -> None:
+        def run() -> None:
+            while not self._stop.is_set():
+                on_frame(self.next_frame())
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=run, name='fake-bar-source', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class BatchedNDJSONWriter:
+    """
+    Write bars as NDJSON lines in micro-batches from a bounded queue.
+
+    `put` blocks once `max_buffered` bars are waiting, which pushes back on
+    the source when the reader of `out` is slower than the feed.
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, out: TextIO, batch_size: int = 200, flush_interval: float = 0.2, max_buffered: int = 5000):
+        self.out = out
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: 'queue.Queue[Any]' = queue.Queue(maxsize=max_buffered)
+        self.written = 0
+        self.broken = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ndjson-writer', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def put(self, bar: Dict[str, Any]) -> None:
+        # Poll so a producer blocked on a full queue notices a dead reader
+        while not self.broken.is_set():
+            try:
+                self.queue.put(bar, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def close(self) -> None:
+        """Flush everything still queued and stop the writer thread."""
+        self.put(self._CLOSE)
+        self._thread.join()
+
+    def _run(self) -> None:
+        closing = False
+        while not closing:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # Collect until the batch is full or the flush deadline passes
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is self._CLOSE:
+                    closing = True
+                    break
+                batch.append(json.dumps(item, default=str))
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self.out.write('\n'.join(batch) + '\n')
+                    self.out.flush()
+                    self.written += len(batch)
+                except (BrokenPipeError, ValueError) as e:
+                    logger.error(f"Stream output closed: {e}")
+                    self.broken.set()
+                    return
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Persisted FiinQuantX session state, so one-shot runs can skip the login.
+
+After a login, the JSON-serializable attributes of the logged-in client
+(access token, expiry and similar) are written to a local file that only
+the current user can read. Later runs rebuild the client from that state
+until it expires, instead of calling `FiinSession.login()` again.
+
+The state is keyed by the username and a salted scrypt hash of the
+password, so a copy of the file does not give the password away to a fast
+offline guess, and it is ignored when the file is readable by other users.
+
+Rebuilding a client this way skips its __init__ and only brings back the
+attributes that could be saved, so it depends on FiinQuantX internals.
+Reuse is therefore opt-in (FIINQUANT_SESSION_REUSE=true), and a restored
+client must pass a cheap probe call before it is trusted (see load); one
+that still fails later is replaced by a fresh login by the fetcher (see
+FiinQuantFetcher._call_upstream).
+"""
+
+import os
+import json
+import time
+import hmac
+import hashlib
+import logging
+import importlib
+import tempfile
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'fiinquant_session.json')
+DEFAULT_TTL_SECONDS = 3600
+
+# Saved sessions are dropped this long before they expire, so a run that
+# starts just before expiry does not use a token that lapses mid-request
+EXPIRY_MARGIN_SECONDS = 60
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def session_reuse_enabled() -> bool:
+    """Whether saved sessions may be reused (FIINQUANT_SESSION_REUSE=true)."""
+    return os.getenv('FIINQUANT_SESSION_REUSE', 'false').strip().lower() in ('1', 'true', 'yes')
+
+
+def _json_safe(value: Any) -> bool:
+    if isinstance(value, _JSON_SCALARS):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_json_safe(item) for item in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and _json_safe(item) for key, item in value.items())
+    return False
+
+
+# scrypt cost (about 16 MB and tens of ms), paid once per run that loads or saves
+SCRYPT_PARAMS = {'n': 2 ** 14, 'r': 8, 'p': 1}
+SALT_BYTES = 16
+
+
+def _fingerprint(username: str, password: str, salt: bytes) -> str:
+    """Salted scrypt hash of the credentials, enough to notice that they changed."""
+    return hashlib.scrypt(
+        f"{username}\0{password}".encode('utf-8'), salt=salt, dklen=32, **SCRYPT_PARAMS
+    ).hex()
+
+
+def _matches(saved: Dict[str, Any], username: str, password: str) -> bool:
+    """Whether `saved` belongs to these credentials; the hash is only computed for the right user."""
+    if saved.get('username') != username or not isinstance(saved.get('salt'), str):
+        return False
+    try:
+        salt = bytes.fromhex(saved['salt'])
+    except ValueError:
+        return False
+    return hmac.compare_digest(str(saved.get('fingerprint', '')), _fingerprint(username, password, salt))
+
+
+def _capture(obj: Any, password: str) -> Dict[str, Any]:
+    """JSON-serializable instance attributes of `obj`, without the password."""
+    state = {}
+    for name, value in vars(obj).items():
+        if 'password' in name.lower() or (password and value == password):
+            continue
+        if _json_safe(value):
+            state[name] = value
+    return state
+
+
+def _token_expiry(state: Dict[str, Any]) -> Optional[float]:
+    """Epoch seconds of the earliest expiry-like attribute (e.g. expired_token), if any."""
+    expiries = []
+    for name, value in state.items():
+        if 'expir' in name.lower() and isinstance(value, (int, float)) and not isinstance(value, bool):
+            # Milliseconds and seconds since the epoch are both in use
+            if value > 1e12:
+                value = value / 1000
+            if value > 1e9:
+                expiries.append(float(value))
+    return min(expiries) if expiries else None
+
+
+class SessionStore:
+    """Read and write the saved session file (JSON, mode 0600)."""
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        self.path = path or os.getenv('FIINQUANT_SESSION_PATH', DEFAULT_SESSION_PATH)
+        if ttl is None:
+            ttl = float(os.getenv('FIINQUANT_SESSION_TTL', DEFAULT_TTL_SECONDS))
+        self.ttl = ttl
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        with os.fdopen(fd, 'r', encoding='utf-8') as f:
+            info = os.fstat(f.fileno())
+            if info.st_mode & 0o077 or (hasattr(os, 'getuid') and info.st_uid != os.getuid()):
+                logger.warning(f"Ignoring saved session {self.path}: it must be private to the current user (chmod 600)")
+                return None
+            return json.load(f)
+
+    def load(
+        self,
+        username: str,
+        password: str,
+        session_factory: Callable[..., Any],
+        verify: Optional[Callable[[Any], bool]] = None
+    ) -> Optional[Tuple[Any, Any, float]]:
+        """
+        Rebuild a logged-in session from the saved state.
+
+        Args:
+            username: FiinQuant username the state must belong to
+            password: FiinQuant password the state must belong to
+            session_factory: FiinSession class, called as session_factory(username=, password=)
+            verify: Cheap upstream call on the restored client; the saved state
+                is dropped unless it returns True
+
+        Returns:
+            (session, client, expires_at), or None when there is no usable saved session
+        """
+        try:
+            saved = self._read()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read saved session {self.path}: {e}")
+            return None
+        if not saved or not _matches(saved, username, password):
+            return None
+
+        expires_at = float(saved.get('expires_at') or 0)
+        if expires_at - EXPIRY_MARGIN_SECONDS <= time.time():
+            logger.info("Saved FiinQuant session has expired")
+            return None
+
+        try:
+            session = session_factory(username=username, password=password)
+            vars(session).update(saved.get('session') or {})
+            if saved.get('client_is_session'):
+                client = session
+            else:
+                client = self._restore_client(saved, session_factory)
+                if client is None:
+                    return None
+        except Exception as e:
+            logger.warning(f"Could not restore saved session: {e}")
+            return None
+
+        if verify is not None:
+            try:
+                usable = verify(client)
+            except Exception as e:
+                logger.warning(f"Saved FiinQuant session failed its probe call: {e}")
+                usable = False
+            if not usable:
+                logger.warning("Saved FiinQuant session is not usable, logging in again")
+                self.clear()
+                return None
+
+        logger.info(f"Reusing saved FiinQuant session ({int(expires_at - time.time())}s left)")
+        return session, client, expires_at
+
+    @staticmethod
+    def _restore_client(saved: Dict[str, Any], session_factory: Callable[..., Any]) -> Any:
+        module_name, _, class_name = (saved.get('client_class') or '').partition(':')
+        # Only classes from the FiinQuantX package itself are rebuilt
+        package = session_factory.__module__.split('.')[0]
+        if module_name.split('.')[0] != package:
+            return None
+        client_class = getattr(importlib.import_module(module_name), class_name, None)
+        if not isinstance(client_class, type):
+            return None
+        client = client_class.__new__(client_class)
+        vars(client).update(saved.get('client') or {})
+        return client
+
+    def save(self, username: str, password: str, session: Any, client: Any) -> Optional[float]:
+        """
+        Save the state of a freshly logged-in session.
+
+        Returns:
+            Epoch seconds when the saved state expires, or None if it could not be written
+        """
+        client_is_session = client is session
+        session_state = _capture(session, password)
+        client_state = {} if client_is_session else _capture(client, password)
+
+        expires_at = time.time() + self.ttl
+        token_expiry = _token_expiry({**session_state, **client_state})
+        if token_expiry is not None:
+            expires_at = min(expires_at, token_expiry)
+
+        salt = os.urandom(SALT_BYTES)
+        saved = {
+            'username': username,
+            'salt': salt.hex(),
+            'fingerprint': _fingerprint(username, password, salt),
+            'saved_at': time.time(),
+            'expires_at': expires_at,
+            'client_is_session': client_is_session,
+            'client_class': f"{type(client).__module__}:{type(client).__qualname__}",
+            'session': session_state,
+            'client': client_state,
+        }
+
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.fiinquant_session.', dir=directory)
+            try:
+                # mkstemp creates the file with mode 0600
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(saved, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Could not save session to {self.path}: {e}")
+            return None
+        return expires_at
+
+    def clear(self) -> None:
+        """Forget the saved session, e.g. after it was rejected upstream."""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove saved session {self.path}: {e}")
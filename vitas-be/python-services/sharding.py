@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Multi-process historical fetches with shards balanced by expected cost.
+
+The ticker universe is split into one shard per worker process so that
+every shard carries about the same expected cost (see cost_index.py), not
+the same number of tickers: dense tickers are spread out first and the
+long tail of thin ones fills the gaps (longest-processing-time-first
+greedy assignment). Each shard keeps its tickers in universe order.
+
+Every shard runs as its own `fiinquant_fetcher.py` process with the same
+options and its own tickers, writing to a temporary file. The outputs are
+merged back in universe ticker order: JSON documents key by key, NDJSON
+streams group by group without loading them whole. A balance report
+compares the expected and actual time of every shard.
+"""
+
+import os
+import sys
+import json
+import heapq
+import time
+import logging
+import tempfile
+import subprocess
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FETCHER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fiinquant_fetcher.py')
+
+# Command line options replaced per shard; the others are passed on unchanged
+SHARD_OPTIONS = ('--shards', '--tickers', '--tickers-file')
+
+# Set in the environment of every shard process, which must not shard again
+SHARD_WORKER_ENV = 'FIINQUANT_SHARD_WORKER'
+
+
+def plan_shards(tickers: List[str], costs: Dict[str, float], shards: int) -> List[List[str]]:
+    """
+    Split tickers into `shards` groups of about equal total expected cost.
+
+    Args:
+        tickers: Tickers in universe order
+        costs: Expected cost per ticker
+        shards: Number of groups (fewer when there are fewer tickers)
+
+    Returns:
+        Non-empty groups, each in universe order
+    """
+    shards = max(1, min(shards, len(tickers)))
+    order = {ticker: i for i, ticker in enumerate(tickers)}
+    loads = [(0.0, shard) for shard in range(shards)]
+    groups: List[List[str]] = [[] for _ in range(shards)]
+    for ticker in sorted(tickers, key=lambda t: (-costs.get(t, 0.0), order[t])):
+        load, shard = heapq.heappop(loads)
+        groups[shard].append(ticker)
+        heapq.heappush(loads, (load + costs.get(ticker, 0.0), shard))
+    return [sorted(group, key=order.__getitem__) for group in groups if group]
+
+
+def _imbalance(values: List[float]) -> Optional[float]:
+    mean = sum(values) / len(values) if values else 0
+    return round(max(values) / mean, 3) if mean > 0 else None
+
+
+def balance_report(
+    tickers: List[str],
+    groups: List[List[str]],
+    costs: Dict[str, float],
+    elapsed_ms: Optional[List[float]] = None,
+    estimated: int = 0
+) -> Dict[str, Any]:
+    """
+    How evenly the shards are loaded, expected and (once run) actual.
+
+    Imbalance is the slowest shard relative to the mean (1.0 is perfectly
+    even). The expected imbalance of cutting `tickers` into consecutive
+    equal-count shards is reported alongside for comparison.
+    """
+    expected = [sum(costs.get(t, 0.0) for t in group) for group in groups]
+    size = -(-len(tickers) // len(groups)) if groups else 0
+    even = [sum(costs.get(t, 0.0) for t in tickers[i:i + size]) for i in range(0, len(tickers), size)] if size else []
+
+    report: Dict[str, Any] = {
+        'shards': [
+            {'tickers': len(group), 'expected_ms': round(cost, 1)}
+            for group, cost in zip(groups, expected)
+        ],
+        'expected_imbalance': _imbalance(expected),
+        'even_split_expected_imbalance': _imbalance(even),
+        'estimated_tickers': estimated,
+    }
+    if elapsed_ms is not None:
+        for shard, ms in zip(report['shards'], elapsed_ms):
+            shard['elapsed_ms'] = round(ms, 1)
+        report['actual_imbalance'] = _imbalance(elapsed_ms)
+    return report
+
+
+def shard_argv(argv: List[str], tickers: List[str]) -> List[str]:
+    """
+    Command line of one shard: `argv` without the SHARD_OPTIONS, plus `--shards 1` and the shard's tickers.
+
+    Abbreviations argparse accepts (--shard, --ticker) are removed too.
+    """
+    out: List[str] = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        name = arg.split('=', 1)[0]
+        if len(name) > 2 and name.startswith('--') and any(option.startswith(name) for option in SHARD_OPTIONS):
+            skip = '=' not in arg
+            continue
+        out.append(arg)
+    return out + ['--shards', '1', '--tickers', ','.join(tickers)]
+
+
+def run_shards(groups: List[List[str]], argv: List[str], workdir: str) -> Tuple[List[str], List[float]]:
+    """
+    Run one fetcher process per shard and wait for all of them.
+
+    Shard logs go to this process's stderr; each shard's stdout goes to a
+    file in `workdir`.
+
+    Returns:
+        (output file per shard, wall time per shard in ms)
+
+    Raises:
+        RuntimeError: A shard failed; carries the shard's error message
+    """
+    outputs, processes, started = [], [], []
+    env = dict(os.environ, **{SHARD_WORKER_ENV: '1'})
+    for index, group in enumerate(groups):
+        path = os.path.join(workdir, f'shard-{index}.out')
+        outputs.append(path)
+        with open(path, 'wb') as out:
+            processes.append(subprocess.Popen(
+                [sys.executable, FETCHER_SCRIPT] + shard_argv(argv, group),
+                stdout=out,
+                stderr=sys.stderr,
+                env=env,
+            ))
+        started.append(time.perf_counter())
+
+    elapsed: List[float] = [0.0] * len(processes)
+    pending = set(range(len(processes)))
+    while pending:
+        for index in list(pending):
+            if processes[index].poll() is not None:
+                elapsed[index] = (time.perf_counter() - started[index]) * 1000
+                pending.discard(index)
+        if pending:
+            time.sleep(0.01)
+
+    for index, process in enumerate(processes):
+        if process.returncode != 0:
+            with open(outputs[index], 'rb') as f:
+                text = f.read().decode('utf-8', 'replace').strip()
+            try:
+                message = json.loads(text.splitlines()[-1]).get('error') or text
+            except (ValueError, IndexError, AttributeError):
+                message = text or f'exit code {process.returncode}'
+            raise RuntimeError(f"Shard {index} failed: {message}")
+    return outputs, elapsed
+
+
+def merge_json(outputs: List[str], tickers: List[str]) -> Dict[str, Any]:
+    """
+    Merge the JSON results of the shards in `tickers` order.
+
+    Results keyed by timeframe first (derive) are merged per timeframe.
+    """
+    order = {ticker: i for i, ticker in enumerate(tickers)}
+    documents = []
+    for path in outputs:
+        with open(path, 'r', encoding='utf-8') as f:
+            documents.append(json.load(f))
+
+    def merged(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        combined: Dict[str, Any] = {}
+        for part in parts:
+            combined.update(part)
+        return dict(sorted(combined.items(), key=lambda item: order.get(item[0], len(order))))
+
+    if any(key in order for doc in documents for key in doc) or not any(documents):
+        return merged(documents)
+    timeframes = list(dict.fromkeys(key for doc in documents for key in doc))
+    return {tf: merged([doc.get(tf, {}) for doc in documents]) for tf in timeframes}
+
+
+_TICKER_PREFIX = '{"ticker": "'
+
+
+def _ticker_groups(f: IO[str]) -> Iterator[Tuple[str, List[str]]]:
+    """Consecutive NDJSON lines of one ticker."""
+    ticker, lines = None, []
+    for line in f:
+        # Bars are written with the ticker first, so most lines need no parsing
+        if line.startswith(_TICKER_PREFIX):
+            current = line[len(_TICKER_PREFIX):line.index('"', len(_TICKER_PREFIX))]
+        else:
+            current = json.loads(line).get('ticker')
+        if lines and current != ticker:
+            yield ticker, lines
+            lines = []
+        ticker = current
+        lines.append(line)
+    if lines:
+        yield ticker, lines
+
+
+def merge_ndjson(outputs: List[str], tickers: List[str], out: IO[str]) -> int:
+    """
+    Stream the NDJSON outputs of the shards to `out`, ticker groups in `tickers` order.
+
+    Only one group per shard is held at a time. Bars of one ticker keep
+    their order; a ticker fetched in several time windows keeps its
+    per-window groups.
+
+    Returns:
+        Number of bars written
+    """
+    order = {ticker: i for i, ticker in enumerate(tickers)}
+    files = [open(path, 'r', encoding='utf-8') for path in outputs]
+    written = 0
+    try:
+        streams = [_ticker_groups(f) for f in files]
+        heads = []
+        for index, stream in enumerate(streams):
+            group = next(stream, None)
+            if group is not None:
+                heads.append((order.get(group[0], len(order)), index, group[1]))
+        heapq.heapify(heads)
+        while heads:
+            _, index, lines = heapq.heappop(heads)
+            out.write(''.join(lines))
+            out.flush()
+            written += len(lines)
+            group = next(streams[index], None)
+            if group is not None:
+                heapq.heappush(heads, (order.get(group[0], len(order)), index, group[1]))
+    finally:
+        for f in files:
+            f.close()
+    return written
+
+
+def run_sharded(
+    argv: List[str],
+    tickers: List[str],
+    costs: Dict[str, float],
+    shards: int,
+    output: str,
+    out: IO[str],
+    estimated: int = 0
+) -> Dict[str, Any]:
+    """
+    Fetch historical data for `tickers` in `shards` cost-balanced worker processes.
+
+    Args:
+        argv: This process's command line options (passed on to every shard)
+        tickers: Tickers in output order
+        costs: Expected cost per ticker (CostIndex.expected_costs)
+        shards: Number of worker processes
+        output: 'json' or 'ndjson'
+        out: Text stream the merged result is written to
+        estimated: Tickers whose cost was estimated, for the report
+
+    Returns:
+        Balance report (see balance_report)
+
+    Raises:
+        RuntimeError: Called inside a shard process
+    """
+    if os.environ.get(SHARD_WORKER_ENV):
+        raise RuntimeError("A shard process cannot start shards of its own")
+    groups = plan_shards(tickers, costs, shards)
+    planned = balance_report(tickers, groups, costs, estimated=estimated)
+    logger.info(f"Fetching {len(tickers)} tickers in {len(groups)} shards, expected imbalance "
+                f"{planned['expected_imbalance']} (even split: {planned['even_split_expected_imbalance']})")
+
+    with tempfile.TemporaryDirectory(prefix='fiinquant-shards-') as workdir:
+        outputs, elapsed = run_shards(groups, argv, workdir)
+        if output == 'ndjson':
+            written = merge_ndjson(outputs, tickers, out)
+            logger.info(f"Merged {written} bars as NDJSON")
+        else:
+            out.write(json.dumps(merge_json(outputs, tickers), default=str) + '\n')
+            out.flush()
+
+    report = balance_report(tickers, groups, costs, elapsed, estimated)
+    logger.info(f"Shard balance: actual imbalance {report['actual_imbalance']}, "
+                f"expected {report['expected_imbalance']}")
+    return report
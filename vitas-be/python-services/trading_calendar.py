@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+HOSE/HNX trading calendar: trading days, session phases and bar slots.
+
+Trading days are weekdays that are not exchange holidays; the holidays are
+read from a JSON file (vn_market_holidays.json next to this module, or
+FIINQUANT_HOLIDAYS_PATH) so a new year only needs a data update. A year
+without any holiday in the file has not been added yet: its holidays count
+as trading days, which only makes callers fetch instead of skipping, but
+expected bar counts come out too high, so the first lookup of such a year
+logs a warning and describe() reports it. Times are
+exchange local (Asia/Ho_Chi_Minh, UTC+7 all year) regardless of the host's
+time zone.
+
+A trading day is split into phases:
+
+    HOSE  09:00 ATO | 09:15 continuous | 11:30 lunch break | 13:00 continuous
+          14:30 ATC | 14:45 put-through | 15:00 closed
+    HNX   09:00 continuous | 11:30 lunch break | 13:00 continuous
+          14:30 ATC | 14:45 put-through | 15:00 closed
+
+FiinQuantX bars start in the 09:00-11:30 and 13:00-14:45 windows, anchored
+at each window's start (see resample.bucket_starts), which gives the
+expected bar slots per timeframe.
+
+Kept free of pandas and numpy so market-status can use it on the fast path.
+"""
+
+import os
+import json
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE_TIMEZONE = 'Asia/Ho_Chi_Minh'
+EXCHANGE_TZ = timezone(timedelta(hours=7), 'ICT')
+
+DEFAULT_HOLIDAYS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vn_market_holidays.json')
+
+# (phase, start minute, end minute) of each exchange's trading day
+EXCHANGE_PHASES = {
+    'HOSE': (
+        ('ato', 9 * 60, 9 * 60 + 15),
+        ('continuous', 9 * 60 + 15, 11 * 60 + 30),
+        ('lunch_break', 11 * 60 + 30, 13 * 60),
+        ('continuous', 13 * 60, 14 * 60 + 30),
+        ('atc', 14 * 60 + 30, 14 * 60 + 45),
+        ('put_through', 14 * 60 + 45, 15 * 60),
+    ),
+    'HNX': (
+        ('continuous', 9 * 60, 11 * 60 + 30),
+        ('lunch_break', 11 * 60 + 30, 13 * 60),
+        ('continuous', 13 * 60, 14 * 60 + 30),
+        ('atc', 14 * 60 + 30, 14 * 60 + 45),
+        ('put_through', 14 * 60 + 45, 15 * 60),
+    ),
+}
+
+# Phases in which orders are matched and bars are produced
+OPEN_PHASES = ('ato', 'continuous', 'atc')
+
+# Windows in which FiinQuantX bars start (minutes after midnight, end exclusive)
+BAR_WINDOWS = ((9 * 60, 11 * 60 + 30), (13 * 60, 14 * 60 + 45))
+
+INTRADAY_MINUTES = {'1m': 1, '5m': 5, '15m': 15, '30m': 30, '1h': 60, '4h': 240}
+
+
+def bar_slots(timeframe: str) -> List[int]:
+    """Minutes after midnight of every bar start of `timeframe` on a trading day (1d: [0])."""
+    if timeframe == '1d':
+        return [0]
+    if timeframe not in INTRADAY_MINUTES:
+        raise ValueError(f"Unsupported timeframe: {timeframe} (supported: {list(INTRADAY_MINUTES) + ['1d']})")
+    step = INTRADAY_MINUTES[timeframe]
+    return [minute for start, end in BAR_WINDOWS for minute in range(start, end, step)]
+
+
+def exchange_now() -> datetime:
+    """Current exchange-local time as a naive datetime."""
+    return datetime.now(EXCHANGE_TZ).replace(tzinfo=None)
+
+
+def _to_day(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def load_holidays(path: Optional[str] = None) -> List[date]:
+    """
+    Read exchange holidays from a JSON file.
+
+    Args:
+        path: JSON file holding either a list of YYYY-MM-DD dates or an object
+            with a "holidays" list; defaults to FIINQUANT_HOLIDAYS_PATH or
+            vn_market_holidays.json
+
+    Returns:
+        Holiday dates; empty (with a warning) when the file cannot be read
+    """
+    path = path or os.getenv('FIINQUANT_HOLIDAYS_PATH', DEFAULT_HOLIDAYS_PATH)
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"No holiday calendar loaded from {path}: {e}")
+        return []
+    if isinstance(data, dict):
+        data = data.get('holidays') or []
+    return sorted({_to_day(item) for item in data})
+
+
+class TradingCalendar:
+    """Trading days and session phases of one exchange."""
+
+    def __init__(self, holidays: Optional[Iterable[Any]] = None, exchange: str = 'HOSE'):
+        """
+        Args:
+            holidays: Holiday dates (date or YYYY-MM-DD); defaults to load_holidays()
+            exchange: HOSE or HNX
+        """
+        if exchange not in EXCHANGE_PHASES:
+            raise ValueError(f"Unsupported exchange: {exchange} (supported: {list(EXCHANGE_PHASES)})")
+        self.exchange = exchange
+        self.phases = EXCHANGE_PHASES[exchange]
+        self.holidays = frozenset(_to_day(day) for day in (load_holidays() if holidays is None else holidays))
+        # Years the holiday data covers; every year has at least New Year's Day
+        self.covered_years = frozenset(day.year for day in self.holidays)
+        self._warned_years = set()
+
+    def covers(self, year: int) -> bool:
+        """Whether the holiday data includes `year`."""
+        return year in self.covered_years
+
+    def is_trading_day(self, day: Any) -> bool:
+        day = _to_day(day)
+        if day.weekday() >= 5:
+            return False
+        if day.year not in self.covered_years and day.year not in self._warned_years:
+            self._warned_years.add(day.year)
+            logger.warning(
+                f"No {self.exchange} holidays for {day.year} in the holiday calendar: its holidays count as "
+                f"trading days, so expected bar counts are too high (update vn_market_holidays.json)"
+            )
+        return day not in self.holidays
+
+    def trading_days(self, start: Any, end: Any) -> List[date]:
+        """Trading days in [start, end], inclusive."""
+        day, end = _to_day(start), _to_day(end)
+        days = []
+        while day <= end:
+            if self.is_trading_day(day):
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    def next_trading_day(self, day: Any, inclusive: bool = False) -> date:
+        day = _to_day(day)
+        if not inclusive:
+            day += timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return day
+
+    def previous_trading_day(self, day: Any, inclusive: bool = False) -> date:
+        day = _to_day(day)
+        if not inclusive:
+            day -= timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    @property
+    def open_minute(self) -> int:
+        return self.phases[0][1]
+
+    @property
+    def close_minute(self) -> int:
+        return self.phases[-1][2]
+
+    def phase(self, now: datetime) -> str:
+        """
+        Session phase at exchange-local time `now`.
+
+        Returns:
+            One of pre_open, ato, continuous, lunch_break, atc, put_through,
+            closed (after the close, or on a non-trading day)
+        """
+        if not self.is_trading_day(now):
+            return 'closed'
+        minute = now.hour * 60 + now.minute
+        if minute < self.open_minute:
+            return 'pre_open'
+        for name, start, end in self.phases:
+            if start <= minute < end:
+                return name
+        return 'closed'
+
+    def _next_change(self, now: datetime) -> datetime:
+        """Next time the phase changes after `now`."""
+        if self.is_trading_day(now):
+            minute = now.hour * 60 + now.minute
+            for _, start, end in self.phases:
+                for boundary in (start, end):
+                    if boundary > minute:
+                        return datetime.combine(now.date(), time()) + timedelta(minutes=boundary)
+        return self._session_start(self.next_trading_day(now))
+
+    def _session_start(self, day: date) -> datetime:
+        return datetime.combine(day, time()) + timedelta(minutes=self.open_minute)
+
+    def status(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Market status at exchange-local time `now` (default: the current time).
+
+        Returns:
+            Dictionary with is_open, phase, trading-day flags, the next open and
+            the next phase change (when a cached status goes stale)
+        """
+        now = now or exchange_now()
+        phase = self.phase(now)
+        is_weekday = now.weekday() < 5
+        is_trading_day = self.is_trading_day(now)
+
+        if is_trading_day and now.hour * 60 + now.minute < self.open_minute:
+            next_open = self._session_start(now.date())
+        else:
+            next_open = self._session_start(self.next_trading_day(now))
+
+        return {
+            'is_open': phase in OPEN_PHASES,
+            'phase': phase,
+            'is_weekday': is_weekday,
+            'is_trading_day': is_trading_day,
+            'is_holiday': is_weekday and not is_trading_day,
+            'exchange': self.exchange,
+            'current_time': now.isoformat(),
+            'next_open': next_open.isoformat(),
+            'next_change': self._next_change(now).isoformat(),
+            'trading_hours': '09:00-15:00',
+            'timezone': EXCHANGE_TIMEZONE,
+        }
+
+    def clamp(self, from_date: Any, to_date: Any, now: Optional[datetime] = None) -> Optional[Tuple[date, date]]:
+        """
+        Narrow [from_date, to_date] to the trading days that can have bars.
+
+        Today only counts once its first session has started.
+
+        Returns:
+            (first trading day, last trading day), or None when the window has no trading
+        """
+        now = now or exchange_now()
+        start, end = _to_day(from_date), _to_day(to_date)
+        if end >= now.date() and now.hour * 60 + now.minute < self.open_minute:
+            end = now.date() - timedelta(days=1)
+        end = min(end, now.date())
+        if start > end:
+            return None
+        first = self.next_trading_day(start, inclusive=True)
+        if first > end:
+            return None
+        return first, self.previous_trading_day(end, inclusive=True)
+
+    def expected_bars(self, timeframe: str, from_date: Any, to_date: Any, now: Optional[datetime] = None) -> int:
+        """
+        Number of bars one ticker should have in [from_date, to_date].
+
+        On the current day only bars that have already started are counted.
+        """
+        now = now or exchange_now()
+        slots = bar_slots(timeframe)
+        clamped = self.clamp(from_date, to_date, now)
+        if clamped is None:
+            return 0
+        days = self.trading_days(*clamped)
+        count = len(days) * len(slots)
+        if days and days[-1] == now.date():
+            minute = now.hour * 60 + now.minute
+            count -= sum(1 for slot in slots if slot > minute)
+        return count
+
+    def next_bar_start(self, timeframe: str, after: datetime) -> datetime:
+        """Start of the first `timeframe` bar strictly after exchange-local time `after`."""
+        slots = bar_slots(timeframe)
+        midnight = datetime.combine(after.date(), time())
+        if self.is_trading_day(after):
+            for slot in slots:
+                start = midnight + timedelta(minutes=slot)
+                if start > after:
+                    return start
+        return datetime.combine(self.next_trading_day(after), time()) + timedelta(minutes=slots[0])
+
+    def has_bars_after(
+        self,
+        timeframe: str,
+        after: datetime,
+        to_date: Any = None,
+        now: Optional[datetime] = None
+    ) -> bool:
+        """
+        Whether a `timeframe` bar newer than `after` can exist by `now` (and by `to_date`).
+
+        Used to skip incremental fetches of tickers that are already up to date.
+        """
+        now = now or exchange_now()
+        start = self.next_bar_start(timeframe, after)
+        if to_date and start.date() > _to_day(to_date):
+            return False
+        if timeframe == '1d':
+            # A daily bar exists once its first session has started
+            return start + timedelta(minutes=self.open_minute) <= now
+        return start <= now
+
+    def describe(
+        self,
+        from_date: Any,
+        to_date: Any,
+        timeframes: Iterable[str] = ('1m', '15m', '1h', '4h', '1d'),
+        now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Trading days and expected bar counts of a date window, for the trading-calendar action.
+
+        Returns:
+            Dictionary with has_trading, the clamped from/to dates, the trading
+            days, the expected bars per ticker for each timeframe, and the
+            years of the window missing from the holiday data
+        """
+        now = now or exchange_now()
+        clamped = self.clamp(from_date, to_date, now)
+        days = self.trading_days(*clamped) if clamped else []
+        years = range(_to_day(from_date).year, _to_day(to_date).year + 1)
+        return {
+            'exchange': self.exchange,
+            'holidays_missing_for': [year for year in years if not self.covers(year)],
+            'has_trading': bool(days),
+            'from_date': clamped[0].isoformat() if clamped else None,
+            'to_date': clamped[1].isoformat() if clamped else None,
+            'trading_days': [day.isoformat() for day in days],
+            'expected_bars': {tf: self.expected_bars(tf, from_date, to_date, now) for tf in timeframes},
+        }
+
+
+_default_calendar: Optional[TradingCalendar] = None
+
+
+def get_calendar() -> TradingCalendar:
+    """Shared HOSE calendar with the configured holiday file, loaded on first use."""
+    global _default_calendar
+    if _default_calendar is None:
+        _default_calendar = TradingCalendar()
+    return _default_calendar
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Per-ticker watermarks for incremental historical fetches (`--since`).
+
+A watermark map gives the last stored bar time of every ticker:
+
+    {"VIC": "2025-06-02T14:29:00", "FPT": 1748849340000, "HPG": null}
+
+or one such map per timeframe, to bring several collections up to date at once:
+
+    {"1m": {"VIC": "2025-06-02T14:29:00"}, "15m": {"VIC": "2025-06-02T14:15:00"}}
+
+Values are ISO timestamps (naive ones are host-local, like the bars' own
+timestamps; "Z" and offsets are honored, so JSON-encoded JavaScript Dates
+work), epoch milliseconds, or null for a ticker with nothing stored yet.
+
+Tickers whose watermarks lie within a tolerance of each other share one
+upstream call, starting at the first bar after the oldest of them. Every
+ticker then only gets bars strictly newer than its own watermark; the older
+rows are dropped as arrays before any conversion. Groups that cannot have a
+new bar yet (after the close, weekends, holidays) are not fetched at all.
+"""
+
+import sys
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import INTRADAY_MINUTES, bar_slots, get_calendar
+
+# Watermarks at most this many bars apart share an upstream call
+DEFAULT_TOLERANCE_BARS = 30
+
+Watermarks = Dict[str, Optional[float]]
+
+
+def parse_watermark(value: Any) -> Optional[float]:
+    """Epoch milliseconds of one watermark value (ISO string or epoch ms), or None."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid watermark: {value!r} (expected an ISO timestamp or epoch milliseconds)")
+    # Naive values are host-local, the same reading _timestamp_millis gives bar timestamps
+    return parsed.timestamp() * 1000
+
+
+def load_watermarks(source: Any, timeframe: str) -> Tuple[Dict[str, Watermarks], bool]:
+    """
+    Read a watermark map.
+
+    Args:
+        source: The map itself (serve mode), a JSON file path, or "-" for stdin
+        timeframe: Timeframe of a flat {ticker: watermark} map
+
+    Returns:
+        ({timeframe: {TICKER: epoch ms or None}}, whether the map was keyed by timeframe)
+    """
+    if isinstance(source, str):
+        if source == '-':
+            source = json.load(sys.stdin)
+        else:
+            with open(source, encoding='utf-8') as f:
+                source = json.load(f)
+    if not isinstance(source, dict):
+        raise ValueError("--since must be a JSON object of ticker -> last stored timestamp")
+
+    nested = bool(source) and all(
+        key in INTRADAY_MINUTES or key == '1d' for key in source
+    ) and all(isinstance(value, dict) for value in source.values())
+    by_timeframe = source if nested else {timeframe: source}
+
+    return {
+        tf: {str(ticker).strip().upper(): parse_watermark(value) for ticker, value in marks.items()}
+        for tf, marks in by_timeframe.items()
+    }, nested
+
+
+def _local_time(millis: float) -> datetime:
+    return datetime.fromtimestamp(millis / 1000)
+
+
+def _range_start(timeframe: str, start: datetime) -> str:
+    """from_date for a fetch starting at bar `start`; whole days stay plain dates (bar cache friendly)."""
+    if timeframe == '1d' or start.hour * 60 + start.minute == bar_slots(timeframe)[0]:
+        return start.date().isoformat()
+    return start.strftime('%Y-%m-%d %H:%M')
+
+
+def plan_since_groups(
+    watermarks: Watermarks,
+    timeframe: str,
+    tolerance_bars: Optional[int] = None,
+    max_tickers: int = 50,
+    to_date: Optional[str] = None,
+    now: Optional[datetime] = None
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Group tickers with nearby watermarks into shared fetches.
+
+    Args:
+        watermarks: TICKER -> last stored bar (epoch ms), None when nothing is stored
+        timeframe: Bar timeframe of the watermarks
+        tolerance_bars: Max distance between watermarks of one group, in bars
+            (default DEFAULT_TOLERANCE_BARS)
+        max_tickers: Max tickers per group (the planner's chunk size)
+        to_date: Last day to fetch, if not today
+        now: Exchange-local current time (default: now)
+
+    Returns:
+        (groups, up-to-date tickers). Each group is {"tickers", "from_date"};
+        from_date is None for tickers without a watermark, which use the
+        request's normal date range.
+    """
+    calendar = get_calendar()
+    if tolerance_bars is None:
+        tolerance_bars = DEFAULT_TOLERANCE_BARS
+    tolerance_ms = max(0, tolerance_bars) * (INTRADAY_MINUTES.get(timeframe) or 24 * 60) * 60000
+    max_tickers = max(1, max_tickers)
+
+    fresh = [ticker for ticker, mark in watermarks.items() if mark is None]
+    groups = [
+        {'tickers': fresh[i:i + max_tickers], 'from_date': None}
+        for i in range(0, len(fresh), max_tickers)
+    ]
+
+    up_to_date: List[str] = []
+    pending = []
+    for ticker, mark in watermarks.items():
+        if mark is None:
+            continue
+        if calendar.has_bars_after(timeframe, _local_time(mark), to_date, now):
+            pending.append((mark, ticker))
+        else:
+            up_to_date.append(ticker)
+
+    pending.sort()
+    start = 0
+    for end in range(1, len(pending) + 1):
+        if end == len(pending) or end - start >= max_tickers or pending[end][0] - pending[start][0] > tolerance_ms:
+            oldest = _local_time(pending[start][0])
+            groups.append({
+                'tickers': [ticker for _, ticker in pending[start:end]],
+                'from_date': _range_start(timeframe, calendar.next_bar_start(timeframe, oldest)),
+            })
+            start = end
+    return groups, up_to_date
+
+
+def newer_than(df: pd.DataFrame, stamps: np.ndarray, watermarks: Watermarks) -> np.ndarray:
+    """
+    Row mask of bars strictly newer than their ticker's watermark.
+
+    Args:
+        df: Fetched frame (with a ticker column when it holds several tickers)
+        stamps: Epoch milliseconds of its rows, NaN where unparseable
+        watermarks: TICKER -> epoch ms or None
+
+    Rows of tickers without a watermark are all kept.
+    """
+    if 'ticker' in df.columns:
+        marks = df['ticker'].map(watermarks).to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        mark = next(iter(watermarks.values()), None)
+        marks = np.full(len(df), np.nan if mark is None else mark)
+    return ~(stamps <= marks) & ~np.isnan(stamps)
@@ -0,0 +1,179 @@
+import { Readable } from 'stream';
+
+/**
+ * One ticker (and timeframe, for --derive) of columnar fetcher output.
+ * Every column holds `count` float64 values; `timestamp` is epoch milliseconds
+ * and indicator columns are NaN where the JSON output omits the field.
+ */
+export interface ColumnarBatch {
+  ticker: string;
+  timeframe: string | null;
+  count: number;
+  columns: Record<string, Float64Array>;
+}
+
+/**
+ * View little-endian float64 bytes as a Float64Array, copying only when the
+ * bytes are not 8-byte aligned inside their buffer.
+ */
+function toFloat64Array(bytes: Uint8Array): Float64Array {
+  const count = bytes.byteLength / 8;
+  if (bytes.byteOffset % 8 === 0) {
+    return new Float64Array(bytes.buffer, bytes.byteOffset, count);
+  }
+  return new Float64Array(new Uint8Array(bytes).buffer, 0, count);
+}
+
+/**
+ * Minimal MessagePack decoder for the subset written by the fetcher
+ * (maps, strings, binary, integers, floats, booleans and nil).
+ * Binary values are returned as views into the input buffer.
+ */
+class MsgpackDecoder {
+  private offset = 0;
+
+  constructor(private readonly buffer: Buffer) {}
+
+  get done(): boolean {
+    return this.offset >= this.buffer.length;
+  }
+
+  decode(): any {
+    const type = this.buffer[this.offset++];
+
+    if (type <= 0x7f) return type;
+    if (type >= 0xe0) return type - 0x100;
+    if ((type & 0xf0) === 0x80) return this.map(type & 0x0f);
+    if ((type & 0xf0) === 0x90) return this.array(type & 0x0f);
+    if ((type & 0xe0) === 0xa0) return this.str(type & 0x1f);
+
+    switch (type) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return this.bin(this.uint(1));
+      case 0xc5: return this.bin(this.uint(2));
+      case 0xc6: return this.bin(this.uint(4));
+      case 0xca: return this.read(4, (o) => this.buffer.readFloatBE(o));
+      case 0xcb: return this.read(8, (o) => this.buffer.readDoubleBE(o));
+      case 0xcc: return this.uint(1);
+      case 0xcd: return this.uint(2);
+      case 0xce: return this.uint(4);
+      case 0xcf: return this.read(8, (o) => Number(this.buffer.readBigUInt64BE(o)));
+      case 0xd0: return this.read(1, (o) => this.buffer.readInt8(o));
+      case 0xd1: return this.read(2, (o) => this.buffer.readInt16BE(o));
+      case 0xd2: return this.read(4, (o) => this.buffer.readInt32BE(o));
+      case 0xd3: return this.read(8, (o) => Number(this.buffer.readBigInt64BE(o)));
+      case 0xd9: return this.str(this.uint(1));
+      case 0xda: return this.str(this.uint(2));
+      case 0xdb: return this.str(this.uint(4));
+      case 0xdc: return this.array(this.uint(2));
+      case 0xdd: return this.array(this.uint(4));
+      case 0xde: return this.map(this.uint(2));
+      case 0xdf: return this.map(this.uint(4));
+      default:
+        throw new Error(`Unsupported MessagePack type 0x${type.toString(16)} at offset ${this.offset - 1}`);
+    }
+  }
+
+  private read<T>(size: number, reader: (offset: number) => T): T {
+    if (this.offset + size > this.buffer.length) {
+      throw new Error('Truncated MessagePack data');
+    }
+    const value = reader(this.offset);
+    this.offset += size;
+    return value;
+  }
+
+  private uint(size: number): number {
+    return this.read(size, (o) => this.buffer.readUIntBE(o, size));
+  }
+
+  private str(length: number): string {
+    return this.read(length, (o) => this.buffer.toString('utf8', o, o + length));
+  }
+
+  private bin(length: number): Uint8Array {
+    return this.read(length, (o) => this.buffer.subarray(o, o + length));
+  }
+
+  private array(length: number): any[] {
+    const out = new Array(length);
+    for (let i = 0; i < length; i++) {
+      out[i] = this.decode();
+    }
+    return out;
+  }
+
+  private map(length: number): Record<string, any> {
+    const out: Record<string, any> = {};
+    for (let i = 0; i < length; i++) {
+      const key = this.decode();
+      out[key] = this.decode();
+    }
+    return out;
+  }
+}
+
+/**
+ * Decode the complete `--format msgpack` output (one message per ticker).
+ */
+export function decodeMsgpackBatches(buffer: Buffer): ColumnarBatch[] {
+  const decoder = new MsgpackDecoder(buffer);
+  const batches: ColumnarBatch[] = [];
+
+  while (!decoder.done) {
+    const message = decoder.decode();
+    const columns: Record<string, Float64Array> = {};
+    for (const [name, bytes] of Object.entries(message.columns || {})) {
+      columns[name] = toFloat64Array(bytes as Uint8Array);
+    }
+    batches.push({
+      ticker: message.ticker,
+      timeframe: message.timeframe ?? null,
+      count: message.count,
+      columns,
+    });
+  }
+
+  return batches;
+}
+
+/**
+ * The optional `apache-arrow` package, or null when it is not installed
+ */
+export function loadArrow(): any | null {
+  try {
+    // Optional dependency, only loaded when Arrow output is enabled
+    // eslint-disable-next-line @typescript-eslint/no-require-imports
+    return require('apache-arrow');
+  } catch {
+    return null;
+  }
+}
+
+/**
+ * Read `--format arrow` output (an Arrow IPC stream, one record batch per ticker).
+ *
+ * @param arrow The `apache-arrow` module (see loadArrow)
+ */
+export async function* readArrowBatches(stream: Readable, arrow: any): AsyncGenerator<ColumnarBatch> {
+  const reader = await arrow.RecordBatchReader.from(stream);
+  for await (const batch of reader) {
+    if (batch.numRows === 0) {
+      continue;
+    }
+    const columns: Record<string, Float64Array> = {};
+    for (const field of batch.schema.fields) {
+      if (field.name !== 'ticker' && field.name !== 'timeframe') {
+        columns[field.name] = batch.getChild(field.name).toArray();
+      }
+    }
+    yield {
+      ticker: batch.getChild('ticker').get(0),
+      timeframe: batch.getChild('timeframe').get(0) ?? null,
+      count: batch.numRows,
+      columns,
+    };
+  }
+}
@@ -2,9 +2,89 @@ import { Injectable, Logger } from '@nestjs/common';
 import { ConfigService } from '@nestjs/config';
 import { spawn, ChildProcess } from 'child_process';
 import { IMarketDataPoint } from '../../common/interfaces/trading.interface';
+import { ColumnarBatch, decodeMsgpackBatches, loadArrow, readArrowBatches } from './fiinquant-columnar.decoder';
+import { Readable } from 'stream';
+import * as readline from 'readline';
 import * as path from 'path';
 import * as fs from 'fs';
 
+/**
+ * Write summary of a historical fetch stored by the Python Mongo sink (--sink mongo)
+ */
+export interface MongoSinkSummary {
+  success: boolean;
+  sink: 'mongo';
+  database: string;
+  tickers: number;
+  tickers_without_data: string[];
+  bars: number;
+  upserted: number;
+  modified: number;
+  batches: number;
+  write_errors: number;
+  errors: string[];
+  collections: { [collection: string]: { bars: number; upserted: number; modified: number; matched: number; write_errors: number } };
+  elapsed_ms: number;
+}
+
+/**
+ * Result of an adjusted-price revision check (--action check-adjustments, see adjustments.py)
+ */
+export interface AdjustmentCheckReport {
+  probe_from: string;
+  probe_to: string;
+  checked: number;
+  unchanged: number;
+  changed: {
+    [ticker: string]: {
+      status: 'adjusted' | 'revised';
+      price_factor?: number;
+      volume_factor?: number;
+      verified_through: string;
+    };
+  };
+  new: string[];
+  unverified: string[];
+  missing: string[];
+  elapsed_ms: number;
+  applied?: {
+    tickers: { [ticker: string]: Record<string, any> };
+    rebuilt: Array<{ timeframe: string; from_date: string; tickers: string[]; bars?: number; write_errors?: number; error?: string }>;
+  };
+}
+
+/**
+ * Options of a vectorized backtest run by the Python fetcher (--action backtest, see backtest.py)
+ */
+export interface VectorizedBacktestOptions {
+  tickers: string[];
+  timeframe?: string;
+  fromDate?: string;
+  toDate?: string;
+  /** Only the last N bars per ticker */
+  limit?: number;
+  /** Strategy parameters (backtest.py DEFAULT_PARAMS names); array values are swept as a grid */
+  params?: { [name: string]: number | number[] };
+  /** Worker processes for parameter grids (default: CPU count) */
+  workers?: number;
+  includeTrades?: boolean;
+}
+
+/**
+ * Per-stage timings and counters of one fetcher action (FIINQUANT_METRICS, see fetch_metrics.py)
+ */
+export interface FetcherMetricsRecord {
+  action: string;
+  success: boolean;
+  elapsed_ms: number;
+  stages: { [stage: string]: { ms: number; calls: number } };
+  counters: { [counter: string]: number };
+  tickers: { [ticker: string]: { rows_in: number; rows_out: number } };
+  ticker_count: number;
+  peak_rss_bytes: number | null;
+  profile?: Record<string, any>;
+}
+
 @Injectable()
 export class FiinQuantDataService {
   private readonly logger = new Logger(FiinQuantDataService.name);
@@ -12,6 +92,28 @@ export class FiinQuantDataService {
   private readonly pythonScriptPath: string;
   private readonly venvPath: string;
   private readonly pythonExecutable: string;
+  private readonly serveModeEnabled: boolean;
+  private readonly outputFormat: 'json' | 'msgpack' | 'arrow';
+  private readonly arrow: any | null;
+  private serveProcess: ChildProcess | null = null;
+  private nextServeRequestId = 1;
+  private readonly pendingServeRequests = new Map<number, {
+    resolve: (data: any) => void;
+    reject: (error: Error) => void;
+    timer: NodeJS.Timeout;
+  }>();
+  private readonly latestBatchWindowMs: number;
+  // Latest-quote batch still collecting tickers, and tickers already being fetched
+  private pendingLatestBatch: {
+    tickers: Set<string>;
+    promise: Promise<{ [ticker: string]: IMarketDataPoint }>;
+  } | null = null;
+  private readonly inFlightLatest = new Map<string, Promise<{ [ticker: string]: IMarketDataPoint }>>();
+  private readonly latestStats = { requests: 0, tickers: 0, coalescedTickers: 0, fetcherCalls: 0 };
+  // Last market-status result, valid until the exchange's next phase change
+  private marketStatusCache: { status: any; expiresAt: number } | null = null;
+  // Latest fetcher metrics record per action, when FIINQUANT_METRICS includes "stderr"
+  private readonly fetcherMetrics = new Map<string, FetcherMetricsRecord>();
 
   constructor(private readonly configService: ConfigService) {
     // Path to Python script for FiinQuant data fetching
@@ -20,6 +122,22 @@ export class FiinQuantDataService {
     // Python virtual environment configuration
     this.venvPath = process.env.PYTHON_VENV_PATH || path.join(process.cwd(), 'python-services', 'venv');
     this.pythonExecutable = this.getPythonExecutable();
+
+    // Keep one long-running fetcher process instead of spawning one per call
+    this.serveModeEnabled = process.env.FIINQUANT_SERVE_MODE === 'true';
+
+    // Binary columnar output for historical pulls (JSON stays the default)
+    const outputFormat = process.env.FIINQUANT_OUTPUT_FORMAT || 'json';
+    this.outputFormat = outputFormat === 'msgpack' || outputFormat === 'arrow' ? outputFormat : 'json';
+    this.arrow = this.outputFormat === 'arrow' ? loadArrow() : null;
+    if (this.outputFormat === 'arrow' && !this.arrow) {
+      this.logger.warn('FIINQUANT_OUTPUT_FORMAT=arrow requires the apache-arrow package (npm install apache-arrow); using json');
+      this.outputFormat = 'json';
+    }
+
+    // Latest-quote requests arriving within this window share one fetcher call
+    const latestBatchWindowMs = Number(process.env.FIINQUANT_LATEST_BATCH_MS ?? 10);
+    this.latestBatchWindowMs = Number.isFinite(latestBatchWindowMs) && latestBatchWindowMs >= 0 ? latestBatchWindowMs : 10;
   }
 
   /**
@@ -72,6 +190,281 @@ export class FiinQuantDataService {
     return env;
   }
 
+  /**
+   * Map a fetcher bar (snake_case JSON) to IMarketDataPoint
+   */
+  private toMarketDataPoint(ticker: string, row: any, timeframe: string): IMarketDataPoint {
+    const point: IMarketDataPoint = {
+      ticker,
+      timestamp: new Date(row.timestamp),
+      timeframe,
+      open: row.open,
+      high: row.high,
+      low: row.low,
+      close: row.close,
+      volume: row.volume,
+      change: row.change,
+      changePercent: row.change_percent,
+      totalMatchValue: row.total_match_value,
+      foreignBuyVolume: row.foreign_buy_volume,
+      foreignSellVolume: row.foreign_sell_volume,
+      matchVolume: row.match_volume,
+    };
+
+    // Indicator fields are only present when requested with --indicators
+    if (row.rsi !== undefined) point.rsi = row.rsi;
+    if (row.psar !== undefined) {
+      point.psar = row.psar;
+      point.psarTrend = row.psar_trend;
+      point.priceVsPsar = row.price_vs_psar;
+    }
+    if (row.engulfing_pattern !== undefined) point.engulfingPattern = row.engulfing_pattern;
+    if (row.avg_volume_20 !== undefined) {
+      point.avgVolume20 = row.avg_volume_20;
+      point.volumeAnomaly = row.volume_anomaly;
+    }
+
+    return point;
+  }
+
+  /**
+   * Map one columnar batch (--format msgpack|arrow) to IMarketDataPoint objects
+   */
+  private columnarBatchToPoints(batch: ColumnarBatch, timeframe: string): IMarketDataPoint[] {
+    const c = batch.columns;
+    const points: IMarketDataPoint[] = new Array(batch.count);
+
+    for (let i = 0; i < batch.count; i++) {
+      const point: IMarketDataPoint = {
+        ticker: batch.ticker,
+        timestamp: new Date(c.timestamp[i]),
+        timeframe,
+        open: c.open[i],
+        high: c.high[i],
+        low: c.low[i],
+        close: c.close[i],
+        volume: c.volume[i],
+        change: c.change[i],
+        changePercent: c.change_percent[i],
+        totalMatchValue: c.total_match_value[i],
+        foreignBuyVolume: c.foreign_buy_volume[i],
+        foreignSellVolume: c.foreign_sell_volume[i],
+        matchVolume: c.volume[i],
+      };
+
+      // Indicator columns hold NaN where the JSON output would omit the field
+      if (c.rsi && !Number.isNaN(c.rsi[i])) point.rsi = c.rsi[i];
+      if (c.psar && !Number.isNaN(c.psar[i])) {
+        point.psar = c.psar[i];
+        point.psarTrend = c.psar_trend[i] === 1 ? 'up' : 'down';
+        point.priceVsPsar = c.price_vs_psar[i] === 1;
+      }
+      if (c.engulfing_pattern && !Number.isNaN(c.engulfing_pattern[i])) point.engulfingPattern = c.engulfing_pattern[i];
+      if (c.avg_volume_20 && !Number.isNaN(c.avg_volume_20[i])) {
+        point.avgVolume20 = c.avg_volume_20[i];
+        point.volumeAnomaly = c.volume_anomaly[i] === 1;
+      }
+
+      points[i] = point;
+    }
+
+    return points;
+  }
+
+  /**
+   * Convert a historical fetcher result to IMarketDataPoint arrays per ticker
+   */
+  private formatHistoricalResult(result: any, timeframe: string): { [ticker: string]: IMarketDataPoint[] } {
+    const formattedResult: { [ticker: string]: IMarketDataPoint[] } = {};
+
+    for (const [ticker, data] of Object.entries(result)) {
+      if (Array.isArray(data)) {
+        formattedResult[ticker] = (data as any[]).map(row => this.toMarketDataPoint(ticker, row, timeframe));
+      }
+    }
+
+    return formattedResult;
+  }
+
+  /**
+   * Parse newline-delimited JSON from a stream line by line as it arrives
+   */
+  private consumeNdjson(
+    stream: Readable,
+    onRecord: (record: any) => void,
+    onError: (error: Error) => void = (error) => this.logger.error('Failed to parse NDJSON line:', error),
+  ): void {
+    const lines = readline.createInterface({ input: stream, crlfDelay: Infinity });
+
+    lines.on('line', (line) => {
+      if (!line.trim()) {
+        return;
+      }
+
+      try {
+        onRecord(JSON.parse(line));
+      } catch (error) {
+        onError(error);
+      }
+    });
+  }
+
+  /**
+   * Start the long-running `--action serve` fetcher process if it is not running
+   */
+  private getServeProcess(): ChildProcess {
+    if (this.serveProcess) {
+      if (this.serveProcess.exitCode === null && this.serveProcess.stdin!.writable) {
+        return this.serveProcess;
+      }
+      // Exited, but its 'close' event has not been handled yet
+      this.serveProcess = null;
+      this.failServeRequests('Python serve process exited');
+    }
+
+    const serveProcess = spawn(this.pythonExecutable, [this.pythonScriptPath, '--action', 'serve'], {
+      stdio: ['pipe', 'pipe', 'pipe'],
+      env: this.createPythonEnv(),
+    });
+
+    this.consumeNdjson(serveProcess.stdout!, (response) => this.handleServeResponse(response), (error) => {
+      this.logger.error('Failed to parse serve response:', error);
+    });
+
+    serveProcess.stderr!.on('data', (data) => {
+      this.logger.debug(`Python serve stderr: ${data.toString()}`);
+    });
+
+    // Pending requests all belong to the current process; once it has been
+    // replaced they were failed already and belong to its successor
+    const failPending = (reason: string) => {
+      if (this.serveProcess === serveProcess) {
+        this.serveProcess = null;
+        this.failServeRequests(reason);
+      }
+    };
+
+    serveProcess.on('close', (code) => {
+      this.logger.warn(`Python serve process exited with code ${code}`);
+      failPending(`Python serve process exited with code ${code}`);
+    });
+
+    serveProcess.on('error', (error) => {
+      this.logger.error('Python serve process error:', error);
+      failPending(error.message);
+    });
+
+    // Writing to a process that already exited fails with EPIPE on stdin
+    serveProcess.stdin!.on('error', (error) => {
+      this.logger.error('Python serve stdin error:', error);
+      failPending(`Python serve process is not accepting requests: ${error.message}`);
+    });
+
+    this.serveProcess = serveProcess;
+    this.logger.log('Started Python fetcher in serve mode');
+    return serveProcess;
+  }
+
+  /**
+   * Reject every request waiting for a serve response
+   */
+  private failServeRequests(reason: string): void {
+    for (const [id, pending] of this.pendingServeRequests) {
+      clearTimeout(pending.timer);
+      pending.reject(new Error(reason));
+      this.pendingServeRequests.delete(id);
+    }
+  }
+
+  /**
+   * Route a response from the serve process to its caller
+   */
+  private handleServeResponse(response: any): void {
+    const pending = this.pendingServeRequests.get(response.id);
+    if (!pending) {
+      this.logger.warn(`Dropping serve response for unknown request id ${response.id}`);
+      return;
+    }
+
+    clearTimeout(pending.timer);
+    this.pendingServeRequests.delete(response.id);
+    if (response.metrics) {
+      this.recordFetcherMetrics(response.metrics);
+    }
+
+    if (response.success) {
+      pending.resolve(response.data);
+    } else {
+      pending.reject(new Error(response.error || 'Python serve request failed'));
+    }
+  }
+
+  /**
+   * Keep the metrics records a one-shot fetcher run printed on stderr
+   */
+  private forwardMetrics(stderr: string): void {
+    for (const line of stderr.split('\n')) {
+      if (!line.startsWith('{"metrics":')) {
+        continue;
+      }
+      try {
+        this.recordFetcherMetrics(JSON.parse(line).metrics);
+      } catch {
+        // A record split across stderr chunks is only a lost sample
+      }
+    }
+  }
+
+  private recordFetcherMetrics(record: FetcherMetricsRecord): void {
+    this.fetcherMetrics.set(record.action, record);
+    const stages = Object.entries(record.stages)
+      .map(([stage, timing]) => `${stage}=${timing.ms}ms`)
+      .join(' ');
+    this.logger.debug(`Fetcher ${record.action} metrics: ${record.elapsed_ms}ms total, ${stages}`);
+  }
+
+  /**
+   * Latest per-stage timings and counters reported by the fetcher, keyed by action
+   */
+  getFetcherMetrics(): { [action: string]: FetcherMetricsRecord } {
+    return Object.fromEntries(this.fetcherMetrics);
+  }
+
+  /**
+   * Send one request to the serve process and wait for its response
+   */
+  private requestFromServer(action: string, params: Record<string, any>, timeoutMs: number): Promise<any> {
+    return new Promise((resolve, reject) => {
+      const serveProcess = this.getServeProcess();
+      if (!serveProcess.stdin!.writable) {
+        reject(new Error(`Python serve process is not accepting requests (${action})`));
+        return;
+      }
+      const id = this.nextServeRequestId++;
+
+      const timer = setTimeout(() => {
+        if (this.pendingServeRequests.delete(id)) {
+          reject(new Error(`Python serve request ${action} timeout`));
+        }
+      }, timeoutMs);
+
+      this.pendingServeRequests.set(id, { resolve, reject, timer });
+      serveProcess.stdin!.write(JSON.stringify({ id, action, params }) + '\n');
+    });
+  }
+
+  /**
+   * Stop the serve process
+   */
+  private stopServeProcess(): void {
+    if (this.serveProcess) {
+      this.serveProcess.stdin!.end();
+      this.serveProcess.kill('SIGTERM');
+      this.serveProcess = null;
+      this.failServeRequests('Python serve process stopped');
+    }
+  }
+
   /**
    * Fetch historical data from FiinQuant via Python script
    */
@@ -80,7 +473,356 @@ export class FiinQuantDataService {
     timeframe: string = '15m',
     period: number = 100,
     fromDate?: string,
-    toDate?: string
+    toDate?: string,
+    indicators?: string[]
+  ): Promise<{ [ticker: string]: IMarketDataPoint[] }> {
+    if (this.serveModeEnabled) {
+      const result = await this.requestFromServer('historical', {
+        tickers,
+        timeframe,
+        period,
+        from_date: fromDate,
+        to_date: toDate,
+        indicators,
+      }, 30000);
+      return this.formatHistoricalResult(result, timeframe);
+    }
+
+    if (this.outputFormat !== 'json') {
+      return this.fetchHistoricalColumnar(tickers, timeframe, period, fromDate, toDate, indicators);
+    }
+
+    const args = [
+      this.pythonScriptPath,
+      '--action', 'historical',
+      '--tickers', tickers.join(','),
+      '--timeframe', timeframe,
+      '--period', period.toString(),
+      '--output', 'ndjson',
+    ];
+
+    if (fromDate) {
+      args.push('--from-date', fromDate);
+    }
+    if (toDate) {
+      args.push('--to-date', toDate);
+    }
+    if (indicators && indicators.length > 0) {
+      // Computed for all tickers at once in Python (same defaults as calculateAllIndicators)
+      args.push('--indicators', indicators.join(','));
+    }
+
+    return this.runHistoricalNdjson(args, tickers, timeframe);
+  }
+
+  /**
+   * Fetch only the bars newer than each ticker's last stored bar (`--since` watermarks).
+   * Tickers with nearby watermarks share one upstream call and up-to-date tickers
+   * are not fetched at all; a null watermark fetches the default range (30 days).
+   */
+  async fetchHistoricalSince(
+    watermarks: { [ticker: string]: Date | null },
+    timeframe: string = '15m'
+  ): Promise<{ [ticker: string]: IMarketDataPoint[] }> {
+    const since = Object.fromEntries(
+      Object.entries(watermarks).map(([ticker, date]) => [ticker, date ? date.toISOString() : null])
+    );
+    const timeoutMs = this.sinceTimeoutMs(watermarks);
+
+    if (this.serveModeEnabled) {
+      const result = await this.requestFromServer('historical', { timeframe, since }, timeoutMs);
+      return this.formatHistoricalResult(result, timeframe);
+    }
+
+    const args = [
+      this.pythonScriptPath,
+      '--action', 'historical',
+      '--timeframe', timeframe,
+      '--since', '-',
+      '--output', 'ndjson',
+    ];
+    return this.runHistoricalNdjson(args, Object.keys(watermarks), timeframe, JSON.stringify(since), timeoutMs);
+  }
+
+  /**
+   * Time allowed for one `--since` fetch: up-to-date tickers cost little, while
+   * tickers without a watermark backfill the default range
+   */
+  private sinceTimeoutMs(watermarks: { [ticker: string]: Date | null }): number {
+    const tickers = Object.keys(watermarks).length;
+    const backfills = Object.values(watermarks).filter((date) => !date).length;
+    return 30000 + tickers * 200 + backfills * 2000;
+  }
+
+  /**
+   * Run a one-shot historical fetch with NDJSON output and collect its bars per ticker
+   */
+  private runHistoricalNdjson(
+    args: string[],
+    tickers: string[],
+    timeframe: string,
+    input?: string,
+    timeoutMs: number = 30000
+  ): Promise<{ [ticker: string]: IMarketDataPoint[] }> {
+    return new Promise((resolve, reject) => {
+      this.logger.debug(`Executing Python script: ${this.pythonExecutable} ${args.join(' ')}`);
+
+      const pythonProcess = spawn(this.pythonExecutable, args, {
+        stdio: ['pipe', 'pipe', 'pipe'],
+        env: this.createPythonEnv(),
+      });
+
+      // Bars arrive as NDJSON (one bar per line, flushed per ticker) and are
+      // converted as they come instead of buffering the whole output
+      const formattedResult: { [ticker: string]: IMarketDataPoint[] } = {};
+      for (const ticker of tickers) {
+        formattedResult[ticker] = [];
+      }
+
+      let stderr = '';
+      let parseError: Error | null = null;
+
+      this.consumeNdjson(pythonProcess.stdout, (row) => {
+        if (row.success === false) {
+          parseError = new Error(row.error || 'Python script reported an error');
+          return;
+        }
+        if (!formattedResult[row.ticker]) {
+          formattedResult[row.ticker] = [];
+        }
+        formattedResult[row.ticker].push(this.toMarketDataPoint(row.ticker, row, timeframe));
+      }, (error) => {
+        parseError = error;
+      });
+
+      pythonProcess.stderr.on('data', (data) => {
+        stderr += data.toString();
+        this.logger.warn(`Python script stderr: ${data.toString()}`);
+      });
+
+      pythonProcess.on('close', (code) => {
+        this.forwardMetrics(stderr);
+        if (code === 0 && !parseError) {
+          this.logger.debug(`Fetched data for ${Object.keys(formattedResult).length} tickers`);
+          resolve(formattedResult);
+        } else if (code === 0) {
+          this.logger.error('Failed to parse Python script output:', parseError);
+          reject(new Error(`Failed to parse data: ${parseError!.message}`));
+        } else {
+          this.logger.error(`Python script exited with code ${code}`);
+          this.logger.error('stderr:', stderr);
+          reject(new Error(`Python script failed with code ${code}: ${stderr}`));
+        }
+      });
+
+      pythonProcess.on('error', (error) => {
+        this.logger.error('Failed to start Python script:', error);
+        reject(error);
+      });
+
+      // A fetcher that exits before reading stdin (bad arguments, missing module)
+      // makes the write fail with EPIPE; its exit code and stderr are reported on 'close'
+      pythonProcess.stdin.on('error', (error) => {
+        this.logger.warn(`Python script stdin error: ${error.message}`);
+      });
+
+      // The watermark map goes in on stdin (`--since -`), however many tickers it has
+      pythonProcess.stdin.end(input);
+
+      const timer = setTimeout(() => {
+        pythonProcess.kill();
+        reject(new Error(`Python script timeout after ${timeoutMs}ms`));
+      }, timeoutMs);
+      pythonProcess.on('close', () => clearTimeout(timer));
+    });
+  }
+
+  /**
+   * Run a one-shot fetcher action that prints one JSON document and return it parsed.
+   * Rejects with the fetcher's `error` (or its stderr) when it fails, and kills it
+   * after `timeoutMs`.
+   */
+  private runPythonJson(args: string[], timeoutMs: number, label: string): Promise<any> {
+    return new Promise((resolve, reject) => {
+      this.logger.debug(`Executing Python script: ${this.pythonExecutable} ${args.join(' ')}`);
+
+      const pythonProcess = spawn(this.pythonExecutable, args, {
+        stdio: ['pipe', 'pipe', 'pipe'],
+        env: this.createPythonEnv(),
+      });
+
+      const timer = setTimeout(() => {
+        pythonProcess.kill();
+        reject(new Error(`${label} timeout after ${timeoutMs}ms`));
+      }, timeoutMs);
+
+      let stdout = '';
+      let stderr = '';
+
+      pythonProcess.stdout.on('data', (data) => {
+        stdout += data.toString();
+      });
+
+      pythonProcess.stderr.on('data', (data) => {
+        stderr += data.toString();
+      });
+
+      pythonProcess.on('close', (code) => {
+        clearTimeout(timer);
+        this.forwardMetrics(stderr);
+        let result: any = null;
+        try {
+          result = JSON.parse(stdout);
+        } catch (error) {
+          if (code === 0) {
+            this.logger.error(`Failed to parse ${label} output:`, error);
+          }
+        }
+
+        if (code === 0 && result) {
+          resolve(result);
+        } else {
+          this.logger.error(`${label} failed with code ${code}: ${stderr}`);
+          reject(new Error(result?.error || `Python script failed with code ${code}: ${stderr}`));
+        }
+      });
+
+      pythonProcess.on('error', (error) => {
+        clearTimeout(timer);
+        this.logger.error('Failed to start Python script:', error);
+        reject(error);
+      });
+    });
+  }
+
+  /**
+   * Fetch historical data and let the Python fetcher upsert it straight into the
+   * stock-ss* collection for the timeframe (FIINQUANT_MONGO_SINK=true).
+   * Only a write summary comes back; no bars cross the process boundary.
+   */
+  async fetchAndStoreHistoricalData(
+    tickers: string[],
+    timeframe: string = '15m',
+    period: number = 100,
+    fromDate?: string,
+    toDate?: string,
+    indicators?: string[]
+  ): Promise<MongoSinkSummary> {
+    if (this.serveModeEnabled) {
+      return this.requestFromServer('historical', {
+        tickers,
+        timeframe,
+        period,
+        from_date: fromDate,
+        to_date: toDate,
+        indicators,
+        sink: 'mongo',
+      }, 120000);
+    }
+
+    const args = [
+      this.pythonScriptPath,
+      '--action', 'historical',
+      '--tickers', tickers.join(','),
+      '--timeframe', timeframe,
+      '--period', period.toString(),
+      '--sink', 'mongo',
+    ];
+
+    if (fromDate) {
+      args.push('--from-date', fromDate);
+    }
+    if (toDate) {
+      args.push('--to-date', toDate);
+    }
+    if (indicators && indicators.length > 0) {
+      args.push('--indicators', indicators.join(','));
+    }
+
+    // One call covers every ticker
+    return this.runPythonJson(args, 120000, 'Mongo sink run');
+  }
+
+  /**
+   * Compare recent adjusted daily closes with their stored fingerprints to find
+   * tickers hit by a dividend or split. With `apply`, the Python fetcher rescales
+   * their bars in the bar cache and the stock-ss* collections (or rebuilds them
+   * when no single factor explains the change) instead of refetching everything.
+   */
+  async checkPriceAdjustments(tickers: string[], apply: boolean = true): Promise<AdjustmentCheckReport> {
+    const args = [
+      this.pythonScriptPath,
+      '--action', 'check-adjustments',
+      '--tickers', tickers.join(','),
+    ];
+    if (apply) {
+      args.push('--apply', '--sink', 'mongo');
+    }
+
+    // Rebuilding revised tickers may refetch long histories
+    return this.runPythonJson(args, 600000, 'Adjustment check');
+  }
+
+  /**
+   * Backtest the RSI-PSAR-engulfing strategy over many tickers in one Python run.
+   * Signals, trades and statistics are computed as array operations on the fetched
+   * bars, and parameter grids are spread over a process pool; the result has the
+   * BacktestSummaryDto shape (best parameter set first, every run under `grid`).
+   */
+  async runVectorizedBacktest(options: VectorizedBacktestOptions): Promise<Record<string, any>> {
+    if (this.serveModeEnabled) {
+      return this.requestFromServer('backtest', {
+        tickers: options.tickers,
+        timeframe: options.timeframe || '15m',
+        from_date: options.fromDate,
+        to_date: options.toDate,
+        limit: options.limit,
+        backtest_params: options.params,
+        backtest_workers: options.workers,
+        include_trades: options.includeTrades,
+      }, 600000);
+    }
+
+    const args = [
+      this.pythonScriptPath,
+      '--action', 'backtest',
+      '--tickers', options.tickers.join(','),
+      '--timeframe', options.timeframe || '15m',
+    ];
+    if (options.fromDate) {
+      args.push('--from-date', options.fromDate);
+    }
+    if (options.toDate) {
+      args.push('--to-date', options.toDate);
+    }
+    if (options.limit) {
+      args.push('--limit', options.limit.toString());
+    }
+    if (options.params && Object.keys(options.params).length > 0) {
+      args.push('--backtest-params', JSON.stringify(options.params));
+    }
+    if (options.workers) {
+      args.push('--backtest-workers', options.workers.toString());
+    }
+    if (options.includeTrades) {
+      args.push('--include-trades');
+    }
+
+    // Large grids over the whole universe take a while even in parallel
+    return this.runPythonJson(args, 600000, 'Vectorized backtest');
+  }
+
+  /**
+   * Historical fetch using binary columnar output (FIINQUANT_OUTPUT_FORMAT=msgpack|arrow).
+   * Columns arrive as float64 arrays, so no numbers or dates are parsed from text.
+   */
+  private fetchHistoricalColumnar(
+    tickers: string[],
+    timeframe: string,
+    period: number,
+    fromDate?: string,
+    toDate?: string,
+    indicators?: string[]
   ): Promise<{ [ticker: string]: IMarketDataPoint[] }> {
     return new Promise((resolve, reject) => {
       const args = [
@@ -89,6 +831,7 @@ export class FiinQuantDataService {
         '--tickers', tickers.join(','),
         '--timeframe', timeframe,
         '--period', period.toString(),
+        '--format', this.outputFormat,
       ];
 
       if (fromDate) {
@@ -97,6 +840,9 @@ export class FiinQuantDataService {
       if (toDate) {
         args.push('--to-date', toDate);
       }
+      if (indicators && indicators.length > 0) {
+        args.push('--indicators', indicators.join(','));
+      }
 
       this.logger.debug(`Executing Python script: ${this.pythonExecutable} ${args.join(' ')}`);
 
@@ -105,54 +851,60 @@ export class FiinQuantDataService {
         env: this.createPythonEnv(),
       });
 
-      let stdout = '';
+      const formattedResult: { [ticker: string]: IMarketDataPoint[] } = {};
+      for (const ticker of tickers) {
+        formattedResult[ticker] = [];
+      }
+      // Long ranges arrive as several batches per ticker (one per time window), in time order
+      const addBatch = (batch: ColumnarBatch) => {
+        const points = formattedResult[batch.ticker] || (formattedResult[batch.ticker] = []);
+        for (const point of this.columnarBatchToPoints(batch, timeframe)) {
+          points.push(point);
+        }
+      };
+
       let stderr = '';
+      let decodeError: Error | null = null;
+      const chunks: Buffer[] = [];
 
-      pythonProcess.stdout.on('data', (data) => {
-        stdout += data.toString();
-      });
+      // Arrow batches are decoded as they stream in; MessagePack is decoded once complete
+      const arrowDone = this.outputFormat === 'arrow'
+        ? (async () => {
+            for await (const batch of readArrowBatches(pythonProcess.stdout, this.arrow)) {
+              addBatch(batch);
+            }
+          })().catch((error) => {
+            decodeError = error;
+            // Keep draining stdout so the process can exit and the error is reported
+            pythonProcess.stdout.resume();
+          })
+        : Promise.resolve();
+      if (this.outputFormat === 'msgpack') {
+        pythonProcess.stdout.on('data', (chunk: Buffer) => chunks.push(chunk));
+      }
 
       pythonProcess.stderr.on('data', (data) => {
         stderr += data.toString();
         this.logger.warn(`Python script stderr: ${data.toString()}`);
       });
 
-      pythonProcess.on('close', (code) => {
-        if (code === 0) {
+      pythonProcess.on('close', async (code) => {
+        await arrowDone;
+        this.forwardMetrics(stderr);
+        if (code === 0 && !decodeError && this.outputFormat === 'msgpack') {
           try {
-            const result = JSON.parse(stdout);
-            
-            // Convert to IMarketDataPoint format
-            const formattedResult: { [ticker: string]: IMarketDataPoint[] } = {};
-            
-            for (const [ticker, data] of Object.entries(result)) {
-              if (Array.isArray(data)) {
-                formattedResult[ticker] = (data as any[]).map(row => ({
-                  ticker,
-                  timestamp: new Date(row.timestamp),
-                  timeframe,
-                  open: row.open,
-                  high: row.high,
-                  low: row.low,
-                  close: row.close,
-                  volume: row.volume,
-                  change: row.change,
-                  changePercent: row.change_percent,
-                  totalMatchValue: row.total_match_value,
-                  foreignBuyVolume: row.foreign_buy_volume,
-                  foreignSellVolume: row.foreign_sell_volume,
-                  matchVolume: row.match_volume,
-                }));
-              }
-            }
-            
-            this.logger.debug(`Fetched data for ${Object.keys(formattedResult).length} tickers`);
-            resolve(formattedResult);
+            decodeMsgpackBatches(Buffer.concat(chunks)).forEach(addBatch);
           } catch (error) {
-            this.logger.error('Failed to parse Python script output:', error);
-            this.logger.error('Raw output:', stdout);
-            reject(new Error(`Failed to parse data: ${error.message}`));
+            decodeError = error as Error;
           }
+        }
+
+        if (code === 0 && !decodeError) {
+          this.logger.debug(`Fetched ${this.outputFormat} data for ${Object.keys(formattedResult).length} tickers`);
+          resolve(formattedResult);
+        } else if (code === 0) {
+          this.logger.error(`Failed to decode ${this.outputFormat} output:`, decodeError);
+          reject(new Error(`Failed to decode data: ${decodeError!.message}`));
         } else {
           this.logger.error(`Python script exited with code ${code}`);
           this.logger.error('stderr:', stderr);
@@ -166,77 +918,104 @@ export class FiinQuantDataService {
       });
 
       // Timeout after 30 seconds
-      setTimeout(() => {
-        if (!pythonProcess.killed) {
-          pythonProcess.kill();
-          reject(new Error('Python script timeout'));
-        }
+      const timer = setTimeout(() => {
+        pythonProcess.kill();
+        reject(new Error('Python script timeout'));
       }, 30000);
+      pythonProcess.on('close', () => clearTimeout(timer));
     });
   }
 
   /**
-   * Fetch latest data for specific ticker
+   * Fetch several timeframes at once from a single 1m pull.
+   * Higher timeframes are resampled in Python along HOSE sessions
+   * (buckets never cross the lunch break).
    */
-  async fetchLatestData(ticker: string): Promise<IMarketDataPoint | null> {
+  async fetchDerivedHistoricalData(
+    tickers: string[],
+    timeframes: string[],
+    fromDate?: string,
+    toDate?: string
+  ): Promise<{ [timeframe: string]: { [ticker: string]: IMarketDataPoint[] } }> {
+    const formattedResult: { [timeframe: string]: { [ticker: string]: IMarketDataPoint[] } } = {};
+    for (const timeframe of timeframes) {
+      formattedResult[timeframe] = {};
+      for (const ticker of tickers) {
+        formattedResult[timeframe][ticker] = [];
+      }
+    }
+
+    if (this.serveModeEnabled) {
+      const result = await this.requestFromServer('historical', {
+        tickers,
+        derive: timeframes,
+        from_date: fromDate,
+        to_date: toDate,
+      }, 60000);
+      for (const [timeframe, series] of Object.entries(result || {})) {
+        formattedResult[timeframe] = this.formatHistoricalResult(series, timeframe);
+      }
+      return formattedResult;
+    }
+
     return new Promise((resolve, reject) => {
       const args = [
         this.pythonScriptPath,
-        '--action', 'latest',
-        '--tickers', ticker,
+        '--action', 'historical',
+        '--tickers', tickers.join(','),
+        '--derive', timeframes.join(','),
+        '--output', 'ndjson',
       ];
 
+      if (fromDate) {
+        args.push('--from-date', fromDate);
+      }
+      if (toDate) {
+        args.push('--to-date', toDate);
+      }
+
+      this.logger.debug(`Executing Python script: ${this.pythonExecutable} ${args.join(' ')}`);
+
       const pythonProcess = spawn(this.pythonExecutable, args, {
         stdio: ['pipe', 'pipe', 'pipe'],
         env: this.createPythonEnv(),
       });
 
-      let stdout = '';
       let stderr = '';
+      let parseError: Error | null = null;
 
-      pythonProcess.stdout.on('data', (data) => {
-        stdout += data.toString();
+      // Every NDJSON line carries the timeframe it was resampled to
+      this.consumeNdjson(pythonProcess.stdout, (row) => {
+        if (row.success === false) {
+          parseError = new Error(row.error || 'Python script reported an error');
+          return;
+        }
+        const series = formattedResult[row.timeframe] || (formattedResult[row.timeframe] = {});
+        if (!series[row.ticker]) {
+          series[row.ticker] = [];
+        }
+        series[row.ticker].push(this.toMarketDataPoint(row.ticker, row, row.timeframe));
+      }, (error) => {
+        parseError = error;
       });
 
       pythonProcess.stderr.on('data', (data) => {
         stderr += data.toString();
+        this.logger.warn(`Python script stderr: ${data.toString()}`);
       });
 
       pythonProcess.on('close', (code) => {
-        if (code === 0) {
-          try {
-            const result = JSON.parse(stdout);
-            
-            if (result[ticker]) {
-              const data = result[ticker];
-              const marketData: IMarketDataPoint = {
-                ticker,
-                timestamp: new Date(data.timestamp),
-                timeframe: '1m', // Latest data is typically 1-minute
-                open: data.open,
-                high: data.high,
-                low: data.low,
-                close: data.close,
-                volume: data.volume,
-                change: data.change,
-                changePercent: data.change_percent,
-                totalMatchValue: data.total_match_value,
-                foreignBuyVolume: data.foreign_buy_volume,
-                foreignSellVolume: data.foreign_sell_volume,
-                matchVolume: data.match_volume,
-              };
-              
-              resolve(marketData);
-            } else {
-              resolve(null);
-            }
-          } catch (error) {
-            this.logger.error('Failed to parse latest data:', error);
-            reject(error);
-          }
+        this.forwardMetrics(stderr);
+        if (code === 0 && !parseError) {
+          this.logger.debug(`Fetched ${timeframes.join(', ')} data for ${tickers.length} tickers`);
+          resolve(formattedResult);
+        } else if (code === 0) {
+          this.logger.error('Failed to parse Python script output:', parseError);
+          reject(new Error(`Failed to parse data: ${parseError!.message}`));
         } else {
-          this.logger.error(`Python script failed with code ${code}: ${stderr}`);
-          reject(new Error(`Failed to fetch latest data: ${stderr}`));
+          this.logger.error(`Python script exited with code ${code}`);
+          this.logger.error('stderr:', stderr);
+          reject(new Error(`Python script failed with code ${code}: ${stderr}`));
         }
       });
 
@@ -245,14 +1024,115 @@ export class FiinQuantDataService {
         reject(error);
       });
 
-      // Timeout after 10 seconds
-      setTimeout(() => {
-        if (!pythonProcess.killed) {
-          pythonProcess.kill();
-          reject(new Error('Latest data fetch timeout'));
-        }
-      }, 10000);
+      // 1m pulls are larger than single-timeframe ones
+      const timer = setTimeout(() => {
+        pythonProcess.kill();
+        reject(new Error('Python script timeout'));
+      }, 60000);
+      pythonProcess.on('close', () => clearTimeout(timer));
+    });
+  }
+
+  /**
+   * Fetch latest data for specific ticker
+   */
+  async fetchLatestData(ticker: string): Promise<IMarketDataPoint | null> {
+    const result = await this.fetchLatestDataBatch([ticker]);
+    return result[ticker] || null;
+  }
+
+  /**
+   * Fetch latest data for several tickers at once.
+   *
+   * Calls made within FIINQUANT_LATEST_BATCH_MS of each other are merged into
+   * one fetcher call, and tickers already being fetched join that call instead
+   * of starting another. In serve mode the fetcher also keeps a short-lived
+   * snapshot cache (FIINQUANT_LATEST_TTL) shared by all callers.
+   */
+  async fetchLatestDataBatch(tickers: string[]): Promise<{ [ticker: string]: IMarketDataPoint }> {
+    const uniqueTickers = [...new Set(tickers)];
+    this.latestStats.requests++;
+    this.latestStats.tickers += uniqueTickers.length;
+
+    const batches = uniqueTickers.map((ticker) => {
+      const inFlight = this.inFlightLatest.get(ticker);
+      if (inFlight) {
+        this.latestStats.coalescedTickers++;
+        return inFlight;
+      }
+      return this.queueLatestTicker(ticker);
+    });
+
+    const batchResults = await Promise.all(batches);
+    const result: { [ticker: string]: IMarketDataPoint } = {};
+    uniqueTickers.forEach((ticker, index) => {
+      if (batchResults[index][ticker]) {
+        result[ticker] = batchResults[index][ticker];
+      }
     });
+    return result;
+  }
+
+  /**
+   * Latest-quote batching counters, plus the fetcher's cache statistics in serve mode
+   */
+  async getLatestDataStats(): Promise<{ node: Record<string, number>; fetcher: any }> {
+    const fetcher = this.serveModeEnabled ? await this.requestFromServer('latest-stats', {}, 5000) : null;
+    return { node: { ...this.latestStats }, fetcher };
+  }
+
+  /**
+   * Add a ticker to the batch that is still collecting, opening one if needed
+   */
+  private queueLatestTicker(ticker: string): Promise<{ [ticker: string]: IMarketDataPoint }> {
+    if (!this.pendingLatestBatch) {
+      const batchTickers = new Set<string>();
+      const promise = new Promise<void>((resolve) => setTimeout(resolve, this.latestBatchWindowMs))
+        .then(() => {
+          this.pendingLatestBatch = null;
+          return this.requestLatestData([...batchTickers]);
+        })
+        .finally(() => {
+          for (const batchTicker of batchTickers) {
+            if (this.inFlightLatest.get(batchTicker) === promise) {
+              this.inFlightLatest.delete(batchTicker);
+            }
+          }
+        });
+      this.pendingLatestBatch = { tickers: batchTickers, promise };
+    }
+
+    this.pendingLatestBatch.tickers.add(ticker);
+    this.inFlightLatest.set(ticker, this.pendingLatestBatch.promise);
+    return this.pendingLatestBatch.promise;
+  }
+
+  /**
+   * One fetcher call for the latest data of `tickers`
+   */
+  private async requestLatestData(tickers: string[]): Promise<{ [ticker: string]: IMarketDataPoint }> {
+    this.latestStats.fetcherCalls++;
+    const toPoints = (result: any) => {
+      const points: { [ticker: string]: IMarketDataPoint } = {};
+      for (const ticker of tickers) {
+        if (result && result[ticker]) {
+          // Latest data is typically 1-minute
+          points[ticker] = this.toMarketDataPoint(ticker, result[ticker], '1m');
+        }
+      }
+      return points;
+    };
+
+    if (this.serveModeEnabled) {
+      return toPoints(await this.requestFromServer('latest', { tickers }, 10000));
+    }
+
+    const args = [
+      this.pythonScriptPath,
+      '--action', 'latest',
+      '--tickers', tickers.join(','),
+    ];
+    return toPoints(await this.runPythonJson(args, 10000, 'Latest data fetch'));
   }
 
   /**
@@ -279,35 +1159,10 @@ export class FiinQuantDataService {
         env: this.createPythonEnv(),
       });
 
-      this.pythonProcess!.stdout!.on('data', (data) => {
-        try {
-          const lines = data.toString().split('\n').filter(line => line.trim());
-          
-          for (const line of lines) {
-            const marketData = JSON.parse(line);
-            
-            const formattedData: IMarketDataPoint = {
-              ticker: marketData.ticker,
-              timestamp: new Date(marketData.timestamp),
-              timeframe: '1m',
-              open: marketData.open,
-              high: marketData.high,
-              low: marketData.low,
-              close: marketData.close,
-              volume: marketData.volume,
-              change: marketData.change,
-              changePercent: marketData.change_percent,
-              totalMatchValue: marketData.total_match_value,
-              foreignBuyVolume: marketData.foreign_buy_volume,
-              foreignSellVolume: marketData.foreign_sell_volume,
-              matchVolume: marketData.match_volume,
-            };
-            
-            callback(formattedData);
-          }
-        } catch (error) {
-          this.logger.error('Failed to parse real-time data:', error);
-        }
+      this.consumeNdjson(this.pythonProcess!.stdout!, (marketData) => {
+        callback(this.toMarketDataPoint(marketData.ticker, marketData, '1m'));
+      }, (error) => {
+        this.logger.error('Failed to parse real-time data:', error);
       });
 
       this.pythonProcess!.stderr!.on('data', (data) => {
@@ -369,56 +1224,47 @@ export class FiinQuantDataService {
    * Check if market is open
    */
   async isMarketOpen(): Promise<boolean> {
-    return new Promise((resolve, reject) => {
-      const args = [
-        this.pythonScriptPath,
-        '--action', 'market-status',
-      ];
-
-      const pythonProcess = spawn(this.pythonExecutable, args, {
-        stdio: ['pipe', 'pipe', 'pipe'],
-        env: this.createPythonEnv(),
-      });
-
-      let stdout = '';
-      let stderr = '';
-
-      pythonProcess.stdout.on('data', (data) => {
-        stdout += data.toString();
-      });
+    const status = await this.getMarketStatus();
+    return status?.is_open === true;
+  }
 
-      pythonProcess.stderr.on('data', (data) => {
-        stderr += data.toString();
-      });
+  /**
+   * Exchange market status (phase, trading-day and holiday flags), cached until
+   * the next phase change reported by the fetcher's trading calendar
+   */
+  async getMarketStatus(): Promise<any | null> {
+    if (this.marketStatusCache && Date.now() < this.marketStatusCache.expiresAt) {
+      return this.marketStatusCache.status;
+    }
 
-      pythonProcess.on('close', (code) => {
-        if (code === 0) {
-          try {
-            const result = JSON.parse(stdout);
-            resolve(result.is_open === true);
-          } catch (error) {
-            this.logger.error('Failed to parse market status:', error);
-            resolve(false);
-          }
-        } else {
-          this.logger.error(`Market status check failed: ${stderr}`);
-          resolve(false);
-        }
-      });
+    const status = await this.requestMarketStatus();
+    if (status) {
+      // next_change is exchange-local time (UTC+7)
+      const nextChange = Date.parse(`${status.next_change}+07:00`);
+      this.marketStatusCache = {
+        status,
+        expiresAt: Number.isNaN(nextChange) ? Date.now() + 60000 : nextChange,
+      };
+    }
+    return status;
+  }
 
-      pythonProcess.on('error', (error) => {
+  private async requestMarketStatus(): Promise<any | null> {
+    if (this.serveModeEnabled) {
+      try {
+        return await this.requestFromServer('market-status', {}, 5000);
+      } catch (error) {
         this.logger.error('Failed to check market status:', error);
-        resolve(false);
-      });
+        return null;
+      }
+    }
 
-      // Timeout after 5 seconds
-      setTimeout(() => {
-        if (!pythonProcess.killed) {
-          pythonProcess.kill();
-          resolve(false);
-        }
-      }, 5000);
-    });
+    try {
+      return await this.runPythonJson([this.pythonScriptPath, '--action', 'market-status'], 5000, 'Market status check');
+    } catch (error) {
+      this.logger.error('Failed to check market status:', error);
+      return null;
+    }
   }
 
   /**
@@ -493,5 +1339,6 @@ export class FiinQuantDataService {
    */
   async onModuleDestroy() {
     await this.stopRealtimeStream();
+    this.stopServeProcess();
   }
 }
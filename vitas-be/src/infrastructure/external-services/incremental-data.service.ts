@@ -7,6 +7,9 @@ import { IMarketDataPoint } from '../../common/interfaces/trading.interface';
 @Injectable()
 export class IncrementalDataService {
   private readonly logger = new Logger(IncrementalDataService.name);
+  // Tickers per `--since` fetch in bulk runs, for stored and for unstored tickers
+  private readonly sinceGroupSize = 100;
+  private readonly backfillGroupSize = 20;
 
   constructor(
     private readonly marketDataService: MarketDataService,
@@ -31,61 +34,58 @@ export class IncrementalDataService {
     try {
       this.logger.log(`Processing incremental data for ${ticker}`);
 
-      // 1. Get latest data date from database
+      // 1. Get latest stored bar from database
       const dataRange = await this.marketDataService.getDataRange(ticker, timeframe);
       const lastUpdateDate = dataRange.endDate;
 
-      // 2. Determine date range for fetching
-      let fromDate: string;
-      if (lastUpdateDate) {
-        // Fetch from day after last update
-        const nextDay = new Date(lastUpdateDate);
-        nextDay.setDate(nextDay.getDate() + 1);
-        fromDate = nextDay.toISOString().split('T')[0];
-      } else {
-        // No data exists, fetch last 30 days
-        const thirtyDaysAgo = new Date();
-        thirtyDaysAgo.setDate(thirtyDaysAgo.getDate() - 30);
-        fromDate = thirtyDaysAgo.toISOString().split('T')[0];
-      }
+      // 2. Fetch only the bars newer than it (the last 30 days when nothing is stored)
+      const marketDataMap = await this.fiinQuantService.fetchHistoricalSince(
+        { [ticker]: lastUpdateDate },
+        timeframe
+      );
 
-      const toDate = new Date().toISOString().split('T')[0];
+      return await this.storeIncrementalData(ticker, timeframe, marketDataMap[ticker] || [], lastUpdateDate);
 
-      // 3. Check if we need to fetch new data
-      if (lastUpdateDate && fromDate > toDate) {
-        this.logger.log(`No new data needed for ${ticker} - up to date`);
-        return {
-          success: true,
-          newDataPoints: 0,
-          latestPrice: 0,
-          indicatorsCalculated: false,
-          message: 'No new data available'
-        };
-      }
-
-      // 4. Fetch new data from FiinQuant
-      const marketDataMap = await this.fiinQuantService.fetchHistoricalData(
-        [ticker],
-        timeframe,
-        1000, // Large number to get all available data
-        fromDate,
-        toDate
-      );
+    } catch (error) {
+      this.logger.error(`Failed to process incremental data for ${ticker}:`, error);
+      return {
+        success: false,
+        newDataPoints: 0,
+        latestPrice: 0,
+        indicatorsCalculated: false,
+        message: error.message
+      };
+    }
+  }
 
-      const newData = marketDataMap[ticker] || [];
-      
+  /**
+   * Calculate indicators for newly fetched bars of a ticker and save them
+   */
+  private async storeIncrementalData(
+    ticker: string,
+    timeframe: string,
+    newData: IMarketDataPoint[],
+    lastUpdateDate: Date | null
+  ): Promise<{
+    success: boolean;
+    newDataPoints: number;
+    latestPrice: number;
+    indicatorsCalculated: boolean;
+    message?: string;
+  }> {
+    try {
       if (newData.length === 0) {
-        this.logger.log(`No new data received for ${ticker}`);
+        this.logger.log(`No new data for ${ticker} - up to date`);
         return {
           success: true,
           newDataPoints: 0,
           latestPrice: 0,
           indicatorsCalculated: false,
-          message: 'No new data received from FiinQuant'
+          message: 'No new data available'
         };
       }
 
-      // 5. Get existing data for indicator calculation
+      // 3. Get existing data for indicator calculation
       const existingData = await this.marketDataService.getHistoricalData(
         ticker,
         timeframe,
@@ -94,7 +94,7 @@ export class IncrementalDataService {
         lastUpdateDate || undefined
       );
 
-      // 6. Combine existing and new data for indicator calculation
+      // 4. Combine existing and new data for indicator calculation
       const allData = [
         ...existingData.map(item => ({
           ticker: item.ticker,
@@ -122,14 +122,14 @@ export class IncrementalDataService {
         ...newData
       ];
 
-      // 7. Calculate indicators for all data
+      // 5. Calculate indicators for all data
       const dataWithIndicators = this.indicatorsService.calculateAllIndicators(allData);
 
-      // 8. Save only new data to database
+      // 6. Save only new data to database
       const newDataWithIndicators = dataWithIndicators.slice(-newData.length);
       const insertedCount = await this.marketDataService.bulkCreate(newDataWithIndicators);
 
-      // 9. Update existing data with new indicators (if needed)
+      // 7. Update existing data with new indicators (if needed)
       if (existingData.length > 0) {
         const updates = dataWithIndicators.slice(0, -newData.length).map(point => ({
           ticker: point.ticker,
@@ -193,6 +193,7 @@ export class IncrementalDataService {
       message?: string;
     }>;
     totalNewDataPoints: number;
+    failedGroups?: Array<{ tickers: string[]; error: string }>;
   }> {
     try {
       this.logger.log(`Processing incremental data for ${tickers.length} tickers`);
@@ -206,13 +207,56 @@ export class IncrementalDataService {
       }> = [];
       let totalNewDataPoints = 0;
 
-      // Process tickers in batches to avoid overwhelming the system
+      // Process tickers in batches to avoid overwhelming the database
       const batchSize = 5;
+      const watermarks: { [ticker: string]: Date | null } = {};
+      for (let i = 0; i < tickers.length; i += batchSize) {
+        const batch = tickers.slice(i, i + batchSize);
+        const ranges = await Promise.all(
+          batch.map(ticker => this.marketDataService.getDataRange(ticker, timeframe))
+        );
+        batch.forEach((ticker, index) => {
+          watermarks[ticker] = ranges[index].endDate;
+        });
+      }
+
+      // Tickers go to the fetcher in bounded groups: within a group it shares
+      // upstream calls between nearby watermarks and skips up-to-date tickers,
+      // and a failed group only fails its own tickers. Tickers without a
+      // watermark backfill the default range, so their groups are smaller.
+      const marketDataMap: { [ticker: string]: IMarketDataPoint[] } = {};
+      const failedTickers = new Map<string, string>();
+      const failedGroups: Array<{ tickers: string[]; error: string }> = [];
+      const groups = [
+        ...this.chunk(tickers.filter(ticker => watermarks[ticker]), this.sinceGroupSize),
+        ...this.chunk(tickers.filter(ticker => !watermarks[ticker]), this.backfillGroupSize),
+      ];
+      for (const group of groups) {
+        try {
+          const groupWatermarks = Object.fromEntries(group.map(ticker => [ticker, watermarks[ticker]]));
+          Object.assign(marketDataMap, await this.fiinQuantService.fetchHistoricalSince(groupWatermarks, timeframe));
+        } catch (error) {
+          const message = error instanceof Error ? error.message : String(error);
+          this.logger.error(`Incremental fetch failed for ${group.length} tickers (${group.join(',')}): ${message}`);
+          group.forEach(ticker => failedTickers.set(ticker, `Fetch failed: ${message}`));
+          failedGroups.push({ tickers: group, error: message });
+        }
+      }
+
       for (let i = 0; i < tickers.length; i += batchSize) {
         const batch = tickers.slice(i, i + batchSize);
         
         const batchPromises = batch.map(async (ticker) => {
-          const result = await this.processIncrementalData(ticker, timeframe);
+          const fetchError = failedTickers.get(ticker);
+          if (fetchError) {
+            return { ticker, success: false, newDataPoints: 0, latestPrice: 0, message: fetchError };
+          }
+          const result = await this.storeIncrementalData(
+            ticker,
+            timeframe,
+            marketDataMap[ticker] || [],
+            watermarks[ticker]
+          );
           return {
             ticker,
             success: result.success,
@@ -226,11 +270,6 @@ export class IncrementalDataService {
         results.push(...batchResults);
         
         totalNewDataPoints += batchResults.reduce((sum, r) => sum + r.newDataPoints, 0);
-
-        // Small delay between batches
-        if (i + batchSize < tickers.length) {
-          await new Promise(resolve => setTimeout(resolve, 1000));
-        }
       }
 
       const successCount = results.filter(r => r.success).length;
@@ -242,7 +281,8 @@ export class IncrementalDataService {
       return {
         success: true,
         results,
-        totalNewDataPoints
+        totalNewDataPoints,
+        failedGroups
       };
 
     } catch (error) {
@@ -296,4 +336,12 @@ export class IncrementalDataService {
       return [];
     }
   }
+
+  private chunk<T>(items: T[], size: number): T[][] {
+    const chunks: T[][] = [];
+    for (let i = 0; i < items.length; i += size) {
+      chunks.push(items.slice(i, i + size));
+    }
+    return chunks;
+  }
 }
@@ -2,7 +2,7 @@ import { Controller, Post, Body, Get, Delete, Logger } from '@nestjs/common';
 import { ApiTags, ApiOperation, ApiResponse, ApiBody } from '@nestjs/swagger';
 import { BaseResponseDto } from '../../common/dto/base.dto';
 import { BacktestService } from './backtest.service';
-import { RunBacktestDto, BacktestSummaryDto } from './dto/backtest.dto';
+import { RunBacktestDto, RunVectorizedBacktestDto, BacktestSummaryDto } from './dto/backtest.dto';
 
 @ApiTags('Backtest')
 @Controller('api/backtest')
@@ -111,6 +111,52 @@ export class BacktestController {
     }
   }
 
+  @Post('run-vectorized')
+  @ApiOperation({
+    summary: 'Chạy backtest vector hóa cho nhiều mã cùng lúc',
+    description: `
+      **Chức năng**: Backtest chiến lược RSI-PSAR-Engulfing trên toàn bộ danh sách mã trong một lần chạy Python.
+      
+      **Cách hoạt động**:
+      1. Python fetcher lấy dữ liệu lịch sử của mọi ticker trong một lần gọi
+      2. Chỉ báo, tín hiệu, điểm vào/ra lệnh, stop-loss/take-profit và lãi/lỗ từng giao dịch được tính bằng phép toán mảng
+      3. Tham số dạng mảng trong \`params\` được quét thành lưới, chạy song song trên nhiều process
+      4. Trả về kết quả của bộ tham số tốt nhất cùng thống kê của mọi bộ tham số (\`grid\`)
+      
+      **Lưu ý**:
+      - Không replay từng candle, không lưu tín hiệu và không gửi notification
+      - Tham số mặc định lấy từ cấu hình trading (RSI, PSAR, stop-loss, take-profit, bộ lọc thanh khoản)
+    `,
+  })
+  @ApiBody({ type: RunVectorizedBacktestDto })
+  @ApiResponse({
+    status: 200,
+    description: 'Backtest vector hóa chạy thành công',
+    type: BaseResponseDto,
+  })
+  async runVectorizedBacktest(@Body() dto: RunVectorizedBacktestDto): Promise<BaseResponseDto<BacktestSummaryDto>> {
+    this.logger.log(`Received vectorized backtest request for ${dto.tickers.length} tickers`);
+    
+    try {
+      const result = await this.backtestService.runVectorizedBacktest(dto);
+      
+      return BaseResponseDto.success(
+        result,
+        `Vectorized backtest completed. Processed ${result.totalCandles} candles, ${result.totalTrades} trades` +
+        (result.grid ? ` across ${result.grid.length} parameter sets.` : '.')
+      );
+    } catch (error) {
+      this.logger.error('Failed to run vectorized backtest:', error);
+      
+      return BaseResponseDto.error(
+        'Failed to run vectorized backtest',
+        {
+          error: error.message,
+        } as any
+      );
+    }
+  }
+
   @Get('status')
   @ApiOperation({
     summary: 'Lấy trạng thái backtest hiện tại',
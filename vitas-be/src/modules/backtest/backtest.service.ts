@@ -5,8 +5,9 @@ import { AnalysisService } from '../trading/services/analysis.service';
 import { TradingSignalService } from '../../infrastructure/database/trading-signal.service';
 import { TelegramService } from '../alerts/services/telegram.service';
 import { EmailService } from '../alerts/services/email.service';
+import { FiinQuantDataService } from '../../infrastructure/external-services/fiinquant-data.service';
 import { ITradingSignal } from '../../common/interfaces/trading.interface';
-import { RunBacktestDto, BacktestResultDto, BacktestSummaryDto } from './dto/backtest.dto';
+import { RunBacktestDto, RunVectorizedBacktestDto, BacktestResultDto, BacktestSummaryDto } from './dto/backtest.dto';
 
 @Injectable()
 export class BacktestService {
@@ -21,6 +22,7 @@ export class BacktestService {
     private readonly tradingSignalService: TradingSignalService,
     private readonly telegramService: TelegramService,
     private readonly emailService: EmailService,
+    private readonly fiinQuantService: FiinQuantDataService,
   ) {}
 
   /**
@@ -75,6 +77,63 @@ export class BacktestService {
     return summary;
   }
 
+  /**
+   * Run the strategy over all tickers at once in the Python fetcher, without
+   * replaying candles, saving signals or sending notifications. Parameters
+   * default to the trading config; array values in dto.params are swept as a
+   * grid and the best run is returned with the statistics of every run.
+   */
+  async runVectorizedBacktest(dto: RunVectorizedBacktestDto): Promise<BacktestSummaryDto> {
+    const startTime = Date.now();
+    this.logger.log(`🚀 Starting vectorized backtest for ${dto.tickers.length} tickers (${dto.timeframe || '15m'})`);
+
+    const summary = await this.fiinQuantService.runVectorizedBacktest({
+      tickers: dto.tickers,
+      timeframe: dto.timeframe || '15m',
+      fromDate: dto.fromDate,
+      toDate: dto.toDate,
+      limit: dto.limit,
+      params: { ...this.getStrategyParams(), ...(dto.params || {}) },
+      workers: dto.workers,
+      includeTrades: dto.includeTrades,
+    }) as BacktestSummaryDto;
+
+    this.logger.log(
+      `✅ Vectorized backtest completed: ${summary.totalCandles} candles, ${summary.totalSignals} signals, ` +
+      `${summary.totalTrades} trades, ${summary.grid?.length || 1} parameter sets in ${Date.now() - startTime}ms`
+    );
+    return summary;
+  }
+
+  /**
+   * Strategy, risk management and liquidity filter settings as backtest.py parameters
+   */
+  private getStrategyParams(): { [name: string]: number } {
+    const strategy = this.configService.get('trading.strategy');
+    const risk = this.configService.get('trading.riskManagement');
+    const filters = this.configService.get('trading.market.filters');
+    const params: { [name: string]: number | undefined } = {
+      rsiPeriod: strategy?.rsi?.period,
+      rsiOverbought: strategy?.rsi?.overbought,
+      rsiOversold: strategy?.rsi?.oversold,
+      psarAfInit: strategy?.psar?.afInit,
+      psarAfStep: strategy?.psar?.afStep,
+      psarAfMax: strategy?.psar?.afMax,
+      engulfingMinBodyRatio: strategy?.engulfing?.minBodyRatio,
+      volumeAvgPeriod: strategy?.volume?.avgPeriod,
+      volumeAnomalyThreshold: strategy?.volume?.anomalyThreshold,
+      stopLoss: risk?.stopLoss,
+      takeProfit: risk?.takeProfit,
+      minPrice: filters?.minPrice,
+      maxPrice: filters?.maxPrice,
+      minVolume: filters?.minVolume,
+    };
+    // Unset values fall back to the Python defaults, which mirror the config defaults
+    return Object.fromEntries(
+      Object.entries(params).filter(([, value]) => typeof value === 'number' && !isNaN(value))
+    ) as { [name: string]: number };
+  }
+
   /**
    * Process single ticker backtest
    */
@@ -1,4 +1,4 @@
-import { IsArray, IsString, IsOptional, IsNumber, Min, Max } from 'class-validator';
+import { IsArray, IsString, IsOptional, IsNumber, IsObject, IsBoolean, IsDateString, Min, Max } from 'class-validator';
 import { Type } from 'class-transformer';
 import { ApiProperty, ApiPropertyOptional } from '@nestjs/swagger';
 
@@ -61,6 +61,73 @@ export class RunBacktestDto {
   dryRun?: boolean = false;
 }
 
+export class RunVectorizedBacktestDto {
+  @ApiProperty({
+    description: 'Danh sách mã cổ phiếu cần backtest (có thể là toàn bộ thị trường)',
+    example: ['VCB', 'FPT', 'VIC'],
+    type: [String],
+    minItems: 1,
+  })
+  @IsArray()
+  @IsString({ each: true })
+  tickers: string[];
+
+  @ApiPropertyOptional({
+    description: 'Khung thời gian dữ liệu',
+    example: '15m',
+    enum: ['1m', '15m', '1h', '4h', '1d'],
+    default: '15m',
+  })
+  @IsOptional()
+  @IsString()
+  timeframe?: string = '15m';
+
+  @ApiPropertyOptional({ description: 'Ngày bắt đầu (YYYY-MM-DD), mặc định 30 ngày trước', example: '2025-01-01' })
+  @IsOptional()
+  @IsDateString()
+  fromDate?: string;
+
+  @ApiPropertyOptional({ description: 'Ngày kết thúc (YYYY-MM-DD), mặc định hôm nay', example: '2025-06-30' })
+  @IsOptional()
+  @IsDateString()
+  toDate?: string;
+
+  @ApiPropertyOptional({
+    description: 'Chỉ dùng N candles cuối cùng của mỗi ticker',
+    example: 1000,
+    minimum: 10,
+  })
+  @IsOptional()
+  @IsNumber()
+  @Type(() => Number)
+  @Min(10)
+  limit?: number;
+
+  @ApiPropertyOptional({
+    description: 'Tham số chiến lược ghi đè cấu hình (rsiOversold, stopLoss, takeProfit, feeRate, ...); giá trị dạng mảng sẽ được quét thành lưới tham số',
+    example: { rsiOversold: [25, 30, 35], stopLoss: [0.05, 0.08], feeRate: 0.0015 },
+  })
+  @IsOptional()
+  @IsObject()
+  params?: { [name: string]: number | number[] };
+
+  @ApiPropertyOptional({
+    description: 'Số process chạy song song khi quét lưới tham số (mặc định theo số CPU)',
+    example: 4,
+    minimum: 1,
+  })
+  @IsOptional()
+  @IsNumber()
+  @Type(() => Number)
+  @Min(1)
+  workers?: number;
+
+  @ApiPropertyOptional({ description: 'Trả về danh sách giao dịch của từng ticker', example: false, default: false })
+  @IsOptional()
+  @IsBoolean()
+  includeTrades?: boolean = false;
+}
+
 export class BacktestResultDto {
   @ApiProperty({ description: 'Ticker được backtest', example: 'VCB' })
   ticker: string;
@@ -88,6 +155,37 @@ export class BacktestResultDto {
 
   @ApiProperty({ description: 'Trạng thái hoàn thành', example: 'completed' })
   status: 'completed' | 'failed' | 'cancelled';
+
+  @ApiPropertyOptional({ description: 'Số giao dịch đã đóng (backtest vector hóa)', example: 8 })
+  trades?: number;
+
+  @ApiPropertyOptional({ description: 'Số giao dịch có lãi', example: 5 })
+  winningTrades?: number;
+
+  @ApiPropertyOptional({ description: 'Tỷ lệ giao dịch thắng (%)', example: 62.5 })
+  winRate?: number | null;
+
+  @ApiPropertyOptional({ description: 'Lợi nhuận kép của các giao dịch (%)', example: 12.4 })
+  totalReturnPct?: number | null;
+
+  @ApiPropertyOptional({ description: 'Lợi nhuận trung bình mỗi giao dịch (%)', example: 1.5 })
+  avgTradeReturnPct?: number | null;
+
+  @ApiPropertyOptional({ description: 'Mức sụt giảm vốn lớn nhất (%)', example: 7.8 })
+  maxDrawdownPct?: number | null;
+
+  @ApiPropertyOptional({ description: 'Tổng lãi / tổng lỗ (null khi không có giao dịch lỗ)', example: 1.8 })
+  profitFactor?: number | null;
+
+  @ApiPropertyOptional({ description: 'Danh sách giao dịch (khi includeTrades = true)' })
+  tradeList?: Array<{
+    entryTime: string;
+    exitTime: string;
+    entryPrice: number;
+    exitPrice: number;
+    exitReason: 'stop_loss' | 'take_profit' | 'signal' | 'end';
+    returnPct: number;
+  }>;
 }
 
 export class BacktestSummaryDto {
@@ -108,4 +206,37 @@ export class BacktestSummaryDto {
 
   @ApiProperty({ description: 'Trạng thái tổng thể', example: 'completed' })
   overallStatus: 'completed' | 'failed' | 'cancelled';
+
+  @ApiPropertyOptional({ description: 'Bộ tham số đã dùng (bộ tốt nhất khi quét lưới)' })
+  params?: { [name: string]: number };
+
+  @ApiPropertyOptional({ description: 'Tổng số giao dịch của mọi ticker', example: 120 })
+  totalTrades?: number;
+
+  @ApiPropertyOptional({ description: 'Tỷ lệ giao dịch thắng (%)', example: 55.2 })
+  winRate?: number | null;
+
+  @ApiPropertyOptional({ description: 'Lợi nhuận trung bình của các ticker, tỷ trọng bằng nhau (%)', example: 4.3 })
+  totalReturnPct?: number | null;
+
+  @ApiPropertyOptional({ description: 'Lợi nhuận trung bình mỗi giao dịch (%)', example: 0.9 })
+  avgTradeReturnPct?: number | null;
+
+  @ApiPropertyOptional({ description: 'Mức sụt giảm vốn lớn nhất trong các ticker (%)', example: 15.1 })
+  maxDrawdownPct?: number | null;
+
+  @ApiPropertyOptional({ description: 'Tổng lãi / tổng lỗ', example: 1.3 })
+  profitFactor?: number | null;
+
+  @ApiPropertyOptional({ description: 'Thống kê của từng bộ tham số khi quét lưới, tốt nhất trước' })
+  grid?: Array<{
+    params: { [name: string]: number };
+    totalSignals: number;
+    totalTrades: number;
+    winRate: number | null;
+    totalReturnPct: number | null;
+    avgTradeReturnPct: number | null;
+    maxDrawdownPct: number | null;
+    profitFactor: number | null;
+  }>;
 }
@@ -33,6 +33,10 @@ export class DataFetchService {
       throw new Error(`Invalid timeframe: ${timeframe}. Supported: 1d, 4h, 1h, 15m`);
     }
 
+    if (process.env.FIINQUANT_MONGO_SINK === 'true') {
+      return this.fetchAndStoreWithMongoSink(tickers, timeframe, periods, fromDate, toDate);
+    }
+
     const results: any[] = [];
     let totalDataPoints = 0;
     const errors: string[] = [];
@@ -104,18 +108,56 @@ export class DataFetchService {
     };
   }
 
+  /**
+   * One fetcher run for all tickers that computes the indicators and upserts the
+   * bars directly into the timeframe's collection (FIINQUANT_MONGO_SINK=true)
+   */
+  private async fetchAndStoreWithMongoSink(
+    tickers: string[],
+    timeframe: string,
+    periods: number,
+    fromDate?: string,
+    toDate?: string
+  ) {
+    this.logger.log(`Fetching historical data for ${tickers.length} tickers (${timeframe}) via Mongo sink`);
+
+    const summary = await this.fiinQuantService.fetchAndStoreHistoricalData(
+      tickers, timeframe, periods, fromDate, toDate, ['rsi', 'psar', 'engulfing', 'volume']
+    );
+    const withoutData = new Set(summary.tickers_without_data);
+    const errors = [
+      ...summary.tickers_without_data.map(ticker => `${ticker}: No data received`),
+      ...summary.errors,
+    ];
+    const successfulCount = tickers.length - withoutData.size;
+
+    this.logger.log(
+      `Mongo sink stored ${summary.bars} bars (${summary.upserted} new, ${summary.modified} updated) ` +
+      `in ${summary.elapsed_ms}ms: ${successfulCount}/${tickers.length} successful`
+    );
+
+    return {
+      success: successfulCount > 0 && summary.write_errors === 0,
+      totalTickers: tickers.length,
+      successfulTickers: successfulCount,
+      failedTickers: tickers.length - successfulCount,
+      totalDataPoints: summary.bars,
+      errors,
+      results: tickers.map(ticker => ({
+        ticker,
+        timeframe,
+        collection: `stock-ss${timeframe}`,
+        success: !withoutData.has(ticker),
+        ...(withoutData.has(ticker) ? { message: 'No data received' } : {}),
+      })),
+      sink: summary,
+    };
+  }
+
   async fetchLatestData(tickers: string[], timeframe: string = '15m') {
     try {
-      const latestData = await this.fiinQuantService.fetchLatestData(tickers[0]);
-      
-      const results = {};
-      for (const ticker of tickers) {
-        if (latestData && latestData[ticker]) {
-          results[ticker] = latestData[ticker];
-        }
-      }
-      
-      return results;
+      // One batched call for all tickers, shared with concurrent requests
+      return await this.fiinQuantService.fetchLatestDataBatch(tickers);
     } catch (error) {
       this.logger.error('Failed to fetch latest data:', error);
       throw error;
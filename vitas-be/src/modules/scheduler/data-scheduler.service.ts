@@ -61,6 +61,15 @@ export class DataSchedulerService {
     return isWeekday && isTradingHours;
   }
 
+  /**
+   * Check the exchange calendar so holidays are skipped; falls back to the
+   * weekday check when the market status is unavailable
+   */
+  private async isTradingDay(): Promise<boolean> {
+    const status = await this.fiinQuantService.getMarketStatus();
+    return status ? status.is_trading_day === true : true;
+  }
+
   private isTopOfHour(): boolean {
     const now = new Date();
     const vietnamTime = new Date(now.toLocaleString("en-US", {timeZone: "Asia/Ho_Chi_Minh"}));
@@ -101,8 +110,8 @@ export class DataSchedulerService {
       return;
     }
 
-    if (!this.isTradingTime()) {
-      this.logger.debug('Outside trading hours or not a weekday, skipping fetch');
+    if (!this.isTradingTime() || !(await this.isTradingDay())) {
+      this.logger.debug('Outside trading hours or not a trading day, skipping fetch');
       return;
     }
 
@@ -297,12 +306,37 @@ export class DataSchedulerService {
     return this.getNextFetchTime();
   }
 
+  /**
+   * After the close, find tickers whose adjusted prices changed (dividends, splits)
+   * and fix just their stored history instead of re-downloading every collection
+   */
+  @Cron('0 30 15 * * 1-5', { timeZone: 'Asia/Ho_Chi_Minh' })
+  async checkPriceAdjustments(): Promise<void> {
+    if (!(await this.isTradingDay())) {
+      return;
+    }
+
+    try {
+      const report = await this.fiinQuantService.checkPriceAdjustments(this.allTickers);
+      const changed = Object.keys(report.changed);
+      if (changed.length > 0) {
+        this.logger.warn(`Adjusted prices changed for ${changed.length} tickers: ${changed.join(', ')}`);
+      }
+      this.logger.log(
+        `Price adjustment check: ${report.checked} tickers in ${report.elapsed_ms}ms, ` +
+        `${report.unchanged} unchanged, ${changed.length} fixed`
+      );
+    } catch (error) {
+      this.logger.error('Price adjustment check failed:', error);
+    }
+  }
+
   /**
    * Sync 1-minute data every minute during trading hours
    */
   @Cron(CronExpression.EVERY_MINUTE)
   async sync1mData(): Promise<void> {
-    if (!this.isTradingTime()) {
+    if (!this.isTradingTime() || !(await this.isTradingDay())) {
       return;
     }
 